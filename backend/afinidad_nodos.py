@@ -0,0 +1,277 @@
+# afinidad_nodos.py
+# ===================================================================================
+# --- AFINIDAD DE WORKSPACES ENTRE NODOS (ANILLO DE HASH CONSISTENTE) ---
+# ===================================================================================
+# Las cachés de DataFrames, agregados y auditorías son locales a cada proceso (ver
+# precalculo.py). Si el balanceador reparte las peticiones de un workspace al azar
+# entre N nodos, cada nodo parsea su propia copia y la tasa de aciertos cae ~1/N.
+#
+# Cada workspace (o sesión anónima) tiene un nodo "dueño" según un anillo de hash
+# consistente. El dueño se decide solo con la ruta, la query y las cabeceras
+# (X-Workspace-ID, que el frontend copia del formulario, y X-Session-ID), sin leer
+# el cuerpo: el nodo que recibe la petición la atiende si es el dueño y, si no,
+# se la reenvía al dueño pasándole el cuerpo a medida que llega, sin guardarlo en
+# memoria. Si el dueño no responde a la conexión se prueba el siguiente nodo del
+# anillo y, en último caso, se atiende localmente. Un nodo se da por caído recién
+# tras varios fallos seguidos (sondeos o reenvíos), para que un sondeo lento bajo
+# carga no lo saque y lo vuelva a meter en el anillo a cada rato.
+# Agregar o quitar un nodo solo mueve ~1/N de los workspaces.
+#
+# Configuración (sin CLUSTER_NODES la afinidad está desactivada):
+#   CLUSTER_NODES      URLs base de todos los nodos, separadas por comas
+#   CLUSTER_SELF_URL   URL base de este nodo (debe estar en CLUSTER_NODES)
+# Ver bench_afinidad_nodos.py para medir la tasa de aciertos con varios procesos.
+import os
+import re
+import json
+import time
+import asyncio
+import bisect
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+NODOS_CLUSTER = [n.strip().rstrip("/") for n in os.getenv("CLUSTER_NODES", "").split(",") if n.strip()]
+NODO_PROPIO = os.getenv("CLUSTER_SELF_URL", "").strip().rstrip("/")
+NODOS_VIRTUALES = int(os.getenv("CLUSTER_VIRTUAL_NODES", "160"))
+# Fallos seguidos (sondeos o conexiones de reenvío) para dar un nodo por caído
+FALLOS_PARA_CAIDA = int(os.getenv("CLUSTER_DOWN_AFTER_FAILURES", "3"))
+# Un nodo caído no recibe reenvíos durante este tiempo (o hasta que el sondeo lo vea sano)
+SEGUNDOS_NODO_CAIDO = float(os.getenv("CLUSTER_DOWN_SECONDS", "15"))
+SEGUNDOS_ENTRE_SONDEOS = float(os.getenv("CLUSTER_HEALTH_INTERVAL", "5"))
+SEGUNDOS_TIMEOUT_REENVIO = float(os.getenv("CLUSTER_FORWARD_TIMEOUT", "300"))
+SEGUNDOS_TIMEOUT_SONDEO = float(os.getenv("CLUSTER_HEALTH_TIMEOUT", "5"))
+
+# Marca las peticiones ya reenviadas: el nodo que la recibe la atiende sí o sí (nunca hay dos saltos)
+CABECERA_REENVIO = "x-ftros-forwarded-by"
+CABECERA_NODO = "x-ftros-node"
+RUTA_SONDEO = "/healthcheck"
+# Cabeceras que describen la conexión y no el contenido: no se copian al reenviar
+CABECERAS_DE_SALTO = {b"host", b"connection", b"keep-alive", b"transfer-encoding", b"te", b"trailer", b"upgrade"}
+
+_PATRON_WORKSPACE_RUTA = re.compile(r"^/workspaces/([^/]+)")
+
+
+def _hash(texto: str) -> int:
+    return int.from_bytes(hashlib.md5(texto.encode("utf-8")).digest()[:8], "big")
+
+
+class AnilloConsistente:
+    def __init__(self, nodos: List[str], nodos_virtuales: int = NODOS_VIRTUALES):
+        self.nodos = list(dict.fromkeys(nodos))
+        puntos = sorted((_hash(f"{nodo}#{i}"), nodo) for nodo in self.nodos for i in range(nodos_virtuales))
+        self._hashes = [h for h, _ in puntos]
+        self._nodos_por_punto = [nodo for _, nodo in puntos]
+
+    def candidatos(self, clave: str) -> List[str]:
+        """Nodos en el orden en que deben atender la clave: el dueño y luego sus sucesores."""
+        if not self._hashes:
+            return []
+        inicio = bisect.bisect(self._hashes, _hash(clave)) % len(self._hashes)
+        vistos: List[str] = []
+        for i in range(len(self._hashes)):
+            nodo = self._nodos_por_punto[(inicio + i) % len(self._hashes)]
+            if nodo not in vistos:
+                vistos.append(nodo)
+                if len(vistos) == len(self.nodos):
+                    break
+        return vistos
+
+
+def clave_afinidad(scope: dict) -> Optional[str]:
+    """
+    Workspace de la petición (ruta, query o cabecera X-Workspace-ID) o, si no hay,
+    la sesión anónima (X-Session-ID). None = petición sin estado: se atiende donde llegó.
+    """
+    coincidencia = _PATRON_WORKSPACE_RUTA.match(scope.get("path", ""))
+    if coincidencia:
+        return f"ws:{coincidencia.group(1)}"
+    workspace_id = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("workspace_id", [None])[0]
+    if workspace_id:
+        return f"ws:{workspace_id}"
+
+    cabeceras = {k.lower(): v for k, v in scope.get("headers", [])}
+    if cabeceras.get(b"x-workspace-id"):
+        return f"ws:{cabeceras[b'x-workspace-id'].decode('latin-1')}"
+    session_id = cabeceras.get(b"x-session-id")
+    return f"s:{session_id.decode('latin-1')}" if session_id else None
+
+
+class ClusterAfinidad:
+    def __init__(self, nodos: List[str], nodo_propio: str, nodos_virtuales: int = NODOS_VIRTUALES):
+        self.nodo_propio = nodo_propio
+        # Sin la lista de nodos o sin saber quiénes somos, cada nodo atiende todo (comportamiento anterior)
+        self.activo = len(nodos) > 1 and nodo_propio in nodos
+        self.anillo = AnilloConsistente(nodos, nodos_virtuales)
+        self._caidos_hasta: Dict[str, float] = {}
+        self._fallos_seguidos: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._tarea_sondeo: Optional[asyncio.Task] = None
+        self.metricas = {"locales": 0, "sin_clave": 0, "reenviadas": 0, "recibidas_reenviadas": 0, "reenvios_fallidos": 0, "atendidas_por_respaldo": 0}
+
+    @classmethod
+    def desde_entorno(cls) -> "ClusterAfinidad":
+        return cls(NODOS_CLUSTER, NODO_PROPIO)
+
+    def _contar(self, metrica: str):
+        with self._lock:
+            self.metricas[metrica] += 1
+
+    def esta_sano(self, nodo: str) -> bool:
+        return nodo == self.nodo_propio or self._caidos_hasta.get(nodo, 0) <= time.monotonic()
+
+    def registrar_fallo(self, nodo: str):
+        """Un sondeo o una conexión de reenvío fallida; al llegar a FALLOS_PARA_CAIDA seguidos, el nodo se da por caído."""
+        with self._lock:
+            fallos = self._fallos_seguidos.get(nodo, 0) + 1
+            self._fallos_seguidos[nodo] = fallos
+            if fallos < FALLOS_PARA_CAIDA:
+                return
+            ya_caido = self._caidos_hasta.get(nodo, 0) > time.monotonic()
+            self._caidos_hasta[nodo] = time.monotonic() + SEGUNDOS_NODO_CAIDO
+        if not ya_caido:
+            print(f"⚠️ Nodo '{nodo}' no responde ({fallos} fallos seguidos): sus workspaces pasan al siguiente nodo del anillo.")
+
+    def registrar_exito(self, nodo: str):
+        with self._lock:
+            self._fallos_seguidos.pop(nodo, None)
+            volvio = self._caidos_hasta.pop(nodo, None) is not None
+        if volvio:
+            print(f"✅ Nodo '{nodo}' vuelve a estar disponible.")
+
+    def nodos_para(self, clave: str) -> List[str]:
+        """Candidatos sanos para la clave, en orden; el nodo propio siempre está."""
+        return [nodo for nodo in self.anillo.candidatos(clave) if self.esta_sano(nodo)]
+
+    def cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(timeout=httpx.Timeout(SEGUNDOS_TIMEOUT_REENVIO, connect=2.0))
+        return self._cliente
+
+    # --- SONDEO DE SALUD EN SEGUNDO PLANO ---
+    async def _sondear(self):
+        while True:
+            for nodo in self.anillo.nodos:
+                if nodo == self.nodo_propio:
+                    continue
+                try:
+                    respuesta = await self.cliente().get(nodo + RUTA_SONDEO, timeout=SEGUNDOS_TIMEOUT_SONDEO)
+                    if respuesta.status_code == 200:
+                        self.registrar_exito(nodo)
+                    else:
+                        self.registrar_fallo(nodo)
+                except httpx.HTTPError:
+                    self.registrar_fallo(nodo)
+            await asyncio.sleep(SEGUNDOS_ENTRE_SONDEOS)
+
+    def iniciar_sondeo(self):
+        if self.activo and self._tarea_sondeo is None:
+            self._tarea_sondeo = asyncio.create_task(self._sondear())
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            metricas = dict(self.metricas)
+        return {
+            "activo": self.activo,
+            "nodo_propio": self.nodo_propio,
+            "nodos": {nodo: ("sano" if self.esta_sano(nodo) else "caido") for nodo in self.anillo.nodos},
+            **metricas,
+        }
+
+
+CLUSTER = ClusterAfinidad.desde_entorno()
+
+
+class _CuerpoEnStreaming:
+    """
+    Pasa el cuerpo de la petición al nodo dueño a medida que llega, sin juntarlo en
+    memoria. `iniciado` indica si ya se consumió algo de `receive`: a partir de ahí
+    la petición ya no se puede atender en otro nodo ni localmente.
+    """
+    def __init__(self, receive):
+        self.receive = receive
+        self.iniciado = False
+
+    async def __aiter__(self):
+        self.iniciado = True
+        while True:
+            mensaje = await self.receive()
+            if mensaje["type"] != "http.request":
+                # El cliente se desconectó a mitad del envío
+                raise ConnectionAbortedError("El cliente cerró la conexión antes de enviar todo el cuerpo.")
+            if mensaje.get("body"):
+                yield mensaje["body"]
+            if not mensaje.get("more_body", False):
+                return
+
+
+class MiddlewareAfinidad:
+    """Middleware ASGI: atiende localmente o reenvía al nodo dueño del workspace."""
+
+    def __init__(self, app, cluster: Optional[ClusterAfinidad] = None):
+        self.app = app
+        self.cluster = cluster or CLUSTER
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.cluster.activo:
+            return await self.app(scope, receive, send)
+        if any(k.lower() == CABECERA_REENVIO.encode() for k, _ in scope.get("headers", [])):
+            self.cluster._contar("recibidas_reenviadas")
+            return await self.app(scope, receive, send)
+
+        clave = clave_afinidad(scope)
+        if clave is None:
+            self.cluster._contar("sin_clave")
+            return await self.app(scope, receive, send)
+
+        for posicion, nodo in enumerate(self.cluster.nodos_para(clave)):
+            if nodo == self.cluster.nodo_propio:
+                self.cluster._contar("locales" if posicion == 0 else "atendidas_por_respaldo")
+                return await self.app(scope, receive, send)
+            cuerpo = _CuerpoEnStreaming(receive)
+            try:
+                await self._reenviar(nodo, scope, cuerpo, send)
+                self.cluster._contar("reenviadas")
+                self.cluster.registrar_exito(nodo)
+                return
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                self.cluster._contar("reenvios_fallidos")
+                self.cluster.registrar_fallo(nodo)
+                if cuerpo.iniciado:
+                    # El cuerpo ya se empezó a consumir: no se puede volver a enviar a otro nodo
+                    await _responder_error(send, 502, "El nodo dueño del workspace no respondió.")
+                    return
+                # La petición no llegó al dueño: es seguro probar con el siguiente
+        self.cluster._contar("atendidas_por_respaldo")
+        return await self.app(scope, receive, send)
+
+    async def _reenviar(self, nodo: str, scope, cuerpo: "_CuerpoEnStreaming", send):
+        ruta = scope.get("raw_path") or scope["path"].encode()
+        url = nodo + ruta.decode("latin-1")
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        # Se conserva content-length si el cliente lo envió; si no, httpx usa transfer-encoding: chunked
+        cabeceras = [(k, v) for k, v in scope.get("headers", []) if k.lower() not in CABECERAS_DE_SALTO]
+        cabeceras.append((CABECERA_REENVIO.encode(), self.cluster.nodo_propio.encode()))
+        if scope.get("client"):
+            cabeceras.append((b"x-forwarded-for", scope["client"][0].encode()))
+
+        async with self.cluster.cliente().stream(scope["method"], url, headers=cabeceras, content=cuerpo) as respuesta:
+            cabeceras_respuesta = [(k, v) for k, v in respuesta.headers.raw if k.lower() not in CABECERAS_DE_SALTO]
+            cabeceras_respuesta.append((CABECERA_NODO.encode(), nodo.encode()))
+            await send({"type": "http.response.start", "status": respuesta.status_code, "headers": cabeceras_respuesta})
+            # aiter_raw: el cuerpo va tal cual (sin descomprimir) y con su content-encoding original
+            async for bloque in respuesta.aiter_raw():
+                await send({"type": "http.response.body", "body": bloque, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _responder_error(send, estado: int, detalle: str):
+    cuerpo = json.dumps({"detail": detalle}).encode("utf-8")
+    await send({"type": "http.response.start", "status": estado,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())]})
+    await send({"type": "http.response.body", "body": cuerpo, "more_body": False})
@@ -0,0 +1,104 @@
+# auditoria_compacta.py
+# ===================================================================================
+# --- INFORME DE EVOLUCIÓN: DOCUMENTO COMPACTO + DETALLE EN STORAGE ---
+# ===================================================================================
+# El informe completo (con la vista previa y la lista de SKUs de cada tarea) puede
+# acercarse al límite de 1 MiB de un documento de Firestore en catálogos grandes.
+# Guardamos en 'auditorias/latest' solo lo que se dibuja de inmediato (puntaje,
+# KPIs, encabezados de tareas y archivos de origen) y movemos los campos pesados
+# de cada tarea a un JSON comprimido en Storage, que se lee solo cuando se pide.
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+FORMATO_COMPACTO = "compacto_v1"
+
+# Campos de cada tarea que se mueven al detalle
+CAMPOS_PESADOS = ("preview_data", "skus_afectados")
+
+# Listas de tareas dentro del informe, con la ruta para llegar a ellas
+SECCIONES_DE_TAREAS = {
+    "plan_de_accion": ("plan_de_accion",),
+    "nuevos_problemas": ("log_eventos", "nuevos_problemas"),
+    "problemas_resueltos": ("log_eventos", "problemas_resueltos"),
+}
+
+# Campos que bastan para saber si el informe está al día (lectura con máscara de campos)
+CAMPOS_ESTADO = ["source_files", "tipo", "fecha_actual", "puntaje_actual", "puntaje_salud", "formato"]
+
+
+def _obtener_lista(informe: Dict[str, Any], ruta: Tuple[str, ...]) -> Optional[List[Dict[str, Any]]]:
+    nodo: Any = informe
+    for clave in ruta:
+        if not isinstance(nodo, dict):
+            return None
+        nodo = nodo.get(clave)
+    return nodo if isinstance(nodo, list) else None
+
+
+def separar_informe(informe: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Divide un informe (ya limpio para JSON) en (compacto, detalle).
+    El compacto conserva cada tarea sin sus campos pesados y agrega 'num_skus_afectados';
+    el detalle es {seccion: {task_id: {campo_pesado: valor}}}.
+    """
+    compacto = dict(informe)
+    if isinstance(informe.get("log_eventos"), dict):
+        compacto["log_eventos"] = dict(informe["log_eventos"])
+
+    detalle: Dict[str, Dict[str, Any]] = {}
+    for seccion, ruta in SECCIONES_DE_TAREAS.items():
+        tareas = _obtener_lista(informe, ruta)
+        if tareas is None:
+            continue
+        tareas_compactas = []
+        detalle[seccion] = {}
+        for tarea in tareas:
+            encabezado = {k: v for k, v in tarea.items() if k not in CAMPOS_PESADOS}
+            encabezado["num_skus_afectados"] = len(tarea.get("skus_afectados") or [])
+            tareas_compactas.append(encabezado)
+            pesados = {k: tarea[k] for k in CAMPOS_PESADOS if k in tarea}
+            if pesados:
+                detalle[seccion][tarea.get("id")] = pesados
+
+        # Reemplazamos la lista en la copia compacta (sin tocar el informe original)
+        contenedor = compacto
+        for clave in ruta[:-1]:
+            contenedor = contenedor[clave]
+        contenedor[ruta[-1]] = tareas_compactas
+
+    compacto["formato"] = FORMATO_COMPACTO
+    return compacto, detalle
+
+
+def hidratar_informe(compacto: Dict[str, Any], detalle: Dict[str, Any]) -> Dict[str, Any]:
+    """Reconstruye el informe completo a partir del documento compacto y su detalle."""
+    informe = dict(compacto)
+    if isinstance(compacto.get("log_eventos"), dict):
+        informe["log_eventos"] = dict(compacto["log_eventos"])
+
+    for seccion, ruta in SECCIONES_DE_TAREAS.items():
+        tareas = _obtener_lista(compacto, ruta)
+        if tareas is None:
+            continue
+        pesados_por_tarea = detalle.get(seccion, {})
+        contenedor = informe
+        for clave in ruta[:-1]:
+            contenedor = contenedor[clave]
+        contenedor[ruta[-1]] = [
+            {**tarea, **pesados_por_tarea.get(tarea.get("id"), {})} for tarea in tareas
+        ]
+    informe.pop("detalle", None)
+    return informe
+
+
+def detalle_de_tarea(detalle: Dict[str, Any], task_id: str) -> Optional[Dict[str, Any]]:
+    """Campos pesados de una tarea, buscándola en todas las secciones."""
+    for seccion in SECCIONES_DE_TAREAS:
+        encontrado = detalle.get(seccion, {}).get(task_id)
+        if encontrado is not None:
+            return encontrado
+    return None
+
+
+def serializar_detalle(detalle: Dict[str, Any]) -> bytes:
+    return json.dumps(detalle, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
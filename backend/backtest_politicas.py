@@ -0,0 +1,181 @@
+# backtest_politicas.py
+# ===================================================================================
+# --- BACKTESTING DE POLÍTICAS DE REPOSICIÓN (SIMULACIÓN VECTORIZADA) ---
+# ===================================================================================
+# ¿Los parámetros de los Puntos de Alerta / Plan de Compra (lead time, días de
+# cobertura, días de seguridad, peso histórico) habrían evitado los quiebres del
+# último año? Este módulo "re-juega" la demanda diaria real del archivo de ventas
+# contra la política de reposición, para TODOS los SKUs a la vez:
+#
+# - Cada `dias_entre_recalculos` días se recalcula la política con la información
+#   disponible hasta ese día (nunca con ventas futuras), igual que en los reportes:
+#       PDA      = PDA efectivo reciente * (1 - peso) + PDA efectivo general * peso
+#       Alerta   = PDA * lead time + stock de seguridad ('dias' o 'variabilidad')
+#       Ideal    = PDA * días de cobertura ideal * factor de la categoría
+#   Las ventas de las ventanas se llevan como sumas móviles (se suma el día que
+#   entra y se resta el que sale), sin recorrer el historial en cada recálculo.
+# - Cada día: llegan los pedidos en tránsito, se atiende la demanda con el stock
+#   disponible (lo que no alcanza es venta perdida) y, si el stock + lo que está en
+#   camino queda en o bajo el Punto de Alerta, se pide hasta el Stock Ideal. El
+#   pedido llega `lead_time_dias` días después.
+#
+# El único bucle de Python es sobre los días; cada paso opera sobre arreglos
+# (escenarios x SKUs). Los parámetros de la política aceptan un valor o una lista
+# (un escenario por valor), así el mismo recorrido evalúa varias políticas a la vez.
+#
+# Simplificaciones: la simulación arranca con cada SKU en su Stock Ideal, no
+# incluye los ajustes por importancia y rotación de los reportes (dependen del
+# ranking del momento) y toma la venta histórica como demanda (la venta que no
+# ocurrió por falta de stock no se observa).
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+Parametro = Union[float, Sequence[float], np.ndarray]
+
+DIAS_SIMULACION = 365
+DIAS_MINIMOS_SIMULACION = 28
+
+
+def _por_escenario(valor: Parametro) -> np.ndarray:
+    """Parámetro como columna (escenarios x 1) para operar contra arreglos (escenarios x SKUs)."""
+    return np.atleast_1d(np.asarray(valor, dtype=np.float64)).reshape(-1, 1)
+
+
+def simular_politica(
+    demanda: np.ndarray,
+    dias_historia: int,
+    costo_unitario: np.ndarray,
+    lead_time_dias: Parametro = 7.0,
+    dias_cobertura_ideal_base: Parametro = 10,
+    dias_seguridad_base: Parametro = 0,
+    peso_ventas_historicas: Parametro = 0.6,
+    dias_analisis_ventas_recientes: Parametro = 30,
+    dias_analisis_ventas_general: Parametro = 90,
+    factor_cobertura: Optional[np.ndarray] = None,
+    metodo_stock_seguridad: str = 'dias',
+    nivel_servicio: Parametro = 0.95,
+    coef_variacion_lead_time: Parametro = 0.25,
+    dias_entre_recalculos: int = 7,
+) -> Dict[str, np.ndarray]:
+    """
+    Simula la política sobre `demanda` (días x SKUs): los primeros `dias_historia`
+    días solo alimentan las ventanas del PDA y el resto se simula. Los parámetros
+    de la política pueden ser listas de igual largo (escenarios); cada métrica se
+    devuelve como arreglo (escenarios x SKUs).
+    """
+    num_dias, num_skus = demanda.shape
+    params = np.broadcast_arrays(*[_por_escenario(p) for p in (
+        lead_time_dias, dias_cobertura_ideal_base, dias_seguridad_base, peso_ventas_historicas,
+        dias_analisis_ventas_recientes, dias_analisis_ventas_general, nivel_servicio, coef_variacion_lead_time
+    )])
+    lead_time, cobertura, seguridad, peso, dias_rec, dias_gen, servicio, cv_lead_time = params
+    num_escenarios = len(lead_time)
+    dias_rec = np.clip(np.round(dias_rec), 1, dias_historia).astype(np.int64)
+    dias_gen = np.clip(np.maximum(np.round(dias_gen), dias_rec), 1, dias_historia).astype(np.int64)
+    # Un pedido hecho al cierre del día t está disponible al inicio del día t + L
+    dias_entrega = np.maximum(1, np.ceil(lead_time - 1e-9)).astype(np.int64).ravel()
+    z = np.array([NormalDist().inv_cdf(min(max(float(s), 0.5), 0.999)) for s in servicio.ravel()]).reshape(-1, 1)
+    factor_cobertura = np.ones(num_skus) if factor_cobertura is None else np.asarray(factor_cobertura, dtype=np.float64)
+    forma = (num_escenarios, num_skus)
+
+    # Sumas móviles de las ventanas (ventas, días con venta y cuadrados) al inicio de la simulación
+    vendio = (demanda > 0).astype(np.int8)
+    def _ventana(dias: np.ndarray, valores: np.ndarray) -> np.ndarray:
+        acumulado = np.concatenate([np.zeros((1, num_skus)), np.cumsum(valores[:dias_historia], axis=0, dtype=np.float64)])
+        return acumulado[dias_historia] - acumulado[dias_historia - dias.ravel()]
+    ventas_rec, dias_venta_rec = _ventana(dias_rec, demanda), _ventana(dias_rec, vendio)
+    ventas_gen, dias_venta_gen = _ventana(dias_gen, demanda), _ventana(dias_gen, vendio)
+    cuadrados_gen = _ventana(dias_gen, np.square(demanda, dtype=np.float64))
+
+    def _politica():
+        pda_rec = np.divide(ventas_rec, dias_venta_rec, out=np.zeros(forma), where=dias_venta_rec > 0)
+        pda_gen = np.divide(ventas_gen, dias_venta_gen, out=np.zeros(forma), where=dias_venta_gen > 0)
+        pda_rec = np.where(pda_rec > 0, pda_rec, pda_gen)
+        pda_gen = np.where(pda_gen > 0, pda_gen, ventas_gen / dias_gen)
+        pda = np.round(pda_rec * (1 - peso) + pda_gen * peso, 2)
+        if metodo_stock_seguridad == 'variabilidad':
+            media = ventas_gen / dias_gen
+            varianza = np.clip(cuadrados_gen / dias_gen - media ** 2, 0, None)
+            stock_seguridad = np.round(z * np.sqrt(lead_time * varianza + media ** 2 * (cv_lead_time * lead_time) ** 2))
+        else:
+            stock_seguridad = np.round(pda * seguridad)
+        alerta = np.round(pda * lead_time) + stock_seguridad
+        ideal = np.clip(np.round(pda * cobertura * factor_cobertura), 0, None)
+        return alerta, ideal
+
+    alerta, ideal = _politica()
+    stock = ideal.copy()
+    en_transito = np.zeros(forma)
+    llegadas = np.zeros((int(dias_entrega.max()) + 1, *forma))
+    escenario = np.arange(num_escenarios)
+
+    demanda_total = np.zeros(forma)
+    atendida = np.zeros(forma)
+    dias_quiebre = np.zeros(forma, dtype=np.int64)
+    stock_acumulado = np.zeros(forma)
+    pedidos = np.zeros(forma, dtype=np.int64)
+    unidades_pedidas = np.zeros(forma)
+
+    for t in range(dias_historia, num_dias):
+        if t > dias_historia and (t - dias_historia) % dias_entre_recalculos == 0:
+            alerta, ideal = _politica()
+        ranura = t % len(llegadas)
+        stock += llegadas[ranura]
+        en_transito -= llegadas[ranura]
+        llegadas[ranura] = 0
+
+        hoy = demanda[t]
+        vendido = np.minimum(stock, hoy)
+        stock -= vendido
+        demanda_total += hoy
+        atendida += vendido
+        dias_quiebre += vendido < hoy
+        stock_acumulado += stock
+
+        posicion = stock + en_transito
+        pedido = np.where(posicion <= alerta, np.ceil(np.clip(ideal - posicion, 0, None)), 0)
+        llegadas[(t + dias_entrega) % len(llegadas), escenario] += pedido
+        en_transito += pedido
+        pedidos += pedido > 0
+        unidades_pedidas += pedido
+
+        # Las ventanas avanzan un día: entra t y sale t - dias (nunca antes del día 0: dias <= dias_historia)
+        sale_rec, sale_gen = t - dias_rec.ravel(), t - dias_gen.ravel()
+        ventas_rec += hoy - demanda[sale_rec]
+        ventas_gen += hoy - demanda[sale_gen]
+        dias_venta_rec += vendio[t] - vendio[sale_rec]
+        dias_venta_gen += vendio[t] - vendio[sale_gen]
+        cuadrados_gen += np.square(hoy, dtype=np.float64) - np.square(demanda[sale_gen], dtype=np.float64)
+
+    dias_simulados = max(num_dias - dias_historia, 1)
+    stock_promedio = stock_acumulado / dias_simulados
+    return {
+        "demanda": demanda_total,
+        "atendida": atendida,
+        "fill_rate": np.divide(atendida, demanda_total, out=np.ones(forma), where=demanda_total > 0),
+        "dias_quiebre": dias_quiebre,
+        "stock_promedio": stock_promedio,
+        "valor_inventario_promedio": stock_promedio * costo_unitario,
+        "pedidos": pedidos,
+        "unidades_pedidas": unidades_pedidas,
+        "dias_simulados": np.int64(num_dias - dias_historia),
+    }
+
+
+def resumen_escenarios(resultado: Dict[str, np.ndarray], costo_unitario: np.ndarray) -> pd.DataFrame:
+    """Métricas agregadas por escenario: fill rate en unidades, días-SKU en quiebre e inventario valorizado."""
+    demanda = resultado["demanda"].sum(axis=1)
+    perdida = (resultado["demanda"] - resultado["atendida"])
+    dias_simulados = int(resultado["dias_simulados"])
+    return pd.DataFrame({
+        "Fill Rate": np.divide(resultado["atendida"].sum(axis=1), demanda, out=np.ones(len(demanda)), where=demanda > 0),
+        "Dias SKU en Quiebre": resultado["dias_quiebre"].sum(axis=1),
+        "Dias SKU en Quiebre (%)": resultado["dias_quiebre"].sum(axis=1) / max(dias_simulados * perdida.shape[1], 1),
+        "Unidades Perdidas": perdida.sum(axis=1),
+        "Venta Perdida a Costo": (perdida * costo_unitario).sum(axis=1),
+        "Inventario Promedio Valorizado": resultado["valor_inventario_promedio"].sum(axis=1),
+        "Pedidos Colocados": resultado["pedidos"].sum(axis=1),
+    })
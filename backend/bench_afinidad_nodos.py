@@ -0,0 +1,169 @@
+# bench_afinidad_nodos.py
+# ===================================================================================
+# --- SIMULACIÓN: TASA DE ACIERTOS DE CACHÉ CON VARIOS NODOS Y AFINIDAD ---
+# ===================================================================================
+# Levanta N procesos uvicorn en localhost, cada uno con una aplicación mínima que
+# imita el costo de parsear los archivos de un workspace (una caché CacheTTL
+# acotada por nodo y un retardo en cada fallo), envuelta en MiddlewareAfinidad.
+# El workspace viaja en la cabecera X-Workspace-ID, como lo envía el frontend.
+# Un "balanceador" reparte las peticiones al azar entre los nodos, con popularidad
+# de workspaces tipo Zipf, y se mide la tasa de aciertos:
+#   1. sin afinidad (cada nodo atiende lo que le llega),
+#   2. con afinidad (anillo de hash consistente y reenvío al dueño),
+#   3. con afinidad y un nodo caído a mitad de la prueba (respaldo en el anillo).
+#
+# Uso:
+#   python bench_afinidad_nodos.py --nodos 4 --workspaces 400 --peticiones 4000
+import os
+import sys
+import time
+import socket
+import random
+import asyncio
+import argparse
+import multiprocessing as mp
+
+import httpx
+
+MS_PARSEO = 40
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servir(puerto: int, nodos: list, con_afinidad: bool, capacidad_cache: int):
+    """Proceso hijo: un nodo de la simulación."""
+    import warnings
+    warnings.filterwarnings("ignore", category=DeprecationWarning) # on_event, igual que en main.py
+    import uvicorn
+    from fastapi import FastAPI, Form
+    from afinidad_nodos import ClusterAfinidad, MiddlewareAfinidad
+    from cache_local import CacheTTL
+
+    propio = f"http://127.0.0.1:{puerto}"
+    cluster = ClusterAfinidad(nodos if con_afinidad else [propio], propio)
+    cache = CacheTTL(ttl_segundos=3600, max_entradas=capacidad_cache)
+    app = FastAPI()
+
+    @app.get("/healthcheck")
+    async def healthcheck():
+        return {"status": "ok"}
+
+    @app.post("/reporte")
+    async def reporte(workspace_id: str = Form(...)):
+        acierto = cache.obtener(workspace_id) is not None
+        if not acierto:
+            await asyncio.sleep(MS_PARSEO / 1000) # "descarga y parseo"
+            cache.guardar(True, clave=workspace_id)
+        return {"nodo": propio, "acierto": acierto}
+
+    @app.get("/metricas")
+    async def metricas():
+        return {"cache": cache.estadisticas(), "cluster": cluster.estadisticas()}
+
+    @app.on_event("startup")
+    async def iniciar():
+        cluster.iniciar_sondeo()
+
+    uvicorn.run(MiddlewareAfinidad(app, cluster), host="127.0.0.1", port=puerto, log_level="error")
+
+
+def _levantar(num_nodos: int, con_afinidad: bool, capacidad_cache: int):
+    puertos = [_puerto_libre() for _ in range(num_nodos)]
+    nodos = [f"http://127.0.0.1:{p}" for p in puertos]
+    procesos = [mp.Process(target=_servir, args=(p, nodos, con_afinidad, capacidad_cache), daemon=True) for p in puertos]
+    for proceso in procesos:
+        proceso.start()
+    for nodo in nodos:
+        for _ in range(100):
+            try:
+                if httpx.get(nodo + "/healthcheck", timeout=0.5).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+    return nodos, procesos
+
+
+async def _trafico(nodos: list, workspaces: int, peticiones: int, concurrencia: int, al_llegar_a=None):
+    rng = random.Random(11)
+    pesos = [1 / (rango + 1) ** 0.8 for rango in range(workspaces)]
+    secuencia = rng.choices(range(workspaces), weights=pesos, k=peticiones)
+    vivos = list(nodos)
+    resultados = {"aciertos": 0, "fallos": 0, "errores": 0, "latencias": []}
+    cola: asyncio.Queue = asyncio.Queue()
+    for i, ws in enumerate(secuencia):
+        cola.put_nowait((i, ws))
+
+    async def trabajador(cliente):
+        while not cola.empty():
+            i, ws = cola.get_nowait()
+            if al_llegar_a and i == al_llegar_a[0]:
+                vivos.remove(al_llegar_a[1]()) # el balanceador deja de enviarle tráfico
+            inicio = time.perf_counter()
+            try:
+                # Como el frontend: el workspace va en el formulario y en la cabecera X-Workspace-ID
+                respuesta = await cliente.post(rng.choice(vivos) + "/reporte", data={"workspace_id": f"ws{ws:04d}"},
+                                               headers={"X-Workspace-ID": f"ws{ws:04d}"})
+                respuesta.raise_for_status()
+                resultados["aciertos" if respuesta.json()["acierto"] else "fallos"] += 1
+                resultados["latencias"].append(time.perf_counter() - inicio)
+            except httpx.HTTPError:
+                resultados["errores"] += 1
+
+    async with httpx.AsyncClient(timeout=30) as cliente:
+        await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+    return resultados
+
+
+def _reportar(titulo: str, resultados: dict, nodos: list):
+    total = resultados["aciertos"] + resultados["fallos"]
+    latencias = sorted(resultados["latencias"]) or [0]
+    print(f"\n--- {titulo} ---")
+    print(f"Tasa de aciertos: {resultados['aciertos'] / max(total, 1):.1%} ({resultados['aciertos']}/{total}), errores: {resultados['errores']}")
+    print(f"Latencia media {sum(latencias) / len(latencias) * 1000:.1f} ms, p95 {latencias[int(len(latencias) * 0.95)] * 1000:.1f} ms")
+    for nodo in nodos:
+        try:
+            metricas = httpx.get(nodo + "/metricas", timeout=2).json()
+            cluster = metricas["cluster"]
+            print(f"  {nodo}: cache {metricas['cache']['entradas']} entradas, locales {cluster['locales']}, "
+                  f"reenviadas {cluster['reenviadas']}, respaldo {cluster['atendidas_por_respaldo']}, reenvíos fallidos {cluster['reenvios_fallidos']}")
+        except httpx.HTTPError:
+            print(f"  {nodo}: caído")
+    return resultados["aciertos"] / max(total, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodos", type=int, default=4)
+    parser.add_argument("--workspaces", type=int, default=400)
+    parser.add_argument("--peticiones", type=int, default=4000)
+    parser.add_argument("--capacidad-cache", type=int, default=80, help="Workspaces en caché por nodo")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    tasas = {}
+    for titulo, con_afinidad, con_caida in (("Sin afinidad", False, False), ("Con afinidad", True, False), ("Con afinidad y un nodo caído a mitad", True, True)):
+        nodos, procesos = _levantar(args.nodos, con_afinidad, args.capacidad_cache)
+        al_llegar_a = None
+        if con_caida:
+            def tumbar():
+                procesos[-1].terminate()
+                return nodos[-1]
+            al_llegar_a = (args.peticiones // 2, tumbar)
+        resultados = asyncio.run(_trafico(nodos, args.workspaces, args.peticiones, args.concurrencia, al_llegar_a))
+        tasas[titulo] = _reportar(titulo, resultados, nodos)
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.join()
+
+    ok = tasas["Con afinidad"] > tasas["Sin afinidad"]
+    print(f"\n{'✅' if ok else '❌'} Afinidad: {tasas['Con afinidad']:.1%} vs {tasas['Sin afinidad']:.1%} de aciertos sin afinidad")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench_backtest_politicas.py
+# ===================================================================================
+# --- TIEMPOS DEL BACKTESTING DE POLÍTICAS DE REPOSICIÓN ---
+# ===================================================================================
+# Una matriz de demanda intermitente sintética (por defecto 50k SKUs x 365 días
+# simulados + 90 de historia), con uno y con varios escenarios. Sale con código 1 si
+# un solo escenario supera --max-segundos. La paridad con una simulación SKU por SKU
+# y los casos borde se verifican en tests/test_backtest_politicas.py.
+#
+# Uso:
+#   python bench_backtest_politicas.py --skus 50000 --dias 365 --max-segundos 30
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from backtest_politicas import simular_politica, resumen_escenarios
+
+
+def generar_demanda(num_skus: int, num_dias: int, semilla: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(semilla)
+    tasa = rng.gamma(0.5, 1.0, num_skus)
+    probabilidad_venta = rng.uniform(0.05, 0.9, num_skus)
+    demanda = rng.poisson(tasa, (num_dias, num_skus)) * (rng.random((num_dias, num_skus)) < probabilidad_venta)
+    return demanda.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=50_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--historia", type=int, default=90)
+    parser.add_argument("--max-segundos", type=float, default=30.0)
+    args = parser.parse_args()
+
+    demanda = generar_demanda(args.skus, args.historia + args.dias)
+    costo = np.random.default_rng(2).uniform(1, 100, args.skus)
+    inicio = time.perf_counter()
+    resultado = simular_politica(demanda, args.historia, costo, dias_analisis_ventas_general=args.historia)
+    segundos_un_escenario = segundos = time.perf_counter() - inicio
+    total = resumen_escenarios(resultado, costo).iloc[0]
+    print(f"⏱️ {args.skus:,} SKUs x {args.dias} días: {segundos:.2f} s; fill rate {total['Fill Rate']:.2%}, "
+          f"días-SKU en quiebre {total['Dias SKU en Quiebre (%)']:.2%}, inventario promedio S/ {total['Inventario Promedio Valorizado']:,.0f}")
+
+    inicio = time.perf_counter()
+    resultado = simular_politica(demanda, args.historia, costo, dias_analisis_ventas_general=args.historia,
+                                 lead_time_dias=[3, 7, 14, 7], dias_seguridad_base=[0, 0, 0, 5])
+    segundos = time.perf_counter() - inicio
+    print(f"⏱️ 4 escenarios en un solo recorrido: {segundos:.2f} s")
+    print(resumen_escenarios(resultado, costo).round(4).to_string())
+    sys.exit(0 if segundos_un_escenario <= args.max_segundos else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_cesta_compras.py
+# ===================================================================================
+# --- TIEMPOS Y MEMORIA DEL ANÁLISIS DE CANASTA (PRODUCTOS COMPRADOS JUNTOS) ---
+# ===================================================================================
+# Un historial sintético (por defecto 1M líneas y 50k SKUs) con canastas de tamaño
+# variable, algunos comprobantes enormes y pares "sembrados" que deben salir con
+# lift alto. Informa tiempos y el pico de memoria; sale con código 1 si se recupera
+# menos del 90% de los pares sembrados. La paridad con un self-merge de pandas y los
+# casos borde se verifican en tests/test_cesta_compras.py.
+#
+# Uso:
+#   python bench_cesta_compras.py --lineas 1000000 --skus 50000 --presupuesto-mb 256
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from cesta_compras import COMPROBANTE_COL, SKU_COL, incidencias_de_bloques, pares_frecuentes
+
+
+def generar_ventas(num_lineas: int, num_skus: int, pares_sembrados: int = 200, semilla: int = 5) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    # Tamaño de canasta: la mayoría 1-4 productos, 0.1% de comprobantes "institucionales" de 300
+    tamanos = rng.geometric(0.4, num_lineas // 2)
+    tamanos[rng.random(len(tamanos)) < 0.001] = 300
+    tamanos = tamanos[np.cumsum(tamanos) <= num_lineas]
+    comprobante = np.repeat(np.arange(len(tamanos)), tamanos)
+    # Popularidad tipo Zipf
+    pesos = 1 / np.arange(1, num_skus + 1) ** 0.9
+    sku = rng.choice(num_skus, len(comprobante), p=pesos / pesos.sum())
+    # Pares sembrados: si aparece el primero, el segundo lo acompaña con probabilidad 0.6
+    primeros = rng.choice(num_skus // 10, pares_sembrados, replace=False)
+    segundos = num_skus - 1 - primeros
+    socio = dict(zip(primeros, segundos))
+    es_primero = np.isin(sku, primeros)
+    agrega = es_primero & (rng.random(len(sku)) < 0.6)
+    comprobante = np.r_[comprobante, comprobante[agrega]]
+    sku = np.r_[sku, [socio[s] for s in sku[agrega]]]
+    return pd.DataFrame({
+        COMPROBANTE_COL: [f"B001-{c:08d}" for c in comprobante],
+        SKU_COL: [f"SKU{s:06d}" for s in sku],
+    }), {f"SKU{a:06d}": f"SKU{b:06d}" for a, b in socio.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lineas", type=int, default=1_000_000)
+    parser.add_argument("--skus", type=int, default=50_000)
+    parser.add_argument("--presupuesto-mb", type=float, default=256)
+    args = parser.parse_args()
+
+    ventas, sembrados = generar_ventas(args.lineas, args.skus)
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    bloques = (ventas.iloc[i:i + 250_000] for i in range(0, len(ventas), 250_000))
+    incidencias = incidencias_de_bloques(bloques)
+    segundos_incidencias = time.perf_counter() - inicio
+    resultado = pares_frecuentes(incidencias, top_k=5, presupuesto_mb=args.presupuesto_mb)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pares = resultado["pares"]
+    encontrados = pares[pares[SKU_COL].map(sembrados) == pares['SKU Relacionado']]
+    recuperados = encontrados[SKU_COL].nunique() / len(sembrados)
+    print(f"⏱️ {len(ventas):,} líneas, {resultado['comprobantes']:,} comprobantes, {args.skus:,} SKUs: "
+          f"incidencias {segundos_incidencias:.2f} s, total {segundos:.2f} s, {resultado['tramos']} tramos, "
+          f"pico de memoria {pico / 1024 / 1024:,.0f} MB (presupuesto de pares {args.presupuesto_mb:,.0f} MB)")
+    print(f"Pares devueltos: {len(pares):,}; canasta promedio {resultado['skus_por_comprobante_promedio']:.2f}; "
+          f"tope de SKUs por comprobante {resultado['max_skus_por_comprobante']}; "
+          f"pares sembrados recuperados {recuperados:.1%} (lift mediano {encontrados['Lift'].median():.0f})")
+    sys.exit(0 if recuperados > 0.9 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench_cubo_inventario.py
+# ===================================================================================
+# --- TIEMPOS DEL CUBO POR CATEGORÍA / SUBCATEGORÍA / MARCA ---
+# ===================================================================================
+# Armado del cubo desde los agregados por SKU y latencia de las consultas de
+# drill-down (raíz, categoría, subcategoría, página de SKUs). Sale con código 1 si
+# alguna consulta supera --max-ms. La paridad con un cálculo directo desde las
+# líneas, el cubo tras un delta de ventas y los casos borde se verifican en
+# tests/test_cubo_inventario.py.
+#
+# Uso:
+#   python bench_cubo_inventario.py --skus 100000 --lineas 2000000 --max-ms 50
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cubo_inventario import construir_hechos, construir_cubo, consultar_cubo
+
+SKU_COL = 'SKU / Código de producto'
+
+
+def generar_datos(num_skus: int, num_lineas: int, semilla: int = 0):
+    rng = np.random.default_rng(semilla)
+    pesos = 1 / np.arange(1, num_skus + 1) ** 0.9
+    sku = rng.choice(num_skus, num_lineas, p=pesos / pesos.sum())
+    costo = np.round(rng.uniform(1, 200, num_skus), 2)
+    ventas = pd.DataFrame({
+        SKU_COL: [f'S{s:06d}' for s in sku],
+        'Fecha de venta': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 540, num_lineas), unit='D')).strftime('%d/%m/%Y'),
+        'Cantidad vendida': rng.integers(1, 6, num_lineas),
+        'Precio de venta unitario (S/.)': np.round(costo[sku] * rng.uniform(1.1, 1.6, num_lineas), 2),
+    })
+    total = num_skus + num_skus // 10
+    categorias = np.array(['Tornillería', 'Herramientas manuales', 'Pinturas', 'Material eléctrico', 'Gasfitería', None], dtype=object)
+    inventario = pd.DataFrame({
+        SKU_COL: [f'S{s:06d}' for s in range(total)],
+        'Nombre del producto': [f'Producto {s}' for s in range(total)],
+        'Categoría': categorias[rng.integers(0, len(categorias), total)],
+        'Subcategoría': np.array(['General', 'Accesorios', 'Repuestos'])[rng.integers(0, 3, total)],
+        'Marca': np.array(['TRUPER', 'STANLEY', 'PAVCO', 'CPP', 'BOSCH', 'VINIFAN'])[rng.integers(0, 6, total)],
+        'Precio de compra actual (S/.)': np.r_[costo, rng.uniform(1, 50, total - num_skus)],
+        'Cantidad en stock actual': rng.integers(-2, 60, total),
+    })
+    return ventas, inventario
+
+
+def agregar_ventas(df_ventas: pd.DataFrame) -> pd.DataFrame:
+    """Los mismos agregados por SKU que precalculo.agregar_ventas_por_sku (sin líneas condensadas)."""
+    ventas = pd.DataFrame({
+        SKU_COL: df_ventas[SKU_COL].astype(str).str.strip(),
+        "unidades": pd.to_numeric(df_ventas['Cantidad vendida'], errors='coerce').fillna(0),
+        "fecha": pd.to_datetime(df_ventas['Fecha de venta'], format='%d/%m/%Y', errors='coerce'),
+    })
+    ventas["ingresos"] = ventas["unidades"] * pd.to_numeric(df_ventas['Precio de venta unitario (S/.)'], errors='coerce').fillna(0)
+    ventas["lineas"] = 1
+    return ventas.groupby(SKU_COL, sort=False).agg(
+        unidades=("unidades", "sum"), lineas=("lineas", "sum"), ingresos=("ingresos", "sum"),
+        primera_venta=("fecha", "min"), ultima_venta=("fecha", "max")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--lineas", type=int, default=2_000_000)
+    parser.add_argument("--max-ms", type=float, default=50.0, help="Latencia máxima de una consulta")
+    args = parser.parse_args()
+
+    ventas, inventario = generar_datos(args.skus, args.lineas, semilla=1)
+    inicio = time.perf_counter()
+    agregados = agregar_ventas(ventas)
+    segundos_agregados = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cubo = construir_cubo(construir_hechos(inventario, agregados))
+    segundos_cubo = time.perf_counter() - inicio
+    print(f"⏱️ Agregados por SKU desde {args.lineas:,} líneas: {segundos_agregados:.2f} s (se hace una vez y luego se actualiza por deltas)")
+    print(f"⏱️ Cubo desde los agregados ({len(inventario):,} SKUs): {segundos_cubo * 1000:.0f} ms")
+
+    raiz = consultar_cubo(cubo)
+    categoria = raiz["hijos"][0]["nombre"]
+    subcategoria = consultar_cubo(cubo, categoria)["hijos"][0]["nombre"]
+    marca = consultar_cubo(cubo, categoria, subcategoria)["hijos"][0]["nombre"]
+    latencia_maxima = 0.0
+    for ruta in ((), (categoria,), (categoria, subcategoria), (categoria, subcategoria, marca)):
+        repeticiones = 50
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            consultar_cubo(cubo, *ruta, ordenar_por='ingresos', pagina=2)
+        ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+        latencia_maxima = max(latencia_maxima, ms)
+        print(f"⏱️ Consulta {' → '.join(ruta) or '(raíz)'}: {ms:.2f} ms")
+    sys.exit(0 if latencia_maxima <= args.max_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_duplicados_nombres.py
+# ===================================================================================
+# --- TIEMPOS DE LA DETECCIÓN DE NOMBRES CASI DUPLICADOS ---
+# ===================================================================================
+# Un catálogo sintético (por defecto 100k nombres) con variantes "sembradas" de
+# nombres existentes (mayúsculas, espacios, tildes, palabras omitidas, errores de
+# tipeo). Informa el tiempo, cuántas variantes quedan en el grupo de su original y
+# cuántos grupos mezclan productos distintos; sale con código 1 si se recupera menos
+# del 90% de las variantes. El recall del LSH contra fuerza bruta y los casos borde
+# se verifican en tests/test_duplicados_nombres.py.
+#
+# Uso:
+#   python bench_duplicados_nombres.py --nombres 100000
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from duplicados_nombres import agrupar_nombres_similares
+
+TIPOS = ["TORNILLO", "PERNO", "CLAVO", "MARTILLO DE UÑA", "LLAVE FRANCESA", "TUBO PVC", "CODO PVC", "CABLE MELLIZO",
+         "PINTURA LÁTEX", "BROCA PARA CONCRETO", "DISCO DE CORTE", "CINTA AISLANTE", "CANDADO", "BISAGRA", "LIJA DE AGUA",
+         "SILICONA", "TARUGO", "ARANDELA", "TUERCA", "ALAMBRE GALVANIZADO", "FOCO LED", "INTERRUPTOR", "TOMACORRIENTE"]
+MARCAS = ["STANLEY", "TRUPER", "PAVCO", "INDECO", "VENCEDOR", "BOSCH", "3M", "FORTE", "CPP", "TEKNO", "AMERICAN", "SOLDIMIX"]
+COLORES = ["BLANCO", "NEGRO", "ROJO", "AZUL", "GRIS", "VERDE", ""]
+MEDIDAS = ["1/2 X 2", "3/8 X 1", "1/4 X 3", "5/16 X 1 1/2", "16OZ", "4MM", "6MM", "10MM", "1 GL", "1/4 GL", "2.5MM", "3/4", "1", "40W", "9W"]
+
+
+def _variante(nombre: str, rng) -> str:
+    operacion = rng.integers(0, 6)
+    if operacion == 0:
+        return nombre.title()
+    if operacion == 1:
+        return nombre.replace(" X ", "x").lower()
+    if operacion == 2:
+        return nombre.replace("Ñ", "N").replace("Á", "A").replace("É", "E")
+    if operacion == 3:
+        palabras = nombre.split()
+        return " ".join(p for p in palabras if p not in ("DE", "PARA")) + " "
+    if operacion == 4 and len(nombre) > 8:
+        k = int(rng.integers(1, len(nombre) - 2)) # error de tipeo: dos letras intercambiadas
+        return nombre[:k] + nombre[k + 1] + nombre[k] + nombre[k + 2:]
+    return "  " + nombre.replace(" ", "  ")
+
+
+def generar_catalogo(num_nombres: int, fraccion_variantes: float = 0.1, semilla: int = 11):
+    rng = np.random.default_rng(semilla)
+    num_bases = int(num_nombres * (1 - fraccion_variantes))
+    combinaciones = set()
+    while len(combinaciones) < num_bases:
+        faltan = num_bases - len(combinaciones)
+        for t, m, c, d, modelo in zip(rng.integers(0, len(TIPOS), faltan), rng.integers(0, len(MARCAS), faltan),
+                                      rng.integers(0, len(COLORES), faltan), rng.integers(0, len(MEDIDAS), faltan),
+                                      rng.integers(0, 2000, faltan)):
+            combinaciones.add(f"{TIPOS[t]} {MEDIDAS[d]} {MARCAS[m]} {COLORES[c]} MOD{modelo}".replace("  ", " ").strip())
+    bases = sorted(combinaciones)
+    origen = rng.choice(num_bases, num_nombres - num_bases, replace=False)
+    variantes = [_variante(bases[i], rng) for i in origen]
+    return pd.Series(bases + variantes), np.r_[np.arange(num_bases), origen]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nombres", type=int, default=100_000)
+    args = parser.parse_args()
+
+    nombres, base = generar_catalogo(args.nombres)
+    inicio = time.perf_counter()
+    resultado = agrupar_nombres_similares(nombres)
+    segundos = time.perf_counter() - inicio
+
+    grupo = resultado["grupo"]
+    num_bases = int((np.arange(len(base)) == base).sum())
+    variantes = np.arange(num_bases, len(base))
+    recuperadas = (grupo[variantes] == grupo[base[variantes]]).mean()
+    # Grupos con más de un producto original distinto (mezclas)
+    por_grupo = pd.Series(base).groupby(grupo).nunique()
+    tamano_grupo = pd.Series(grupo).value_counts()
+    con_duplicados = tamano_grupo[tamano_grupo > 1].index
+    mezclados = int((por_grupo.loc[con_duplicados] > 1).sum())
+    print(f"⏱️ {args.nombres:,} nombres ({resultado['nombres_distintos']:,} normalizados distintos) en {segundos:.2f} s; "
+          f"{resultado['pares_candidatos']:,} pares candidatos, {resultado['pares_confirmados']:,} confirmados")
+    print(f"Variantes sembradas en el grupo de su original: {recuperadas:.1%}; "
+          f"grupos con duplicados: {len(con_duplicados):,}, de ellos mezclan productos distintos: {mezclados:,}")
+    sys.exit(0 if recuperadas > 0.9 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench_escenarios_plan_compra.py
+# ===================================================================================
+# --- TIEMPOS DEL SIMULADOR DE ESCENARIOS DEL PLAN DE COMPRA ---
+# ===================================================================================
+# Una grilla de cientos de escenarios sobre un catálogo sintético, comparada con el
+# tiempo de UNA ejecución del Plan de Compra. Sale con código 1 si la grilla completa
+# tarda más que --max-planes ejecuciones del plan. La paridad de cada escenario con
+# el Plan de Compra completo y los casos borde se verifican en
+# tests/test_escenarios_plan_compra.py.
+#
+# Uso:
+#   python bench_escenarios_plan_compra.py --skus 20000 --lineas 1000000
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from track_expenses import process_csv_plan_compra_sugerido, process_csv_plan_compra_escenarios
+
+
+def generar_datos(num_skus: int, num_lineas: int, semilla: int = 0):
+    rng = np.random.default_rng(semilla)
+    pesos = 1 / np.arange(1, num_skus + 1) ** 0.8
+    sku = rng.choice(num_skus, num_lineas, p=pesos / pesos.sum())
+    fechas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 400, num_lineas), unit='D')
+    costo = np.round(rng.uniform(1, 200, num_skus), 2)
+    ventas = pd.DataFrame({
+        'SKU / Código de producto': [f'S{s:05d}' for s in sku],
+        'Fecha de venta': fechas.strftime('%d/%m/%Y'),
+        'Cantidad vendida': rng.integers(1, 6, num_lineas),
+        'Precio de venta unitario (S/.)': np.round(costo[sku] * rng.uniform(1.1, 1.6, num_lineas), 2),
+    })
+    extras = 200
+    categorias = np.array(['Tornillería', 'Herramientas manuales', 'Pinturas', 'Material eléctrico', 'Gasfitería'])
+    inventario = pd.DataFrame({
+        'SKU / Código de producto': [f'S{s:05d}' for s in range(num_skus + extras)],
+        'Nombre del producto': [f'Producto {s}' for s in range(num_skus + extras)],
+        'Categoría': categorias[rng.integers(0, len(categorias), num_skus + extras)],
+        'Subcategoría': 'General',
+        'Marca': np.array(['TRUPER', 'STANLEY', 'PAVCO', 'CPP'])[rng.integers(0, 4, num_skus + extras)],
+        'Precio de compra actual (S/.)': np.r_[costo, rng.uniform(1, 50, extras)],
+        'Precio de venta actual (S/.)': np.r_[costo * 1.35, rng.uniform(1, 60, extras)],
+        'Cantidad en stock actual': rng.integers(0, 40, num_skus + extras),
+    })
+    # Casos borde: costos faltantes y stock negativo
+    inventario.loc[inventario.sample(frac=0.02, random_state=1).index, 'Precio de compra actual (S/.)'] = np.nan
+    inventario.loc[inventario.sample(frac=0.02, random_state=2).index, 'Cantidad en stock actual'] = -3
+    return ventas, inventario
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=20_000)
+    parser.add_argument("--lineas", type=int, default=1_000_000)
+    parser.add_argument("--max-planes", type=float, default=10, help="Tiempo máximo de la grilla, en ejecuciones del plan")
+    args = parser.parse_args()
+
+    ventas, inventario = generar_datos(args.skus, args.lineas, semilla=3)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_csv_plan_compra_sugerido(ventas, inventario, pesos_importancia={'ventas': 0.4, 'ingreso': 0.3, 'margen': 0.2, 'dias_venta': 0.1})
+    segundos_plan = time.perf_counter() - inicio
+
+    grilla = {'dias_cobertura_ideal_base': [5, 7, 10, 15, 20, 30], 'lead_time_dias': [2, 3, 5, 7, 10, 14],
+              'peso_ventas_historicas': [0.3, 0.6, 0.8], 'score_ventas': [2, 5, 8]}
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = process_csv_plan_compra_escenarios(ventas, inventario, grilla_escenarios=grilla)
+    segundos_escenarios = time.perf_counter() - inicio
+    print(f"⏱️ Un Plan de Compra ({args.skus:,} SKUs, {args.lineas:,} líneas): {segundos_plan:.2f} s")
+    print(f"⏱️ {len(resultado['data']):,} escenarios: {segundos_escenarios:.2f} s "
+          f"(≈ {segundos_plan * len(resultado['data']) / 60:.0f} min ejecutando el plan una vez por escenario)")
+    print(resultado["summary"]["insight"])
+    sys.exit(0 if segundos_escenarios <= args.max_planes * segundos_plan else 1)
+
+
+if __name__ == "__main__":
+    main()
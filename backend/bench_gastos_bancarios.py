@@ -0,0 +1,145 @@
+# bench_gastos_bancarios.py
+# ===================================================================================
+# --- TIEMPOS DEL PIPELINE DE GASTOS BANCARIOS (LEGADO) ---
+# ===================================================================================
+# Mide process_csv y standardise_categories vectorizados sobre N líneas (por defecto
+# 1M) de extractos sintéticos en ambos formatos (westpac y simple), y la
+# implementación anterior fila por fila (copiada abajo) sobre una muestra,
+# extrapolada a N. Sale con código 1 si alguna versión vectorizada no es más rápida.
+# La paridad con la implementación anterior y los casos borde se verifican en
+# tests/test_gastos_bancarios.py, que usa esta misma referencia.
+#
+# Uso:
+#   python bench_gastos_bancarios.py --lineas 1000000 --muestra-referencia 100000
+import re
+import sys
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from track_expenses import (
+    CATEGORY_KEYWORDS, clean_narrative, is_valid_expense, process_csv, standardise_categories,
+)
+
+COMERCIOS = ["WOOLWORTHS 1234 SYDNEY", "COLES EXPRESS", "UBER *TRIP", "NETFLIX.COM", "BUNNINGS WAREHOUSE",
+             "Shell Coles Express", "ALDI STORES", "Spotify P0123", "TELSTRA PREPAID", "CHEMIST WAREHOUSE",
+             "Hoyts Cinemas", "Origin Energy", "JB HI-FI ONLINE", "Kmart 1043", "OPTUS MOBILE", "BEEM IT PAYMENT"]
+PREFIJOS = ["DEBIT CARD PURCHASE ", "EFTPOS DEBIT ", "EFTPOS CREDIT ", "Debit Card Purchase ", "WITHDRAWAL ", "DEPOSIT ", ""]
+CATEGORIAS = list(CATEGORY_KEYWORDS) + ["Cheese shop", "Pet Food", "Entertainment ", "streaming services", None]
+
+
+# --- Implementación anterior (referencia de tiempos y de paridad) ------------------
+def _process_csv_por_filas(df):
+    records = []
+    if {'Date', 'Narrative', 'Debit Amount', 'Credit Amount'}.issubset(df.columns):
+        format_type = 'westpac'
+    elif {'Date', 'Description', 'Amount'}.issubset(df.columns):
+        format_type = 'simple'
+    else:
+        raise ValueError("Unrecognized CSV format")
+
+    for _, row in df.iterrows():
+        try:
+            date = datetime.strptime(row['Date'], "%d/%m/%Y")
+        except Exception:
+            continue
+        if format_type == 'westpac':
+            narrative = row['Narrative']
+            if not is_valid_expense(narrative):
+                continue
+            debit = float(row['Debit Amount']) if pd.notna(row['Debit Amount']) else 0.0
+            credit = float(row['Credit Amount']) if pd.notna(row['Credit Amount']) else 0.0
+            amount = debit if debit > 0 else -credit
+            cleaned_narrative = clean_narrative(narrative)
+        else:
+            narrative = row['Description']
+            if not is_valid_expense(narrative):
+                continue
+            amount = float(row['Amount'])
+            cleaned_narrative = clean_narrative(narrative)
+            debit = amount if amount > 0 else 0.0
+            credit = -amount if amount < 0 else 0.0
+        records.append({'Date': date, 'Category': cleaned_narrative, 'Debit': debit, 'Credit': credit, 'Amount': amount})
+
+    processed_df = pd.DataFrame(records)
+    processed_df['WeekStart'] = processed_df['Date'].dt.to_period('W').apply(lambda r: r.start_time)
+    processed_df['MonthStart'] = processed_df['Date'].dt.to_period('M').apply(lambda r: r.start_time)
+    processed_df['Week'] = processed_df['WeekStart'].dt.strftime('%d %b %Y')
+    processed_df['Month'] = processed_df['MonthStart'].dt.strftime('%B %Y')
+    return processed_df
+
+
+def _standardise_categories_por_filas(df):
+    def match_category(original):
+        if pd.isna(original):
+            return original
+        text = str(original).lower()
+        for keyword, mapped_category in CATEGORY_KEYWORDS.items():
+            if re.search(rf"\b{re.escape(keyword)}\b", text):
+                return mapped_category
+        return 'General / Miscellaneous'
+    df['Category'] = df['Category'].apply(match_category)
+    return df
+# -----------------------------------------------------------------------------------
+
+
+def generar_extracto(num_lineas: int, formato: str, semilla: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    dias = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 900, num_lineas), unit="D")
+    fechas = pd.Series(dias.strftime("%d/%m/%Y"), dtype=object)
+    malas = rng.random(num_lineas)
+    fechas[malas < 0.01] = "2023-13-45"
+    fechas[(malas >= 0.01) & (malas < 0.015)] = None
+    narrativas = (pd.Series(PREFIJOS, dtype=object).to_numpy()[rng.integers(0, len(PREFIJOS), num_lineas)]
+                  + pd.Series(COMERCIOS, dtype=object).to_numpy()[rng.integers(0, len(COMERCIOS), num_lineas)]
+                  + " " + rng.integers(0, 50_000, num_lineas).astype(str))
+    montos = np.round(rng.gamma(2.0, 30.0, num_lineas), 2)
+    es_credito = rng.random(num_lineas) < 0.2
+    if formato == "westpac":
+        debito = np.where(es_credito, np.nan, montos)
+        credito = np.where(es_credito, montos, np.nan)
+        return pd.DataFrame({"Date": fechas, "Narrative": narrativas, "Debit Amount": debito, "Credit Amount": credito})
+    return pd.DataFrame({"Date": fechas, "Description": narrativas, "Amount": np.where(es_credito, -montos, montos)})
+
+
+def generar_categorias(num_lineas: int, semilla: int = 4) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    categorias = pd.Series(CATEGORIAS, dtype=object).to_numpy()[rng.integers(0, len(CATEGORIAS), num_lineas)]
+    return pd.DataFrame({"Category": categorias, "Amount": rng.normal(0, 50, num_lineas)})
+
+
+def _medir(funcion, df) -> float:
+    inicio = time.perf_counter()
+    funcion(df)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lineas", type=int, default=1_000_000)
+    parser.add_argument("--muestra-referencia", type=int, default=100_000)
+    args = parser.parse_args()
+
+    aceleraciones = []
+    factor = args.lineas / args.muestra_referencia
+    for formato in ("westpac", "simple"):
+        extracto = generar_extracto(args.lineas, formato)
+        nuevo = _medir(process_csv, extracto)
+        referencia = _medir(_process_csv_por_filas, extracto.iloc[:args.muestra_referencia]) * factor
+        aceleraciones.append(referencia / nuevo)
+        print(f"⏱️ process_csv {formato}, {args.lineas:,} líneas: {nuevo:.2f} s "
+              f"(fila por fila ≈ {referencia:.1f} s extrapolado, x{referencia / nuevo:.0f})")
+    categorias = generar_categorias(args.lineas)
+    nuevo = _medir(lambda df: standardise_categories(df.copy()), categorias)
+    referencia = _medir(lambda df: _standardise_categories_por_filas(df.copy()), categorias.iloc[:args.muestra_referencia]) * factor
+    aceleraciones.append(referencia / nuevo)
+    print(f"⏱️ standardise_categories, {args.lineas:,} filas: {nuevo:.2f} s "
+          f"(fila por fila ≈ {referencia:.1f} s extrapolado, x{referencia / nuevo:.0f})")
+    sys.exit(0 if min(aceleraciones) > 1 else 1)
+
+
+if __name__ == "__main__":
+    main()
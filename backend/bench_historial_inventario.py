@@ -0,0 +1,86 @@
+# bench_historial_inventario.py
+# ===================================================================================
+# --- TIEMPOS DE LA DIFERENCIA ENTRE CARGAS DE INVENTARIO ---
+# ===================================================================================
+# Foto, lectura de una foto guardada y diferencia de dos inventarios grandes (lineal
+# en el número de SKUs). La paridad con una comparación directa SKU por SKU y los
+# casos borde están en tests/test_historial_inventario.py.
+#
+# Uso:
+#   python bench_historial_inventario.py --skus 500000 --max-segundos 20
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from historial_inventario import (
+    construir_foto_inventario, serializar_foto_inventario, deserializar_foto_inventario,
+    comparar_fotos_inventario, alertas_de_costo
+)
+
+SKU_COL = 'SKU / Código de producto'
+
+
+def generar_inventarios(num_skus: int, semilla: int = 0):
+    """Un inventario y la carga siguiente: SKUs retirados y nuevos, stock movido, costos y precios cambiados."""
+    rng = np.random.default_rng(semilla)
+    costo = np.round(rng.uniform(1, 200, num_skus), 2)
+    previo = pd.DataFrame({
+        SKU_COL: [f'S{s:07d}' for s in range(num_skus)],
+        'Nombre del producto': [f'Producto {s}' for s in range(num_skus)],
+        'Categoría': np.array(['Tornillería', 'Pinturas', 'Gasfitería'])[rng.integers(0, 3, num_skus)],
+        'Marca': np.array(['TRUPER', 'STANLEY', 'PAVCO'])[rng.integers(0, 3, num_skus)],
+        'Cantidad en stock actual': rng.integers(0, 80, num_skus),
+        'Precio de compra actual (S/.)': costo,
+        'Precio de venta actual (S/.)': np.round(costo * 1.35, 2),
+    })
+    previo.loc[previo.sample(frac=0.01, random_state=1).index, 'Precio de compra actual (S/.)'] = np.nan
+
+    actual = previo.sample(frac=0.97, random_state=2).copy()
+    nuevos = previo.iloc[: num_skus // 50].copy()
+    nuevos[SKU_COL] = [f'N{s:07d}' for s in range(len(nuevos))]
+    actual = pd.concat([actual, nuevos], ignore_index=True)
+    mueve = rng.random(len(actual)) < 0.3
+    actual.loc[mueve, 'Cantidad en stock actual'] = rng.integers(0, 80, mueve.sum())
+    sube = rng.random(len(actual)) < 0.05
+    actual.loc[sube, 'Precio de compra actual (S/.)'] = np.round(actual.loc[sube, 'Precio de compra actual (S/.)'] * rng.uniform(1.02, 1.3, sube.sum()), 2)
+    ajusta = sube & (rng.random(len(actual)) < 0.5)
+    actual.loc[ajusta, 'Precio de venta actual (S/.)'] = np.round(actual.loc[ajusta, 'Precio de compra actual (S/.)'] * 1.35, 2)
+    # Los SKUs como texto con espacios, como llegan a veces en los CSV
+    actual[SKU_COL] = actual[SKU_COL] + ' '
+    return previo, actual.sample(frac=1, random_state=3).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=500_000)
+    parser.add_argument("--max-segundos", type=float, default=20.0, help="Tiempo máximo de fotos + lectura + diferencia")
+    args = parser.parse_args()
+
+    previo, actual = generar_inventarios(args.skus, semilla=1)
+    inicio = time.perf_counter()
+    foto_previa, foto_actual = construir_foto_inventario(previo), construir_foto_inventario(actual)
+    segundos_fotos = time.perf_counter() - inicio
+    contenido = serializar_foto_inventario(foto_actual)
+    inicio = time.perf_counter()
+    foto_leida = deserializar_foto_inventario(contenido)
+    segundos_lectura = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    diferencia = comparar_fotos_inventario(foto_leida, foto_previa)
+    alertas_de_costo(diferencia["cambios"])
+    segundos_diferencia = time.perf_counter() - inicio
+    print(f"⏱️ Fotos de dos inventarios de {args.skus:,} SKUs: {segundos_fotos:.2f} s "
+          f"(foto serializada: {len(contenido) / 1e6:.1f} MB sin comprimir)")
+    print(f"⏱️ Lectura de una foto guardada: {segundos_lectura:.2f} s")
+    print(f"⏱️ Diferencia + alertas de costo: {segundos_diferencia:.2f} s ({len(diferencia['cambios']):,} SKUs con cambios)")
+    print(diferencia["resumen"])
+    total = segundos_fotos + segundos_lectura + segundos_diferencia
+    ok = total <= args.max_segundos
+    print(f"{'✅' if ok else '❌'} Total {total:.2f} s (máximo {args.max_segundos:.0f} s)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# bench_import_time.py
+# ===================================================================================
+# --- BENCHMARK DE ARRANQUE EN FRÍO (python -X importtime) ---
+# ===================================================================================
+# Importa `main` en un proceso limpio con `-X importtime`, agrupa el tiempo por
+# paquete raíz y lo compara contra una línea base guardada en el repositorio.
+#
+# Uso:
+#   python bench_import_time.py                      -> imprime el desglose
+#   python bench_import_time.py --guardar-baseline   -> actualiza import_time_baseline.json
+#   python bench_import_time.py --verificar          -> sale con código 1 si hay regresión
+#
+# Se ejecuta con STARTUP_MODE=lazy para medir solo el costo de importación, sin
+# conectarse a Firebase. Conviene correrlo varias veces (--repeticiones) porque
+# la primera ejecución incluye la compilación de los .pyc.
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BASELINE = os.path.join(DIRECTORIO, "import_time_baseline.json")
+
+# Paquetes que se cargan en el calentamiento o con su primer uso (ver carga_diferida.py):
+# si alguno aparece al importar `main`, alguien volvió a importarlo a nivel de módulo.
+PAQUETES_DIFERIDOS = (
+    "pandas", "numpy", "scipy", "pyarrow", "duckdb", "xlsxwriter", "openpyxl",
+    "track_expenses", "report_config", "tooltips_config", "precalculo", "cubo_inventario",
+)
+
+# Formato de cada línea: "import time:      1234 |       5678 |     paquete.modulo"
+PATRON_LINEA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def medir_importacion(modulo: str = "main") -> dict:
+    """Ejecuta `python -X importtime -c 'import <modulo>'` y parsea el resultado."""
+    env = os.environ.copy()
+    env["STARTUP_MODE"] = "lazy"
+    # firebase_config exige estas variables aunque no se conecte en modo 'lazy'
+    env.setdefault("FIREBASE_CREDS_PATH", "no-usado.json")
+    env.setdefault("FIREBASE_STORAGE_BUCKET_URL", "no-usado.appspot.com")
+
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=DIRECTORIO, env=env, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar '{modulo}':\n{proceso.stderr[-2000:]}")
+
+    self_por_paquete = defaultdict(int)
+    total_us = 0
+    for linea in proceso.stderr.splitlines():
+        coincidencia = PATRON_LINEA.match(linea)
+        if not coincidencia:
+            continue
+        self_us, acumulado_us, sangria, nombre = coincidencia.groups()
+        self_por_paquete[nombre.split(".")[0]] += int(self_us)
+        # El módulo raíz (sin sangría) que pedimos trae el acumulado total
+        if nombre == modulo and len(sangria) <= 1:
+            total_us = int(acumulado_us)
+
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "paquetes_ms": {
+            paquete: round(us / 1000, 1)
+            for paquete, us in sorted(self_por_paquete.items(), key=lambda kv: kv[1], reverse=True)
+        },
+    }
+
+
+def medir_varias_veces(repeticiones: int) -> dict:
+    """Toma la mejor de N mediciones (la menos afectada por ruido del sistema)."""
+    mediciones = [medir_importacion() for _ in range(max(1, repeticiones))]
+    return min(mediciones, key=lambda m: m["total_ms"])
+
+
+def paquetes_diferidos_cargados(resultado: dict) -> list:
+    return [paquete for paquete in PAQUETES_DIFERIDOS if paquete in resultado["paquetes_ms"]]
+
+
+def imprimir_reporte(resultado: dict, top: int = 15):
+    print(f"Tiempo total de importación de 'main': {resultado['total_ms']:.1f} ms")
+    print(f"{'Paquete':<32}{'ms (self)':>12}")
+    print("-" * 44)
+    for paquete, ms in list(resultado["paquetes_ms"].items())[:top]:
+        print(f"{paquete:<32}{ms:>12.1f}")
+
+
+def verificar_regresion(resultado: dict, baseline: dict, tolerancia: float, minimo_ms: float) -> list:
+    """Devuelve la lista de regresiones que superan la tolerancia relativa."""
+    regresiones = []
+    limite_total = baseline["total_ms"] * (1 + tolerancia)
+    if resultado["total_ms"] > limite_total:
+        regresiones.append(f"total: {resultado['total_ms']:.1f} ms > {limite_total:.1f} ms")
+
+    for paquete, ms in resultado["paquetes_ms"].items():
+        ms_base = baseline["paquetes_ms"].get(paquete, 0.0)
+        # Ignoramos paquetes diminutos para no fallar por ruido
+        if ms >= minimo_ms and ms > ms_base * (1 + tolerancia) + minimo_ms:
+            regresiones.append(f"{paquete}: {ms:.1f} ms (línea base {ms_base:.1f} ms)")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil de importación de la API (-X importtime).")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--guardar-baseline", action="store_true")
+    parser.add_argument("--verificar", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Regresión relativa permitida (0.25 = 25%%)")
+    parser.add_argument("--minimo-ms", type=float, default=20.0, help="Ignora paquetes por debajo de este tiempo")
+    args = parser.parse_args()
+
+    resultado = medir_varias_veces(args.repeticiones)
+    imprimir_reporte(resultado, args.top)
+
+    if args.guardar_baseline:
+        resultado["python"] = sys.version.split()[0]
+        with open(RUTA_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"✅ Línea base guardada en {RUTA_BASELINE}")
+
+    if args.verificar:
+        if not os.path.exists(RUTA_BASELINE):
+            print("🚫 No existe import_time_baseline.json. Ejecuta primero con --guardar-baseline.")
+            sys.exit(2)
+        with open(RUTA_BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regresiones = verificar_regresion(resultado, baseline, args.tolerancia, args.minimo_ms)
+        regresiones += [f"{paquete}: se importa al arrancar (debería ser diferido)" for paquete in paquetes_diferidos_cargados(resultado)]
+        if regresiones:
+            print("🔥 Regresiones de tiempo de importación detectadas:")
+            for r in regresiones:
+                print(f"   - {r}")
+            sys.exit(1)
+        print("✅ Sin regresiones de tiempo de importación.")
@@ -0,0 +1,116 @@
+# bench_motor_duckdb.py
+# ===================================================================================
+# --- TIEMPOS DEL BACKEND DUCKDB FRENTE A PANDAS ---
+# ===================================================================================
+# 1. Motores: ejecuta cada motor con el backend pandas y con DuckDB sobre el mismo
+#    historial y mide ambos tiempos.
+# 2. Condensado: condensa el mismo CSV comprimido con gzip por bloques (pandas) y
+#    con DuckDB leyendo desde disco, y mide ambos tiempos.
+#
+# Con --aceleracion-minima sale con código 1 si DuckDB no alcanza esa aceleración sobre
+# el total de los motores (por defecto solo informa: con pocas líneas pandas suele ganar). La paridad de resultados y los casos borde se verifican en
+# tests/test_motor_duckdb.py. Requiere `pip install duckdb`.
+#
+# Uso:
+#   python bench_motor_duckdb.py --lineas 2000000 --skus 20000 --aceleracion-minima 1.0
+import os
+import sys
+import gzip
+import time
+import argparse
+import tempfile
+
+import pandas as pd
+
+import motor_duckdb
+from bench_ventas_por_bloques import generar_inventario, escribir_historial
+from ventas_por_bloques import condensar_ventas
+from track_expenses import (
+    process_csv_abc, procesar_stock_muerto, process_csv_analisis_estrategico_rotacion,
+    process_csv_puntos_alerta_stock, process_csv_plan_compra_sugerido
+)
+
+MOTORES = {
+    "abc": process_csv_abc,
+    "stock_muerto": procesar_stock_muerto,
+    "rotacion": process_csv_analisis_estrategico_rotacion,
+    "puntos_alerta": process_csv_puntos_alerta_stock,
+    "plan_compra": process_csv_plan_compra_sugerido,
+}
+
+
+def _cronometrar(backend: str, motor, df_ventas: pd.DataFrame, df_inventario: pd.DataFrame) -> float:
+    anterior = motor_duckdb.establecer_backend(backend)
+    try:
+        inicio = time.perf_counter()
+        motor(df_ventas.copy(), df_inventario.copy())
+        return time.perf_counter() - inicio
+    finally:
+        motor_duckdb.establecer_backend(anterior)
+
+
+def medir_motores(df_ventas: pd.DataFrame, df_inventario: pd.DataFrame) -> tuple:
+    print(f"\n--- Motores con {len(df_ventas):,} líneas ---")
+    total_pandas = total_duckdb = 0.0
+    for nombre, motor in MOTORES.items():
+        t_pandas = _cronometrar("pandas", motor, df_ventas, df_inventario)
+        t_duckdb = _cronometrar("duckdb", motor, df_ventas, df_inventario)
+        total_pandas += t_pandas
+        total_duckdb += t_duckdb
+        print(f"  {nombre}: pandas {t_pandas:.2f} s, duckdb {t_duckdb:.2f} s ({t_pandas / t_duckdb:.1f}x)")
+    return total_pandas, total_duckdb
+
+
+def medir_condensado(ruta_csv: str) -> None:
+    print("\n--- Condensado de un CSV comprimido ---")
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_gz = os.path.join(directorio, "ventas.csv.gz")
+        with open(ruta_csv, "rb") as origen, gzip.open(ruta_gz, "wb", compresslevel=1) as destino:
+            while True:
+                bloque = origen.read(1 << 24)
+                if not bloque:
+                    break
+                destino.write(bloque)
+
+        inicio = time.perf_counter()
+        condensar_ventas(ruta_gz)
+        t_pandas = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        obtenido = motor_duckdb.condensar_csv([ruta_gz])
+        t_duckdb = time.perf_counter() - inicio
+
+    if obtenido is None:
+        print("  ⚠️ DuckDB no pudo leer el CSV; se usaría el condensado de pandas")
+        return
+    print(f"  condensado: pandas {t_pandas:.2f} s, duckdb {t_duckdb:.2f} s ({t_pandas / t_duckdb:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lineas", type=int, default=2_000_000)
+    parser.add_argument("--skus", type=int, default=20_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--aceleracion-minima", type=float, default=0.0,
+                        help="Tiempo total pandas / tiempo total DuckDB exigido en los motores")
+    args = parser.parse_args()
+
+    if motor_duckdb.duckdb is None:
+        print("DuckDB no está instalado (pip install duckdb).")
+        sys.exit(1)
+
+    df_inventario = generar_inventario(args.skus)
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "ventas.csv")
+        escribir_historial(ruta, args.lineas, df_inventario, args.dias)
+        df_ventas = pd.read_csv(ruta)
+        total_pandas, total_duckdb = medir_motores(df_ventas, df_inventario)
+        del df_ventas
+        medir_condensado(ruta)
+
+    aceleracion = total_pandas / total_duckdb
+    print(f"\nTotal motores: pandas {total_pandas:.2f} s, duckdb {total_duckdb:.2f} s ({aceleracion:.1f}x, mínimo {args.aceleracion_minima:.1f}x)")
+    sys.exit(0 if aceleracion >= args.aceleracion_minima else 1)
+
+
+if __name__ == "__main__":
+    main()
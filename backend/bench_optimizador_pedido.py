@@ -0,0 +1,62 @@
+# bench_optimizador_pedido.py
+# ===================================================================================
+# --- TIEMPOS DEL OPTIMIZADOR DE MONTO MÍNIMO POR MARCA ---
+# ===================================================================================
+# Resuelve a la vez muchas marcas con miles de productos candidatos cada una (voraz
+# con reparación) y muchas marcas chicas (programación dinámica exacta), e informa
+# la brecha contra la cota de la relajación fraccional. La brecha contra el óptimo
+# en casos chicos se verifica en tests/test_optimizador_pedido.py.
+#
+# Uso:
+#   python bench_optimizador_pedido.py --marcas 200 --productos 3000
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from optimizador_pedido import optimizar_extras
+
+
+def generar_candidatos(num_marcas: int, productos_por_marca: int, semilla: int = 7):
+    rng = np.random.default_rng(semilla)
+    n = num_marcas * productos_por_marca
+    grupo = np.repeat(np.arange(num_marcas), productos_por_marca)
+    costo = np.round(rng.lognormal(2.5, 1.0, n), 2) + 0.1
+    urgencia = np.where(rng.random(n) < 0.3, rng.uniform(0, 1, n), 0)
+    valor = costo * (urgencia + 0.1 * rng.uniform(0, 1, n) + 0.01)
+    tope = rng.integers(0, 12, n)
+    disponible = np.bincount(grupo, weights=costo * tope)
+    deficit = disponible * rng.uniform(0, 0.3, num_marcas)
+    holgura = deficit * 0.1
+    return grupo, costo, valor, tope, deficit, holgura
+
+
+def medir(etiqueta: str, datos) -> float:
+    inicio = time.perf_counter()
+    resultado = optimizar_extras(*datos)
+    segundos = time.perf_counter() - inicio
+    activos = datos[4] > 0
+    brecha = 1 - resultado["valor"][activos].sum() / resultado["cota_superior"][activos].sum()
+    print(f"⏱️ {etiqueta} ({len(datos[0]):,} candidatos) en {segundos:.3f} s; "
+          f"{int(resultado['alcanzado'][activos].sum())}/{int(activos.sum())} marcas alcanzan el mínimo "
+          f"({int(resultado['holgura_ampliada'].sum())} con la holgura ampliada); "
+          f"brecha contra la cota fraccional {brecha:.3%}")
+    return segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--marcas", type=int, default=200)
+    parser.add_argument("--productos", type=int, default=3000, help="Productos candidatos por marca")
+    parser.add_argument("--marcas-chicas", type=int, default=2000, help="Marcas de 20 productos (programación dinámica)")
+    args = parser.parse_args()
+
+    segundos = medir(f"{args.marcas} marcas x {args.productos:,} productos", generar_candidatos(args.marcas, args.productos))
+    chicas = generar_candidatos(args.marcas_chicas, 20, semilla=8)
+    segundos += medir(f"{args.marcas_chicas} marcas chicas x 20 productos", chicas)
+    sys.exit(0 if segundos < 2.0 else 1)
+
+
+if __name__ == "__main__":
+    main()
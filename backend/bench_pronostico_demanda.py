@@ -0,0 +1,73 @@
+# bench_pronostico_demanda.py
+# ===================================================================================
+# --- TIEMPOS Y PRECISIÓN DEL PRONÓSTICO VECTORIZADO DE DEMANDA ---
+# ===================================================================================
+# 1. Tiempo: pronostica una matriz sintética de SKUs x semanas (por defecto
+#    100.000 x 104) con demanda regular, intermitente e irregular, y estacionalidad
+#    por categoría.
+# 2. Precisión: compara, en las últimas semanas reservadas, el error del pronóstico
+#    elegido contra el promedio de ventana que usa hoy PDA_Final. Sale con código 1
+#    si el pronóstico no mejora ese promedio.
+#
+# La paridad con una implementación SKU por SKU y los casos borde se verifican en
+# tests/test_pronostico_demanda.py.
+#
+# Uso:
+#   python bench_pronostico_demanda.py --skus 100000 --semanas 104
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from pronostico_demanda import pronosticar_matriz
+
+
+def generar_demanda(num_skus: int, semanas: int, num_categorias: int = 20, semilla: int = 7):
+    rng = np.random.default_rng(semilla)
+    categorias = rng.integers(0, num_categorias, num_skus)
+    # Estacionalidad anual por categoría (p. ej. pinturas antes de fiestas)
+    amplitud = rng.uniform(0, 0.6, num_categorias)
+    fase = rng.uniform(0, 2 * np.pi, num_categorias)
+    semana = np.arange(semanas)
+    estacional = 1 + amplitud[:, None] * np.sin(2 * np.pi * semana / 52 + fase[:, None])
+
+    probabilidad = rng.choice([0.9, 0.5, 0.2, 0.05], num_skus, p=[0.15, 0.25, 0.35, 0.25])
+    tamano = rng.gamma(2.0, rng.uniform(1, 10, num_skus))
+    hay_venta = rng.random((num_skus, semanas)) < np.clip(probabilidad[:, None] * estacional[categorias], 0, 1)
+    cantidades = rng.poisson(tamano[:, None] * np.ones(semanas)) + 1
+    matriz = np.where(hay_venta, cantidades, 0).astype(np.float64)
+    # Parte del catálogo empieza a venderse a mitad del historial
+    nuevos = rng.random(num_skus) < 0.1
+    matriz[nuevos, : semanas // 2] = 0
+    return matriz, categorias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--semanas", type=int, default=104)
+    parser.add_argument("--reservadas", type=int, default=8, help="Semanas finales para medir la precisión")
+    args = parser.parse_args()
+
+    matriz, categorias = generar_demanda(args.skus, args.semanas + args.reservadas)
+
+    historia, futuro = matriz[:, : args.semanas], matriz[:, args.semanas:]
+    inicio = time.perf_counter()
+    resultado = pronosticar_matriz(historia, horizonte_periodos=args.reservadas, grupos=categorias)
+    segundos = time.perf_counter() - inicio
+    print(f"⏱️ {args.skus:,} SKUs x {args.semanas} semanas pronosticados en {segundos:.2f} s")
+
+    real = futuro.mean(axis=1)
+    promedio_ventana = historia[:, -26:].mean(axis=1) # ~180 días, como la ventana general de PDA_Final
+    error_pronostico = np.abs(resultado["pronostico"] - real).mean()
+    error_promedio = np.abs(promedio_ventana - real).mean()
+    metodos, conteos = np.unique(resultado["metodo"], return_counts=True)
+    print("Métodos elegidos: " + ", ".join(f"{m} {c:,}" for m, c in zip(metodos, conteos)))
+    print(f"Error absoluto medio por semana en las {args.reservadas} semanas reservadas: "
+          f"pronóstico {error_pronostico:.3f} vs promedio de 26 semanas {error_promedio:.3f}")
+    sys.exit(0 if error_pronostico < error_promedio else 1)
+
+
+if __name__ == "__main__":
+    main()
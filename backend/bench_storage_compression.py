@@ -0,0 +1,90 @@
+# bench_storage_compression.py
+# ===================================================================================
+# --- BENCHMARK: COMPRESIÓN DE ARCHIVOS DE VENTAS EN STORAGE ---
+# ===================================================================================
+# Genera un CSV de ventas sintético con el formato que esperan los reportes
+# (por defecto 200.000 líneas) y compara, para cada códec disponible:
+#   - bytes almacenados / transferidos
+#   - tiempo de compresión (al subir)
+#   - tiempo estimado de descarga para un ancho de banda dado
+#   - tiempo de descompresión en flujo + pd.read_csv
+#
+# Uso:
+#   python bench_storage_compression.py --lineas 200000 --mbps 100
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from compresion import comprimir_contenido, abrir_flujo_descomprimido, zstandard
+
+
+def generar_csv_ventas(num_lineas: int, num_skus: int = 4000, dias: int = 365, semilla: int = 42) -> bytes:
+    """Crea un CSV de ventas realista (comprobantes con varias líneas, fechas dd/mm/aaaa)."""
+    rng = np.random.default_rng(semilla)
+    skus = np.array([f"SKU{idx:06d}" for idx in range(num_skus)])
+    nombres = np.array([f"Producto ferretería {idx} {rng.choice(['Tornillo', 'Pintura', 'Cable', 'Tubo'])}" for idx in range(num_skus)])
+    precios = np.round(rng.uniform(1, 350, num_skus), 2)
+
+    # Popularidad tipo Pareto: pocos SKUs concentran la mayoría de las ventas
+    pesos = 1 / np.arange(1, num_skus + 1) ** 0.9
+    idx_sku = rng.choice(num_skus, size=num_lineas, p=pesos / pesos.sum())
+    fechas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, dias, num_lineas), unit="D")
+
+    df = pd.DataFrame({
+        "Fecha de venta": fechas.strftime("%d/%m/%Y"),
+        "N° de comprobante / boleta": [f"B001-{n:07d}" for n in (np.arange(num_lineas) // 3)],
+        "SKU / Código de producto": skus[idx_sku],
+        "Nombre del producto": nombres[idx_sku],
+        "Cantidad vendida": rng.integers(1, 12, num_lineas),
+        "Precio de venta unitario (S/.)": precios[idx_sku],
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def medir(codec, contenido: bytes, mbps: float, repeticiones: int) -> dict:
+    inicio = time.perf_counter()
+    almacenado, codec_usado = comprimir_contenido(contenido, codec)
+    ms_compresion = (time.perf_counter() - inicio) * 1000
+
+    tiempos_lectura = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        df = pd.read_csv(abrir_flujo_descomprimido(almacenado))
+        tiempos_lectura.append((time.perf_counter() - inicio) * 1000)
+
+    ms_descarga = len(almacenado) * 8 / (mbps * 1_000_000) * 1000
+    return {
+        "codec": codec_usado or "sin comprimir",
+        "bytes": len(almacenado),
+        "ratio": len(contenido) / len(almacenado),
+        "ms_compresion": ms_compresion,
+        "ms_descarga_estimada": ms_descarga,
+        "ms_lectura": min(tiempos_lectura),
+        "ms_total_lectura": ms_descarga + min(tiempos_lectura),
+        "filas": len(df),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara códecs de compresión para los CSV de ventas.")
+    parser.add_argument("--lineas", type=int, default=200_000)
+    parser.add_argument("--mbps", type=float, default=100.0, help="Ancho de banda simulado Storage -> API")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    contenido = generar_csv_ventas(args.lineas)
+    print(f"CSV sintético: {args.lineas:,} líneas, {len(contenido) / 1e6:.1f} MB sin comprimir")
+    if zstandard is None:
+        print("⚠️ 'zstandard' no está instalado: solo se mide gzip.")
+
+    codecs = ["none", "gzip"] + (["zstd"] if zstandard else [])
+    resultados = [medir(codec, contenido, args.mbps, args.repeticiones) for codec in codecs]
+
+    print(f"\n{'Códec':<15}{'MB':>8}{'Ratio':>8}{'Compr. ms':>11}{'Desc. ms':>10}{'Lectura ms':>12}{'Total ms':>10}")
+    print("-" * 74)
+    for r in resultados:
+        print(f"{r['codec']:<15}{r['bytes'] / 1e6:>8.2f}{r['ratio']:>8.1f}{r['ms_compresion']:>11.0f}"
+              f"{r['ms_descarga_estimada']:>10.0f}{r['ms_lectura']:>12.0f}{r['ms_total_lectura']:>10.0f}")
+    print(f"\n(Descarga estimada a {args.mbps:.0f} Mbps; 'Total' = descarga + descompresión + parseo)")
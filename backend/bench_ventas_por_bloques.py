@@ -0,0 +1,134 @@
+# bench_ventas_por_bloques.py
+# ===================================================================================
+# --- TECHO DE MEMORIA DE LA LECTURA POR BLOQUES ---
+# ===================================================================================
+# Escribe a disco un historial de millones de líneas (sin tenerlo nunca entero en
+# memoria), lo condensa por bloques y ejecuta los motores sobre el resultado,
+# midiendo tiempos y el pico de memoria con tracemalloc. Sale con código 1 si se
+# supera el techo. La paridad de los motores con el historial condensado y los
+# casos borde se verifican en tests/test_ventas_por_bloques.py.
+#
+# Uso:
+#   python bench_ventas_por_bloques.py --lineas 5000000 --techo-mb 768
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from ventas_por_bloques import condensar_ventas, COLUMNA_LINEAS
+from track_expenses import (
+    process_csv_abc, procesar_stock_muerto, process_csv_analisis_estrategico_rotacion,
+    process_csv_puntos_alerta_stock, process_csv_plan_compra_sugerido, auditar_margenes_de_productos_nuevo
+)
+
+SKU_COL = 'SKU / Código de producto'
+
+MOTORES = {
+    "abc": process_csv_abc,
+    "stock_muerto": procesar_stock_muerto,
+    "rotacion": process_csv_analisis_estrategico_rotacion,
+    "puntos_alerta": process_csv_puntos_alerta_stock,
+    "plan_compra": process_csv_plan_compra_sugerido,
+    "margenes": auditar_margenes_de_productos_nuevo,
+}
+
+
+def generar_inventario(num_skus: int, semilla: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    precios_venta = np.round(rng.uniform(2, 350, num_skus), 2)
+    return pd.DataFrame({
+        SKU_COL: [f"SKU{idx:06d}" for idx in range(num_skus)],
+        "Nombre del producto": [f"Producto {idx}" for idx in range(num_skus)],
+        "Categoría": rng.choice(["Herramientas", "Pinturas", "Electricidad", "Gasfitería"], num_skus),
+        "Subcategoría": rng.choice(["A", "B", "C"], num_skus),
+        "Marca": rng.choice(["Marca1", "Marca2", "Marca3", "Marca4", "Marca5"], num_skus),
+        "Cantidad en stock actual": rng.integers(0, 200, num_skus),
+        "Precio de compra actual (S/.)": np.round(precios_venta * rng.uniform(0.55, 0.95, num_skus), 2),
+        "Precio de venta actual (S/.)": precios_venta,
+    })
+
+
+def generar_bloque_ventas(inicio: int, num_lineas: int, df_inventario: pd.DataFrame, dias: int, rng) -> pd.DataFrame:
+    """Líneas de venta recientes con popularidad tipo Pareto y algunos descuentos."""
+    num_skus = len(df_inventario)
+    pesos = 1 / np.arange(1, num_skus + 1) ** 0.9
+    idx_sku = rng.choice(num_skus, size=num_lineas, p=pesos / pesos.sum())
+    hoy = pd.Timestamp.now().normalize()
+    fechas = hoy - pd.to_timedelta(rng.integers(0, dias, num_lineas), unit="D")
+    descuento = rng.choice([1.0, 1.0, 1.0, 0.9, 0.85], num_lineas)
+    return pd.DataFrame({
+        "Fecha de venta": fechas.strftime("%d/%m/%Y"),
+        "N° de comprobante / boleta": [f"B001-{n:08d}" for n in (np.arange(inicio, inicio + num_lineas) // 3)],
+        SKU_COL: df_inventario[SKU_COL].to_numpy()[idx_sku],
+        "Nombre del producto": df_inventario["Nombre del producto"].to_numpy()[idx_sku],
+        "Cantidad vendida": rng.integers(1, 12, num_lineas),
+        "Precio de venta unitario (S/.)": np.round(df_inventario["Precio de venta actual (S/.)"].to_numpy()[idx_sku] * descuento, 2),
+    })
+
+
+def escribir_historial(ruta: str, num_lineas: int, df_inventario: pd.DataFrame, dias: int, lineas_por_bloque: int = 500_000):
+    rng = np.random.default_rng(42)
+    escritas = 0
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        while escritas < num_lineas:
+            n = min(lineas_por_bloque, num_lineas - escritas)
+            generar_bloque_ventas(escritas, n, df_inventario, dias, rng).to_csv(archivo, index=False, header=(escritas == 0))
+            escritas += n
+
+
+def _normalizar(resultado) -> pd.DataFrame:
+    """Resultado de un motor ordenado por SKU y sin la columna de líneas, para comparar entre fuentes."""
+    df = resultado.get("data") if isinstance(resultado, dict) else resultado
+    df = df.drop(columns=[COLUMNA_LINEAS], errors="ignore")
+    orden = [col for col in (SKU_COL, "sku") if col in df.columns][:1]
+    return df.sort_values(orden).reset_index(drop=True) if orden else df.reset_index(drop=True)
+
+
+def verificar_techo(num_lineas: int, df_inventario: pd.DataFrame, dias: int, techo_mb: float) -> bool:
+    print(f"\n--- Techo de memoria con {num_lineas:,} líneas (techo {techo_mb:.0f} MB) ---")
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "ventas.csv")
+        inicio = time.perf_counter()
+        escribir_historial(ruta, num_lineas, df_inventario, dias)
+        print(f"CSV de {os.path.getsize(ruta) / 1e6:,.0f} MB escrito en {time.perf_counter() - inicio:.1f} s")
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        df_condensado = condensar_ventas(ruta)
+        _, pico_condensado = tracemalloc.get_traced_memory()
+        print(f"Condensado: {len(df_condensado):,} filas en {time.perf_counter() - inicio:.1f} s, pico {pico_condensado / 1e6:,.0f} MB")
+
+        for nombre, motor in MOTORES.items():
+            tracemalloc.reset_peak()
+            inicio = time.perf_counter()
+            motor(df_condensado.copy(), df_inventario.copy())
+            _, pico = tracemalloc.get_traced_memory()
+            print(f"  {nombre}: {time.perf_counter() - inicio:.1f} s, pico {pico / 1e6:,.0f} MB")
+            pico_condensado = max(pico_condensado, pico)
+        tracemalloc.stop()
+
+    dentro = pico_condensado / 1e6 <= techo_mb
+    print(f"{'✅' if dentro else '❌'} Pico máximo: {pico_condensado / 1e6:,.0f} MB (techo {techo_mb:.0f} MB)")
+    return dentro
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lineas", type=int, default=5_000_000, help="Líneas del historial grande")
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--techo-mb", type=float, default=768)
+    args = parser.parse_args()
+
+    df_inventario = generar_inventario(args.skus)
+    techo_ok = verificar_techo(args.lineas, df_inventario, args.dias, args.techo_mb)
+    sys.exit(0 if techo_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# cache_arrow.py
+# ===================================================================================
+# --- CACHÉ EN DISCO COMPARTIDA ENTRE WORKERS (ARCHIVOS ARROW MAPEADOS EN MEMORIA) ---
+# ===================================================================================
+# Con varios workers de uvicorn, cada proceso tendría su propia copia parseada de
+# los workspaces activos (ver cache_local.py). Este segundo nivel guarda los
+# DataFrames normalizados (ventas, inventario y agregados) como archivos Arrow IPC
+# sin comprimir en un directorio local. Los workers los abren con memory-mapping:
+# las columnas numéricas se leen sin copiarse y todos los procesos comparten la
+# misma copia física a través del page cache del sistema operativo.
+#
+# - Escrituras atómicas: se escribe a un temporal y se renombra (os.replace).
+# - Desalojo por tamaño total (LRU por fecha de último uso) y por antigüedad.
+# - Un archivo ilegible o corrupto se borra y se devuelve None: quien llama vuelve
+#   a descargar y parsear, igual que con un fallo de la caché en memoria.
+#
+# pyarrow es una dependencia opcional: sin ella, la caché está siempre vacía.
+import os
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError: # Dependencia opcional: sin ella solo queda la caché en memoria
+    pa = None
+
+CACHE_ARROW_ACTIVA = os.getenv("ARROW_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "si")
+DIRECTORIO_CACHE_ARROW = os.getenv("ARROW_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ftros_cache_arrow"))
+EXTENSION = ".arrow"
+MAGIC_ARROW = b"ARROW1"
+# Un temporal más viejo que esto es de una escritura que no terminó (p. ej. un worker caído)
+SEGUNDOS_TEMPORAL_HUERFANO = 3600
+
+
+def _nulos_como_nan(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Arrow devuelve los nulos de las columnas de texto como None, pero pd.read_csv
+    los deja como NaN y los motores dependen de eso (p. ej. astype(str) -> 'nan').
+    """
+    for columna in df.columns[df.dtypes == object]:
+        nulos = df[columna].isna()
+        if nulos.any():
+            df[columna] = df[columna].where(~nulos, np.nan)
+    return df
+
+
+class CacheArrowDisco:
+    def __init__(self, directorio: str, max_bytes: int, ttl_segundos: float):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self.activa = CACHE_ARROW_ACTIVA and pa is not None
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.corruptos = 0
+        if self.activa:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        # Las claves llevan correos y '|': el nombre del archivo es un hash
+        return os.path.join(self.directorio, hashlib.sha256(clave.encode("utf-8")).hexdigest() + EXTENSION)
+
+    def _contar(self, atributo: str):
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + 1)
+
+    def _borrar(self, ruta: str):
+        # En Linux, un worker que ya tiene el archivo mapeado lo sigue leyendo sin problema
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+    def _archivos(self) -> list:
+        archivos = []
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError: # Otro worker lo desalojó mientras listábamos
+                    continue
+                archivos.append((entrada.path, info.st_mtime, info.st_size))
+        return archivos
+
+    def _desalojar(self):
+        ahora = time.time()
+        vigentes, total = [], 0
+        for ruta, modificado, tamano in self._archivos():
+            if ruta.endswith(EXTENSION):
+                if ahora - modificado > self.ttl_segundos:
+                    self._borrar(ruta)
+                    continue
+                vigentes.append((modificado, ruta, tamano))
+                total += tamano
+            elif ahora - modificado > SEGUNDOS_TEMPORAL_HUERFANO:
+                self._borrar(ruta)
+        # Los menos usados primero: `obtener` actualiza la fecha de modificación
+        for _, ruta, tamano in sorted(vigentes):
+            if total <= self.max_bytes:
+                break
+            self._borrar(ruta)
+            total -= tamano
+
+    def guardar(self, df: pd.DataFrame, clave: str) -> bool:
+        """Escribe el DataFrame (con su índice) de forma atómica. Devuelve False si no se pudo."""
+        if not self.activa or df is None:
+            return False
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=True)
+            # Sin compresión: es lo que permite leer las columnas directamente del mapeo
+            with pa.OSFile(temporal, "wb") as destino, pa.ipc.new_file(destino, tabla.schema) as escritor:
+                escritor.write_table(tabla)
+            os.replace(temporal, ruta)
+        except (pa.ArrowException, OSError, ValueError, TypeError) as e:
+            # p. ej. una columna con tipos mezclados que Arrow no sabe representar
+            print(f"⚠️ No se pudo guardar '{clave}' en la caché Arrow: {e}")
+            self._borrar(temporal)
+            return False
+        try:
+            self._desalojar()
+        except OSError as e:
+            print(f"⚠️ No se pudo desalojar la caché Arrow: {e}")
+        return True
+
+    def obtener(self, clave: Optional[str]) -> Optional[pd.DataFrame]:
+        """
+        Devuelve el DataFrame guardado, o None si no está, venció o está corrupto.
+        Las columnas numéricas apuntan al archivo mapeado y son de solo lectura
+        (asignar sobre ellas lanza "assignment destination is read-only"): quien
+        lo vaya a modificar debe usar `.copy()`.
+        """
+        if not self.activa or not clave:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            if time.time() - os.path.getmtime(ruta) > self.ttl_segundos:
+                self._borrar(ruta)
+                raise FileNotFoundError(ruta)
+            fuente = pa.memory_map(ruta, "r")
+            # El lector valida el pie del archivo; la cabecera y la estructura se revisan aquí
+            if fuente.read(len(MAGIC_ARROW)) != MAGIC_ARROW:
+                raise ValueError("cabecera Arrow inválida")
+            tabla = pa.ipc.open_file(fuente).read_all()
+            tabla.validate()
+            # split_blocks evita consolidar columnas (una copia); las numéricas apuntan al mapeo
+            df = _nulos_como_nan(tabla.to_pandas(split_blocks=True))
+        except FileNotFoundError:
+            self._contar("fallos")
+            return None
+        except (pa.ArrowException, OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Entrada corrupta en la caché Arrow para '{clave}' ({e}); se volverá a parsear.")
+            self._borrar(ruta)
+            self._contar("corruptos")
+            self._contar("fallos")
+            return None
+        try:
+            os.utime(ruta) # Marca de uso para el desalojo LRU
+        except OSError:
+            pass
+        self._contar("aciertos")
+        return df
+
+    def estadisticas(self) -> dict:
+        archivos = [a for a in self._archivos() if a[0].endswith(EXTENSION)] if self.activa else []
+        with self._lock:
+            return {
+                "activa": self.activa,
+                "entradas": len(archivos),
+                "bytes": sum(tamano for _, _, tamano in archivos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "corruptos": self.corruptos,
+            }
@@ -0,0 +1,81 @@
+# cache_local.py
+# ===================================================================================
+# --- CACHÉ EN MEMORIA CON EXPIRACIÓN (TTL) ---
+# ===================================================================================
+# Caché simple, segura entre hilos y acotada en número de entradas y bytes.
+# Es local a cada proceso de uvicorn: quien la use debe tener siempre un
+# camino alternativo (volver a leer desde Storage) cuando una clave no esté.
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class CacheTTL:
+    def __init__(self, ttl_segundos: float, max_entradas: int = 64, max_bytes: Optional[int] = None):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict() # clave -> (expira_en, tamano, valor)
+        self._bytes_totales = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _eliminar(self, clave: str):
+        _, tamano, _ = self._datos.pop(clave)
+        self._bytes_totales -= tamano
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (expira, _, _) in self._datos.items() if expira <= ahora]:
+            self._eliminar(clave)
+        # Desalojamos las entradas más antiguas (LRU) si superamos los límites
+        while self._datos and (
+            len(self._datos) > self.max_entradas
+            or (self.max_bytes is not None and self._bytes_totales > self.max_bytes)
+        ):
+            self._eliminar(next(iter(self._datos)))
+
+    def guardar(self, valor: Any, clave: Optional[str] = None, tamano_bytes: int = 0) -> str:
+        """Guarda un valor y devuelve su clave (un token aleatorio si no se indica)."""
+        clave = clave or uuid.uuid4().hex
+        with self._lock:
+            if clave in self._datos:
+                self._eliminar(clave)
+            self._datos[clave] = (time.monotonic() + self.ttl_segundos, tamano_bytes, valor)
+            self._bytes_totales += tamano_bytes
+            self._purgar()
+        return clave
+
+    def obtener(self, clave: Optional[str]) -> Optional[Any]:
+        if not clave:
+            return None
+        with self._lock:
+            self._purgar()
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[2]
+
+    def extraer(self, clave: Optional[str]) -> Optional[Any]:
+        """Como `obtener`, pero elimina la entrada (tokens de un solo uso)."""
+        valor = self.obtener(clave)
+        if valor is not None:
+            with self._lock:
+                if clave in self._datos:
+                    self._eliminar(clave)
+        return valor
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes_totales,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
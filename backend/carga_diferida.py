@@ -0,0 +1,50 @@
+# carga_diferida.py
+# ===================================================================================
+# --- IMPORTACIÓN DIFERIDA DE MÓDULOS PESADOS ---
+# ===================================================================================
+# pandas, numpy, scipy, pyarrow y duckdb (a través de los motores de análisis)
+# son la mayor parte del arranque en frío. Un ModuloDiferido ocupa el lugar del
+# módulo y lo importa recién cuando se accede a uno de sus atributos, así que
+# `pd.DataFrame(...)` o `track_expenses.process_csv_abc` siguen funcionando igual.
+# El calentamiento en segundo plano de main.py los precarga con `precargar`.
+import importlib
+from typing import Dict, Iterable, Optional
+
+
+class ModuloDiferido:
+    """
+    Sustituto de un módulo que lo importa la primera vez que se accede a uno de
+    sus atributos. Importar desde varios hilos a la vez es seguro: el sistema de
+    importación de Python serializa la carga de cada módulo.
+    """
+    def __init__(self, nombre_modulo: str):
+        self._nombre_modulo = nombre_modulo
+        self._modulo = None
+
+    def cargar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre_modulo)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self._modulo is not None else "pendiente"
+        return f"<módulo diferido '{self._nombre_modulo}' ({estado})>"
+
+
+def precargar(nombres_modulos: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Importa cada módulo y devuelve {nombre: error o None}. Un módulo que falla no
+    impide cargar los demás: se volverá a intentar con su primer uso real.
+    """
+    errores: Dict[str, Optional[str]] = {}
+    for nombre in nombres_modulos:
+        try:
+            importlib.import_module(nombre)
+            errores[nombre] = None
+        except Exception as e:
+            errores[nombre] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ No se pudo precargar '{nombre}' (se cargará con su primer uso): {e}")
+    return errores
@@ -0,0 +1,222 @@
+# cesta_compras.py
+# ===================================================================================
+# --- ANÁLISIS DE CANASTA: PRODUCTOS QUE SE COMPRAN JUNTOS ---
+# ===================================================================================
+# El archivo de ventas trae el 'N° de comprobante / boleta' de cada línea. Con él
+# se arma una matriz dispersa A (comprobantes x SKUs) con un 1 donde el SKU aparece
+# en el comprobante, y la matriz de co-ocurrencia sale de un producto disperso:
+#
+#   C = A^T A      C[i, j] = comprobantes donde aparecen juntos i y j
+#
+# Para cada par se calculan soporte (n_ij / N), confianza (n_ij / n_i) y lift
+# (n_ij * N / (n_i * n_j): cuántas veces más se compran juntos de lo esperado si
+# fueran independientes), y se devuelven los K pares más fuertes de cada SKU.
+#
+# Memoria acotada:
+# - Las incidencias (comprobante, SKU) se arman por bloques con hashes de 64 bits
+#   de los comprobantes, sin cargar el resto de las columnas (ver `incidencias_de_bloques`).
+# - Los SKUs con menos de `min_comprobantes_juntos` comprobantes no pueden formar
+#   un par frecuente y salen de la matriz antes del producto.
+# - Los comprobantes enormes (compras institucionales, inventarios) generan pares
+#   en forma cuadrática y no dicen nada de la canasta típica: se excluyen los que
+#   superan `max_skus_por_comprobante`, y ese tope se reduce hasta que los pares
+#   quepan en el presupuesto de memoria.
+# - El producto se hace por tramos de comprobantes, cada uno dentro del presupuesto.
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+SKU_COL = 'SKU / Código de producto'
+COMPROBANTE_COL = 'N° de comprobante / boleta'
+# Columna de incidencias: hash de 64 bits del comprobante
+CLAVE_COMPROBANTE = 'Clave de comprobante'
+
+MIN_COMPROBANTES_JUNTOS = 3
+MAX_SKUS_POR_COMPROBANTE = 50
+PRESUPUESTO_MB = 256
+# Bytes por par durante el producto (A^T A simétrica, triángulo y acumulado)
+BYTES_POR_PAR = 40
+
+
+# --- INCIDENCIAS (COMPROBANTE, SKU) ---
+def _normalizado_por_valor(serie: pd.Series):
+    """Códigos y valores únicos sin espacios: el strip se hace una vez por valor distinto, no por línea."""
+    codigos, unicos = pd.factorize(serie)
+    return codigos, pd.Index(unicos).astype(str).str.strip()
+
+
+def _incidencias_de_bloque(bloque: pd.DataFrame) -> pd.DataFrame:
+    codigos, comprobantes = _normalizado_por_valor(bloque[COMPROBANTE_COL])
+    claves = pd.util.hash_array(comprobantes.to_numpy(dtype=object))
+    codigos_sku, skus = _normalizado_por_valor(bloque[SKU_COL])
+    valido = codigos >= 0 # comprobante vacío (NaN)
+    valido[valido] = (comprobantes.to_numpy()[codigos[valido]] != '')
+    return pd.DataFrame({
+        CLAVE_COMPROBANTE: claves[codigos[valido]],
+        SKU_COL: skus.to_numpy()[codigos_sku[valido]],
+    }).drop_duplicates()
+
+
+def incidencias_de_bloques(bloques: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Pares únicos (comprobante, SKU) de un historial leído por bloques. En memoria
+    solo queda un bloque más las incidencias (8 bytes + el código del SKU por par).
+    """
+    partes = []
+    for bloque in bloques:
+        if COMPROBANTE_COL not in bloque.columns or SKU_COL not in bloque.columns:
+            raise ValueError(f"El archivo de ventas debe tener las columnas '{COMPROBANTE_COL}' y '{SKU_COL}'.")
+        parte = _incidencias_de_bloque(bloque)
+        parte[SKU_COL] = parte[SKU_COL].astype('category')
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame({CLAVE_COMPROBANTE: np.array([], dtype=np.uint64), SKU_COL: pd.Categorical([])})
+    # Un comprobante puede quedar partido entre dos bloques: se deduplica al final
+    incidencias = pd.concat(partes, ignore_index=True).drop_duplicates(ignore_index=True)
+    incidencias[SKU_COL] = incidencias[SKU_COL].astype(str).astype('category')
+    return incidencias
+
+
+def incidencias_de_ventas(df_ventas: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Incidencias de un historial ya cargado; None si no trae comprobantes (p. ej. condensado)."""
+    if COMPROBANTE_COL not in df_ventas.columns or SKU_COL not in df_ventas.columns:
+        return None
+    return incidencias_de_bloques([df_ventas[[COMPROBANTE_COL, SKU_COL]]])
+
+
+# --- CO-OCURRENCIA ---
+def _tope_por_presupuesto(skus_por_comprobante: np.ndarray, tope: int, presupuesto_mb: float) -> int:
+    """Reduce el tope de SKUs por comprobante hasta que todos los pares quepan en el presupuesto."""
+    pares = skus_por_comprobante * (skus_por_comprobante - 1) // 2
+    limite_pares = presupuesto_mb * 1024 * 1024 / BYTES_POR_PAR
+    while tope > 2 and pares[skus_por_comprobante <= tope].sum() > limite_pares:
+        tope = max(2, int(tope * 0.8))
+    return tope
+
+
+def coocurrencias(
+    incidencias: pd.DataFrame,
+    min_comprobantes_juntos: int = MIN_COMPROBANTES_JUNTOS,
+    max_skus_por_comprobante: int = MAX_SKUS_POR_COMPROBANTE,
+    presupuesto_mb: float = PRESUPUESTO_MB,
+) -> Dict[str, Any]:
+    """
+    Pares (i < j) con al menos `min_comprobantes_juntos` comprobantes en común.
+    Devuelve los arreglos 'i', 'j', 'juntos', el conteo por SKU 'n_sku', los
+    'skus', el total de comprobantes 'comprobantes' y datos del cálculo.
+    """
+    filas, _ = pd.factorize(incidencias[CLAVE_COMPROBANTE])
+    columnas, skus = pd.factorize(incidencias[SKU_COL])
+    skus = np.asarray(skus, dtype=object)
+    skus_por_comprobante = np.bincount(filas)
+    tope = _tope_por_presupuesto(skus_por_comprobante, max_skus_por_comprobante, presupuesto_mb)
+
+    # Los comprobantes enormes salen de todos los conteos (también de N y de n_i)
+    considerado = (skus_por_comprobante <= tope)[filas]
+    filas, columnas = filas[considerado], columnas[considerado]
+    num_comprobantes = int((skus_por_comprobante <= tope).sum())
+    num_incidencias = len(filas)
+    n_sku = np.bincount(columnas, minlength=len(skus))
+
+    # Poda tipo apriori: un SKU poco frecuente no forma pares frecuentes
+    frecuente = (n_sku >= min_comprobantes_juntos)[columnas]
+    filas, columnas = filas[frecuente], columnas[frecuente]
+    vacio = {"i": np.array([], dtype=np.int64), "j": np.array([], dtype=np.int64), "juntos": np.array([], dtype=np.int64),
+             "n_sku": n_sku, "skus": skus, "comprobantes": num_comprobantes, "max_skus_por_comprobante": tope, "tramos": 0,
+             "skus_por_comprobante_promedio": num_incidencias / max(num_comprobantes, 1)}
+    if len(filas) == 0:
+        return vacio
+
+    # Filas compactas (solo comprobantes con algún SKU frecuente), ordenadas
+    filas, _ = pd.factorize(filas, sort=True)
+    num_filas = int(filas.max()) + 1
+    matriz = sparse.csr_matrix(
+        (np.ones(len(filas), dtype=np.int32), (filas, columnas)), shape=(num_filas, len(skus))
+    )
+
+    # Tramos de comprobantes con a lo sumo la mitad del presupuesto en pares cada uno
+    k = np.diff(matriz.indptr)
+    pares_acumulados = np.cumsum(k * (k - 1) // 2)
+    pares_por_tramo = max(1, int(presupuesto_mb * 1024 * 1024 / 2 / BYTES_POR_PAR))
+    cortes = np.searchsorted(pares_acumulados, np.arange(pares_por_tramo, pares_acumulados[-1] + pares_por_tramo, pares_por_tramo), side='right')
+    cortes = np.unique(np.r_[0, np.clip(cortes, 1, num_filas), num_filas])
+
+    acumulada = sparse.csr_matrix((len(skus), len(skus)), dtype=np.int32)
+    for inicio, fin in zip(cortes[:-1], cortes[1:]):
+        tramo = matriz[inicio:fin]
+        acumulada = acumulada + sparse.triu(tramo.T @ tramo, k=1, format='csr')
+
+    acumulada = acumulada.tocoo()
+    mantener = acumulada.data >= min_comprobantes_juntos
+    return {
+        **vacio,
+        "i": acumulada.row[mantener].astype(np.int64),
+        "j": acumulada.col[mantener].astype(np.int64),
+        "juntos": acumulada.data[mantener].astype(np.int64),
+        "tramos": len(cortes) - 1,
+    }
+
+
+def pares_frecuentes(
+    incidencias: pd.DataFrame,
+    top_k: int = 5,
+    min_comprobantes_juntos: int = MIN_COMPROBANTES_JUNTOS,
+    ordenar_por: str = 'lift',
+    min_lift: float = 1.0,
+    max_skus_por_comprobante: int = MAX_SKUS_POR_COMPROBANTE,
+    presupuesto_mb: float = PRESUPUESTO_MB,
+) -> Dict[str, Any]:
+    """
+    Los `top_k` productos comprados junto a cada SKU, con soporte, confianza
+    (de SKU -> relacionado) y lift. `ordenar_por`: 'lift', 'confianza' o 'frecuencia'.
+    """
+    resultado = coocurrencias(incidencias, min_comprobantes_juntos, max_skus_por_comprobante, presupuesto_mb)
+    i, j, juntos, n_sku = resultado["i"], resultado["j"], resultado["juntos"], resultado["n_sku"]
+    total = max(resultado["comprobantes"], 1)
+
+    # Cada par aparece en las dos direcciones (i -> j y j -> i)
+    antecedente, consecuente, juntos = np.r_[i, j], np.r_[j, i], np.r_[juntos, juntos].astype(np.float64)
+    confianza = juntos / n_sku[antecedente]
+    lift = juntos * total / (n_sku[antecedente].astype(np.float64) * n_sku[consecuente])
+    mantener = lift >= min_lift
+    antecedente, consecuente, juntos, confianza, lift = (a[mantener] for a in (antecedente, consecuente, juntos, confianza, lift))
+
+    criterio = {'confianza': confianza, 'frecuencia': juntos}.get(ordenar_por, lift)
+    orden = np.lexsort((-juntos, -criterio, antecedente))
+    antecedente_ordenado = antecedente[orden]
+    inicio = np.r_[True, antecedente_ordenado[1:] != antecedente_ordenado[:-1]]
+    posicion = np.arange(len(orden)) - np.maximum.accumulate(np.where(inicio, np.arange(len(orden)), 0))
+    orden = orden[posicion < top_k]
+
+    skus = resultado["skus"]
+    pares = pd.DataFrame({
+        SKU_COL: skus[antecedente[orden]],
+        'SKU Relacionado': skus[consecuente[orden]],
+        'Comprobantes Juntos': juntos[orden].astype(np.int64),
+        'Soporte': juntos[orden] / total,
+        'Confianza': confianza[orden],
+        'Lift': lift[orden],
+    })
+    return {
+        "pares": pares,
+        "comprobantes": resultado["comprobantes"],
+        "skus_por_comprobante_promedio": resultado["skus_por_comprobante_promedio"],
+        "max_skus_por_comprobante": resultado["max_skus_por_comprobante"],
+        "tramos": resultado["tramos"],
+    }
+
+
+def resumen_comprados_juntos(pares: pd.DataFrame, nombres: pd.Series, por_sku: int = 3, min_confianza: float = 0.05) -> pd.Series:
+    """
+    Texto 'Producto (45%), ...' con los productos comprados junto a cada SKU
+    (índice: SKU). Se omiten los que acompañan en menos de `min_confianza` de sus comprobantes.
+    """
+    pares = pares[pares['Confianza'] >= min_confianza]
+    if pares.empty:
+        return pd.Series(dtype=object)
+    primeros = pares.groupby(SKU_COL, sort=False).head(por_sku)
+    etiqueta = primeros['SKU Relacionado'].map(nombres).fillna(primeros['SKU Relacionado'])
+    texto = etiqueta + ' (' + (primeros['Confianza'] * 100).round().astype(int).astype(str) + '%)'
+    return texto.groupby(primeros[SKU_COL], sort=False).agg(', '.join)
@@ -0,0 +1,81 @@
+# compresion.py
+# ===================================================================================
+# --- COMPRESIÓN DE ARCHIVOS ALMACENADOS EN STORAGE ---
+# ===================================================================================
+# Los CSV de ventas se comprimen muy bien (texto repetitivo). Los guardamos
+# comprimidos con zstd (si la librería está instalada) o gzip, y al leerlos
+# los descomprimimos como flujo, sin materializar una copia descomprimida.
+# La detección se hace por los "magic bytes", así que los archivos antiguos
+# guardados sin comprimir se siguen leyendo igual que antes.
+import io
+import os
+import gzip
+from typing import Optional, Tuple
+
+try:
+    import zstandard
+except ImportError: # Dependencia opcional: sin ella usamos gzip
+    zstandard = None
+
+MAGIC_GZIP = b"\x1f\x8b"
+MAGIC_ZSTD = b"\x28\xb5\x2f\xfd"
+
+# 'zstd', 'gzip' o 'none'. Por defecto, el mejor códec disponible.
+COMPRESION_STORAGE = os.getenv("STORAGE_COMPRESSION", "zstd" if zstandard else "gzip").strip().lower()
+NIVEL_ZSTD = int(os.getenv("STORAGE_ZSTD_LEVEL", "6"))
+NIVEL_GZIP = int(os.getenv("STORAGE_GZIP_LEVEL", "6"))
+
+
+def comprimir_contenido(contenido: bytes, codec: Optional[str] = None) -> Tuple[bytes, Optional[str]]:
+    """
+    Comprime el contenido con el códec indicado (o el configurado por defecto).
+    Devuelve (bytes_a_guardar, codec). Si la compresión no reduce el tamaño,
+    o el códec no está disponible, devuelve el contenido original y None.
+    """
+    codec = (codec or COMPRESION_STORAGE)
+    if codec == "zstd" and zstandard is None:
+        codec = "gzip"
+
+    if codec == "zstd":
+        comprimido = zstandard.ZstdCompressor(level=NIVEL_ZSTD).compress(contenido)
+    elif codec == "gzip":
+        comprimido = gzip.compress(contenido, compresslevel=NIVEL_GZIP, mtime=0)
+    else:
+        return contenido, None
+
+    if len(comprimido) >= len(contenido):
+        return contenido, None
+    return comprimido, codec
+
+
+def detectar_codec(contenido: bytes) -> Optional[str]:
+    """Identifica el códec por los primeros bytes. None = sin comprimir."""
+    if contenido[:2] == MAGIC_GZIP:
+        return "gzip"
+    if contenido[:4] == MAGIC_ZSTD:
+        return "zstd"
+    return None
+
+
+def abrir_flujo_descomprimido(contenido: bytes):
+    """
+    Devuelve un objeto tipo archivo que entrega el contenido ya descomprimido
+    a medida que se lee (apto para `pd.read_csv`). Si el contenido no está
+    comprimido, lo envuelve tal cual en un BytesIO.
+    """
+    codec = detectar_codec(contenido)
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=io.BytesIO(contenido), mode="rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("El archivo está comprimido con zstd pero la librería 'zstandard' no está instalada.")
+        return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(contenido))
+    return io.BytesIO(contenido)
+
+
+def descomprimir_contenido(contenido: bytes) -> bytes:
+    """Versión no-streaming, para los pocos casos que necesitan los bytes completos."""
+    if detectar_codec(contenido) is None:
+        return contenido
+    with abrir_flujo_descomprimido(contenido) as flujo:
+        return flujo.read()
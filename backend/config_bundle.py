@@ -0,0 +1,157 @@
+# config_bundle.py
+# ===================================================================================
+# --- PAQUETE PRECALCULADO DE /reports-config ---
+# ===================================================================================
+# REPORTS_CONFIG, TOOLTIPS_GLOSSARY y KPI_TOOLTIPS_GLOSSARY son estáticos durante
+# la vida del proceso. En lugar de re-serializarlos en cada request, los
+# serializamos y comprimimos una sola vez y los servimos con un ETag basado en
+# el hash del contenido, de modo que las recargas del frontend reciban un 304.
+import json
+import gzip
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from carga_diferida import ModuloDiferido
+
+# Las configuraciones se importan al armar el primer paquete, no al arrancar
+report_config = ModuloDiferido("report_config")
+tooltips_config = ModuloDiferido("tooltips_config")
+
+# El contenido solo cambia con un deploy, pero obligamos a revalidar para que
+# un cambio de configuración llegue al navegador sin esperar a que expire.
+CACHE_CONTROL_CONFIG = "public, max-age=0, must-revalidate"
+
+# Campos livianos del catálogo: suficientes para dibujar el menú de reportes.
+# Los parámetros, planes de acción y columnas se piden por reporte bajo demanda.
+CAMPOS_CATALOGO = [
+    "label", "endpoint", "key", "url_key", "categoria", "isPro", "costo", "description"
+]
+
+SECCIONES_DISPONIBLES = ["completo", "reports", "tooltips", "kpi_tooltips", "catalogo"]
+
+_lock_paquetes = threading.Lock()
+_PAQUETES: Dict[str, Dict[str, Any]] = {}
+
+
+def _serializar(contenido: Any) -> bytes:
+    # Mismo formato que usa JSONResponse de Starlette
+    return json.dumps(
+        contenido, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _construir_paquete(contenido: Any) -> Dict[str, Any]:
+    """Serializa, comprime (gzip determinista) y calcula el ETag de un contenido."""
+    cuerpo = _serializar(contenido)
+    return {
+        "cuerpo": cuerpo,
+        "cuerpo_gzip": gzip.compress(cuerpo, compresslevel=9, mtime=0),
+        "etag": f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"',
+    }
+
+
+def _contenido_de_seccion(seccion: str) -> Optional[Any]:
+    if seccion == "completo":
+        return {
+            "reports": report_config.REPORTS_CONFIG,
+            "tooltips": tooltips_config.TOOLTIPS_GLOSSARY,
+            "kpi_tooltips": tooltips_config.KPI_TOOLTIPS_GLOSSARY
+        }
+    if seccion == "reports":
+        return report_config.REPORTS_CONFIG
+    if seccion == "tooltips":
+        return tooltips_config.TOOLTIPS_GLOSSARY
+    if seccion == "kpi_tooltips":
+        return tooltips_config.KPI_TOOLTIPS_GLOSSARY
+    if seccion == "catalogo":
+        return {
+            report_key: {campo: config[campo] for campo in CAMPOS_CATALOGO if campo in config}
+            for report_key, config in report_config.REPORTS_CONFIG.items()
+        }
+    if seccion.startswith("reporte:"):
+        return report_config.REPORTS_CONFIG.get(seccion.split(":", 1)[1])
+    return None
+
+
+def obtener_paquete(seccion: str = "completo") -> Optional[Dict[str, Any]]:
+    """Devuelve (y memoriza) el paquete precalculado de una sección, o None si no existe."""
+    paquete = _PAQUETES.get(seccion)
+    if paquete is not None:
+        return paquete
+
+    contenido = _contenido_de_seccion(seccion)
+    if contenido is None:
+        return None
+
+    with _lock_paquetes:
+        if seccion not in _PAQUETES:
+            _PAQUETES[seccion] = _construir_paquete(contenido)
+        return _PAQUETES[seccion]
+
+
+def precalcular_paquetes():
+    """Construye de antemano las secciones fijas; se llama en el calentamiento de la API."""
+    for seccion in SECCIONES_DISPONIBLES:
+        obtener_paquete(seccion)
+    completo = _PAQUETES["completo"]
+    print(f"✅ Paquete /reports-config precalculado: {len(completo['cuerpo'])} bytes "
+          f"({len(completo['cuerpo_gzip'])} bytes gzip), ETag {completo['etag']}")
+
+
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    if "*" in candidatos:
+        return True
+    # La comparación débil ignora el prefijo W/ (algunos proxies lo agregan al re-comprimir)
+    return any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+def _acepta_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Interpreta Accept-Encoding con sus q-values: 'gzip;q=0' rechaza gzip y un
+    comodín '*' lo acepta solo si gzip no aparece de forma explícita.
+    """
+    calidades: Dict[str, float] = {}
+    for elemento in (accept_encoding or "").lower().split(","):
+        codificacion, *parametros = [parte.strip() for parte in elemento.split(";")]
+        if not codificacion:
+            continue
+        calidad = 1.0
+        for parametro in parametros:
+            nombre, _, valor = parametro.partition("=")
+            if nombre.strip() == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        calidades[codificacion] = calidad
+    if "gzip" in calidades:
+        return calidades["gzip"] > 0
+    return calidades.get("*", 0.0) > 0
+
+
+def responder_paquete(request: Request, paquete: Dict[str, Any]) -> Response:
+    """
+    Arma la respuesta HTTP: 304 si el cliente ya tiene la versión actual,
+    o el cuerpo (comprimido si el cliente acepta gzip) con ETag y Cache-Control.
+    """
+    headers = {
+        "ETag": paquete["etag"],
+        "Cache-Control": CACHE_CONTROL_CONFIG,
+        "Vary": "Accept-Encoding",
+    }
+
+    if _etag_coincide(request.headers.get("if-none-match"), paquete["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    if _acepta_gzip(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=paquete["cuerpo_gzip"], media_type="application/json", headers=headers)
+
+    return Response(content=paquete["cuerpo"], media_type="application/json", headers=headers)
@@ -0,0 +1,227 @@
+# cubo_inventario.py
+# ===================================================================================
+# --- CUBO DE TOTALES POR CATEGORÍA / SUBCATEGORÍA / MARCA (DRILL-DOWN) ---
+# ===================================================================================
+# Los tableros necesitan totales por Categoría → Subcategoría → Marca (valor del
+# stock, stock muerto, ventas, margen y mezcla ABC) y, al final del camino, la
+# lista de SKUs. En vez de bajar un reporte completo por SKU y agregarlo en el
+# navegador, el cubo se arma una vez por par de archivos:
+#
+# - "Hechos": una fila por SKU del inventario con sus medidas, construida desde
+#   los agregados de ventas por SKU de precalculo.py (que ya se actualizan de forma
+#   incremental cuando llega un delta de ventas: nunca se vuelve a leer el historial).
+# - Un DataFrame por nivel (total, categoría, +subcategoría, +marca) con índice
+#   ordenado: cada consulta de drill-down es una búsqueda binaria en el índice.
+#
+# Reglas (las mismas de los reportes):
+# - Stock muerto: stock > 0 y sin ventas en `dias_sin_venta_muerto` días (o nunca
+#   vendido), contando hacia atrás desde la última venta del historial.
+# - Clase ABC por ingresos del historial: A hasta el 80% acumulado, B hasta el 95%,
+#   C el resto; los SKUs sin ventas quedan como 'Sin ventas'.
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+NOMBRE_COL = 'Nombre del producto'
+STOCK_COL = 'Cantidad en stock actual'
+PRECIO_COMPRA_COL = 'Precio de compra actual (S/.)'
+NIVELES = ('Categoría', 'Subcategoría', 'Marca')
+SIN_VALOR = {'Categoría': 'Sin Categoría', 'Subcategoría': 'Sin Subcategoría', 'Marca': 'Sin Marca'}
+
+DIAS_SIN_VENTA_MUERTO = 180
+UMBRAL_ACUMULADO_A, UMBRAL_ACUMULADO_B = 80, 95
+CLASES_ABC = ('A', 'B', 'C', 'Sin ventas')
+TAM_PAGINA_SKUS = 50
+MAX_TAM_PAGINA_SKUS = 500
+
+# Medidas de cada nodo del cubo (todas aditivas: se suman de un nivel al siguiente)
+MEDIDAS = (
+    'skus', 'stock_unidades', 'valor_stock', 'skus_stock_muerto', 'valor_stock_muerto',
+    'unidades_vendidas', 'ingresos', 'margen', 'skus_A', 'skus_B', 'skus_C', 'skus_sin_ventas',
+)
+ORDEN_PERMITIDO = ('valor_stock', 'valor_stock_muerto', 'ingresos', 'margen', 'unidades_vendidas', 'skus', 'nombre')
+
+
+def _clase_abc(ingresos: np.ndarray) -> np.ndarray:
+    """Clase ABC por participación acumulada en los ingresos (ver process_csv_abc)."""
+    clases = np.full(len(ingresos), 'Sin ventas', dtype=object)
+    con_ventas = np.flatnonzero(ingresos > 0)
+    if len(con_ventas) == 0:
+        return clases
+    orden = con_ventas[np.argsort(-ingresos[con_ventas], kind='stable')]
+    acumulado = 100 * np.cumsum(ingresos[orden]) / ingresos[orden].sum()
+    clases[orden] = np.where(acumulado <= UMBRAL_ACUMULADO_A, 'A', np.where(acumulado <= UMBRAL_ACUMULADO_B, 'B', 'C'))
+    return clases
+
+
+def construir_hechos(
+    df_inventario: pd.DataFrame,
+    agregados_ventas: Optional[pd.DataFrame],
+    dias_sin_venta_muerto: int = DIAS_SIN_VENTA_MUERTO
+) -> pd.DataFrame:
+    """
+    Una fila por SKU del inventario con sus medidas. `agregados_ventas` es el
+    resultado de precalculo.agregar_ventas_por_sku (índice SKU; unidades, ingresos,
+    ultima_venta); None si el historial no trae esas columnas.
+    """
+    inventario = df_inventario.copy()
+    inventario[SKU_COL] = inventario[SKU_COL].astype(str).str.strip()
+    inventario = inventario.drop_duplicates(subset=[SKU_COL])
+
+    hechos = pd.DataFrame({'sku': inventario[SKU_COL].to_numpy()})
+    hechos['nombre'] = inventario[NOMBRE_COL].to_numpy() if NOMBRE_COL in inventario.columns else ''
+    for nivel in NIVELES:
+        if nivel in inventario.columns:
+            valores = inventario[nivel].where(inventario[nivel].notna(), '').astype(str).str.strip()
+        else:
+            valores = pd.Series('', index=inventario.index)
+        hechos[nivel] = valores.replace('', SIN_VALOR[nivel]).to_numpy()
+
+    stock = pd.to_numeric(inventario[STOCK_COL], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+    costo = pd.to_numeric(inventario[PRECIO_COMPRA_COL], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    hechos['stock_unidades'] = stock
+    hechos['valor_stock'] = stock * costo
+
+    agregados = agregados_ventas if agregados_ventas is not None else pd.DataFrame(columns=['unidades', 'ingresos', 'ultima_venta'])
+    fila = agregados.index.get_indexer(hechos['sku'])
+    vendio = fila >= 0
+
+    def _columna(nombre: str, relleno) -> np.ndarray:
+        if nombre not in agregados.columns:
+            return np.full(len(hechos), relleno)
+        valores = agregados[nombre].to_numpy()[np.where(vendio, fila, 0)] if len(agregados) else np.full(len(hechos), relleno)
+        return np.where(vendio, valores, relleno)
+
+    unidades = _columna('unidades', 0.0).astype(np.float64)
+    ingresos = _columna('ingresos', 0.0).astype(np.float64)
+    hechos['unidades_vendidas'] = unidades
+    hechos['ingresos'] = ingresos
+    hechos['margen'] = ingresos - unidades * costo
+
+    ultima_venta = pd.to_datetime(pd.Series(_columna('ultima_venta', pd.NaT)), errors='coerce')
+    fecha_referencia = pd.to_datetime(agregados['ultima_venta'], errors='coerce').max() if 'ultima_venta' in agregados.columns and len(agregados) else pd.NaT
+    dias_sin_venta = (fecha_referencia - ultima_venta).dt.days.to_numpy(dtype=np.float64) if pd.notna(fecha_referencia) else np.full(len(hechos), np.nan)
+    hechos['dias_sin_venta'] = dias_sin_venta
+    # Sin fecha de última venta (nunca vendido) cuenta como muerto si tiene stock
+    es_muerto = (stock > 0) & ~(dias_sin_venta < dias_sin_venta_muerto)
+    hechos['stock_muerto'] = es_muerto
+    hechos['valor_stock_muerto'] = np.where(es_muerto, hechos['valor_stock'], 0.0)
+    hechos['clase_abc'] = _clase_abc(ingresos)
+    return hechos
+
+
+def construir_cubo(hechos: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Agrega los hechos por cada prefijo de NIVELES. Cada nivel queda con el índice
+    ordenado para resolver el drill-down con búsquedas binarias; los hechos quedan
+    indexados por (Categoría, Subcategoría, Marca) para paginar los SKUs de una marca.
+    """
+    base = pd.DataFrame({nivel: hechos[nivel] for nivel in NIVELES})
+    base['skus'] = 1
+    base['skus_stock_muerto'] = hechos['stock_muerto'].astype(np.int64)
+    for columna in ('stock_unidades', 'valor_stock', 'valor_stock_muerto', 'unidades_vendidas', 'ingresos', 'margen'):
+        base[columna] = hechos[columna]
+    for clase in CLASES_ABC:
+        base['skus_sin_ventas' if clase == 'Sin ventas' else f'skus_{clase}'] = (hechos['clase_abc'] == clase).astype(np.int64)
+
+    # Del nivel más fino al total: cada nivel se suma desde el anterior, no desde los SKUs
+    niveles: List[pd.DataFrame] = [None] * (len(NIVELES) + 1)
+    niveles[len(NIVELES)] = base.groupby(list(NIVELES), sort=True)[list(MEDIDAS)].sum()
+    for profundidad in range(len(NIVELES) - 1, 0, -1):
+        niveles[profundidad] = niveles[profundidad + 1].groupby(level=list(range(profundidad)), sort=True).sum()
+    niveles[0] = niveles[1].sum().to_frame().T
+
+    hechos_indexados = hechos.sort_values(list(NIVELES) + ['valor_stock'], ascending=[True] * len(NIVELES) + [False], kind='stable')
+    return {
+        "niveles": niveles,
+        "hechos": hechos_indexados.set_index(list(NIVELES)),
+    }
+
+
+def _medidas(fila: pd.Series) -> Dict[str, Any]:
+    medidas = {}
+    for medida in MEDIDAS:
+        medidas[medida] = int(fila[medida]) if medida.startswith('skus') else round(float(fila[medida]), 2)
+    skus_con_ventas = medidas['skus'] - medidas['skus_sin_ventas']
+    medidas['pct_skus_A'] = round(100 * medidas['skus_A'] / skus_con_ventas, 1) if skus_con_ventas else 0.0
+    medidas['pct_valor_stock_muerto'] = round(100 * medidas['valor_stock_muerto'] / medidas['valor_stock'], 1) if medidas['valor_stock'] else 0.0
+    return medidas
+
+
+def consultar_cubo(
+    cubo: Dict[str, Any],
+    categoria: Optional[str] = None,
+    subcategoria: Optional[str] = None,
+    marca: Optional[str] = None,
+    ordenar_por: str = 'valor_stock',
+    pagina: int = 1,
+    tam_pagina: int = TAM_PAGINA_SKUS
+) -> Dict[str, Any]:
+    """
+    Totales del nodo (categoria, subcategoria, marca) y sus hijos: categorías en la
+    raíz, subcategorías dentro de una categoría, marcas dentro de una subcategoría y,
+    con la ruta completa, una página de SKUs. Lanza ValueError si la ruta está
+    incompleta y KeyError si el nodo no existe.
+    """
+    ruta = [categoria, subcategoria, marca]
+    profundidad = next((i for i, valor in enumerate(ruta) if not valor), len(ruta))
+    if any(ruta[profundidad:]):
+        raise ValueError("La ruta debe completarse en orden: Categoría → Subcategoría → Marca.")
+    if ordenar_por not in ORDEN_PERMITIDO:
+        raise ValueError(f"Orden no reconocido: '{ordenar_por}'. Opciones: {', '.join(ORDEN_PERMITIDO)}.")
+    clave = tuple(ruta[:profundidad])
+
+    niveles = cubo["niveles"]
+    if profundidad == 0:
+        nodo = niveles[0].iloc[0]
+    else:
+        # El nivel de categorías tiene un índice simple; los demás, MultiIndex
+        etiqueta = clave if profundidad > 1 else clave[0]
+        if etiqueta not in niveles[profundidad].index:
+            raise KeyError(" → ".join(clave))
+        nodo = niveles[profundidad].loc[etiqueta]
+    respuesta: Dict[str, Any] = {
+        "nivel": NIVELES[profundidad] if profundidad < len(NIVELES) else 'SKU',
+        "ruta": dict(zip(NIVELES, clave)),
+        "totales": _medidas(nodo),
+    }
+
+    if profundidad < len(NIVELES):
+        hijos = niveles[profundidad + 1]
+        if profundidad > 0:
+            hijos = hijos.xs(clave, level=list(range(profundidad)), drop_level=True)
+        hijos = hijos.copy()
+        hijos.index = hijos.index.get_level_values(-1)
+        if ordenar_por == 'nombre':
+            hijos = hijos.sort_index()
+        else:
+            hijos = hijos.sort_values(ordenar_por, ascending=False, kind='stable')
+        respuesta["hijos"] = [{"nombre": str(nombre), **_medidas(fila)} for nombre, fila in hijos.iterrows()]
+        return respuesta
+
+    # --- Hoja: página de SKUs de la marca ---
+    skus = cubo["hechos"].loc[[clave]] # con lista: DataFrame aunque la marca tenga un solo SKU
+    tam_pagina = int(min(max(tam_pagina, 1), MAX_TAM_PAGINA_SKUS))
+    if ordenar_por == 'nombre':
+        skus = skus.sort_values('nombre', kind='stable')
+    elif ordenar_por != 'valor_stock': # los hechos ya vienen por valor de stock
+        skus = skus.sort_values(ordenar_por if ordenar_por in skus.columns else 'valor_stock', ascending=False, kind='stable')
+    total_paginas = max(1, -(-len(skus) // tam_pagina))
+    pagina = int(min(max(pagina, 1), total_paginas))
+    pagina_skus = skus.iloc[(pagina - 1) * tam_pagina: pagina * tam_pagina]
+    respuesta["skus"] = [
+        {
+            "sku": fila.sku, "nombre": fila.nombre, "clase_abc": fila.clase_abc, "stock_muerto": bool(fila.stock_muerto),
+            "stock_unidades": float(fila.stock_unidades), "valor_stock": round(float(fila.valor_stock), 2),
+            "unidades_vendidas": float(fila.unidades_vendidas), "ingresos": round(float(fila.ingresos), 2),
+            "margen": round(float(fila.margen), 2),
+            "dias_sin_venta": None if pd.isna(fila.dias_sin_venta) else int(fila.dias_sin_venta),
+        }
+        for fila in pagina_skus.itertuples(index=False)
+    ]
+    respuesta["pagina"] = pagina
+    respuesta["total_paginas"] = total_paginas
+    respuesta["total_skus"] = int(len(skus))
+    return respuesta
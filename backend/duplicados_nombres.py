@@ -0,0 +1,171 @@
+# duplicados_nombres.py
+# ===================================================================================
+# --- DETECCIÓN DE NOMBRES DE PRODUCTO CASI DUPLICADOS (MINHASH + LSH) ---
+# ===================================================================================
+# Los catálogos reales tienen el mismo artículo con nombres apenas distintos:
+# "TORNILLO 1/2 X 2" y "Tornillo 1/2x2", "Martillo de uña 16oz" y "MARTILLO UÑA 16 OZ".
+# Comparar todos contra todos es O(n²); en su lugar:
+#
+# 1. Normalización: minúsculas, sin tildes, sin conectores ("de", "para"...) y sin
+#    espacios ni signos (se conservan dígitos, '/' y '.'). Cada nombre normalizado
+#    distinto se procesa una sola vez.
+# 2. Firma MinHash de los n-gramas de caracteres (trigramas) de cada nombre: la
+#    fracción de posiciones iguales entre dos firmas estima su similitud de Jaccard.
+# 3. LSH por bandas: la firma se parte en bandas y dos nombres son candidatos si
+#    coinciden en todas las filas de alguna banda. Solo se verifican esos pares.
+# 4. Verificación: similitud estimada >= umbral y los mismos números en ambos
+#    nombres ("Tornillo 1/2 x 2" y "Tornillo 1/2 x 3" NO son el mismo producto).
+# 5. Grupos: componentes conexas de los pares confirmados (scipy.sparse.csgraph).
+#
+# Todo está vectorizado con numpy; los únicos bucles son por banda y por bloque de
+# permutaciones, no por nombre.
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+NGRAMA = 3
+NUM_PERMUTACIONES = 64
+FILAS_POR_BANDA = 4
+UMBRAL_SIMILITUD = 0.7
+# Un bucket de LSH más grande que esto solo se une en estrella (al primero), no todos contra todos
+MAX_PARES_POR_BUCKET = 50
+# Elementos (permutaciones x trigramas) por bloque al calcular las firmas
+ELEMENTOS_POR_BLOQUE = 8_000_000
+SEMILLA = 20240501
+PATRON_CONECTORES = r'\b(?:de|del|la|las|el|los|para|con|y|en|a)\b'
+
+
+def normalizar_nombres(nombres: pd.Series) -> pd.DataFrame:
+    """Texto compacto para los trigramas y la 'firma numérica' de cada nombre."""
+    texto = (nombres.astype(str).str.lower()
+             .str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii'))
+    # Sin conectores ("martillo de una" = "martillo una"); la 'x' de las medidas se conserva
+    compacto = texto.str.replace(PATRON_CONECTORES, ' ', regex=True).str.replace(r'[^a-z0-9./]', '', regex=True)
+    # Sobre el texto compacto: "LATEX3 /4" y "LATEX 3/4" tienen los mismos números
+    numeros = compacto.str.findall(r'\d+(?:[./]\d+)*').map(lambda n: '|'.join(sorted(n)))
+    return pd.DataFrame({"texto": compacto, "numeros": numeros}, index=nombres.index)
+
+
+def firmas_minhash(textos: np.ndarray, num_permutaciones: int = NUM_PERMUTACIONES, ngrama: int = NGRAMA, semilla: int = SEMILLA) -> np.ndarray:
+    """Matriz (textos x permutaciones) con el mínimo hash de los n-gramas de cada texto."""
+    textos = pd.Series(textos, dtype=object).str.pad(ngrama, side='right')
+    largos = textos.str.len().to_numpy(dtype=np.int64)
+    buffer = np.frombuffer(''.join(textos).encode('ascii'), dtype=np.uint8)
+
+    # Inicio de cada n-grama dentro del buffer, todos los textos a la vez
+    cantidad = largos - ngrama + 1
+    inicio_texto = np.cumsum(largos) - largos
+    primero = np.cumsum(cantidad) - cantidad
+    posicion = np.arange(cantidad.sum()) - np.repeat(primero - inicio_texto, cantidad)
+    codigo = np.zeros(len(posicion), dtype=np.uint64)
+    for k in range(ngrama):
+        codigo = (codigo << np.uint64(8)) | buffer[posicion + k].astype(np.uint64)
+
+    rng = np.random.default_rng(semilla)
+    a = rng.integers(0, 1 << 63, num_permutaciones, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 1 << 63, num_permutaciones, dtype=np.uint64)
+    firmas = np.empty((len(textos), num_permutaciones), dtype=np.uint64)
+    paso = max(1, ELEMENTOS_POR_BLOQUE // max(len(codigo), 1))
+    for desde in range(0, num_permutaciones, paso):
+        hasta = min(desde + paso, num_permutaciones)
+        # Hash multiplicativo (a impar, aritmética módulo 2^64): los 32 bits altos
+        h = (a[desde:hasta, None] * codigo[None, :] + b[desde:hasta, None]) >> np.uint64(32)
+        firmas[:, desde:hasta] = np.minimum.reduceat(h, primero, axis=1).T
+    return firmas
+
+
+def _pares_de_buckets(claves: np.ndarray) -> np.ndarray:
+    """Pares (i, j) de elementos con la misma clave; los buckets grandes se unen en estrella."""
+    orden = np.argsort(claves, kind='stable')
+    ordenadas = claves[orden]
+    inicio = np.r_[True, ordenadas[1:] != ordenadas[:-1]]
+    grupo = np.cumsum(inicio) - 1
+    tamano = np.bincount(grupo)[grupo]
+    posicion = np.arange(len(orden)) - np.flatnonzero(inicio)[grupo]
+
+    # Buckets chicos: cada elemento con los que le siguen en su bucket
+    chico = (tamano > 1) & (tamano <= MAX_PARES_POR_BUCKET)
+    parejas = np.where(chico, tamano - posicion - 1, 0)
+    origen = np.repeat(np.arange(len(orden)), parejas)
+    salto = np.arange(len(origen)) - np.repeat(np.cumsum(parejas) - parejas, parejas) + 1
+    pares_chicos = np.c_[orden[origen], orden[origen + salto]]
+
+    # Buckets grandes: todos contra el primero
+    grande = (tamano > MAX_PARES_POR_BUCKET) & (posicion > 0)
+    primero = np.flatnonzero(inicio)[grupo]
+    pares_grandes = np.c_[orden[primero[grande]], orden[grande]]
+    return np.r_[pares_chicos, pares_grandes]
+
+
+def agrupar_nombres_similares(
+    nombres: pd.Series,
+    umbral_similitud: float = UMBRAL_SIMILITUD,
+    num_permutaciones: int = NUM_PERMUTACIONES,
+    filas_por_banda: int = FILAS_POR_BANDA,
+) -> Dict[str, Any]:
+    """
+    Etiqueta de grupo por fila de `nombres` (-1 si el nombre está vacío): filas con
+    la misma etiqueta son casi duplicados entre sí (directamente o en cadena).
+    Devuelve 'grupo', 'similitud' (la mejor similitud estimada de cada fila con
+    otra de su grupo; 1.0 si el nombre normalizado es idéntico) y estadísticas.
+    """
+    valido = nombres.notna().to_numpy() & (nombres.astype(str).str.strip() != '').to_numpy()
+    if not valido.any():
+        return {"grupo": np.full(len(nombres), -1, dtype=np.int64), "similitud": np.zeros(len(nombres)),
+                "nombres_distintos": 0, "pares_candidatos": 0, "pares_confirmados": 0}
+    normalizados = normalizar_nombres(nombres[valido])
+    # Un nombre normalizado distinto = un nodo (las variantes idénticas ya quedan juntas)
+    codigo, unicos = pd.MultiIndex.from_frame(normalizados).factorize()
+    textos = unicos.get_level_values(0).to_numpy(dtype=object)
+    numeros, _ = pd.factorize(unicos.get_level_values(1))
+    m = len(unicos)
+
+    pares = np.empty((0, 2), dtype=np.int64)
+    confirmados = np.empty((0, 2), dtype=np.int64)
+    similitud_nodo = np.zeros(m)
+    if m > 1:
+        firmas = firmas_minhash(textos, num_permutaciones)
+        bandas = num_permutaciones // filas_por_banda
+        candidatos = []
+        for banda in range(bandas):
+            bloque = firmas[:, banda * filas_por_banda:(banda + 1) * filas_por_banda]
+            # Los números forman parte de la clave: nombres con números distintos nunca son candidatos
+            clave = numeros.astype(np.uint64)
+            for fila in range(filas_por_banda):
+                clave = clave * np.uint64(1_000_003) + bloque[:, fila] # desborde intencional (hash)
+            candidatos.append(_pares_de_buckets(clave))
+        pares = np.concatenate(candidatos)
+        pares = np.sort(pares, axis=1)
+        pares = np.unique(pares[:, 0] * m + pares[:, 1])
+        pares = np.c_[pares // m, pares % m]
+
+        # Verificación por bloques: fracción de posiciones iguales en la firma
+        similitud = np.empty(len(pares))
+        for desde in range(0, len(pares), 200_000):
+            i, j = pares[desde:desde + 200_000, 0], pares[desde:desde + 200_000, 1]
+            similitud[desde:desde + 200_000] = (firmas[i] == firmas[j]).mean(axis=1)
+        # (una colisión de hash podría juntar números distintos: se vuelven a comparar)
+        ok = (similitud >= umbral_similitud) & (numeros[pares[:, 0]] == numeros[pares[:, 1]])
+        confirmados = pares[ok]
+        np.maximum.at(similitud_nodo, confirmados[:, 0], similitud[ok])
+        np.maximum.at(similitud_nodo, confirmados[:, 1], similitud[ok])
+
+    grafo = sparse.coo_matrix((np.ones(len(confirmados)), (confirmados[:, 0], confirmados[:, 1])), shape=(m, m))
+    _, componente = connected_components(grafo, directed=False)
+
+    grupo = np.full(len(nombres), -1, dtype=np.int64)
+    grupo[valido] = componente[codigo]
+    similitud = np.zeros(len(nombres))
+    # Varias filas con el mismo nombre normalizado son idénticas entre sí
+    repetido = np.bincount(codigo, minlength=m)[codigo] > 1
+    similitud[valido] = np.where(repetido, 1.0, similitud_nodo[codigo])
+    return {
+        "grupo": grupo,
+        "similitud": similitud,
+        "nombres_distintos": m,
+        "pares_candidatos": len(pares),
+        "pares_confirmados": len(confirmados),
+    }
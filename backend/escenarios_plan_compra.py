@@ -0,0 +1,172 @@
+# escenarios_plan_compra.py
+# ===================================================================================
+# --- SIMULADOR DE ESCENARIOS DEL PLAN DE COMPRA (BARRIDO VECTORIZADO) ---
+# ===================================================================================
+# Para comparar estrategias (pesos de importancia, días de cobertura, lead time...)
+# había que generar el Plan de Compra completo una vez por combinación. Aquí los
+# agregados por SKU (ventas y días con venta de cada ventana, precios, stock) se
+# calculan UNA sola vez y los parámetros se convierten en un eje más: cada fórmula
+# del plan se evalúa sobre arreglos (escenarios x SKUs) y de cada escenario solo
+# se conservan sus KPIs.
+#
+# - Lo que depende solo de `peso_ventas_historicas` (PDA y ranking de ventas
+#   ponderadas) se calcula una vez por valor distinto del peso.
+# - Los escenarios se procesan por bloques para acotar la memoria
+#   (CELDAS_POR_BLOQUE celdas escenario x SKU a la vez).
+#
+# Las fórmulas replican las de process_csv_plan_compra_sugerido con la demanda de
+# 'promedios' (el pronóstico por producto depende del horizonte y no se barre).
+import itertools
+from statistics import NormalDist
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Parámetros que se pueden barrer (los demás quedan fijos en su valor base)
+PARAMETROS_BARRIBLES = (
+    'score_ventas', 'score_ingreso', 'score_margen', 'score_dias_venta',
+    'peso_ventas_historicas', 'dias_cobertura_ideal_base', 'lead_time_dias',
+    'dias_seguridad_base', 'nivel_servicio',
+)
+MAX_ESCENARIOS = 5000
+CELDAS_POR_BLOQUE = 4_000_000
+
+COLUMNAS_KPI = {
+    'inversion': 'Inversión Total Sugerida (S/.)',
+    'skus': 'SKUs a Reponer',
+    'unidades': 'Unidades Totales a Pedir',
+    'margen': 'Margen Potencial (S/.)',
+    'criticos': 'SKUs en Alerta Crítica',
+    'bajo_alerta': 'SKUs bajo Punto de Alerta Ideal',
+}
+
+
+def grilla_de_escenarios(valores_base: Dict[str, Any], grilla: Dict[str, Sequence]) -> pd.DataFrame:
+    """
+    Producto cartesiano de los valores de `grilla`; los parámetros que no aparecen
+    toman su valor de `valores_base`. Una fila por escenario.
+    """
+    desconocidos = sorted(set(grilla) - set(PARAMETROS_BARRIBLES))
+    if desconocidos:
+        raise ValueError(f"Parámetros no admitidos en el barrido: {', '.join(desconocidos)}. "
+                         f"Se pueden variar: {', '.join(PARAMETROS_BARRIBLES)}.")
+    valores = []
+    for parametro in PARAMETROS_BARRIBLES:
+        lista = grilla.get(parametro)
+        if lista is None or (isinstance(lista, (list, tuple)) and len(lista) == 0):
+            lista = [valores_base[parametro]]
+        elif not isinstance(lista, (list, tuple)):
+            lista = [lista]
+        valores.append(list(dict.fromkeys(float(v) for v in lista)))
+    total = int(np.prod([len(v) for v in valores]))
+    if total > MAX_ESCENARIOS:
+        raise ValueError(f"La grilla genera {total:,} escenarios; el máximo es {MAX_ESCENARIOS:,}.")
+    return pd.DataFrame(list(itertools.product(*valores)), columns=list(PARAMETROS_BARRIBLES))
+
+
+def _rank_pct(valores: np.ndarray) -> np.ndarray:
+    """Igual que Series.rank(pct=True) (método 'average'), fila por fila."""
+    return pd.DataFrame(np.atleast_2d(valores).T).rank(pct=True).to_numpy().T
+
+
+def kpis_por_escenario(
+    skus: Dict[str, np.ndarray],
+    escenarios: pd.DataFrame,
+    dias_recientes: int,
+    dias_general: int,
+    coef_importancia_para_cobertura_ideal: float = 0.05,
+    coef_rotacion_para_stock_ideal: float = 0.1,
+    coef_rotacion_para_stock_minimo: float = 0.15,
+    dias_cubrir_con_pedido_minimo: int = 3,
+    factor_importancia_seguridad: float = 1.0,
+    incluir_productos_pasivos: bool = True,
+    cantidad_reposicion_para_pasivos: int = 1,
+    metodo_stock_seguridad: str = 'dias',
+    coef_variacion_lead_time: float = 0.25,
+) -> pd.DataFrame:
+    """
+    KPIs del Plan de Compra para cada fila de `escenarios`. `skus` trae un arreglo
+    por SKU: ventas_rec, dias_venta_rec, ventas_gen, dias_venta_gen, precio_venta_rec,
+    precio_compra, precio_venta_lista, stock, factor_categoria, codigo_sku y, para
+    el stock de seguridad por variabilidad, demanda_media y demanda_desv.
+    """
+    ventas_rec, dias_venta_rec = skus['ventas_rec'], skus['dias_venta_rec']
+    ventas_gen, dias_venta_gen = skus['ventas_gen'], skus['dias_venta_gen']
+    stock = skus['stock']
+    precio_compra = skus['precio_compra']
+    num_skus = len(stock)
+
+    # --- Fijo para todos los escenarios ---
+    margen_pca = pd.Series(skus['precio_venta_rec'] - precio_compra).fillna(0).to_numpy()
+    ingreso = ventas_rec * skus['precio_venta_rec']
+    rank_ingreso, rank_margen, rank_dias = _rank_pct(np.vstack([ingreso, margen_pca, dias_venta_rec]))
+    rank_rotacion = np.nan_to_num(_rank_pct(ventas_rec / (stock + 1e-6))[0], nan=0.0)
+    factor_rotacion_ideal = 1 + rank_rotacion * coef_rotacion_para_stock_ideal
+    factor_rotacion_minimo = 1 + rank_rotacion * coef_rotacion_para_stock_minimo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pda_efectivo_rec = np.where(dias_venta_rec > 0, ventas_rec / dias_venta_rec, 0)
+        pda_efectivo_gen = np.where(dias_venta_gen > 0, ventas_gen / dias_venta_gen, 0)
+    pda_rec_a_usar = np.where(pda_efectivo_rec > 0, pda_efectivo_rec, pda_efectivo_gen)
+    pda_gen_a_usar = np.where(pda_efectivo_gen > 0, pda_efectivo_gen, ventas_gen / dias_general)
+    precio_compra_kpi = np.nan_to_num(precio_compra, nan=0.0)
+    margen_lista = np.clip(np.nan_to_num(skus['precio_venta_lista'], nan=0.0) - precio_compra_kpi, 0, None)
+    # SKUs distintos (el inventario puede repetir un código): filas ordenadas por código
+    orden_codigo = np.argsort(skus['codigo_sku'], kind='stable')
+    inicio_codigo = np.flatnonzero(np.r_[True, np.diff(skus['codigo_sku'][orden_codigo]) != 0])
+
+    # --- Lo que depende solo del peso histórico: una vez por valor distinto ---
+    pesos_unicos, peso_idx = np.unique(escenarios['peso_ventas_historicas'].to_numpy(), return_inverse=True)
+    peso_col = pesos_unicos[:, None]
+    rank_ventas_ponderadas = _rank_pct((ventas_rec / dias_recientes) * (1 - peso_col) + (ventas_gen / dias_general) * peso_col)
+    pda_por_peso = np.round(np.nan_to_num(pda_rec_a_usar * (1 - peso_col) + pda_gen_a_usar * peso_col, nan=0.0), 2)
+
+    # Pesos de importancia normalizados como en el endpoint del Plan de Compra
+    scores = escenarios[['score_ventas', 'score_ingreso', 'score_margen', 'score_dias_venta']].to_numpy(dtype=np.float64)
+    total_scores = scores.sum(axis=1, keepdims=True)
+    pesos = np.divide(scores, total_scores, out=np.full_like(scores, 0.25), where=total_scores != 0)
+
+    z = np.array([NormalDist().inv_cdf(min(max(s, 0.5), 0.999)) for s in escenarios['nivel_servicio']])
+    resultados = {clave: np.zeros(len(escenarios)) for clave in COLUMNAS_KPI}
+    por_bloque = max(1, CELDAS_POR_BLOQUE // max(num_skus, 1))
+    for desde in range(0, len(escenarios), por_bloque):
+        bloque = slice(desde, min(desde + por_bloque, len(escenarios)))
+        columna = lambda nombre: escenarios[nombre].to_numpy(dtype=np.float64)[bloque, None]
+        pda = pda_por_peso[peso_idx[bloque]]
+        w = pesos[bloque]
+        importancia = np.round(np.nan_to_num(
+            rank_ventas_ponderadas[peso_idx[bloque]] * w[:, 0:1] + rank_ingreso * w[:, 1:2]
+            + rank_margen * w[:, 2:3] + rank_dias * w[:, 3:4], nan=0.0), 3)
+
+        dias_cobertura = np.round(columna('dias_cobertura_ideal_base') * (1 + importancia * coef_importancia_para_cobertura_ideal), 1)
+        stock_ideal = np.clip(np.round(pda * dias_cobertura * skus['factor_categoria'] * factor_rotacion_ideal), 0, None)
+        stock_minimo = np.clip(np.round(pda * dias_cubrir_con_pedido_minimo * factor_rotacion_minimo), 0, None)
+        lead_time = columna('lead_time_dias')
+        if metodo_stock_seguridad == 'variabilidad':
+            desviacion_lead_time = coef_variacion_lead_time * lead_time
+            stock_seguridad = np.round(z[bloque, None] * np.sqrt(
+                lead_time * skus['demanda_desv'] ** 2 + skus['demanda_media'] ** 2 * desviacion_lead_time ** 2))
+        else:
+            stock_seguridad = np.round(pda * (columna('dias_seguridad_base') + importancia * factor_importancia_seguridad))
+        alerta_ideal = np.round(pda * lead_time) + stock_seguridad
+        alerta_minimo = np.minimum(
+            np.where((ventas_rec > 1) | (pda > 0), np.ceil(stock_seguridad + pda), stock_seguridad), stock_minimo)
+
+        pedido = np.round(np.clip(stock_ideal - stock, 0, None))
+        if incluir_productos_pasivos:
+            pasivo = (pda <= 1e-6) & (stock == 0) & (ventas_rec > 0)
+            pedido = np.where(pasivo, cantidad_reposicion_para_pasivos, pedido)
+
+        a_reponer = pedido > 0
+        pedido_a_reponer = np.where(a_reponer, pedido, 0)
+        resultados['inversion'][bloque] = (pedido_a_reponer * precio_compra_kpi).sum(axis=1)
+        resultados['unidades'][bloque] = pedido_a_reponer.sum(axis=1)
+        resultados['margen'][bloque] = (pedido_a_reponer * margen_lista).sum(axis=1)
+        resultados['skus'][bloque] = (np.add.reduceat(a_reponer[:, orden_codigo], inicio_codigo, axis=1) > 0).sum(axis=1)
+        resultados['criticos'][bloque] = (stock < alerta_minimo).sum(axis=1)
+        resultados['bajo_alerta'][bloque] = (stock < alerta_ideal).sum(axis=1)
+
+    superficie = escenarios.copy()
+    for clave, nombre in COLUMNAS_KPI.items():
+        superficie[nombre] = resultados[clave].round(2) if clave in ('inversion', 'margen') else resultados[clave].astype(np.int64)
+    return superficie
@@ -0,0 +1,166 @@
+# evolucion_skus.py
+# ===================================================================================
+# --- FOTOS POR SKU DE CADA AUDITORÍA Y DIFERENCIA RÁPIDA ENTRE DOS FOTOS ---
+# ===================================================================================
+# `comparar_auditorias` solo sabe qué tareas aparecieron o desaparecieron. Para
+# decir qué productos cambiaron de estado (p. ej. "12 Estrellas cayeron en
+# quiebre") guardamos en cada auditoría una foto compacta por SKU y comparamos
+# dos fotos con un hash-join sobre el código de SKU, sin volver a ejecutar
+# ninguna de las dos auditorías.
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+
+# Columna de df_maestro -> nombre corto en la foto
+COLUMNAS_CATEGORICAS = {
+    'Clasificación BCG': 'clase_bcg',
+    'Alerta de Stock': 'alerta_stock',
+    'Clasificación Diagnóstica': 'diagnostico',
+}
+COLUMNAS_NUMERICAS = {
+    'Margen Real (S/.)': 'margen',
+    'Inversión Stock Actual (S/.)': 'valor_stock',
+}
+
+ALERTAS_DE_QUIEBRE = ('Agotado', 'Stock Bajo')
+VERSION_SNAPSHOT = 1
+MAX_EJEMPLOS_POR_TRANSICION = 10
+MAX_TRANSICIONES_POR_DIMENSION = 20
+
+
+def construir_snapshot_skus(df_maestro: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extrae del DataFrame maestro de la auditoría la foto por SKU: clase BCG,
+    alerta de stock, diagnóstico, margen real, valor del stock y valor en riesgo.
+    El valor en riesgo usa la misma regla que el KPI 'Capital en Riesgo':
+    todo el stock si es 'Stock Muerto', el excedente sobre el ideal si hay sobre-stock.
+    """
+    foto = pd.DataFrame({"sku": df_maestro[SKU_COL].astype(str).str.strip()})
+    for origen, destino in COLUMNAS_CATEGORICAS.items():
+        valores = df_maestro[origen] if origen in df_maestro.columns else pd.Series(np.nan, index=df_maestro.index)
+        foto[destino] = valores.fillna('N/A').astype(str).astype('category').values
+    for origen, destino in COLUMNAS_NUMERICAS.items():
+        valores = df_maestro[origen] if origen in df_maestro.columns else pd.Series(0, index=df_maestro.index)
+        foto[destino] = pd.to_numeric(valores, errors='coerce').fillna(0).astype('float64').values
+
+    valor_en_riesgo = np.zeros(len(df_maestro))
+    if 'Clasificación Diagnóstica' in df_maestro.columns:
+        es_muerto = (df_maestro['Clasificación Diagnóstica'] == 'Stock Muerto').to_numpy()
+        valor_en_riesgo = np.where(es_muerto, foto["valor_stock"].to_numpy(), valor_en_riesgo)
+    columnas_exceso = ['Stock Actual (Unds)', 'Stock Ideal Sugerido (Unds)', 'Precio Compra (S/.)']
+    if 'Alerta de Stock' in df_maestro.columns and all(c in df_maestro.columns for c in columnas_exceso):
+        excedente = (
+            (pd.to_numeric(df_maestro['Stock Actual (Unds)'], errors='coerce') - pd.to_numeric(df_maestro['Stock Ideal Sugerido (Unds)'], errors='coerce'))
+            * pd.to_numeric(df_maestro['Precio Compra (S/.)'], errors='coerce')
+        ).fillna(0).clip(lower=0).to_numpy()
+        es_exceso = (df_maestro['Alerta de Stock'] == 'Sobre-stock').to_numpy()
+        valor_en_riesgo = valor_en_riesgo + np.where(es_exceso, excedente, 0)
+    foto["valor_en_riesgo"] = valor_en_riesgo
+
+    # Un SKU por fila (los merges de la auditoría pueden haber duplicado alguno)
+    return foto.drop_duplicates(subset="sku", keep="first").reset_index(drop=True)
+
+
+def serializar_snapshot(foto: pd.DataFrame) -> bytes:
+    """
+    Formato columnar compacto: las categóricas se guardan como diccionario +
+    códigos enteros y las numéricas redondeadas a céntimos.
+    """
+    columnas: Dict[str, Any] = {}
+    for destino in COLUMNAS_CATEGORICAS.values():
+        categorias = foto[destino].astype('category')
+        columnas[destino] = {
+            "diccionario": categorias.cat.categories.tolist(),
+            "codigos": categorias.cat.codes.astype(int).tolist(),
+        }
+    for destino in list(COLUMNAS_NUMERICAS.values()) + ["valor_en_riesgo"]:
+        columnas[destino] = np.round(foto[destino].to_numpy(dtype='float64'), 2).tolist()
+
+    contenido = {"version": VERSION_SNAPSHOT, "sku": foto["sku"].tolist(), "columnas": columnas}
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def deserializar_snapshot(contenido: bytes) -> pd.DataFrame:
+    datos = json.loads(contenido)
+    foto = pd.DataFrame({"sku": datos["sku"]})
+    for destino in COLUMNAS_CATEGORICAS.values():
+        columna = datos["columnas"][destino]
+        foto[destino] = pd.Categorical.from_codes(columna["codigos"], categories=columna["diccionario"])
+    for destino in list(COLUMNAS_NUMERICAS.values()) + ["valor_en_riesgo"]:
+        foto[destino] = np.asarray(datos["columnas"][destino], dtype='float64')
+    return foto
+
+
+def _transiciones(cruce: pd.DataFrame, dimension: str) -> List[Dict[str, Any]]:
+    """Cuenta los cambios 'previo -> actual' de una dimensión categórica."""
+    claves = [f"{dimension}_previo", f"{dimension}_actual"]
+    cambiaron = cruce.loc[cruce[claves[0]].astype(str) != cruce[claves[1]].astype(str), claves + ["sku"]]
+    if cambiaron.empty:
+        return []
+    cambiaron = cambiaron.astype({claves[0]: str, claves[1]: str})
+    cantidades = cambiaron.groupby(claves, sort=False).size().sort_values(ascending=False).head(MAX_TRANSICIONES_POR_DIMENSION)
+    # Los ejemplos se toman de un frame ya recortado, sin funciones Python por grupo
+    ejemplos = cambiaron.groupby(claves, sort=False).head(MAX_EJEMPLOS_POR_TRANSICION).groupby(claves, sort=False)["sku"].agg(list)
+    return [
+        {"desde": desde, "hacia": hacia, "cantidad": int(cantidad), "skus_ejemplo": ejemplos[(desde, hacia)]}
+        for (desde, hacia), cantidad in cantidades.items()
+    ]
+
+
+def comparar_snapshots(actual: pd.DataFrame, previo: Optional[pd.DataFrame]) -> Optional[Dict[str, Any]]:
+    """
+    Cruza dos fotos por SKU (hash-join de pandas) y resume los movimientos:
+    altas y bajas de SKUs, transiciones de cada dimensión, eventos destacados
+    y variación del margen y del valor en riesgo.
+    """
+    if previo is None or previo.empty:
+        return None
+
+    cruce = pd.merge(previo, actual, on="sku", how="outer", suffixes=("_previo", "_actual"), indicator=True)
+    en_ambos = cruce[cruce["_merge"] == "both"].copy()
+    for dimension in COLUMNAS_CATEGORICAS.values():
+        for lado in ("_previo", "_actual"):
+            en_ambos[dimension + lado] = en_ambos[dimension + lado].astype(str)
+
+    transiciones = {dimension: _transiciones(en_ambos, dimension) for dimension in COLUMNAS_CATEGORICAS.values()}
+
+    # Eventos destacados: productos que entraron en quiebre, agrupados por su clase BCG actual
+    alerta_previa = en_ambos["alerta_stock_previo"]
+    alerta_actual = en_ambos["alerta_stock_actual"]
+    entraron_en_quiebre = en_ambos[alerta_actual.isin(ALERTAS_DE_QUIEBRE) & ~alerta_previa.isin(ALERTAS_DE_QUIEBRE)]
+    eventos = []
+    for clase, grupo in entraron_en_quiebre.groupby("clase_bcg_actual", sort=False):
+        eventos.append({
+            "tipo": "entraron_en_quiebre",
+            "clase_bcg": clase,
+            "cantidad": int(len(grupo)),
+            "texto": f"{len(grupo)} productos '{clase}' cayeron en quiebre de stock.",
+            "skus_ejemplo": grupo["sku"].head(MAX_EJEMPLOS_POR_TRANSICION).tolist(),
+        })
+    nuevos_muertos = en_ambos[(en_ambos["diagnostico_actual"] == 'Stock Muerto') & (en_ambos["diagnostico_previo"] != 'Stock Muerto')]
+    if not nuevos_muertos.empty:
+        eventos.append({
+            "tipo": "nuevo_stock_muerto",
+            "cantidad": int(len(nuevos_muertos)),
+            "texto": f"{len(nuevos_muertos)} productos pasaron a 'Stock Muerto' (S/ {nuevos_muertos['valor_stock_actual'].sum():,.2f} inmovilizados).",
+            "skus_ejemplo": nuevos_muertos["sku"].head(MAX_EJEMPLOS_POR_TRANSICION).tolist(),
+        })
+    eventos.sort(key=lambda e: e["cantidad"], reverse=True)
+
+    return {
+        "skus_en_comun": int(len(en_ambos)),
+        "skus_nuevos": int((cruce["_merge"] == "right_only").sum()),
+        "skus_retirados": int((cruce["_merge"] == "left_only").sum()),
+        "transiciones": transiciones,
+        "eventos_destacados": eventos,
+        "valor_en_riesgo": {
+            "previo": round(float(previo["valor_en_riesgo"].sum()), 2),
+            "actual": round(float(actual["valor_en_riesgo"].sum()), 2),
+            "delta": round(float(actual["valor_en_riesgo"].sum() - previo["valor_en_riesgo"].sum()), 2),
+        },
+        "margen_real_delta_skus_en_comun": round(float((en_ambos["margen_actual"] - en_ambos["margen_previo"]).sum()), 2),
+    }
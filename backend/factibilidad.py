@@ -0,0 +1,201 @@
+# factibilidad.py
+# ===================================================================================
+# --- PRE-FLIGHT BARATO PARA LOS ANÁLISIS ANÓNIMOS ---
+# ===================================================================================
+# Antes se ejecutaba el reporte completo solo para saber si el resultado iba a
+# salir vacío. Aquí revisamos, con operaciones vectorizadas y sin merges pesados,
+# las condiciones que realmente vacían cada reporte: columnas, fechas válidas,
+# cobertura de la ventana por defecto, cruce de SKUs y stock > 0.
+# Si un reporte no tiene reglas definidas, se recurre a un "dry run" sobre una
+# muestra de SKUs y, solo si la muestra sale vacía, al dry run completo.
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+FECHA_COL = 'Fecha de venta'
+STOCK_COL = 'Cantidad en stock actual'
+
+# Reglas por reporte (clave = 'key' de REPORTS_CONFIG).
+# 'ventana' describe cómo el reporte recorta las ventas con sus parámetros por defecto:
+#   - 'meses_desde_hoy': desde hoy hacia atrás (p. ej. ABC con periodo_abc)
+#   - 'dias_desde_ultima_venta': desde la última fecha del archivo hacia atrás
+REGLAS_FACTIBILIDAD = {
+    "ReporteABC": {
+        "columnas_ventas": [SKU_COL, 'Nombre del producto', FECHA_COL, 'Cantidad vendida', 'Precio de venta unitario (S/.)'],
+        "columnas_inventario": [SKU_COL, 'Precio de compra actual (S/.)', 'Categoría', 'Subcategoría', 'Marca', STOCK_COL],
+        "ventana": {"tipo": "meses_desde_hoy", "parametro": "periodo_abc", "defecto": 6},
+        # El resultado tiene una fila por SKU vendido dentro de la ventana
+        "filas": "skus_vendidos_en_ventana",
+    },
+    "ReporteDiagnosticoStockMuerto": {
+        "columnas_ventas": [SKU_COL, FECHA_COL, 'Cantidad vendida'],
+        "columnas_inventario": [SKU_COL, 'Nombre del producto', STOCK_COL, 'Precio de compra actual (S/.)', 'Categoría', 'Marca'],
+        "ventana": None,
+        # El diagnóstico devuelve una fila por producto del inventario
+        "filas": "skus_inventario",
+    },
+    "ReporteAnalisisEstrategicoRotacion": {
+        "columnas_ventas": [SKU_COL, FECHA_COL, 'Cantidad vendida', 'Precio de venta unitario (S/.)'],
+        "columnas_inventario": [SKU_COL, 'Nombre del producto', STOCK_COL, 'Precio de compra actual (S/.)', 'Categoría', 'Subcategoría', 'Marca'],
+        "ventana": {"tipo": "dias_desde_ultima_venta", "parametro": "dias_analisis_ventas_general", "defecto": 180},
+        # Necesita al menos una fecha válida; luego devuelve todo el inventario
+        "filas": "skus_inventario_si_hay_fechas",
+    },
+}
+
+# Por debajo de este cruce de SKUs el reporte no sale vacío, pero casi no aporta
+UMBRAL_ADVERTENCIA_CRUCE = 0.10
+MAX_SKUS_DRY_RUN_MUESTREADO = 300
+
+
+def _skus_normalizados(df: pd.DataFrame) -> pd.Index:
+    if SKU_COL not in df.columns:
+        return pd.Index([])
+    return pd.Index(df[SKU_COL].dropna().astype(str).str.strip().unique())
+
+
+def evaluar_factibilidad(
+    report_key: str,
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Predice si un reporte saldrá vacío sin ejecutarlo. No modifica los DataFrames.
+
+    Devuelve un diccionario con:
+      - 'concluyente': False si el reporte no tiene reglas (hay que hacer dry run)
+      - 'factible': True/False/None
+      - 'motivo', 'columnas_faltantes', 'advertencias' y 'diagnostico' (métricas usadas)
+    """
+    params = params or {}
+    regla = REGLAS_FACTIBILIDAD.get(report_key)
+    resultado = {
+        "concluyente": regla is not None,
+        "factible": None,
+        "motivo": None,
+        "columnas_faltantes": {"ventas": [], "inventario": []},
+        "advertencias": [],
+        "diagnostico": {},
+    }
+    if regla is None:
+        return resultado
+
+    # --- 1. Columnas requeridas ---
+    columnas_ventas = [str(c).strip() for c in df_ventas.columns]
+    columnas_inventario = [str(c).strip() for c in df_inventario.columns]
+    faltantes_ventas = [c for c in regla["columnas_ventas"] if c not in columnas_ventas]
+    faltantes_inventario = [c for c in regla["columnas_inventario"] if c not in columnas_inventario]
+    resultado["columnas_faltantes"] = {"ventas": faltantes_ventas, "inventario": faltantes_inventario}
+    if faltantes_ventas or faltantes_inventario:
+        resultado["factible"] = False
+        resultado["motivo"] = "COLUMNAS_FALTANTES"
+        return resultado
+
+    # Trabajamos sobre vistas con columnas limpias, sin tocar los originales
+    ventas = df_ventas.rename(columns=lambda c: str(c).strip())
+    inventario = df_inventario.rename(columns=lambda c: str(c).strip())
+
+    # --- 2. Cruce de SKUs ---
+    skus_ventas = _skus_normalizados(ventas)
+    skus_inventario = _skus_normalizados(inventario)
+    skus_comunes = skus_ventas.intersection(skus_inventario)
+    porcentaje_cruce = (len(skus_comunes) / len(skus_inventario)) if len(skus_inventario) else 0.0
+
+    # --- 3. Fechas y cobertura de la ventana por defecto ---
+    fechas = pd.to_datetime(ventas[FECHA_COL], format='%d/%m/%Y', errors='coerce')
+    fechas_validas = fechas.notna()
+    fecha_min = fechas[fechas_validas].min() if fechas_validas.any() else None
+    fecha_max = fechas[fechas_validas].max() if fechas_validas.any() else None
+
+    en_ventana = fechas_validas
+    ventana = regla["ventana"]
+    if ventana and fecha_max is not None:
+        valor = params.get(ventana["parametro"], ventana["defecto"])
+        if ventana["tipo"] == "meses_desde_hoy" and valor and valor > 0:
+            # Mismo reloj que process_csv_abc: hoy en UTC, comparado sin zona horaria
+            corte = (pd.Timestamp.now(tz='UTC').normalize() - pd.DateOffset(months=int(valor))).tz_convert(None)
+            en_ventana = fechas_validas & (fechas >= corte)
+        elif ventana["tipo"] == "dias_desde_ultima_venta" and valor and valor > 0:
+            corte = fecha_max - pd.Timedelta(days=int(valor))
+            en_ventana = fechas_validas & (fechas >= corte)
+
+    skus_en_ventana = ventas.loc[en_ventana, SKU_COL].dropna().astype(str).str.strip().nunique()
+
+    # --- 4. Stock disponible ---
+    stock = pd.to_numeric(inventario[STOCK_COL], errors='coerce').fillna(0)
+    skus_con_stock = int((stock > 0).sum())
+
+    diagnostico = {
+        "lineas_ventas": int(len(ventas)),
+        "lineas_con_fecha_valida": int(fechas_validas.sum()),
+        "fecha_primera_venta": fecha_min.strftime('%Y-%m-%d') if fecha_min is not None else None,
+        "fecha_ultima_venta": fecha_max.strftime('%Y-%m-%d') if fecha_max is not None else None,
+        "lineas_en_ventana": int(en_ventana.sum()),
+        "skus_ventas": int(len(skus_ventas)),
+        "skus_inventario": int(len(skus_inventario)),
+        "skus_en_comun": int(len(skus_comunes)),
+        "porcentaje_cruce_skus": round(porcentaje_cruce * 100, 1),
+        "skus_con_stock": skus_con_stock,
+    }
+
+    # --- 5. Predicción de filas del resultado ---
+    tipo_filas = regla["filas"]
+    if tipo_filas == "skus_vendidos_en_ventana":
+        filas_estimadas = int(skus_en_ventana)
+    elif tipo_filas == "skus_inventario":
+        filas_estimadas = int(len(inventario))
+    else: # 'skus_inventario_si_hay_fechas'
+        filas_estimadas = int(len(inventario)) if fechas_validas.any() else 0
+    diagnostico["filas_estimadas"] = filas_estimadas
+    resultado["diagnostico"] = diagnostico
+
+    if not fechas_validas.any() and tipo_filas != "skus_inventario":
+        resultado["factible"] = False
+        resultado["motivo"] = "SIN_FECHAS_VALIDAS"
+    elif filas_estimadas == 0:
+        resultado["factible"] = False
+        resultado["motivo"] = "SIN_VENTAS_EN_VENTANA" if ventana else "INVENTARIO_VACIO"
+    else:
+        resultado["factible"] = True
+
+    # --- 6. Advertencias (no vacían el reporte, pero degradan su valor) ---
+    if len(skus_inventario) and porcentaje_cruce < UMBRAL_ADVERTENCIA_CRUCE:
+        resultado["advertencias"].append("BAJO_CRUCE_DE_SKUS")
+    if skus_con_stock == 0:
+        resultado["advertencias"].append("INVENTARIO_SIN_STOCK")
+
+    return resultado
+
+
+def dry_run_muestreado(
+    processing_function: Callable[..., Dict[str, Any]],
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    params: Optional[Dict[str, Any]] = None,
+    max_skus: int = MAX_SKUS_DRY_RUN_MUESTREADO,
+    semilla: int = 7
+) -> Optional[bool]:
+    """
+    Ejecuta el reporte sobre una muestra de SKUs (con todas sus líneas de venta).
+    Devuelve True si la muestra produce resultados, o None si no es concluyente
+    (una muestra vacía no prueba que el total esté vacío).
+    """
+    params = params or {}
+    skus_inventario = _skus_normalizados(df_inventario)
+    if len(skus_inventario) <= max_skus:
+        return None # La muestra sería el total: mejor el dry run completo
+
+    rng = np.random.default_rng(semilla)
+    muestra = set(rng.choice(skus_inventario.to_numpy(), size=max_skus, replace=False))
+
+    ventas_muestra = df_ventas[df_ventas[SKU_COL].astype(str).str.strip().isin(muestra)].copy()
+    inventario_muestra = df_inventario[df_inventario[SKU_COL].astype(str).str.strip().isin(muestra)].copy()
+
+    resultado = processing_function(df_ventas=ventas_muestra, df_inventario=inventario_muestra, **params)
+    datos = resultado.get("data") if isinstance(resultado, dict) else resultado
+    if datos is not None and not datos.empty:
+        return True
+    return None
@@ -1,8 +1,10 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from dotenv import load_dotenv
 import sys # Importar sys
+import time
+import threading
+from dotenv import load_dotenv
+
+from carga_diferida import ModuloDiferido
 
 # Carga las variables desde el archivo .env al entorno de la aplicación.
 # Es importante llamar a esta función antes de intentar acceder a las variables.
@@ -18,16 +20,113 @@ URL_BUCKET_STORAGE = os.getenv("FIREBASE_STORAGE_BUCKET_URL")
 if not PATH_CREDENCIALES or not URL_BUCKET_STORAGE:
     raise ValueError("Error: Las variables de entorno FIREBASE_CREDS_PATH y FIREBASE_STORAGE_BUCKET_URL deben estar definidas en el archivo .env")
 
-try:
-    cred = credentials.Certificate(PATH_CREDENCIALES)
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': URL_BUCKET_STORAGE
-    })
-    print("✅ Conexión con Firebase inicializada exitosamente.")
-except Exception as e:
-    print(f"🔥 Error al inicializar Firebase: {e}")
-    print("Asegúrate de que la ruta en FIREBASE_CREDS_PATH sea correcta y el archivo exista.")
-    sys.exit(1) # Detiene la aplicación si la inicialización falla
-
-db = firestore.client()
-bucket = storage.bucket()
\ No newline at end of file
+# --- Modo de arranque ---
+# 'eager':      inicializa Firebase al importar el módulo (comportamiento original).
+# 'lazy':       difiere la inicialización hasta el primer uso de `db` o `bucket`.
+# 'background': como 'lazy', pero main.py lanza un calentamiento en segundo plano
+#               al arrancar, para que el puerto se abra sin esperar a Firebase.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").strip().lower()
+if STARTUP_MODE not in ("eager", "lazy", "background"):
+    STARTUP_MODE = "background"
+
+_lock_inicializacion = threading.Lock()
+_estado = {
+    "db": None,
+    "bucket": None,
+    "duracion_ms": None,
+    "error": None,
+}
+
+
+def inicializar_firebase():
+    """
+    Inicializa firebase_admin y crea los clientes de Firestore y Storage.
+    Es idempotente y segura entre hilos: solo la primera llamada paga el costo
+    de importar los SDKs de Google y de cargar las credenciales.
+    Devuelve la tupla (db, bucket).
+    """
+    if _estado["db"] is not None:
+        return _estado["db"], _estado["bucket"]
+
+    with _lock_inicializacion:
+        if _estado["db"] is not None:
+            return _estado["db"], _estado["bucket"]
+
+        inicio = time.perf_counter()
+        try:
+            # Importaciones pesadas diferidas (grpc, google-cloud-storage, etc.)
+            import firebase_admin
+            from firebase_admin import credentials, firestore, storage
+
+            try:
+                firebase_admin.get_app()
+            except ValueError:
+                cred = credentials.Certificate(PATH_CREDENCIALES)
+                firebase_admin.initialize_app(cred, {
+                    'storageBucket': URL_BUCKET_STORAGE
+                })
+
+            cliente_db = firestore.client()
+            cliente_bucket = storage.bucket()
+        except Exception as e:
+            _estado["error"] = str(e)
+            print(f"🔥 Error al inicializar Firebase: {e}")
+            print("Asegúrate de que la ruta en FIREBASE_CREDS_PATH sea correcta y el archivo exista.")
+            if STARTUP_MODE == "eager":
+                sys.exit(1) # Detiene la aplicación si la inicialización falla
+            raise
+
+        _estado["bucket"] = cliente_bucket
+        _estado["db"] = cliente_db
+        _estado["error"] = None
+        _estado["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        print(f"✅ Conexión con Firebase inicializada exitosamente ({_estado['duracion_ms']} ms).")
+        return cliente_db, cliente_bucket
+
+
+def firebase_inicializado() -> bool:
+    """Indica si los clientes de Firebase ya fueron creados."""
+    return _estado["db"] is not None
+
+
+def estado_firebase() -> dict:
+    """Resumen del estado de inicialización, usado por el endpoint de readiness."""
+    return {
+        "inicializado": firebase_inicializado(),
+        "modo_arranque": STARTUP_MODE,
+        "duracion_ms": _estado["duracion_ms"],
+        "error": _estado["error"],
+    }
+
+
+class _ClienteDiferido:
+    """
+    Proxy que se comporta como el cliente real de Firestore o Storage, pero que
+    lo crea recién la primera vez que se accede a uno de sus atributos.
+    Así `from firebase_config import db, bucket` sigue funcionando sin cambios.
+    """
+    def __init__(self, indice: int, nombre: str):
+        self._indice = indice
+        self._nombre = nombre
+
+    def __getattr__(self, atributo):
+        cliente = inicializar_firebase()[self._indice]
+        return getattr(cliente, atributo)
+
+    def __repr__(self):
+        estado = "inicializado" if firebase_inicializado() else "pendiente"
+        return f"<cliente Firebase diferido '{self._nombre}' ({estado})>"
+
+
+def FieldFilter(*args, **kwargs):
+    """Atajo diferido a `google.cloud.firestore_v1.base_query.FieldFilter`."""
+    from google.cloud.firestore_v1.base_query import FieldFilter as _FieldFilter
+    return _FieldFilter(*args, **kwargs)
+
+
+firestore = ModuloDiferido("firebase_admin.firestore")
+db = _ClienteDiferido(0, "db")
+bucket = _ClienteDiferido(1, "bucket")
+
+if STARTUP_MODE == "eager":
+    inicializar_firebase()
@@ -1,12 +1,15 @@
 # firebase_helpers.py
-import pandas as pd
-from firebase_admin import firestore
 
 from fastapi import UploadFile
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, Literal
-from firebase_config import db, bucket
+from firebase_config import db, bucket, firestore, FieldFilter
 import os
+from compresion import comprimir_contenido, abrir_flujo_descomprimido
+from carga_diferida import ModuloDiferido
+
+# pandas solo se necesita al extraer metadatos de un archivo subido (ver carga_diferida.py)
+pd = ModuloDiferido("pandas")
 
 def upload_to_storage(
     user_id: Optional[str],
@@ -45,17 +48,27 @@ def upload_to_storage(
 
         blob = bucket.blob(blob_path)
 
-        # Sube el contenido directamente
-        blob.upload_from_string(file_contents, content_type=content_type)
+        # Comprimimos antes de subir (zstd o gzip). El códec queda registrado como
+        # Content-Encoding del blob; el content_type sigue siendo el del CSV original.
+        contenido_a_subir, codec = comprimir_contenido(file_contents)
+        if codec:
+            blob.content_encoding = codec
+            blob.metadata = {"tamanoOriginalBytes": str(len(file_contents))}
+
+        blob.upload_from_string(contenido_a_subir, content_type=content_type)
 
-        print(f"Archivo estandarizado '{standard_filename}' subido a '{blob_path}'")
+        if codec:
+            print(f"Archivo estandarizado '{standard_filename}' subido a '{blob_path}' "
+                  f"({codec}: {len(file_contents)} -> {len(contenido_a_subir)} bytes)")
+        else:
+            print(f"Archivo estandarizado '{standard_filename}' subido a '{blob_path}'")
         return blob_path
     except Exception as e:
         print(f"Error al subir archivo a Storage: {e}")
         raise e
 
 # --- NUEVA FUNCIÓN para extraer metadatos de forma robusta ---
-def extraer_metadatos_df(df: pd.DataFrame, tipo_archivo: str) -> Dict[str, Any]:
+def extraer_metadatos_df(df: "pd.DataFrame", tipo_archivo: str) -> Dict[str, Any]:
     """
     Extrae un diccionario de metadatos de un DataFrame, limpiando los nombres de
     las columnas y generando tanto las listas completas como las vistas previas.
@@ -130,10 +143,19 @@ def log_file_upload_in_firestore(
     ruta_storage: str,
     metadata: dict,
     timestamp_obj: datetime,
+    hash_contenido: Optional[str] = None,
+    tamano_bytes: Optional[int] = None,
+    tiempo_procesamiento_ms: Optional[float] = None,
+    archivo_origen_id: Optional[str] = None,
+    campos_extra: Optional[Dict[str, Any]] = None,
 ) -> None:
     """
     Crea un documento para un archivo subido, construyendo la ruta correcta
     dependiendo si es un usuario registrado o una sesión anónima.
+    Si el archivo es un duplicado exacto de otro ya cargado, `archivo_origen_id`
+    apunta al registro original cuyo blob y metadatos se reutilizan.
+    `campos_extra` agrega campos propios de cada tipo de carga (p. ej. los
+    segmentos de un historial de ventas incremental).
     """
     base_ref = None
     log_context_id = ""
@@ -161,6 +183,16 @@ def log_file_upload_in_firestore(
             "rutaStorage": ruta_storage,
             "metadata": metadata
         }
+        if hash_contenido:
+            file_data["hashContenido"] = hash_contenido
+        if tamano_bytes is not None:
+            file_data["tamanoBytes"] = tamano_bytes
+        if tiempo_procesamiento_ms is not None:
+            file_data["tiempoProcesamientoMs"] = tiempo_procesamiento_ms
+        if archivo_origen_id:
+            file_data["archivoOrigenId"] = archivo_origen_id
+        if campos_extra:
+            file_data.update(campos_extra)
         
         files_ref.document(file_id).set(file_data)
         
@@ -171,6 +203,227 @@ def log_file_upload_in_firestore(
         raise e
 
 
+def _referencia_contexto(user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str]):
+    """Devuelve el documento base (workspace o sesión anónima) del contexto, o None."""
+    if user_id and workspace_id:
+        return db.collection('usuarios').document(user_id).collection('espacios_trabajo').document(workspace_id)
+    if session_id:
+        return db.collection('sesiones_anonimas').document(session_id)
+    return None
+
+
+def buscar_archivo_por_hash(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    tipo_archivo: str,
+    hash_contenido: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca en 'archivos_cargados' del mismo contexto un archivo con idéntico
+    contenido (mismo hash SHA-256 y mismo tipo). Devuelve el registro con su
+    'file_id', o None si es la primera vez que se sube ese contenido.
+    """
+    base_ref = _referencia_contexto(user_id, workspace_id, session_id)
+    if base_ref is None:
+        return None
+
+    query = (
+        base_ref.collection('archivos_cargados')
+        .where(filter=FieldFilter("hashContenido", "==", hash_contenido))
+        .where(filter=FieldFilter("tipoArchivo", "==", tipo_archivo))
+        .limit(1)
+    )
+    for doc in query.stream():
+        registro = doc.to_dict()
+        # Solo reutilizamos registros que tengan un blob y metadatos válidos
+        if registro.get("rutaStorage") and registro.get("metadata"):
+            registro["file_id"] = doc.id
+            return registro
+    return None
+
+
+def registrar_ahorro_deduplicacion(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    bytes_ahorrados: int,
+    ms_procesamiento_ahorrados: float
+) -> None:
+    """Acumula en el documento de contexto lo ahorrado gracias a la deduplicación."""
+    base_ref = _referencia_contexto(user_id, workspace_id, session_id)
+    if base_ref is None:
+        return
+    try:
+        base_ref.set({
+            "estadisticas_deduplicacion": {
+                "cargas_reutilizadas": firestore.Increment(1),
+                "bytes_ahorrados": firestore.Increment(int(bytes_ahorrados)),
+                "ms_procesamiento_ahorrados": firestore.Increment(float(ms_procesamiento_ahorrados or 0))
+            }
+        }, merge=True)
+    except Exception as e:
+        # Las estadísticas son informativas: un fallo aquí no debe romper la carga
+        print(f"⚠️ No se pudieron registrar las estadísticas de deduplicación: {e}")
+
+
+def guardar_detalle_auditoria(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    contenido_json: bytes,
+    timestamp_str: str,
+    sufijo: str = "detalle"
+) -> Dict[str, Any]:
+    """
+    Sube a Storage (comprimido) el detalle pesado de un informe de auditoría
+    (o, con otro `sufijo`, un anexo como la foto por SKU).
+    Devuelve la referencia que se guarda dentro del documento compacto.
+    """
+    if user_id and workspace_id:
+        blob_path = f"auditorias/{user_id}/{workspace_id}/{timestamp_str}_{sufijo}.json"
+    elif session_id:
+        blob_path = f"auditorias/{session_id}/{timestamp_str}_{sufijo}.json"
+    else:
+        raise ValueError("Se debe proporcionar un contexto (usuario/workspace o sesión).")
+
+    contenido_a_subir, codec = comprimir_contenido(contenido_json)
+    blob = bucket.blob(blob_path)
+    if codec:
+        blob.content_encoding = codec
+    blob.upload_from_string(contenido_a_subir, content_type="application/json")
+    print(f"Detalle de auditoría subido a '{blob_path}' ({len(contenido_json)} -> {len(contenido_a_subir)} bytes)")
+    return {
+        "rutaStorage": blob_path,
+        "codec": codec,
+        "tamanoBytes": len(contenido_a_subir),
+        "tamanoOriginalBytes": len(contenido_json)
+    }
+
+
+def descargar_detalle_auditoria(ruta_storage: str) -> bytes:
+    """Descarga y descomprime el detalle de un informe de auditoría."""
+    contenido = bucket.blob(ruta_storage).download_as_bytes(raw_download=True)
+    with abrir_flujo_descomprimido(contenido) as flujo:
+        return flujo.read()
+
+
+def obtener_registro_archivo(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    file_id: str
+) -> Optional[Dict[str, Any]]:
+    """Lee el registro de 'archivos_cargados' de un archivo, o None si no existe."""
+    base_ref = _referencia_contexto(user_id, workspace_id, session_id)
+    if base_ref is None:
+        raise ValueError("Se debe proporcionar un contexto (usuario/workspace o sesión).")
+    doc = base_ref.collection('archivos_cargados').document(file_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def descargar_blob_de_storage(ruta_storage: str) -> bytes:
+    """Bytes de un blob tal como están guardados (posiblemente comprimidos)."""
+    return bucket.blob(ruta_storage).download_as_bytes(raw_download=True)
+
+
+def guardar_indice_ventas(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    contenido: bytes,
+    timestamp_str: str
+) -> str:
+    """
+    Sube (comprimido) el índice de claves de un historial de ventas incremental,
+    el que permite deduplicar el siguiente delta sin releer el historial.
+    """
+    if user_id and workspace_id:
+        blob_path = f"indices/{user_id}/{workspace_id}/{timestamp_str}_ventas.npz"
+    elif session_id:
+        blob_path = f"indices/{session_id}/{timestamp_str}_ventas.npz"
+    else:
+        raise ValueError("Se debe proporcionar un contexto (usuario/workspace o sesión).")
+
+    contenido_a_subir, codec = comprimir_contenido(contenido)
+    blob = bucket.blob(blob_path)
+    if codec:
+        blob.content_encoding = codec
+    blob.upload_from_string(contenido_a_subir, content_type="application/octet-stream")
+    print(f"Índice de ventas subido a '{blob_path}' ({len(contenido)} -> {len(contenido_a_subir)} bytes)")
+    return blob_path
+
+
+def guardar_foto_inventario(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    contenido: bytes,
+    timestamp_str: str
+) -> str:
+    """
+    Sube (comprimida) la foto por SKU de una carga de inventario (ver
+    historial_inventario.py), la que permite compararla con cargas posteriores.
+    """
+    if user_id and workspace_id:
+        blob_path = f"inventarios/{user_id}/{workspace_id}/{timestamp_str}_foto.json"
+    elif session_id:
+        blob_path = f"inventarios/{session_id}/{timestamp_str}_foto.json"
+    else:
+        raise ValueError("Se debe proporcionar un contexto (usuario/workspace o sesión).")
+
+    contenido_a_subir, codec = comprimir_contenido(contenido)
+    blob = bucket.blob(blob_path)
+    if codec:
+        blob.content_encoding = codec
+    blob.upload_from_string(contenido_a_subir, content_type="application/json")
+    print(f"Foto de inventario subida a '{blob_path}' ({len(contenido)} -> {len(contenido_a_subir)} bytes)")
+    return blob_path
+
+
+def listar_historial_inventario(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    antes_de: Optional[datetime] = None,
+    limite: int = 20
+) -> list:
+    """
+    Registros de las cargas de inventario del contexto que tienen foto, de la más
+    reciente a la más antigua (con su 'file_id'). Con `antes_de`, solo las
+    anteriores a esa fecha de carga.
+    """
+    base_ref = _referencia_contexto(user_id, workspace_id, session_id)
+    if base_ref is None:
+        raise ValueError("Se debe proporcionar un contexto (usuario/workspace o sesión).")
+
+    query = base_ref.collection('archivos_cargados').where(filter=FieldFilter("tipoArchivo", "==", "inventario"))
+    if antes_de is not None:
+        query = query.where(filter=FieldFilter("fechaCarga", "<", antes_de))
+    query = query.order_by("fechaCarga", direction=firestore.Query.DESCENDING)
+
+    registros = []
+    # Las cargas anteriores a este historial no tienen foto: se saltan
+    for doc in query.limit(limite * 2).stream():
+        registro = doc.to_dict()
+        if registro.get("fotoInventario"):
+            registro["file_id"] = doc.id
+            registros.append(registro)
+            if len(registros) >= limite:
+                break
+    return registros
+
+
+def eliminar_blob_silencioso(ruta_storage: Optional[str]) -> None:
+    """Borra un blob que ya no se usa. Un fallo aquí solo deja basura, no rompe nada."""
+    if not ruta_storage:
+        return
+    try:
+        bucket.blob(ruta_storage).delete()
+    except Exception as e:
+        print(f"⚠️ No se pudo eliminar el blob '{ruta_storage}': {e}")
+
+
 # --- FUNCIÓN DE LOGGING MODIFICADA para aceptar los metadatos ---
 def log_analysis_in_firestore(
     session_id: str,
@@ -224,6 +477,9 @@ async def descargar_contenido_de_storage(
     """
     Descarga un archivo desde Storage de forma asíncrona, construyendo la ruta
     correcta dependiendo si es un usuario registrado o una sesión anónima.
+    Devuelve los bytes tal como están guardados (posiblemente comprimidos);
+    para leerlos usa `abrir_flujo_descomprimido`, que también acepta los
+    archivos antiguos sin comprimir.
     """
     # La lógica para construir la ruta no cambia
     if user_id and workspace_id:
@@ -243,6 +499,9 @@ async def descargar_contenido_de_storage(
             raise ValueError(f"No se encontró el registro del archivo con ID '{file_id}' en Firestore.")
         
         file_data = file_ref.to_dict()
+        if file_data.get("segmentos"):
+            # Un historial de ventas incremental son varios blobs: se arma con precalculo.cargar_dataframe
+            raise ValueError(f"El archivo '{file_id}' es un historial incremental; cárguelo con cargar_dataframe.")
         ruta_storage = file_data.get("rutaStorage")
         
         if not ruta_storage:
@@ -254,7 +513,9 @@ async def descargar_contenido_de_storage(
         
         # La operación de descarga en sí misma es bloqueante, pero al envolverla
         # en una función async, permitimos que `asyncio.gather` la maneje.
-        file_contents = blob.download_as_bytes()
+        # raw_download=True evita la descompresión del lado del servidor (transcoding):
+        # transferimos los bytes comprimidos y descomprimimos como flujo al parsear.
+        file_contents = blob.download_as_bytes(raw_download=True)
         
         return file_contents
 
@@ -0,0 +1,160 @@
+# historial_inventario.py
+# ===================================================================================
+# --- HISTORIAL DE FOTOS DEL INVENTARIO Y DIFERENCIA RÁPIDA ENTRE DOS CARGAS ---
+# ===================================================================================
+# Cada carga de inventario se trataba por separado: el movimiento del stock y de
+# los costos entre una carga y la siguiente se perdía. Al subir un inventario
+# guardamos una foto compacta por SKU (stock, costo de compra y precio de lista)
+# y su ruta queda en el registro del archivo: la cadena de registros del
+# workspace es el historial. Dos fotos se comparan con un hash-join sobre el
+# código de SKU, en tiempo lineal y sin volver a leer ningún CSV.
+#
+# La diferencia alimenta las alertas de cambio de costo de la Auditoría de
+# Márgenes (auditar_margenes_de_productos_nuevo).
+import json
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+
+# Columna del inventario -> nombre corto en la foto
+COLUMNAS_FOTO = {
+    'Cantidad en stock actual': 'stock',
+    'Precio de compra actual (S/.)': 'costo',
+    'Precio de venta actual (S/.)': 'precio',
+}
+
+VERSION_FOTO = 1
+# Variación mínima del costo (%) para que se considere una alerta
+UMBRAL_CAMBIO_COSTO_PCT = 5.0
+# Diferencias menores a medio céntimo (o a media milésima de unidad) son redondeo, no cambios
+TOLERANCIA = 0.005
+
+ALERTA_ALZA_SIN_AJUSTE = 'Costo subió sin ajuste de precio'
+ALERTA_ALZA_CON_AJUSTE = 'Costo subió (precio ajustado)'
+ALERTA_BAJA = 'Costo bajó'
+
+
+def construir_foto_inventario(df_inventario: pd.DataFrame) -> pd.DataFrame:
+    """
+    Foto por SKU de un inventario: stock, costo de compra y precio de lista. Los
+    valores no numéricos quedan como NaN; un SKU repetido se queda con su primera fila.
+    """
+    foto = pd.DataFrame({"sku": df_inventario[SKU_COL].astype(str).str.strip()})
+    for origen, destino in COLUMNAS_FOTO.items():
+        valores = df_inventario[origen] if origen in df_inventario.columns else pd.Series(np.nan, index=df_inventario.index)
+        foto[destino] = pd.to_numeric(valores, errors='coerce').astype('float64').values
+    return foto.drop_duplicates(subset="sku", keep="first").reset_index(drop=True)
+
+
+def resumen_foto(foto: pd.DataFrame) -> Dict[str, Any]:
+    """Totales de la foto que se guardan en el registro del archivo, para listar el historial sin descargarla."""
+    stock = foto["stock"].fillna(0).clip(lower=0)
+    return {
+        "skus": int(len(foto)),
+        "unidades": round(float(stock.sum()), 2),
+        "valor_stock": round(float((stock * foto["costo"].fillna(0)).sum()), 2),
+    }
+
+
+def serializar_foto_inventario(foto: pd.DataFrame) -> bytes:
+    """Formato columnar compacto (una lista por columna); los faltantes se guardan como null."""
+    columnas = {}
+    for destino in COLUMNAS_FOTO.values():
+        valores = np.round(foto[destino].to_numpy(dtype='float64'), 3 if destino == 'stock' else 2)
+        columnas[destino] = [None if np.isnan(v) else v for v in valores.tolist()]
+    contenido = {"version": VERSION_FOTO, "sku": foto["sku"].tolist(), "columnas": columnas}
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def deserializar_foto_inventario(contenido: bytes) -> pd.DataFrame:
+    datos = json.loads(contenido)
+    foto = pd.DataFrame({"sku": datos["sku"]})
+    for destino in COLUMNAS_FOTO.values():
+        # np.asarray convierte los null (None) en NaN
+        foto[destino] = np.asarray(datos["columnas"][destino], dtype='float64')
+    return foto
+
+
+def _variacion_pct(previo: pd.Series, actual: pd.Series) -> pd.Series:
+    return ((actual - previo) / previo.where(previo > 0) * 100).round(2)
+
+
+def comparar_fotos_inventario(actual: pd.DataFrame, previa: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Cruza dos fotos por SKU (hash-join de pandas, O(n + m)) y devuelve:
+    - "cambios": una fila por SKU nuevo, retirado o con cambios de stock, costo o
+      precio, con los valores previos, actuales y sus variaciones;
+    - "resumen": conteos de altas, bajas y cambios, y la variación del valor del stock.
+    """
+    cruce = pd.merge(previa, actual, on="sku", how="outer", suffixes=("_previo", "_actual"), indicator=True)
+    en_ambos = (cruce["_merge"] == "both").to_numpy()
+
+    stock_previo, stock_actual = cruce["stock_previo"].fillna(0), cruce["stock_actual"].fillna(0)
+    cambio_stock = (stock_actual - stock_previo).abs() > TOLERANCIA
+    # Un costo o precio que pasa de faltante a conocido (o al revés) no es una variación
+    cambio_costo = en_ambos & ((cruce["costo_actual"] - cruce["costo_previo"]).abs() > TOLERANCIA).to_numpy()
+    cambio_precio = en_ambos & ((cruce["precio_actual"] - cruce["precio_previo"]).abs() > TOLERANCIA).to_numpy()
+
+    estado = np.select(
+        [cruce["_merge"] == "right_only", cruce["_merge"] == "left_only", cambio_stock | cambio_costo | cambio_precio],
+        ['nuevo', 'retirado', 'modificado'], default='sin cambios'
+    )
+    cambios = pd.DataFrame({
+        "sku": cruce["sku"],
+        "estado": estado,
+        "stock_previo": cruce["stock_previo"],
+        "stock_actual": cruce["stock_actual"],
+        "delta_stock": (stock_actual - stock_previo).round(3),
+        "costo_previo": cruce["costo_previo"],
+        "costo_actual": cruce["costo_actual"],
+        "variacion_costo_pct": _variacion_pct(cruce["costo_previo"], cruce["costo_actual"]).where(cambio_costo),
+        "precio_previo": cruce["precio_previo"],
+        "precio_actual": cruce["precio_actual"],
+        "variacion_precio_pct": _variacion_pct(cruce["precio_previo"], cruce["precio_actual"]).where(cambio_precio),
+    })
+    cambios = cambios[estado != 'sin cambios'].reset_index(drop=True)
+
+    valor_previo = (previa["stock"].fillna(0).clip(lower=0) * previa["costo"].fillna(0)).sum()
+    valor_actual = (actual["stock"].fillna(0).clip(lower=0) * actual["costo"].fillna(0)).sum()
+    alza_costo = cambio_costo & (cruce["costo_actual"] > cruce["costo_previo"]).to_numpy()
+    resumen = {
+        "skus_previo": int(len(previa)),
+        "skus_actual": int(len(actual)),
+        "skus_nuevos": int((estado == 'nuevo').sum()),
+        "skus_retirados": int((estado == 'retirado').sum()),
+        "skus_con_cambio_stock": int((en_ambos & cambio_stock.to_numpy()).sum()),
+        "skus_con_cambio_costo": int(cambio_costo.sum()),
+        "skus_con_alza_costo": int(alza_costo.sum()),
+        "skus_con_cambio_precio": int(cambio_precio.sum()),
+        "unidades_delta": round(float(stock_actual.sum() - stock_previo.sum()), 2),
+        "valor_stock": {
+            "previo": round(float(valor_previo), 2),
+            "actual": round(float(valor_actual), 2),
+            "delta": round(float(valor_actual - valor_previo), 2),
+        },
+    }
+    return {"resumen": resumen, "cambios": cambios}
+
+
+def alertas_de_costo(cambios: pd.DataFrame, umbral_porcentaje: float = UMBRAL_CAMBIO_COSTO_PCT) -> pd.DataFrame:
+    """
+    Alertas por SKU (índice: sku) a partir de los cambios entre dos fotos: el costo
+    varió al menos `umbral_porcentaje`. Un alza es "sin ajuste de precio" si el
+    precio de lista no subió (o no se conoce).
+    """
+    variacion = cambios["variacion_costo_pct"]
+    con_alerta = cambios[variacion.abs() >= umbral_porcentaje]
+    precio_subio = (con_alerta["precio_actual"] - con_alerta["precio_previo"]) > TOLERANCIA
+    alerta = np.select(
+        [con_alerta["variacion_costo_pct"] < 0, precio_subio],
+        [ALERTA_BAJA, ALERTA_ALZA_CON_AJUSTE], default=ALERTA_ALZA_SIN_AJUSTE
+    )
+    return pd.DataFrame({
+        "costo_previo": con_alerta["costo_previo"].to_numpy(),
+        "variacion_costo_pct": con_alerta["variacion_costo_pct"].to_numpy(),
+        "precio_previo": con_alerta["precio_previo"].to_numpy(),
+        "alerta": alerta,
+    }, index=pd.Index(con_alerta["sku"].to_numpy(), name="sku"))
@@ -3,6 +3,9 @@ import uvicorn
 import json
 import asyncio
 import re
+import hashlib
+import inspect
+import copy
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -11,37 +14,63 @@ from fastapi import Depends, FastAPI, UploadFile, File, Form, status, Header, Re
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi import HTTPException
-import pandas as pd
 import traceback
 import io
 import math
 import uuid
 import httpx
-import numpy as np
+from time import perf_counter
 # --- Importaciones de nuestros nuevos módulos ---
-from firebase_admin import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
+# `firestore` y `FieldFilter` se importan de forma diferida para acelerar el arranque en frío
+from firebase_config import firestore, FieldFilter
 import firebase_config # Importar para asegurar que se inicialice
-from firebase_helpers import db, upload_to_storage, log_analysis_in_firestore, extraer_metadatos_df, log_file_upload_in_firestore, descargar_contenido_de_storage, log_report_generation
+from firebase_helpers import db, upload_to_storage, log_analysis_in_firestore, extraer_metadatos_df, log_file_upload_in_firestore, log_report_generation
+from firebase_helpers import buscar_archivo_por_hash, registrar_ahorro_deduplicacion
+from firebase_helpers import guardar_detalle_auditoria, descargar_detalle_auditoria, eliminar_blob_silencioso
+from firebase_helpers import obtener_registro_archivo, guardar_indice_ventas
+from firebase_helpers import guardar_foto_inventario, listar_historial_inventario
+from auditoria_compacta import separar_informe, hidratar_informe, detalle_de_tarea, serializar_detalle, FORMATO_COMPACTO, CAMPOS_ESTADO
+from cache_local import CacheTTL
+from afinidad_nodos import MiddlewareAfinidad, CLUSTER
+from planificador_reportes import PLANIFICADOR, PLAN_ANONIMO, estimar_memoria_mb
 from pydantic import BaseModel, Field, EmailStr
 from io import StringIO
-import openpyxl
 from typing import Optional, Dict, Any, List, Literal, Callable # Any para pd.ExcelWriter
 from datetime import datetime, timedelta, time, timezone # Para pd.Timestamp.now()
-from track_expenses import process_csv, summarise_expenses, clean_data, get_top_expenses_by_month
-from track_expenses import process_csv_abc, procesar_stock_muerto
-from track_expenses import process_csv_puntos_alerta_stock
-from track_expenses import process_csv_plan_compra_sugerido, process_csv_analisis_estrategico_rotacion
-from track_expenses import generar_reporte_maestro_inventario, auditar_margenes_de_productos_nuevo
-from track_expenses import auditar_margenes_de_productos, diagnosticar_catalogo, auditar_calidad_datos
-from track_expenses import generar_auditoria_inventario
-from report_config import REPORTS_CONFIG
 from plan_config import PLANS_CONFIG
 from strategy_config import DEFAULT_STRATEGY
-from tooltips_config import TOOLTIPS_GLOSSARY, KPI_TOOLTIPS_GLOSSARY
+import config_bundle
+from carga_diferida import ModuloDiferido, precargar
+
+# pandas, numpy y los motores de análisis (que traen scipy, pyarrow y duckdb) se
+# importan en el calentamiento o con su primer uso, no al arrancar el proceso
+pd = ModuloDiferido("pandas")
+np = ModuloDiferido("numpy")
+track_expenses = ModuloDiferido("track_expenses")
+configuracion_reportes = ModuloDiferido("report_config")
+precalculo = ModuloDiferido("precalculo")
+factibilidad = ModuloDiferido("factibilidad")
+evolucion_skus = ModuloDiferido("evolucion_skus")
+historial_inventario = ModuloDiferido("historial_inventario")
+cesta_compras = ModuloDiferido("cesta_compras")
+ventas_por_bloques = ModuloDiferido("ventas_por_bloques")
+ventas_incrementales = ModuloDiferido("ventas_incrementales")
+escenarios_plan_compra = ModuloDiferido("escenarios_plan_compra")
+cubo_inventario = ModuloDiferido("cubo_inventario")
+
+# Orden de precarga en el calentamiento: primero el motor principal, que arrastra a la mayoría
+MODULOS_PRECARGA = [
+    "pandas", "numpy", "track_expenses", "report_config", "precalculo", "factibilidad",
+    "evolucion_skus", "historial_inventario", "cesta_compras", "ventas_por_bloques",
+    "ventas_incrementales", "escenarios_plan_compra", "cubo_inventario", "xlsxwriter", "openpyxl",
+]
 
 INITIAL_CREDITS = 25
 
+# Archivos ya parseados por /anonymous-validate, a la espera de /anonymous-analysis.
+# Vida corta y tamaño acotado: si el token expira, el frontend reenvía los archivos.
+CACHE_VALIDACION_ANONIMA = CacheTTL(ttl_segundos=10 * 60, max_entradas=32, max_bytes=256 * 1024 * 1024)
+
 
 
 # Leemos la variable de entorno. Si no existe, asumimos que estamos en 'development'.
@@ -81,6 +110,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Afinidad de workspaces entre nodos (ver afinidad_nodos.py). Se agrega después de CORS
+# para quedar por fuera: el nodo dueño responde con sus propias cabeceras CORS.
+app.add_middleware(MiddlewareAfinidad)
 
 @app.get("/")
 async def root():
@@ -95,17 +127,100 @@ if __name__ == "__main__":
 async def health_check():
     return {"status": "ok"}
 
+
+# ===================================================================================
+# --- ARRANQUE EN FRÍO: CALENTAMIENTO EN SEGUNDO PLANO Y READINESS ---
+# ===================================================================================
+# /healthcheck solo confirma que el proceso responde (liveness).
+# /readiness indica que el calentamiento terminó. Si algo falla al calentar
+# (Firebase, un módulo), el servicio sigue listo: lo que falte se carga con su
+# primer uso, y el error queda reportado como "degradado" en vez de un 503 que
+# haría que la plataforma reinicie el nodo una y otra vez.
+ESTADO_ARRANQUE = {
+    "calentamiento_completo": firebase_config.STARTUP_MODE == "eager",
+    "calentamiento_ms": None,
+    "error": None,
+    "modulos_con_error": {},
+}
+
+def _calentar_servicios_sync():
+    """Crea los clientes de Firebase y precarga los motores, configuraciones y módulos de Excel."""
+    inicio = perf_counter()
+    try:
+        try:
+            firebase_config.inicializar_firebase()
+        except Exception as e:
+            # Los clientes de Firebase se vuelven a intentar con el primer request que los use
+            ESTADO_ARRANQUE["error"] = str(e)
+        # pandas importa xlsxwriter y openpyxl de forma perezosa al exportar a Excel
+        errores = precargar(MODULOS_PRECARGA)
+        ESTADO_ARRANQUE["modulos_con_error"] = {nombre: error for nombre, error in errores.items() if error}
+        config_bundle.precalcular_paquetes()
+    except Exception as e:
+        ESTADO_ARRANQUE["error"] = str(e)
+        print(f"🔥 Error durante el calentamiento en segundo plano: {e}")
+    finally:
+        ESTADO_ARRANQUE["calentamiento_ms"] = round((perf_counter() - inicio) * 1000, 1)
+        ESTADO_ARRANQUE["calentamiento_completo"] = True
+        print(f"✅ Calentamiento terminado en {ESTADO_ARRANQUE['calentamiento_ms']} ms.")
+
+@app.on_event("startup")
+async def iniciar_calentamiento():
+    # Si hay varios nodos, vigilamos su salud para no reenviar a uno caído
+    CLUSTER.iniciar_sondeo()
+    if firebase_config.STARTUP_MODE == "eager":
+        # Firebase ya se inicializó al importar; los motores se cargan antes de abrir el puerto
+        precargar(MODULOS_PRECARGA)
+        config_bundle.precalcular_paquetes()
+    elif firebase_config.STARTUP_MODE == "background":
+        # El puerto se abre de inmediato; Firebase y los motores se cargan en un hilo aparte
+        asyncio.create_task(asyncio.to_thread(_calentar_servicios_sync))
+
+@app.get("/readiness", summary="Indica si la API está lista para atender tráfico", tags=["Health"])
+async def readiness_check():
+    estado_fb = firebase_config.estado_firebase()
+    # En modo 'lazy' no hay calentamiento: todo se carga con el primer request que lo necesite
+    listo = firebase_config.STARTUP_MODE == "lazy" or ESTADO_ARRANQUE["calentamiento_completo"]
+    degradado = bool(estado_fb["error"] or ESTADO_ARRANQUE["error"] or ESTADO_ARRANQUE["modulos_con_error"])
+
+    contenido = {
+        "status": ("degraded" if degradado else "ready") if listo else "warming_up",
+        "firebase": estado_fb,
+        "calentamiento_ms": ESTADO_ARRANQUE["calentamiento_ms"],
+    }
+    if degradado:
+        contenido["errores"] = {
+            "calentamiento": ESTADO_ARRANQUE["error"],
+            "modulos": ESTADO_ARRANQUE["modulos_con_error"],
+        }
+    return JSONResponse(status_code=200 if listo else 503, content=contenido)
+
 @app.get("/reports-config", summary="Obtiene la configuración de los reportes disponibles", tags=["Configuración"])
-async def get_reports_configuration():
+async def get_reports_configuration(
+    request: Request,
+    seccion: str = Query("completo", description="completo | reports | tooltips | kpi_tooltips | catalogo")
+):
     """
     Devuelve la lista de reportes disponibles con sus propiedades (costo, si es Pro, etc.).
     El frontend usará esto para construir dinámicamente la interfaz.
+    El cuerpo está precalculado y versionado con ETag: si el cliente envía
+    If-None-Match con la versión actual, se responde 304 sin cuerpo.
     """
-    return JSONResponse(content={
-            "reports": REPORTS_CONFIG,
-            "tooltips": TOOLTIPS_GLOSSARY,
-            "kpi_tooltips": KPI_TOOLTIPS_GLOSSARY
-        })
+    paquete = config_bundle.obtener_paquete(seccion)
+    if paquete is None:
+        raise HTTPException(status_code=400, detail=f"Sección '{seccion}' no válida. Usa una de: {', '.join(config_bundle.SECCIONES_DISPONIBLES)}.")
+    return config_bundle.responder_paquete(request, paquete)
+
+@app.get("/reports-config/reportes/{report_key}", summary="Obtiene la configuración completa de un solo reporte", tags=["Configuración"])
+async def get_report_configuration(report_key: str, request: Request):
+    """
+    Permite cargar de forma diferida los parámetros de un reporte a partir del
+    catálogo liviano (`/reports-config?seccion=catalogo`).
+    """
+    paquete = config_bundle.obtener_paquete(f"reporte:{report_key}")
+    if paquete is None:
+        raise HTTPException(status_code=404, detail=f"El reporte '{report_key}' no existe.")
+    return config_bundle.responder_paquete(request, paquete)
 
 
 # ===================================================================================
@@ -279,6 +394,64 @@ def clean_for_json(obj: Any) -> Any:
     return obj
 
 
+# Los detalles se guardan con nombre único por auditoría, así que nunca quedan obsoletos
+CACHE_DETALLES_AUDITORIA = CacheTTL(ttl_segundos=15 * 60, max_entradas=128, max_bytes=128 * 1024 * 1024)
+
+
+def _leer_detalle_auditoria(informe_compacto: Dict[str, Any]) -> Dict[str, Any]:
+    """Descarga (o toma de la caché) el detalle pesado de un informe compacto."""
+    ruta = (informe_compacto.get("detalle") or {}).get("rutaStorage")
+    if not ruta:
+        return {}
+    detalle = CACHE_DETALLES_AUDITORIA.obtener(ruta)
+    if detalle is None:
+        contenido = descargar_detalle_auditoria(ruta)
+        detalle = json.loads(contenido)
+        CACHE_DETALLES_AUDITORIA.guardar(detalle, clave=ruta, tamano_bytes=len(contenido))
+    return detalle
+
+
+def _guardar_informe_latest(
+    audit_ref, informe_raw: Dict[str, Any], informe_previo: Optional[Dict[str, Any]],
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Guarda el informe en 'auditorias/latest' como documento compacto y su detalle
+    en Storage. Devuelve el informe completo ya limpio para JSON.
+    """
+    informe_limpio = clean_for_json(informe_raw)
+    compacto, detalle = separar_informe(informe_limpio)
+    timestamp_str = datetime.now(timezone.utc).strftime('%Y-%m-%d_%H%M%S_%f')
+    compacto["detalle"] = guardar_detalle_auditoria(user_id, workspace_id, session_id, serializar_detalle(detalle), timestamp_str)
+    CACHE_DETALLES_AUDITORIA.guardar(detalle, clave=compacto["detalle"]["rutaStorage"], tamano_bytes=compacto["detalle"]["tamanoOriginalBytes"])
+    audit_ref.set(compacto)
+    # El detalle de la auditoría anterior ya no es alcanzable
+    eliminar_blob_silencioso(((informe_previo or {}).get("detalle") or {}).get("rutaStorage"))
+    return informe_limpio
+
+
+def _ultimos_file_ids(base_ref) -> Dict[str, Optional[str]]:
+    """IDs de los últimos archivos de ventas e inventario subidos al contexto."""
+    files_ref = base_ref.collection('archivos_cargados')
+    last_venta_doc = next(files_ref.where("tipoArchivo", "==", "ventas").order_by("fechaCarga", direction="DESCENDING").limit(1).stream(), None)
+    last_inventario_doc = next(files_ref.where("tipoArchivo", "==", "inventario").order_by("fechaCarga", direction="DESCENDING").limit(1).stream(), None)
+    return {
+        "ventas_id": last_venta_doc.id if last_venta_doc else None,
+        "inventario_id": last_inventario_doc.id if last_inventario_doc else None
+    }
+
+
+def _base_ref_auditoria(current_user: Optional[dict], workspace_id: Optional[str], session_id: Optional[str]):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+    if user_id:
+        return db.collection('usuarios').document(user_id).collection('espacios_trabajo').document(workspace_id)
+    if session_id:
+        return db.collection('sesiones_anonimas').document(session_id)
+    raise HTTPException(status_code=401, detail="No se proporcionó contexto de autenticación.")
+
+
 def _parse_kpi_value(kpi_value: Any) -> float:
     """
     Extrae el valor numérico de un string de KPI, sin importar el formato.
@@ -408,14 +581,9 @@ async def ejecutar_auditoria_inicial(
         raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
     
     try:
-        # 2. Cargamos los DataFrames
-        ventas_contents = await descargar_contenido_de_storage(user_id, workspace_id, X_Session_ID, ventas_file_id)
-        inventario_contents = await descargar_contenido_de_storage(user_id, workspace_id, X_Session_ID, inventario_file_id)
-        df_ventas = pd.read_csv(io.BytesIO(ventas_contents))
-        df_inventario = pd.read_csv(io.BytesIO(inventario_contents))
-
-        # 3. Llamamos a la función de lógica que devuelve el resumen
-        auditoria_actual = generar_auditoria_inventario(df_ventas, df_inventario)
+        # 2 y 3. Cargamos los DataFrames y llamamos a la función de lógica que devuelve el resumen
+        auditoria_actual = await _ejecutar_auditoria_con_turno(current_user, workspace_id, X_Session_ID, ventas_file_id, inventario_file_id)
+        auditoria_actual.pop("snapshot_skus", None) # Este flujo no guarda la foto por SKU
         now_iso = datetime.now(timezone.utc).isoformat()
         auditoria_actual["fecha"] = now_iso
 
@@ -445,11 +613,34 @@ async def ejecutar_auditoria_inicial(
         # 5. Devolvemos el resultado ya limpio
         return JSONResponse(content=informe_evolucion_clean)
 
+    except HTTPException:
+        raise # Validaciones y rechazos del planificador
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Ocurrió un error crítico durante la auditoría: {e}")
 
 
+async def _ejecutar_auditoria_con_turno(
+    current_user: Optional[dict],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    ventas_file_id: str,
+    inventario_file_id: str
+) -> Dict[str, Any]:
+    """
+    Carga los archivos y ejecuta `generar_auditoria_inventario` dentro de un turno
+    del planificador (ver planificador_reportes.py), en un hilo aparte.
+    """
+    user_id = current_user['email'] if current_user else None
+    memoria_mb = await _estimar_memoria_reporte("auditoria", user_id, workspace_id, session_id, ventas_file_id, inventario_file_id)
+    async with PLANIFICADOR.turno(user_id or session_id, (current_user or {}).get("plan"), memoria_mb, "auditoria"):
+        df_ventas, df_inventario = await asyncio.gather(
+            precalculo.cargar_ventas(user_id, workspace_id, session_id, ventas_file_id),
+            precalculo.cargar_dataframe(user_id, workspace_id, session_id, inventario_file_id)
+        )
+        return await asyncio.to_thread(track_expenses.generar_auditoria_inventario, df_ventas, df_inventario)
+
+
 
 
 # --- ENDPOINT 1: El "Comparador de Versiones" (Rápido) ---
@@ -458,32 +649,20 @@ async def get_audit_status(
     # La firma de la función recibe el contexto del usuario
     current_user: Optional[dict] = Depends(get_current_user_optional),
     X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
-    workspace_id: Optional[str] = Query(None)
+    workspace_id: Optional[str] = Query(None),
+    incluir_detalle: bool = Query(True, description="Si es False, devuelve el informe compacto (sin vistas previas ni listas de SKUs).")
 ):
     """
     Compara los archivos actuales con los usados en la última auditoría guardada
-    y devuelve el estado y el INFORME COMPLETO si está actualizado.
+    y devuelve el estado y el informe. El detalle pesado de las tareas se lee de
+    Storage solo si `incluir_detalle` es True (ver `/auditoria/detalle`).
     """
     try:
         # 1. Identificar el contexto y la referencia base
-        user_id = current_user['email'] if current_user else None
-        if user_id and not workspace_id:
-            raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
-        
-        if user_id:
-            base_ref = db.collection('usuarios').document(user_id).collection('espacios_trabajo').document(workspace_id)
-        elif X_Session_ID:
-            base_ref = db.collection('sesiones_anonimas').document(X_Session_ID)
-        else:
-            raise HTTPException(status_code=401, detail="No se proporcionó contexto de autenticación.")
+        base_ref = _base_ref_auditoria(current_user, workspace_id, X_Session_ID)
 
         # 2. Buscar los IDs de los últimos archivos subidos
-        files_ref = base_ref.collection('archivos_cargados')
-        last_venta_doc = next(files_ref.where("tipoArchivo", "==", "ventas").order_by("fechaCarga", direction="DESCENDING").limit(1).stream(), None)
-        last_inventario_doc = next(files_ref.where("tipoArchivo", "==", "inventario").order_by("fechaCarga", direction="DESCENDING").limit(1).stream(), None)
-        
-        current_venta_id = last_venta_doc.id if last_venta_doc else None
-        current_inventario_id = last_inventario_doc.id if last_inventario_doc else None
+        current_ids = _ultimos_file_ids(base_ref)
 
         # 3. Buscar el único documento de auditoría guardado
         audit_ref = base_ref.collection('auditorias').document('latest')
@@ -492,24 +671,243 @@ async def get_audit_status(
         if not last_audit_doc.exists:
             return JSONResponse(content={"status": "no_audit_found", "data": None})
 
-        last_audit_data_raw = last_audit_doc.to_dict()
-        last_audit_data_clean = clean_for_json(last_audit_data_raw)
-        source_files = last_audit_data_clean.get("source_files", {})
+        last_audit_data = last_audit_doc.to_dict()
+        if last_audit_data.get("formato") == FORMATO_COMPACTO:
+            # Los documentos compactos se guardan ya limpios: no hace falta clean_for_json
+            if incluir_detalle:
+                last_audit_data = hidratar_informe(last_audit_data, _leer_detalle_auditoria(last_audit_data))
+            else:
+                last_audit_data.pop("detalle", None)
+        else:
+            # Documento antiguo con el informe completo
+            last_audit_data = clean_for_json(last_audit_data)
+        source_files = last_audit_data.get("source_files", {})
 
         # 4. La Comparación Inteligente
-        if source_files.get("ventas_id") == current_venta_id and source_files.get("inventario_id") == current_inventario_id:
-            # Cache Hit: Devolvemos el informe completo que ya estaba guardado
-            return JSONResponse(content={"status": "up_to_date", "data": last_audit_data_clean})
+        if source_files.get("ventas_id") == current_ids["ventas_id"] and source_files.get("inventario_id") == current_ids["inventario_id"]:
+            # Cache Hit: Devolvemos el informe que ya estaba guardado
+            return JSONResponse(content={"status": "up_to_date", "data": last_audit_data})
         else:
             # Cache Miss: Devolvemos el informe antiguo para que el usuario pueda verlo
-            return JSONResponse(content={"status": "outdated", "data": last_audit_data_clean})
+            return JSONResponse(content={"status": "outdated", "data": last_audit_data})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error al verificar estado de auditoría: {e}")
 
 
+@app.get("/auditoria/status/fuentes", summary="Chequeo rápido: ¿la última auditoría usa los archivos actuales?", tags=["Auditoría"])
+async def get_audit_sources_status(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Query(None)
+):
+    """
+    Solo compara los IDs de los archivos de origen. Lee del documento 'latest'
+    únicamente los campos de estado (máscara de campos), sin el cuerpo del informe.
+    """
+    try:
+        base_ref = _base_ref_auditoria(current_user, workspace_id, X_Session_ID)
+        current_ids = _ultimos_file_ids(base_ref)
+
+        audit_doc = base_ref.collection('auditorias').document('latest').get(field_paths=CAMPOS_ESTADO)
+        if not audit_doc.exists:
+            return JSONResponse(content={"status": "no_audit_found", "source_files": None, "current_files": current_ids})
+
+        estado = audit_doc.to_dict() or {}
+        source_files = estado.get("source_files", {})
+        al_dia = source_files.get("ventas_id") == current_ids["ventas_id"] and source_files.get("inventario_id") == current_ids["inventario_id"]
+        return JSONResponse(content=clean_for_json({
+            "status": "up_to_date" if al_dia else "outdated",
+            "fecha": estado.get("fecha_actual"),
+            "puntaje": estado.get("puntaje_actual", estado.get("puntaje_salud")),
+            "source_files": source_files,
+            "current_files": current_ids
+        }))
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error al verificar estado de auditoría: {e}")
 
 
+@app.get("/auditoria/detalle", summary="Devuelve la vista previa y los SKUs afectados de las tareas de la auditoría", tags=["Auditoría"])
+async def get_audit_detail(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Query(None),
+    task_id: Optional[str] = Query(None, description="ID de la tarea. Si se omite, se devuelve el detalle de todas.")
+):
+    """Carga bajo demanda del detalle pesado de la última auditoría (guardado en Storage)."""
+    base_ref = _base_ref_auditoria(current_user, workspace_id, X_Session_ID)
+    audit_doc = base_ref.collection('auditorias').document('latest').get()
+    if not audit_doc.exists:
+        raise HTTPException(status_code=404, detail="No hay una auditoría guardada.")
+
+    informe = audit_doc.to_dict()
+    if informe.get("formato") == FORMATO_COMPACTO:
+        try:
+            detalle = await asyncio.to_thread(_leer_detalle_auditoria, informe)
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"No se pudo leer el detalle de la auditoría: {e}")
+    else:
+        # Documento antiguo: el detalle está dentro del propio informe
+        _, detalle = separar_informe(clean_for_json(informe))
+
+    if task_id is None:
+        return JSONResponse(content=detalle)
+    detalle_tarea = detalle_de_tarea(detalle, task_id)
+    if detalle_tarea is None:
+        raise HTTPException(status_code=404, detail=f"La tarea '{task_id}' no existe en la última auditoría.")
+    return JSONResponse(content={"task_id": task_id, **detalle_tarea})
+
+
+
+@app.get("/dashboard/cubo", summary="Totales por Categoría → Subcategoría → Marca → SKU (drill-down)", tags=["Análisis"])
+async def get_cubo_inventario(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Query(None),
+    ventas_file_id: str = Query(...),
+    inventario_file_id: str = Query(...),
+    categoria: Optional[str] = Query(None),
+    subcategoria: Optional[str] = Query(None),
+    marca: Optional[str] = Query(None),
+    ordenar_por: str = Query("valor_stock", description="'valor_stock', 'valor_stock_muerto', 'ingresos', 'margen', 'unidades_vendidas', 'skus' o 'nombre'."),
+    pagina: int = Query(1, ge=1, description="Página de SKUs (solo con la ruta completa hasta la marca)."),
+    tam_pagina: Optional[int] = Query(None, ge=1, le=500, description="SKUs por página (50 por defecto, máximo 500).")
+):
+    """
+    Valor del stock, stock muerto, ventas, margen y mezcla ABC del nodo pedido y de
+    sus hijos. El cubo se arma una vez por par de archivos (normalmente ya en el
+    precálculo al subirlos); cada consulta de drill-down es solo una búsqueda.
+    """
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+    if not user_id and not X_Session_ID:
+        raise HTTPException(status_code=401, detail="No se proporcionó autenticación ni ID de sesión.")
+
+    try:
+        cubo = await precalculo.obtener_cubo(user_id, workspace_id, X_Session_ID, ventas_file_id, inventario_file_id)
+        return JSONResponse(content=cubo_inventario.consultar_cubo(
+            cubo, categoria, subcategoria, marca, ordenar_por, pagina, tam_pagina or cubo_inventario.TAM_PAGINA_SKUS
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No existe el nodo {e} en el cubo.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"No se pudo consultar el cubo de inventario: {e}")
+
+
+async def _inventario_anterior(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str], inventario_file_id: str
+) -> Optional[str]:
+    """ID de la carga de inventario con foto inmediatamente anterior a `inventario_file_id`, o None."""
+    registro = await asyncio.to_thread(obtener_registro_archivo, user_id, workspace_id, session_id, inventario_file_id)
+    if not registro or not registro.get("fechaCarga"):
+        return None
+    anteriores = await asyncio.to_thread(listar_historial_inventario, user_id, workspace_id, session_id, registro["fechaCarga"], 1)
+    return anteriores[0]["file_id"] if anteriores else None
+
+
+@app.get("/inventario/historial", summary="Cargas de inventario del workspace con sus totales", tags=["Archivos"])
+async def get_historial_inventario(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Query(None),
+    limite: int = Query(20, ge=1, le=100)
+):
+    """
+    Historial de fotos del inventario, de la carga más reciente a la más antigua.
+    Los totales se guardan en cada registro al subir el archivo: no se descarga ninguna foto.
+    """
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+    if not user_id and not X_Session_ID:
+        raise HTTPException(status_code=401, detail="No se proporcionó autenticación ni ID de sesión.")
+
+    try:
+        registros = await asyncio.to_thread(listar_historial_inventario, user_id, workspace_id, X_Session_ID, None, limite)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"No se pudo leer el historial de inventario: {e}")
+    cargas = [
+        {
+            "file_id": registro["file_id"],
+            "fecha_carga": registro["fechaCarga"].isoformat(),
+            "nombre_original": registro.get("nombreOriginal"),
+            **(registro.get("resumenFoto") or {})
+        }
+        for registro in registros
+    ]
+    return JSONResponse(content={"cargas": cargas})
+
+
+@app.get("/inventario/diferencias", summary="Altas, bajas y cambios de stock, costo y precio entre dos cargas de inventario", tags=["Análisis"])
+async def get_diferencias_inventario(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Query(None),
+    inventario_file_id: str = Query(...),
+    previo_file_id: Optional[str] = Query(None, description="Carga con la que se compara. Por defecto, la anterior a 'inventario_file_id'."),
+    estado: Optional[Literal['nuevo', 'retirado', 'modificado']] = Query(None),
+    limite: int = Query(200, ge=1, le=5000)
+):
+    """
+    Compara las fotos por SKU de dos cargas de inventario (hash-join por SKU, sin
+    releer los CSV). Los cambios se ordenan por la variación del costo y luego por
+    la del stock; las alertas de costo son las mismas que usa la Auditoría de Márgenes.
+    """
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+    if not user_id and not X_Session_ID:
+        raise HTTPException(status_code=401, detail="No se proporcionó autenticación ni ID de sesión.")
+
+    try:
+        if previo_file_id is None:
+            previo_file_id = await _inventario_anterior(user_id, workspace_id, X_Session_ID, inventario_file_id)
+            if previo_file_id is None:
+                raise HTTPException(status_code=404, detail="No hay una carga de inventario anterior con la cual comparar.")
+        foto_actual, foto_previa = await asyncio.gather(
+            precalculo.obtener_foto_inventario(user_id, workspace_id, X_Session_ID, inventario_file_id),
+            precalculo.obtener_foto_inventario(user_id, workspace_id, X_Session_ID, previo_file_id)
+        )
+        diferencia = await asyncio.to_thread(historial_inventario.comparar_fotos_inventario, foto_actual, foto_previa)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"No se pudo comparar las cargas de inventario: {e}")
+
+    cambios = diferencia["cambios"]
+    alertas = historial_inventario.alertas_de_costo(cambios)
+    if estado:
+        cambios = cambios[cambios["estado"] == estado]
+    cambios = cambios.assign(
+        _orden_costo=cambios["variacion_costo_pct"].abs().fillna(0), _orden_stock=cambios["delta_stock"].abs()
+    ).sort_values(["_orden_costo", "_orden_stock"], ascending=False).drop(columns=["_orden_costo", "_orden_stock"])
+    filas = cambios.head(limite).astype(object)
+    return JSONResponse(content={
+        "inventario_file_id": inventario_file_id,
+        "previo_file_id": previo_file_id,
+        "resumen": diferencia["resumen"],
+        "alertas_de_costo": {alerta: int(cantidad) for alerta, cantidad in alertas["alerta"].value_counts().items()},
+        "total_cambios": int(len(cambios)),
+        "cambios": filas.where(pd.notna(filas), None).to_dict(orient="records"),
+    })
+
 
 # --- ENDPOINT 2: La Ejecución "Bajo Demanda" (Pesado) ---
 @app.post("/auditoria/run", summary="Ejecuta, compara y guarda un nuevo Informe de Evolución", tags=["Auditoría"])
@@ -542,8 +940,10 @@ async def run_new_audit(
 
         # --- FASE 1: Rotación (Leer 'latest' y guardarlo como 'previa') ---
         print("Fase 1: Rotando la auditoría anterior...")
-        # Leemos el informe anterior directamente desde nuestro "registro dorado"
-        informe_previo = audit_ref.get().to_dict() if audit_ref.get().exists else None
+        # Leemos el informe anterior directamente desde nuestro "registro dorado".
+        # Si es compacto, sus tareas vienen sin vista previa: para comparar basta con los IDs.
+        audit_doc_previo = audit_ref.get()
+        informe_previo = audit_doc_previo.to_dict() if audit_doc_previo.exists else None
 
         auditoria_previa = None
         if informe_previo:
@@ -561,32 +961,55 @@ async def run_new_audit(
 
         # --- FASE 2: Ejecución ---
         print("Fase 2: Ejecutando la nueva auditoría...")
-        # ... (tu lógica para cargar df_ventas y df_inventario)
-        ventas_contents = await descargar_contenido_de_storage(user_id, workspace_id, X_Session_ID, ventas_file_id)
-        inventario_contents = await descargar_contenido_de_storage(user_id, workspace_id, X_Session_ID, inventario_file_id)
-        df_ventas = pd.read_csv(io.BytesIO(ventas_contents))
-        df_inventario = pd.read_csv(io.BytesIO(inventario_contents))
-
-        auditoria_actual = generar_auditoria_inventario(df_ventas, df_inventario)
+        # Si el workspace se precalculó al subir los archivos, la auditoría ya está hecha
+        auditoria_cacheada = precalculo.obtener_auditoria_precalculada(user_id, workspace_id, X_Session_ID, ventas_file_id, inventario_file_id)
+        if auditoria_cacheada is not None:
+            print("♨️ Usando la auditoría precalculada para este par de archivos.")
+            auditoria_actual = copy.deepcopy(auditoria_cacheada)
+        else:
+            auditoria_actual = await _ejecutar_auditoria_con_turno(current_user, workspace_id, X_Session_ID, ventas_file_id, inventario_file_id)
+            precalculo.guardar_auditoria_en_cache(user_id, workspace_id, X_Session_ID, ventas_file_id, inventario_file_id, copy.deepcopy(auditoria_actual))
         now_iso = datetime.now(timezone.utc).isoformat()
         auditoria_actual["fecha"] = now_iso
         auditoria_actual["source_files"] = { "ventas_id": ventas_file_id, "inventario_id": inventario_file_id }
+        snapshot_actual = auditoria_actual.pop("snapshot_skus", None)
         
         print(f"Incrementando contador de auditorías para el workspace: {workspace_id}")
         base_ref.update({"auditorias_ejecutadas": firestore.Increment(1)})
 
         # --- FASE 3: Comparación y Generación del Informe de Evolución ---
         informe_evolucion_raw = comparar_auditorias(auditoria_actual, auditoria_previa)
+
+        # Movimientos por SKU: cruzamos la foto actual con la de la auditoría previa
+        if snapshot_actual is not None:
+            informe_evolucion_raw["evolucion_skus"] = None
+            ruta_snapshot_previo = ((informe_previo or {}).get("snapshot_skus") or {}).get("rutaStorage")
+            if ruta_snapshot_previo:
+                try:
+                    snapshot_previo = evolucion_skus.deserializar_snapshot(descargar_detalle_auditoria(ruta_snapshot_previo))
+                    informe_evolucion_raw["evolucion_skus"] = evolucion_skus.comparar_snapshots(snapshot_actual, snapshot_previo)
+                except Exception as e:
+                    print(f"⚠️ No se pudo comparar con la foto por SKU previa: {e}")
+            informe_evolucion_raw["snapshot_skus"] = guardar_detalle_auditoria(
+                user_id, workspace_id, X_Session_ID, evolucion_skus.serializar_snapshot(snapshot_actual),
+                datetime.now(timezone.utc).strftime('%Y-%m-%d_%H%M%S_%f'), sufijo="snapshot_skus"
+            )
         
 
         # --- FASE 4: Guardado Persistente ---
-        # Guardamos el informe de evolución completo en nuestro "registro dorado", sobrescribiendo el anterior
-        audit_ref.set(informe_evolucion_raw)
+        # Sobrescribimos nuestro "registro dorado" con la versión compacta del informe;
+        # las vistas previas y listas de SKUs van a Storage.
+        informe_evolucion_clean = _guardar_informe_latest(
+            audit_ref, informe_evolucion_raw, informe_previo, user_id, workspace_id, X_Session_ID
+        )
+        if snapshot_actual is not None:
+            eliminar_blob_silencioso(((informe_previo or {}).get("snapshot_skus") or {}).get("rutaStorage"))
 
         # --- FASE 5: Respuesta ---
-        informe_evolucion_clean = clean_for_json(informe_evolucion_raw)
         return JSONResponse(content=informe_evolucion_clean)
 
+    except HTTPException:
+        raise # Validaciones y rechazos del planificador
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Ocurrió un error crítico al ejecutar la auditoría: {e}")
@@ -674,6 +1097,34 @@ async def admin_recharge_credits(
 
 
 
+@app.get("/admin/precalculo", summary="[ADMIN] Métricas del precálculo de workspaces", tags=["Administración"])
+async def admin_precompute_metrics(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    """Cuántos precálculos se hicieron, cuántos se cancelaron y cuántos se aprovecharon."""
+    ADMIN_KEY = os.environ.get("ADMIN_SECRET_KEY")
+    if not ADMIN_KEY or x_admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado: Clave secreta inválida.")
+    return JSONResponse(content=precalculo.metricas_precalculo())
+
+
+@app.get("/admin/cluster", summary="[ADMIN] Estado de la afinidad de workspaces entre nodos", tags=["Administración"])
+async def admin_cluster_status(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    """Nodos del anillo y su salud, y cuántas peticiones se atendieron aquí o se reenviaron."""
+    ADMIN_KEY = os.environ.get("ADMIN_SECRET_KEY")
+    if not ADMIN_KEY or x_admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado: Clave secreta inválida.")
+    return JSONResponse(content=CLUSTER.estadisticas())
+
+
+@app.get("/admin/planificador", summary="[ADMIN] Colas y admisión de reportes por plan", tags=["Administración"])
+async def admin_scheduler_metrics(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    """Reportes en cola y en ejecución, rechazos y tiempos de espera por plan, y memoria reservada."""
+    ADMIN_KEY = os.environ.get("ADMIN_SECRET_KEY")
+    if not ADMIN_KEY or x_admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado: Clave secreta inválida.")
+    return JSONResponse(content=PLANIFICADOR.estadisticas())
+
+
+
 # ===================================================================================
 # --- ENDPOINTS DE AUTENTICACIÓN ---
 # ===================================================================================
@@ -1462,6 +1913,45 @@ async def get_session_strategy(session_id: str):
         raise HTTPException(status_code=500, detail=f"No se pudo obtener la estrategia: {e}")
 
 
+# Configuraciones de lectura a intentar, en orden de probabilidad
+CONFIGS_LECTURA_CSV = [
+    {'sep': ',', 'encoding': 'utf-8', 'skiprows': 0},
+    {'sep': ',', 'encoding': 'latin1', 'skiprows': 0},
+    {'sep': ';', 'encoding': 'utf-8', 'skiprows': 0},
+    {'sep': ';', 'encoding': 'latin1', 'skiprows': 0},
+    # Como plan B, intentamos leer sin saltar ninguna fila, por si el formato cambia
+    {'sep': ',', 'encoding': 'utf-8'},
+]
+
+
+def _leer_csv_subido(contents: bytes, nrows: Optional[int] = None) -> "pd.DataFrame":
+    """Lee un CSV subido probando separadores y codificaciones; limpia los nombres de columnas."""
+    df = None
+    last_error = None
+
+    for config in CONFIGS_LECTURA_CSV:
+        try:
+            # Creamos un nuevo flujo de bytes en cada intento para empezar desde el principio
+            df = pd.read_csv(io.BytesIO(contents), nrows=nrows, **config)
+            df.attrs["config_lectura"] = config
+            print(f"✅ Archivo leído exitosamente con la configuración: {config}")
+            break # Si tiene éxito, salimos del bucle
+        except Exception as e:
+            last_error = e
+            # Si falla, simplemente continuamos con la siguiente configuración
+            continue
+    
+    # Si después de todos los intentos no se pudo leer, lanzamos el error final
+    if df is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No se pudo leer el archivo CSV. Verifique su formato. Error final: {last_error}"
+        )
+
+    df.columns = df.columns.str.strip()
+    return df
+
+
 @app.post("/upload-file", summary="Sube, registra y cachea los filtros de un archivo", tags=["Archivos"])
 async def upload_file(
     # --- Parámetros de contexto (sin cambios) ---
@@ -1487,65 +1977,84 @@ async def upload_file(
     else:
         raise HTTPException(status_code=401, detail="No se proporcionó autenticación ni ID de sesión.")
 
-    contents = await file.read()
-    df = None
-    last_error = None
-
-    # Lista de configuraciones a intentar, en orden de probabilidad
-    configs_to_try = [
-        {'sep': ',', 'encoding': 'utf-8', 'skiprows': 0},
-        {'sep': ',', 'encoding': 'latin1', 'skiprows': 0},
-        {'sep': ';', 'encoding': 'utf-8', 'skiprows': 0},
-        {'sep': ';', 'encoding': 'latin1', 'skiprows': 0},
-        # Como plan B, intentamos leer sin saltar ninguna fila, por si el formato cambia
-        {'sep': ',', 'encoding': 'utf-8'},
-    ]
-
-    for config in configs_to_try:
+    # Leemos el archivo por bloques y calculamos su hash SHA-256 mientras se recibe
+    hasher = hashlib.sha256()
+    bloques = []
+    while True:
+        bloque = await file.read(1024 * 1024)
+        if not bloque:
+            break
+        hasher.update(bloque)
+        bloques.append(bloque)
+    contents = b"".join(bloques)
+    hash_contenido = hasher.hexdigest()
+
+    # --- DEDUPLICACIÓN POR CONTENIDO ---
+    # Si este mismo contenido ya se subió en este contexto, reutilizamos su blob
+    # y sus metadatos: no se vuelve a parsear ni a subir a Storage.
+    archivo_existente = None
+    try:
+        archivo_existente = buscar_archivo_por_hash(user_id, workspace_id, session_id_to_use, tipo_archivo, hash_contenido)
+    except Exception as e:
+        print(f"⚠️ No se pudo consultar la deduplicación por hash, se procesará el archivo completo: {e}")
+
+    inicio_procesamiento = perf_counter()
+    if archivo_existente:
+        metadata = archivo_existente["metadata"]
+        print(f"♻️ Contenido idéntico a '{archivo_existente['file_id']}'. Se reutiliza su blob y metadatos.")
+    elif tipo_archivo == 'ventas' and contents.count(b"\n") >= precalculo.MIN_LINEAS_VENTAS_POR_BLOQUES:
+        # Historial muy grande (plan sin límite de filas): metadatos en una pasada por bloques,
+        # con la configuración detectada en las primeras filas
+        config = _leer_csv_subido(contents, nrows=1000).attrs["config_lectura"]
         try:
-            # Creamos un nuevo flujo de bytes en cada intento para empezar desde el principio
-            df = pd.read_csv(io.BytesIO(contents), **config)
-            print(f"✅ Archivo leído exitosamente con la configuración: {config}")
-            break # Si tiene éxito, salimos del bucle
+            metadata = await asyncio.to_thread(ventas_por_bloques.metadatos_ventas_por_bloques, io.BytesIO(contents), **config)
         except Exception as e:
-            last_error = e
-            # Si falla, simplemente continuamos con la siguiente configuración
-            continue
-    
-    # Si después de todos los intentos no se pudo leer, lanzamos el error final
-    if df is None:
-        raise HTTPException(
-            status_code=400,
-            detail=f"No se pudo leer el archivo CSV. Verifique su formato. Error final: {last_error}"
-        )
-
-    # El resto de tu lógica no cambia
-    df.columns = df.columns.str.strip()
-
+            raise HTTPException(status_code=400, detail=f"Error al procesar el contenido del archivo: {e}")
+    else:
+        df = _leer_csv_subido(contents)
 
-    try:
-        metadata = extraer_metadatos_df(df, tipo_archivo)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error al procesar el contenido del archivo: {e}")
+        try:
+            metadata = extraer_metadatos_df(df, tipo_archivo)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error al procesar el contenido del archivo: {e}")
+    tiempo_procesamiento_ms = round((perf_counter() - inicio_procesamiento) * 1000, 1)
     
     try:
         # --- Guardado en Firebase y Registro ---
         now = datetime.now(timezone.utc)
         timestamp_str = now.strftime('%Y-%m-%d_%H%M%S')
         
-        ruta_storage = upload_to_storage(
-            user_id=user_id,
-            workspace_id=workspace_id,
-            session_id=session_id_to_use,
-            file_contents=contents,
-            tipo_archivo=tipo_archivo,
-            original_filename=file.filename,
-            content_type=file.content_type,
-            timestamp_str=timestamp_str
-        ) # Tu llamada a upload_to_storage
+        if archivo_existente:
+            ruta_storage = archivo_existente["rutaStorage"]
+        else:
+            ruta_storage = upload_to_storage(
+                user_id=user_id,
+                workspace_id=workspace_id,
+                session_id=session_id_to_use,
+                file_contents=contents,
+                tipo_archivo=tipo_archivo,
+                original_filename=file.filename,
+                content_type=file.content_type,
+                timestamp_str=timestamp_str
+            ) # Tu llamada a upload_to_storage
         
         file_id = f"{timestamp_str}_{tipo_archivo}"
 
+        # --- FOTO DEL INVENTARIO PARA EL HISTORIAL (ver historial_inventario.py) ---
+        # Un duplicado comparte la foto del original, igual que su blob
+        campos_foto = None
+        if tipo_archivo == 'inventario':
+            if archivo_existente:
+                if archivo_existente.get("fotoInventario"):
+                    campos_foto = {"fotoInventario": archivo_existente["fotoInventario"], "resumenFoto": archivo_existente.get("resumenFoto")}
+            else:
+                try:
+                    foto = historial_inventario.construir_foto_inventario(df)
+                    ruta_foto = guardar_foto_inventario(user_id, workspace_id, session_id_to_use, historial_inventario.serializar_foto_inventario(foto), timestamp_str)
+                    campos_foto = {"fotoInventario": ruta_foto, "resumenFoto": historial_inventario.resumen_foto(foto)}
+                except Exception as e:
+                    print(f"⚠️ No se pudo guardar la foto del inventario (no afecta la carga): {e}")
+
         log_file_upload_in_firestore(
             user_id=user_id,
             workspace_id=workspace_id,
@@ -1555,11 +2064,43 @@ async def upload_file(
             nombre_original=file.filename,
             ruta_storage=ruta_storage,
             metadata=metadata,
-            timestamp_obj=now
+            timestamp_obj=now,
+            hash_contenido=hash_contenido,
+            tamano_bytes=len(contents),
+            # Para un duplicado guardamos el tiempo del procesamiento original (el que se evitó)
+            tiempo_procesamiento_ms=archivo_existente.get("tiempoProcesamientoMs") if archivo_existente else tiempo_procesamiento_ms,
+            archivo_origen_id=(archivo_existente.get("archivoOrigenId") or archivo_existente["file_id"]) if archivo_existente else None,
+            campos_extra=campos_foto
         )
 
+        deduplicacion = {"reutilizado": False}
+        if archivo_existente:
+            ms_ahorrados = archivo_existente.get("tiempoProcesamientoMs") or 0
+            registrar_ahorro_deduplicacion(user_id, workspace_id, session_id_to_use, len(contents), ms_ahorrados)
+            deduplicacion = {
+                "reutilizado": True,
+                "archivo_origen_id": archivo_existente.get("archivoOrigenId") or archivo_existente["file_id"],
+                "bytes_ahorrados": len(contents),
+                "ms_procesamiento_ahorrados": ms_ahorrados
+            }
+
         # print(f"✅ Metadata en '{metadata}'.")
 
+        # --- PRECÁLCULO EN SEGUNDO PLANO ("WORKSPACE TIBIO") ---
+        # Si el workspace ya tiene el otro archivo, dejamos listos los DataFrames,
+        # los agregados de ventas y la auditoría antes de que el usuario los pida.
+        if user_id and workspace_id:
+            try:
+                tipo_complementario = 'inventario' if tipo_archivo == 'ventas' else 'ventas'
+                files_ref = db.collection('usuarios').document(user_id).collection('espacios_trabajo').document(workspace_id).collection('archivos_cargados')
+                ultimo_complementario = next(files_ref.where("tipoArchivo", "==", tipo_complementario).order_by("fechaCarga", direction="DESCENDING").limit(1).stream(), None)
+                if ultimo_complementario:
+                    ids = {tipo_archivo: file_id, tipo_complementario: ultimo_complementario.id}
+                    if precalculo.programar_precalculo(user_id, workspace_id, None, ids['ventas'], ids['inventario'], contenidos={file_id: contents}):
+                        print(f"🔥 Precálculo agendado para el workspace '{workspace_id}'.")
+            except Exception as e:
+                print(f"⚠️ No se pudo agendar el precálculo (no afecta la carga): {e}")
+
         # --- INICIO DE LA NUEVA LÓGICA DE CACHÉ PARA INVENTARIO---
         # Si la carga es de un usuario registrado y el archivo es un inventario...
         if user_id and workspace_id and tipo_archivo == 'inventario':
@@ -1649,7 +2190,8 @@ async def upload_file(
             "file_id": file_id,
             "tipo_archivo": tipo_archivo,
             "nombre_original": file.filename,
-            "metadata": metadata
+            "metadata": metadata,
+            "deduplicacion": deduplicacion
         }
 
         # --- CAMBIO CLAVE: Añadimos el rango de fechas a la respuesta ---
@@ -1675,33 +2217,173 @@ async def upload_file(
 
 
 # ===================================================================================
-# --- TUS ENDPOINTS EXISTENTES (EJEMPLO) ---
+# --- CARGA INCREMENTAL DE VENTAS (DELTAS) ---
 # ===================================================================================
-# Por ahora, mantenemos tu endpoint /extract-metadata como estaba,
-# ya que lo refactorizaremos en el siguiente paso para usar el nuevo flujo.
+def _metadatos_para_respuesta(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in (metadata or {}).items()}
 
-@app.post("/extract-metadata", summary="Extrae metadatos (categorías, marcas) de un archivo de inventario", tags=["Utilidades"])
-async def extract_metadata(
-    inventario: UploadFile = File(..., description="Archivo CSV con datos de inventario."),
-    X_Session_ID: str = Header(..., alias="X-Session-ID", description="ID de sesión anónima único del cliente.")
+
+@app.post("/upload-file/ventas-incremental", summary="Agrega solo las ventas nuevas al historial del workspace", tags=["Archivos"])
+async def upload_ventas_incremental(
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+    # Historial al que se agrega el delta; por defecto, el último archivo de ventas
+    base_file_id: Optional[str] = Form(None),
+    file: UploadFile = File(...)
 ):
-    if not X_Session_ID:
-            raise HTTPException(status_code=400, detail="La cabecera X-Session-ID es requerida.")
     """
-    Lee un archivo de inventario y devuelve una lista de todas las categorías y marcas únicas.
-    Este endpoint es robusto e intenta leer el CSV con diferentes codificaciones y separadores.
+    Recibe un CSV con ventas recientes (p. ej. la última semana), descarta las líneas
+    que ya existen en el historial (mismo comprobante, SKU y fecha) y registra un
+    nuevo archivo de ventas = historial + líneas nuevas. El historial no se vuelve a
+    leer: la deduplicación usa un índice de claves y los metadatos y agregados se
+    actualizan solo con el delta.
     """
+    user_id = current_user['email'] if current_user else None
+    session_id_to_use = None if user_id else X_Session_ID
+    base_ref = _base_ref_auditoria(current_user, workspace_id, session_id_to_use)
 
-    inventory_contents = await inventario.read()
+    contents = await file.read()
+    hash_delta = hashlib.sha256(contents).hexdigest()
+    inicio_procesamiento = perf_counter()
+
+    df_delta = _leer_csv_subido(contents)
+    faltantes = [col for col in ventas_incrementales.COLUMNAS_REQUERIDAS_DELTA if col not in df_delta.columns]
+    if faltantes:
+        raise HTTPException(status_code=400, detail=f"Al archivo le faltan columnas requeridas: {', '.join(faltantes)}")
+
+    if not base_file_id:
+        ultimo_ventas = next(base_ref.collection('archivos_cargados').where(filter=FieldFilter("tipoArchivo", "==", "ventas")).order_by("fechaCarga", direction=firestore.Query.DESCENDING).limit(1).stream(), None)
+        if not ultimo_ventas:
+            raise HTTPException(status_code=400, detail="No hay un historial de ventas al cual agregar. Sube primero el archivo completo de ventas.")
+        base_file_id = ultimo_ventas.id
+    registro_base = obtener_registro_archivo(user_id, workspace_id, session_id_to_use, base_file_id)
+    if not registro_base or registro_base.get("tipoArchivo") != "ventas":
+        raise HTTPException(status_code=404, detail=f"No se encontró el archivo de ventas '{base_file_id}'.")
 
-    # --- LÓGICA DE LECTURA ROBUSTA ---
     try:
-        # Intento 1: La configuración más común (UTF-8, separado por comas)
-        df_inventario = pd.read_csv(io.BytesIO(inventory_contents), sep=',')
-    except (UnicodeDecodeError, pd.errors.ParserError):
-        try:
-            # Intento 2: Codificación Latin-1 (muy común en Excel de Windows/Español)
-            print("Intento 1 (UTF-8, coma) falló. Reintentando con latin-1 y coma.")
+        indice = await precalculo.obtener_indice_ventas(user_id, workspace_id, session_id_to_use, base_file_id, registro_base)
+        df_nuevas, resumen = await asyncio.to_thread(ventas_incrementales.deduplicar_delta, df_delta, indice)
+    except Exception as e:
+        print(f"🔥 Error al deduplicar el delta de ventas contra '{base_file_id}': {e}")
+        raise HTTPException(status_code=500, detail="No se pudo comparar el archivo con el historial de ventas.")
+    tiempo_procesamiento_ms = round((perf_counter() - inicio_procesamiento) * 1000, 1)
+
+    resumen_delta = {k: v for k, v in resumen.items() if k != "indice"}
+    print(f"➕ Delta de ventas: {resumen['lineas_nuevas']} líneas nuevas de {resumen['lineas_recibidas']} recibidas ({tiempo_procesamiento_ms} ms).")
+
+    if resumen["lineas_nuevas"] == 0:
+        return JSONResponse(content={
+            "message": "Todas las ventas del archivo ya estaban en el historial. No se creó un archivo nuevo.",
+            "file_id": base_file_id,
+            "tipo_archivo": "ventas",
+            "metadata": _metadatos_para_respuesta(registro_base.get("metadata")),
+            "delta": resumen_delta
+        })
+
+    try:
+        now = datetime.now(timezone.utc)
+        timestamp_str = now.strftime('%Y-%m-%d_%H%M%S')
+        file_id = f"{timestamp_str}_ventas"
+
+        # Solo las líneas nuevas se suben como un segmento más del historial
+        ruta_segmento = upload_to_storage(
+            user_id=user_id,
+            workspace_id=workspace_id,
+            session_id=session_id_to_use,
+            file_contents=df_nuevas.to_csv(index=False).encode('utf-8'),
+            tipo_archivo='ventas',
+            original_filename=file.filename,
+            content_type='text/csv',
+            timestamp_str=f"{timestamp_str}_delta"
+        )
+        segmentos = registro_base.get("segmentos") or [{"fileId": base_file_id, "rutaStorage": registro_base["rutaStorage"]}]
+        segmentos = segmentos + [{"fileId": file_id, "rutaStorage": ruta_segmento}]
+        ruta_indice = guardar_indice_ventas(user_id, workspace_id, session_id_to_use, ventas_incrementales.serializar_indice(resumen["indice"]), timestamp_str)
+        metadata = ventas_incrementales.actualizar_metadatos_ventas(registro_base.get("metadata"), df_nuevas, resumen)
+
+        log_file_upload_in_firestore(
+            user_id=user_id,
+            workspace_id=workspace_id,
+            session_id=session_id_to_use,
+            file_id=file_id,
+            tipo_archivo='ventas',
+            nombre_original=file.filename,
+            ruta_storage=ruta_segmento,
+            metadata=metadata,
+            timestamp_obj=now,
+            # Sin 'hashContenido': este registro no equivale al contenido del archivo subido
+            tamano_bytes=len(contents),
+            tiempo_procesamiento_ms=tiempo_procesamiento_ms,
+            campos_extra={
+                "segmentos": segmentos,
+                "indiceVentas": ruta_indice,
+                "archivoBaseId": base_file_id,
+                "hashDelta": hash_delta,
+                "resumenDelta": resumen_delta
+            }
+        )
+
+        caches_propagadas = precalculo.propagar_delta_a_caches(user_id, workspace_id, session_id_to_use, base_file_id, file_id, df_nuevas, resumen["indice"])
+
+        metadata = _metadatos_para_respuesta(metadata)
+        date_range_bounds = None
+        if metadata.get("fecha_primera_venta") and metadata.get("fecha_ultima_venta"):
+            date_range_bounds = {"min_date": metadata["fecha_primera_venta"], "max_date": metadata["fecha_ultima_venta"]}
+            base_ref.update({"fechas_disponibles": date_range_bounds})
+
+        if user_id and workspace_id:
+            try:
+                ultimo_inventario = next(base_ref.collection('archivos_cargados').where(filter=FieldFilter("tipoArchivo", "==", "inventario")).order_by("fechaCarga", direction=firestore.Query.DESCENDING).limit(1).stream(), None)
+                if ultimo_inventario and precalculo.programar_precalculo(user_id, workspace_id, None, file_id, ultimo_inventario.id):
+                    print(f"🔥 Precálculo agendado para el workspace '{workspace_id}'.")
+            except Exception as e:
+                print(f"⚠️ No se pudo agendar el precálculo (no afecta la carga): {e}")
+
+        return JSONResponse(content={
+            "message": f"Se agregaron {resumen['lineas_nuevas']} ventas nuevas al historial.",
+            "file_id": file_id,
+            "tipo_archivo": "ventas",
+            "nombre_original": file.filename,
+            "metadata": metadata,
+            "date_range_bounds": date_range_bounds,
+            "delta": {**resumen_delta, "archivo_base_id": base_file_id, "num_segmentos": len(segmentos)},
+            "caches_actualizadas": caches_propagadas
+        })
+
+    except Exception as e:
+        print(f"🔥 Error en la fase de guardado del delta de ventas: {e}")
+        raise HTTPException(status_code=500, detail="Ocurrió un error al guardar las ventas nuevas en el servidor.")
+
+
+# ===================================================================================
+# --- TUS ENDPOINTS EXISTENTES (EJEMPLO) ---
+# ===================================================================================
+# Por ahora, mantenemos tu endpoint /extract-metadata como estaba,
+# ya que lo refactorizaremos en el siguiente paso para usar el nuevo flujo.
+
+@app.post("/extract-metadata", summary="Extrae metadatos (categorías, marcas) de un archivo de inventario", tags=["Utilidades"])
+async def extract_metadata(
+    inventario: UploadFile = File(..., description="Archivo CSV con datos de inventario."),
+    X_Session_ID: str = Header(..., alias="X-Session-ID", description="ID de sesión anónima único del cliente.")
+):
+    if not X_Session_ID:
+            raise HTTPException(status_code=400, detail="La cabecera X-Session-ID es requerida.")
+    """
+    Lee un archivo de inventario y devuelve una lista de todas las categorías y marcas únicas.
+    Este endpoint es robusto e intenta leer el CSV con diferentes codificaciones y separadores.
+    """
+
+    inventory_contents = await inventario.read()
+
+    # --- LÓGICA DE LECTURA ROBUSTA ---
+    try:
+        # Intento 1: La configuración más común (UTF-8, separado por comas)
+        df_inventario = pd.read_csv(io.BytesIO(inventory_contents), sep=',')
+    except (UnicodeDecodeError, pd.errors.ParserError):
+        try:
+            # Intento 2: Codificación Latin-1 (muy común en Excel de Windows/Español)
+            print("Intento 1 (UTF-8, coma) falló. Reintentando con latin-1 y coma.")
             df_inventario = pd.read_csv(io.BytesIO(inventory_contents), sep=',', encoding='latin1')
         except (UnicodeDecodeError, pd.errors.ParserError):
             try:
@@ -1845,7 +2527,7 @@ async def upload_csvs_abc_analysis(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReporteABC",
-        processing_function=process_csv_abc, # Pasamos la función de lógica como argumento
+        processing_function=track_expenses.process_csv_abc, # Pasamos la función de lógica como argumento
         processing_params=processing_params,
         output_filename="reporte_abc.xlsx",
         user_id=user_id,
@@ -1967,7 +2649,7 @@ async def run_analisis_estrategico_rotacion(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReporteAnalisisEstrategicoRotacion",
-        processing_function=process_csv_analisis_estrategico_rotacion, # Pasamos la función de lógica como argumento
+        processing_function=track_expenses.process_csv_analisis_estrategico_rotacion, # Pasamos la función de lógica como argumento
         processing_params=processing_params,
         output_filename="ReporteAnalisisEstrategicoRotacion.xlsx",
         user_id=user_id,
@@ -2047,7 +2729,7 @@ async def diagnostico_stock_muerto(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReporteDiagnosticoStockMuerto",
-        processing_function=procesar_stock_muerto,
+        processing_function=track_expenses.procesar_stock_muerto,
         processing_params=processing_params,
         output_filename="Diagnostico_Stock_Muerto.xlsx",
         # --- Pasamos el contexto correcto al manejador ---
@@ -2144,7 +2826,7 @@ async def generar_reporte_maestro_endpoint(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReporteMaestro", # La clave única que definimos en la configuración
-        processing_function=generar_reporte_maestro_inventario, # Tu función de lógica real
+        processing_function=track_expenses.generar_reporte_maestro_inventario, # Tu función de lógica real
         # processing_function=lambda df_v, df_i, **kwargs: df_i.head(10), # Simulación
         processing_params=processing_params,
         output_filename="ReporteMaestro.xlsx",
@@ -2167,6 +2849,9 @@ async def reporte_puntos_alerta_stock(
     lead_time_dias: int = Form(7.0),
     dias_seguridad_base: int = Form(0),
     factor_importancia_seguridad: float = Form(1.12),
+    metodo_stock_seguridad: str = Form("dias", description="'dias' (días de seguridad) o 'variabilidad' (nivel de servicio sobre la demanda diaria)."),
+    nivel_servicio: float = Form(0.95),
+    coef_variacion_lead_time: float = Form(0.25),
     ordenar_por: str = Form("Diferencia_vs_Alerta_Minima"),
     excluir_sin_ventas: str = Form("true", description="String 'true' o 'false' para excluir productos sin ventas."),
     filtro_categorias_json: Optional[str] = Form(None),
@@ -2223,6 +2908,9 @@ async def reporte_puntos_alerta_stock(
         "lead_time_dias": lead_time_dias,
         "dias_seguridad_base": dias_seguridad_base,
         "factor_importancia_seguridad": factor_importancia_seguridad,
+        "metodo_stock_seguridad": metodo_stock_seguridad,
+        "nivel_servicio": nivel_servicio,
+        "coef_variacion_lead_time": coef_variacion_lead_time,
         "ordenar_por": ordenar_por,
         "excluir_sin_ventas": excluir_bool,
         "filtro_categorias": filtro_categorias,
@@ -2237,7 +2925,7 @@ async def reporte_puntos_alerta_stock(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReportePuntosAlertaStock",
-        processing_function=process_csv_puntos_alerta_stock, # Pasamos la función de lógica como argumento
+        processing_function=track_expenses.process_csv_puntos_alerta_stock, # Pasamos la función de lógica como argumento
         processing_params=processing_params,
         output_filename="ReportePuntosAlertaStock.xlsx",
         user_id=user_id,
@@ -2274,6 +2962,11 @@ async def lista_basica_reposicion_historico(
     lead_time_dias: float = Form(7.0),
     dias_cobertura_ideal_base: int = Form(10),
     peso_ventas_historicas: float = Form(0.6),
+    fuente_demanda: str = Form("promedios", description="'promedios' o 'pronostico' (Croston/SBA/TSB con estacionalidad)."),
+    metodo_stock_seguridad: str = Form("dias", description="'dias' (días de seguridad) o 'variabilidad' (nivel de servicio sobre la demanda diaria)."),
+    nivel_servicio: float = Form(0.95),
+    coef_variacion_lead_time: float = Form(0.25),
+    incluir_comprados_juntos: str = Form("false", description="String 'true' o 'false' para agregar la columna 'Se Compra Junto Con'."),
     # pesos_importancia_json: Optional[str] = Form(None, description='(Avanzado) Redefine los pesos del Índice de Importancia. Formato JSON.')
     # --- NUEVO: Recibimos los scores de la estrategia desde el frontend ---
     score_ventas: int = Form(...),
@@ -2349,6 +3042,11 @@ async def lista_basica_reposicion_historico(
         "dias_cobertura_ideal_base": dias_cobertura_ideal_base,
         "peso_ventas_historicas": peso_ventas_historicas,
         "pesos_importancia": pesos_calculados,
+        "fuente_demanda": fuente_demanda,
+        "metodo_stock_seguridad": metodo_stock_seguridad,
+        "nivel_servicio": nivel_servicio,
+        "coef_variacion_lead_time": coef_variacion_lead_time,
+        "incluir_comprados_juntos": incluir_comprados_juntos.lower() == 'true',
     }
 
     full_params_for_logging = dict(await request.form())
@@ -2359,7 +3057,7 @@ async def lista_basica_reposicion_historico(
         ventas_file_id=ventas_file_id,
         inventario_file_id=inventario_file_id,
         report_key="ReportePlanDeCompra",
-        processing_function=process_csv_plan_compra_sugerido, # Pasamos la función de lógica como argumento
+        processing_function=track_expenses.process_csv_plan_compra_sugerido, # Pasamos la función de lógica como argumento
         processing_params=processing_params,
         output_filename="ReportePlanDeCompra.xlsx",
         user_id=user_id,
@@ -2403,7 +3101,7 @@ async def reporte_stock_minimo_sugerido(
 
     # --- Procesamiento de los datos ---
     try:
-        processed_df = process_csv_puntos_alerta_stock(
+        processed_df = track_expenses.process_csv_puntos_alerta_stock(
             df_ventas,
             df_inventario,
             # Parámetros de periodos para análisis de ventas
@@ -2553,8 +3251,17 @@ async def generar_auditoria_margenes(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Formato de filtro inválido.")
 
+    # Foto de la carga de inventario anterior para las alertas de cambio de costo (ver historial_inventario.py)
+    foto_inventario_previa = None
+    try:
+        previo_file_id = await _inventario_anterior(user_id, workspace_id, X_Session_ID, inventario_file_id)
+        if previo_file_id:
+            foto_inventario_previa = await precalculo.obtener_foto_inventario(user_id, workspace_id, X_Session_ID, previo_file_id)
+    except Exception as e:
+        print(f"⚠️ No se pudo leer la carga de inventario anterior (la auditoría sigue sin alertas de costo): {e}")
 
     processing_params = {
+        "foto_inventario_previa": foto_inventario_previa,
         "tipo_analisis_margen": tipo_analisis_margen,
         "umbral_desviacion_porcentaje": umbral_desviacion_porcentaje,
         "filtro_categorias": filtro_categorias,
@@ -2568,7 +3275,7 @@ async def generar_auditoria_margenes(
     return await _handle_report_generation(
         full_params_for_logging=full_params_for_logging,
         report_key="ReporteAuditoriaMargenes",
-        processing_function=auditar_margenes_de_productos_nuevo, # La nueva función de lógica
+        processing_function=track_expenses.auditar_margenes_de_productos_nuevo, # La nueva función de lógica
         processing_params=processing_params,
         output_filename="Auditoria_Margenes.xlsx",
         user_id=user_id,
@@ -2621,7 +3328,7 @@ async def generar_diagnostico_catalogo(
     return await _handle_report_generation(
         full_params_for_logging=full_params_for_logging,
         report_key="ReporteDiagnosticoCatalogo",
-        processing_function=diagnosticar_catalogo, # La nueva función de lógica
+        processing_function=track_expenses.diagnosticar_catalogo, # La nueva función de lógica
         processing_params=processing_params,
         # ... (el resto de los argumentos para el manejador)
         output_filename="Diagnostico_Catalogo.xlsx",
@@ -2633,6 +3340,349 @@ async def generar_diagnostico_catalogo(
     )
 
 
+@app.post("/pronostico-demanda", summary="Genera el Pronóstico de Demanda Estacional", tags=["Reportes"])
+async def generar_pronostico_demanda(
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: str = Header(..., alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+
+    ventas_file_id: str = Form(...),
+    inventario_file_id: str = Form(...),
+    horizonte_semanas: int = Form(4),
+    semanas_historia: int = Form(104),
+    metodo_pronostico: Optional[str] = Form(None),
+    ordenar_por: str = Form("faltante"),
+    excluir_sin_ventas: str = Form("true"),
+    incluir_solo_categorias: Optional[str] = Form(None),
+    incluir_solo_marcas: Optional[str] = Form(None),
+    filtro_skus_json: Optional[str] = Form(None)
+):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+
+    try:
+        filtro_categorias = json.loads(incluir_solo_categorias) if incluir_solo_categorias else None
+        filtro_marcas = json.loads(incluir_solo_marcas) if incluir_solo_marcas else None
+        filtro_skus = json.loads(filtro_skus_json) if filtro_skus_json else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Formato de filtro inválido.")
+
+    processing_params = {
+        "horizonte_semanas": horizonte_semanas,
+        "semanas_historia": semanas_historia,
+        "metodo_pronostico": metodo_pronostico or None,
+        "ordenar_por": ordenar_por,
+        "excluir_sin_ventas": excluir_sin_ventas.lower() == 'true',
+        "incluir_solo_categorias": filtro_categorias,
+        "incluir_solo_marcas": filtro_marcas,
+        "filtro_skus": filtro_skus
+    }
+
+    full_params_for_logging = dict(await request.form())
+
+    return await _handle_report_generation(
+        full_params_for_logging=full_params_for_logging,
+        report_key="ReporteReposicionInteligentePorCategoria",
+        processing_function=track_expenses.process_csv_pronostico_demanda,
+        processing_params=processing_params,
+        output_filename="Pronostico_Demanda.xlsx",
+        user_id=user_id,
+        workspace_id=workspace_id,
+        session_id=X_Session_ID,
+        ventas_file_id=ventas_file_id,
+        inventario_file_id=inventario_file_id
+    )
+
+
+@app.post("/optimizador-pedido-minimo", summary="Completa el pedido de cada marca hasta su monto mínimo", tags=["Reportes"])
+async def generar_optimizador_pedido_minimo(
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: str = Header(..., alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+
+    ventas_file_id: str = Form(...),
+    inventario_file_id: str = Form(...),
+    monto_minimo_por_marca: float = Form(500.0),
+    montos_minimos_json: Optional[str] = Form(None, description='Montos mínimos por marca. Formato JSON: {"Marca": monto}.'),
+    tolerancia_exceso_pct: float = Form(10.0),
+    base_pedido: str = Form("minimo"),
+    dias_cobertura_extra: int = Form(15),
+    lead_time_dias: float = Form(7.0),
+    incluir_solo_categorias: Optional[str] = Form(None),
+    incluir_solo_marcas: Optional[str] = Form(None),
+    filtro_skus_json: Optional[str] = Form(None)
+):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+
+    try:
+        montos_minimos = json.loads(montos_minimos_json) if montos_minimos_json else None
+        filtro_categorias = json.loads(incluir_solo_categorias) if incluir_solo_categorias else None
+        filtro_marcas = json.loads(incluir_solo_marcas) if incluir_solo_marcas else None
+        filtro_skus = json.loads(filtro_skus_json) if filtro_skus_json else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Formato de filtro inválido.")
+
+    processing_params = {
+        "monto_minimo_por_marca": monto_minimo_por_marca,
+        "montos_minimos_por_marca": montos_minimos,
+        "tolerancia_exceso_pct": tolerancia_exceso_pct,
+        "base_pedido": base_pedido,
+        "dias_cobertura_extra": dias_cobertura_extra,
+        "lead_time_dias": lead_time_dias,
+        "incluir_solo_categorias": filtro_categorias,
+        "incluir_solo_marcas": filtro_marcas,
+        "filtro_skus": filtro_skus
+    }
+
+    full_params_for_logging = dict(await request.form())
+
+    return await _handle_report_generation(
+        full_params_for_logging=full_params_for_logging,
+        report_key="ReporteListaSugeridaParaAlcanzarMontoMinimo",
+        processing_function=track_expenses.process_csv_optimizador_pedido_minimo,
+        processing_params=processing_params,
+        output_filename="Optimizador_Pedido_Minimo.xlsx",
+        user_id=user_id,
+        workspace_id=workspace_id,
+        session_id=X_Session_ID,
+        ventas_file_id=ventas_file_id,
+        inventario_file_id=inventario_file_id
+    )
+
+
+@app.post("/backtest-politica-reposicion", summary="Simula la política de reposición sobre las ventas históricas", tags=["Reportes"])
+async def generar_backtest_politica_reposicion(
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: str = Header(..., alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+
+    ventas_file_id: str = Form(...),
+    inventario_file_id: str = Form(...),
+    dias_simulacion: int = Form(365),
+    lead_time_dias: float = Form(7.0),
+    dias_cobertura_ideal_base: int = Form(10),
+    dias_seguridad_base: float = Form(0),
+    peso_ventas_historicas: float = Form(0.6),
+    dias_analisis_ventas_recientes: int = Form(30),
+    dias_analisis_ventas_general: int = Form(90),
+    metodo_stock_seguridad: str = Form("dias", description="'dias' o 'variabilidad' (nivel de servicio)."),
+    nivel_servicio: float = Form(0.95),
+    coef_variacion_lead_time: float = Form(0.25),
+    dias_entre_recalculos: int = Form(7),
+    ordenar_por: str = Form("fill_rate", description="'fill_rate', 'dias_quiebre', 'venta_perdida' o 'inventario'."),
+    excluir_sin_ventas: str = Form("true"),
+    incluir_solo_categorias: Optional[str] = Form(None),
+    incluir_solo_marcas: Optional[str] = Form(None),
+    filtro_skus_json: Optional[str] = Form(None)
+):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+
+    try:
+        filtro_categorias = json.loads(incluir_solo_categorias) if incluir_solo_categorias else None
+        filtro_marcas = json.loads(incluir_solo_marcas) if incluir_solo_marcas else None
+        filtro_skus = json.loads(filtro_skus_json) if filtro_skus_json else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Formato de filtro inválido.")
+
+    processing_params = {
+        "dias_simulacion": dias_simulacion,
+        "lead_time_dias": lead_time_dias,
+        "dias_cobertura_ideal_base": dias_cobertura_ideal_base,
+        "dias_seguridad_base": dias_seguridad_base,
+        "peso_ventas_historicas": peso_ventas_historicas,
+        "dias_analisis_ventas_recientes": dias_analisis_ventas_recientes,
+        "dias_analisis_ventas_general": dias_analisis_ventas_general,
+        "metodo_stock_seguridad": metodo_stock_seguridad,
+        "nivel_servicio": nivel_servicio,
+        "coef_variacion_lead_time": coef_variacion_lead_time,
+        "dias_entre_recalculos": dias_entre_recalculos,
+        "ordenar_por": ordenar_por,
+        "excluir_sin_ventas": excluir_sin_ventas.lower() == 'true',
+        "incluir_solo_categorias": filtro_categorias,
+        "incluir_solo_marcas": filtro_marcas,
+        "filtro_skus": filtro_skus
+    }
+
+    full_params_for_logging = dict(await request.form())
+
+    return await _handle_report_generation(
+        full_params_for_logging=full_params_for_logging,
+        report_key="ReporteBacktestPoliticaReposicion",
+        processing_function=track_expenses.process_csv_backtest_politica_reposicion,
+        processing_params=processing_params,
+        output_filename="Backtest_Politica_Reposicion.xlsx",
+        user_id=user_id,
+        workspace_id=workspace_id,
+        session_id=X_Session_ID,
+        ventas_file_id=ventas_file_id,
+        inventario_file_id=inventario_file_id
+    )
+
+
+@app.post("/plan-compra-escenarios", summary="Simula los KPIs del Plan de Compra para una grilla de parámetros", tags=["Reportes"])
+async def generar_plan_compra_escenarios(
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: str = Header(..., alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+
+    ventas_file_id: str = Form(...),
+    inventario_file_id: str = Form(...),
+    # Valores base (los que no se barren quedan fijos en estos valores)
+    dias_analisis_ventas_recientes: Optional[int] = Form(DEFAULT_STRATEGY["dias_analisis_ventas_recientes"]),
+    dias_analisis_ventas_general: Optional[int] = Form(DEFAULT_STRATEGY["dias_analisis_ventas_general"]),
+    score_ventas: int = Form(DEFAULT_STRATEGY["score_ventas"]),
+    score_ingreso: int = Form(DEFAULT_STRATEGY["score_ingreso"]),
+    score_margen: int = Form(DEFAULT_STRATEGY["score_margen"]),
+    score_dias_venta: int = Form(DEFAULT_STRATEGY["score_dias_venta"]),
+    lead_time_dias: float = Form(7.0),
+    dias_cobertura_ideal_base: int = Form(10),
+    dias_seguridad_base: float = Form(0),
+    peso_ventas_historicas: float = Form(0.6),
+    metodo_stock_seguridad: str = Form("dias", description="'dias' o 'variabilidad' (nivel de servicio)."),
+    nivel_servicio: float = Form(0.95),
+    coef_variacion_lead_time: float = Form(0.25),
+    # Grilla: JSON {parámetro: [valores]} y/o una lista JSON por parámetro (selectores del frontend)
+    grilla_json: Optional[str] = Form(None, description='Ej: {"dias_cobertura_ideal_base": [5, 10, 15], "lead_time_dias": [3, 7]}'),
+    valores_dias_cobertura_ideal_base: Optional[str] = Form(None),
+    valores_lead_time_dias: Optional[str] = Form(None),
+    valores_dias_seguridad_base: Optional[str] = Form(None),
+    valores_peso_ventas_historicas: Optional[str] = Form(None),
+    valores_nivel_servicio: Optional[str] = Form(None),
+    ordenar_por: str = Form("grilla", description="'grilla', 'inversion', 'unidades', 'margen' o 'alertas_criticas'."),
+    excluir_sin_ventas: str = Form("true"),
+    incluir_solo_categorias: Optional[str] = Form(None),
+    incluir_solo_marcas: Optional[str] = Form(None),
+    filtro_skus_json: Optional[str] = Form(None)
+):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+
+    try:
+        filtro_categorias = json.loads(incluir_solo_categorias) if incluir_solo_categorias else None
+        filtro_marcas = json.loads(incluir_solo_marcas) if incluir_solo_marcas else None
+        filtro_skus = json.loads(filtro_skus_json) if filtro_skus_json else None
+        grilla = json.loads(grilla_json) if grilla_json else {}
+        valores_por_parametro = {
+            "dias_cobertura_ideal_base": valores_dias_cobertura_ideal_base,
+            "lead_time_dias": valores_lead_time_dias,
+            "dias_seguridad_base": valores_dias_seguridad_base,
+            "peso_ventas_historicas": valores_peso_ventas_historicas,
+            "nivel_servicio": valores_nivel_servicio,
+        }
+        for parametro, valores in valores_por_parametro.items():
+            if valores:
+                grilla[parametro] = json.loads(valores)
+    except (json.JSONDecodeError, TypeError):
+        raise HTTPException(status_code=400, detail="Formato de filtro o de grilla de escenarios inválido. Se esperaba un string JSON.")
+
+    processing_params = {
+        "grilla_escenarios": grilla,
+        "dias_analisis_ventas_recientes": dias_analisis_ventas_recientes,
+        "dias_analisis_ventas_general": dias_analisis_ventas_general,
+        "score_ventas": score_ventas,
+        "score_ingreso": score_ingreso,
+        "score_margen": score_margen,
+        "score_dias_venta": score_dias_venta,
+        "lead_time_dias": lead_time_dias,
+        "dias_cobertura_ideal_base": dias_cobertura_ideal_base,
+        "dias_seguridad_base": dias_seguridad_base,
+        "peso_ventas_historicas": peso_ventas_historicas,
+        "metodo_stock_seguridad": metodo_stock_seguridad,
+        "nivel_servicio": nivel_servicio,
+        "coef_variacion_lead_time": coef_variacion_lead_time,
+        "ordenar_por": ordenar_por,
+        "excluir_sin_ventas": excluir_sin_ventas.lower() == 'true',
+        "incluir_solo_categorias": filtro_categorias,
+        "incluir_solo_marcas": filtro_marcas,
+        "filtro_skus": filtro_skus
+    }
+
+    # Validamos la grilla antes de cobrar el reporte (parámetros admitidos y número de escenarios)
+    try:
+        escenarios_plan_compra.grilla_de_escenarios({p: processing_params[p] for p in escenarios_plan_compra.PARAMETROS_BARRIBLES}, grilla)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    full_params_for_logging = dict(await request.form())
+
+    return await _handle_report_generation(
+        full_params_for_logging=full_params_for_logging,
+        report_key="ReportePlanDeCompraEscenarios",
+        processing_function=track_expenses.process_csv_plan_compra_escenarios,
+        processing_params=processing_params,
+        output_filename="Escenarios_Plan_Compra.xlsx",
+        user_id=user_id,
+        workspace_id=workspace_id,
+        session_id=X_Session_ID,
+        ventas_file_id=ventas_file_id,
+        inventario_file_id=inventario_file_id
+    )
+
+
+@app.post("/productos-comprados-juntos", summary="Productos que se compran juntos (análisis de canasta por comprobante)", tags=["Reportes"])
+async def generar_productos_comprados_juntos(
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: str = Header(..., alias="X-Session-ID"),
+    workspace_id: Optional[str] = Form(None),
+
+    ventas_file_id: str = Form(...),
+    inventario_file_id: str = Form(...),
+    top_k: int = Form(5, description="Productos relacionados a mostrar por cada SKU."),
+    min_comprobantes_juntos: int = Form(3),
+    ordenar_por: str = Form("lift", description="'lift', 'confianza' o 'frecuencia'."),
+    min_lift: float = Form(1.0),
+    incluir_solo_categorias: Optional[str] = Form(None),
+    incluir_solo_marcas: Optional[str] = Form(None),
+    filtro_skus_json: Optional[str] = Form(None)
+):
+    user_id = current_user['email'] if current_user else None
+    if user_id and not workspace_id:
+        raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+
+    try:
+        filtro_categorias = json.loads(incluir_solo_categorias) if incluir_solo_categorias else None
+        filtro_marcas = json.loads(incluir_solo_marcas) if incluir_solo_marcas else None
+        filtro_skus = json.loads(filtro_skus_json) if filtro_skus_json else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Formato de filtro inválido.")
+
+    processing_params = {
+        "top_k": top_k,
+        "min_comprobantes_juntos": min_comprobantes_juntos,
+        "ordenar_por": ordenar_por,
+        "min_lift": min_lift,
+        "incluir_solo_categorias": filtro_categorias,
+        "incluir_solo_marcas": filtro_marcas,
+        "filtro_skus": filtro_skus
+    }
+
+    full_params_for_logging = dict(await request.form())
+
+    return await _handle_report_generation(
+        full_params_for_logging=full_params_for_logging,
+        report_key="ReporteProductosCompradosJuntos",
+        processing_function=track_expenses.process_csv_comprados_juntos,
+        processing_params=processing_params,
+        output_filename="Productos_Comprados_Juntos.xlsx",
+        user_id=user_id,
+        workspace_id=workspace_id,
+        session_id=X_Session_ID,
+        ventas_file_id=ventas_file_id,
+        inventario_file_id=inventario_file_id
+    )
+
+
 @app.post("/auditoria-calidad-datos", summary="Genera la Auditoría de Calidad de Datos", tags=["Reportes"])
 async def generar_auditoria_calidad_datos(
     request: Request,
@@ -2647,6 +3697,7 @@ async def generar_auditoria_calidad_datos(
     incluir_solo_categorias: Optional[str] = Form(None),
     incluir_solo_marcas: Optional[str] = Form(None),
     ordenar_por: str = Form("valor_stock_s"),
+    umbral_similitud_nombres: float = Form(0.7, description="Similitud mínima (0-1) para marcar dos nombres como posible duplicado."),
     filtro_skus_json: Optional[str] = Form(None)    
 ):
     user_id = current_user['email'] if current_user else None
@@ -2675,7 +3726,8 @@ async def generar_auditoria_calidad_datos(
         "criterios_auditoria": criterios_auditoria,
         "filtro_categorias": filtro_categorias,
         "ordenar_por": ordenar_por,
-        "filtro_marcas": filtro_marcas
+        "filtro_marcas": filtro_marcas,
+        "umbral_similitud_nombres": umbral_similitud_nombres
     }
     
     full_params_for_logging = dict(await request.form())
@@ -2683,7 +3735,7 @@ async def generar_auditoria_calidad_datos(
     return await _handle_report_generation(
         full_params_for_logging=full_params_for_logging,
         report_key="ReporteAuditoriaCalidadDatos",
-        processing_function=auditar_calidad_datos, # La nueva función de lógica
+        processing_function=track_expenses.auditar_calidad_datos, # La nueva función de lógica
         processing_params=processing_params,
         inventario_file_id=inventario_file_id,
         # Pasamos None para el archivo de ventas, ya que no se necesita
@@ -2695,6 +3747,315 @@ async def generar_auditoria_calidad_datos(
     )
 
 
+# ===================================================================================
+# --- LOTE DE REPORTES: UNA SOLA CARGA DE DATOS PARA VARIOS REPORTES ---
+# ===================================================================================
+# El frontend suele pedir varios reportes seguidos sobre el mismo par de archivos.
+# Con este endpoint los archivos se descargan y parsean una sola vez, los reportes
+# corren en paralelo (en hilos) sobre copias de los mismos DataFrames y los
+# créditos se reservan en una única transacción de Firestore.
+MAX_REPORTES_POR_LOTE = 8
+MAX_REPORTES_EN_PARALELO = int(os.getenv("BATCH_REPORT_CONCURRENCY", "3"))
+
+
+class ReporteSolicitado(BaseModel):
+    report_key: str
+    # Parámetros con los nombres que espera la función de lógica (p. ej. 'filtro_categorias')
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class LoteReportesPayload(BaseModel):
+    workspace_id: Optional[str] = None
+    ventas_file_id: Optional[str] = None
+    inventario_file_id: Optional[str] = None
+    reportes: List[ReporteSolicitado]
+    # Si es True, la respuesta es NDJSON: una línea por reporte a medida que termina
+    stream: bool = False
+
+
+def _necesita_comprobantes(report_config: Dict[str, Any], processing_params: Dict[str, Any]) -> bool:
+    """Reportes que usan las incidencias (comprobante, SKU) del análisis de canasta (ver cesta_compras.py)."""
+    # En el lote los flags pueden llegar como texto ('true'/'false'), igual que en los formularios
+    return bool(report_config.get("usa_comprobantes")) or str(processing_params.get("incluir_comprados_juntos")).lower() == 'true'
+
+
+def _validar_reporte_de_lote(solicitud: ReporteSolicitado, es_anonimo: bool) -> Dict[str, Any]:
+    """Resuelve la configuración y la función de lógica de un reporte del lote."""
+    report_config = configuracion_reportes.REPORTS_CONFIG.get(solicitud.report_key)
+    if not report_config:
+        raise HTTPException(status_code=404, detail=f"La configuración para el reporte '{solicitud.report_key}' no fue encontrada.")
+
+    processing_function = getattr(track_expenses, report_config.get("processing_function_name", ""), None)
+    if processing_function is None:
+        raise HTTPException(status_code=400, detail=f"El reporte '{solicitud.report_key}' no está disponible en modo lote.")
+
+    if report_config['isPro'] and es_anonimo:
+        raise HTTPException(status_code=403, detail=f"El reporte '{solicitud.report_key}' es 'Pro'. Debes registrarte para acceder.")
+
+    # Rechazamos parámetros desconocidos en lugar de ignorarlos en silencio
+    firma = inspect.signature(processing_function)
+    acepta_kwargs = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in firma.parameters.values())
+    desconocidos = [k for k in solicitud.params if k not in firma.parameters]
+    if desconocidos and not acepta_kwargs:
+        raise HTTPException(status_code=400, detail=f"Parámetros no válidos para '{solicitud.report_key}': {', '.join(desconocidos)}.")
+
+    processing_params = {**report_config.get("default_params", {}), **solicitud.params}
+    processing_params.pop("df_comprobantes", None) # lo arma el servidor, no el cliente
+    return {
+        "report_key": solicitud.report_key,
+        "processing_function": processing_function,
+        "processing_params": processing_params,
+        "costo": report_config['costo'],
+        "usa_comprobantes": _necesita_comprobantes(report_config, processing_params),
+    }
+
+
+def _reservar_creditos_lote(entity_ref, costo_total: int) -> int:
+    """Descuenta el costo total del lote en una transacción. Devuelve el saldo resultante."""
+    @firestore.transactional
+    def reserva_transaction(transaction, entity_ref):
+        snapshot = entity_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise HTTPException(status_code=404, detail="La sesión o el perfil de usuario no existe.")
+        creditos_restantes = snapshot.to_dict().get("creditos_restantes", 0)
+        if creditos_restantes < costo_total:
+            raise HTTPException(status_code=402, detail=f"Créditos insuficientes. Este lote requiere {costo_total} créditos y solo tienes {creditos_restantes}.")
+        transaction.update(entity_ref, {"creditos_restantes": firestore.Increment(-costo_total)})
+        return creditos_restantes - costo_total
+
+    transaction = db.transaction()
+    return reserva_transaction(transaction, entity_ref)
+
+
+def _ejecutar_reporte_de_lote(
+    tarea: Dict[str, Any], df_ventas: "pd.DataFrame", df_inventario: "pd.DataFrame", truncar: bool,
+    df_comprobantes: Optional["pd.DataFrame"] = None
+) -> Dict[str, Any]:
+    """Corre un reporte del lote (en un hilo) y arma su resultado para el frontend."""
+    report_key = tarea["report_key"]
+    inicio = perf_counter()
+    try:
+        extras = {"df_comprobantes": df_comprobantes} if tarea.get("usa_comprobantes") else {}
+        processing_result = tarea["processing_function"](
+            df_ventas=df_ventas.copy(),
+            df_inventario=df_inventario.copy(),
+            **tarea["processing_params"],
+            **extras
+        )
+        resultado_df = processing_result.get("data")
+        summary_data = processing_result.get("summary")
+        if resultado_df is None or summary_data is None:
+            raise ValueError("La función de procesamiento no devolvió la estructura de datos esperada.")
+
+        if resultado_df.empty:
+            return {
+                "report_key": report_key, "estado": "exitoso_vacio", "creditos_consumidos": 0,
+                "insight": "No se encontraron productos que coincidan con los parámetros seleccionados.",
+                "kpis": {}, "data": [], "is_truncated": False, "total_rows": 0,
+                "tiempo_ms": round((perf_counter() - inicio) * 1000, 1),
+            }
+
+        is_truncated = False
+        total_rows = 0
+        if truncar:
+            total_rows = len(resultado_df)
+            if total_rows > 15:
+                resultado_df = resultado_df.head(15)
+                is_truncated = True
+
+        return {
+            "report_key": report_key, "estado": "exitoso", "creditos_consumidos": tarea["costo"],
+            "insight": summary_data.get("insight"),
+            "kpis": summary_data.get("kpis"),
+            "data": _registros_para_frontend(resultado_df),
+            "is_truncated": is_truncated, "total_rows": total_rows,
+            "tiempo_ms": round((perf_counter() - inicio) * 1000, 1),
+        }
+    except Exception as e:
+        traceback.print_exc()
+        user_message = f"Columna requerida no encontrada: {e}" if isinstance(e, KeyError) else "Error inesperado al procesar"
+        return {
+            "report_key": report_key, "estado": "fallido", "creditos_consumidos": 0,
+            "error": user_message,
+            "error_details": {"user_message": user_message, "error_type": type(e).__name__, "technical_details": str(e)},
+            "tiempo_ms": round((perf_counter() - inicio) * 1000, 1),
+        }
+
+
+class _StreamingConCierre(StreamingResponse):
+    """
+    StreamingResponse que ejecuta `al_cerrar` pase lo que pase: respuesta completa,
+    error o cliente desconectado antes o durante el envío. El `finally` de un
+    generador no alcanza (no corre si el generador nunca empezó) y Starlette omite
+    las BackgroundTask cuando el cliente se desconecta.
+    """
+    def __init__(self, contenido, al_cerrar: Callable[[], Any], **kwargs):
+        super().__init__(contenido, **kwargs)
+        self._al_cerrar = al_cerrar
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._al_cerrar()
+
+
+@app.post("/reportes/lote", summary="Genera varios reportes sobre el mismo par de archivos", tags=["Análisis"])
+async def generar_lote_de_reportes(
+    payload: LoteReportesPayload,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    X_Session_ID: Optional[str] = Header(None, alias="X-Session-ID")
+):
+    """
+    Recibe una lista de (report_key, params), carga los archivos una sola vez y
+    ejecuta los reportes en paralelo. Los créditos de todos los reportes se
+    reservan en una sola transacción; los de reportes vacíos o fallidos se devuelven.
+    Con `stream=True` cada reporte se envía (NDJSON) apenas termina.
+    """
+    user_id = None
+    workspace_id = payload.workspace_id
+    session_id = None
+
+    # --- LÓGICA DE DETERMINACIÓN DE CONTEXTO ---
+    if current_user:
+        if not workspace_id:
+            raise HTTPException(status_code=400, detail="Se requiere un 'workspace_id' para usuarios autenticados.")
+        user_id = current_user['email']
+        entity_ref = db.collection('usuarios').document(user_id)
+    elif X_Session_ID:
+        session_id = X_Session_ID
+        workspace_id = None
+        entity_ref = db.collection('sesiones_anonimas').document(session_id)
+    else:
+        raise HTTPException(status_code=401, detail="No se proporcionó autenticación ni ID de sesión.")
+
+    if not payload.reportes:
+        raise HTTPException(status_code=400, detail="El lote no contiene reportes.")
+    if len(payload.reportes) > MAX_REPORTES_POR_LOTE:
+        raise HTTPException(status_code=400, detail=f"Un lote admite como máximo {MAX_REPORTES_POR_LOTE} reportes.")
+    if not payload.ventas_file_id and not payload.inventario_file_id:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un archivo (ventas o inventario).")
+
+    # --- PASO 1: VALIDAR TODO ANTES DE CARGAR O COBRAR ---
+    tareas = [_validar_reporte_de_lote(solicitud, es_anonimo=user_id is None) for solicitud in payload.reportes]
+    costo_total = sum(t["costo"] for t in tareas)
+
+    # Un solo turno del planificador para todo el lote: su costo es el de los reportes
+    # más pesados que pueden correr a la vez sobre los mismos DataFrames
+    costos_mb = sorted((await asyncio.gather(*[
+        _estimar_memoria_reporte(t["report_key"], user_id, workspace_id, session_id, payload.ventas_file_id, payload.inventario_file_id)
+        for t in tareas
+    ])), reverse=True)
+    # (si no caben todos a la vez, el lote ocupa todo el presupuesto y corre solo)
+    costo_lote_mb = max(costos_mb[0], min(sum(costos_mb[:MAX_REPORTES_EN_PARALELO]), PLANIFICADOR.presupuesto_mb))
+    turno = await PLANIFICADOR.adquirir(user_id or session_id, (current_user or {}).get("plan"), costo_lote_mb, "lote")
+
+    try:
+        # --- PASO 2: UNA SOLA DESCARGA Y UN SOLO PARSEO ---
+        inicio_lote = perf_counter()
+        df_ventas, df_inventario = await asyncio.gather(
+            precalculo.cargar_ventas(user_id, workspace_id, session_id, payload.ventas_file_id),
+            precalculo.cargar_dataframe(user_id, workspace_id, session_id, payload.inventario_file_id)
+        )
+        df_comprobantes = None
+        if any(t["usa_comprobantes"] for t in tareas):
+            df_comprobantes = await precalculo.obtener_comprobantes(user_id, workspace_id, session_id, payload.ventas_file_id)
+        ms_carga = round((perf_counter() - inicio_lote) * 1000, 1)
+        print(f"📦 Lote de {len(tareas)} reportes: datos cargados una sola vez en {ms_carga} ms.")
+
+        # --- PASO 3: RESERVA DE CRÉDITOS (UNA TRANSACCIÓN) ---
+        saldo_tras_reserva = _reservar_creditos_lote(entity_ref, costo_total)
+    except BaseException:
+        PLANIFICADOR.liberar(turno)
+        raise
+
+    # --- PASO 4: EJECUCIÓN CONCURRENTE ---
+    semaforo = asyncio.Semaphore(MAX_REPORTES_EN_PARALELO)
+
+    async def _correr(indice: int) -> tuple:
+        async with semaforo:
+            resultado = await asyncio.to_thread(
+                _ejecutar_reporte_de_lote, tareas[indice], df_ventas, df_inventario, user_id is None, df_comprobantes
+            )
+        return indice, resultado
+
+    def _registrar(resultado: Dict[str, Any], tarea: Dict[str, Any]):
+        log_report_generation(
+            user_id=user_id, workspace_id=workspace_id, session_id=session_id,
+            report_name=resultado["report_key"],
+            params={**tarea["processing_params"], "lote": True},
+            ventas_file_id=payload.ventas_file_id, inventario_file_id=payload.inventario_file_id,
+            creditos_consumidos=resultado["creditos_consumidos"], estado=resultado["estado"],
+            error_details=resultado.get("error_details")
+        )
+
+    def _cerrar_lote(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Devolvemos los créditos de los reportes que no se cobran (vacíos o fallidos)
+        reembolso = costo_total - sum(r["creditos_consumidos"] for r in resultados)
+        if reembolso > 0:
+            entity_ref.update({"creditos_restantes": firestore.Increment(reembolso)})
+        if user_id and workspace_id:
+            workspace_ref = db.collection('usuarios').document(user_id).collection('espacios_trabajo').document(workspace_id)
+            workspace_ref.update({"fechaModificacion": datetime.now(timezone.utc)})
+
+        entity_data = entity_ref.get().to_dict() or {}
+        new_remaining = entity_data.get("creditos_restantes", saldo_tras_reserva + reembolso)
+        print(f"✅ Lote completado en {round((perf_counter() - inicio_lote) * 1000, 1)} ms. "
+              f"Créditos cobrados: {costo_total - reembolso}, devueltos: {reembolso}.")
+        return {
+            "updated_credits": {
+                "used": entity_data.get("creditos_iniciales", 0) - new_remaining,
+                "remaining": new_remaining
+            },
+            "creditos_consumidos": costo_total - reembolso,
+            "tiempo_carga_ms": ms_carga,
+            "tiempo_total_ms": round((perf_counter() - inicio_lote) * 1000, 1),
+        }
+
+    def _sin_detalles(resultado: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in resultado.items() if k != "error_details"}
+
+    if not payload.stream:
+        try:
+            resultados = [resultado for _, resultado in await asyncio.gather(*[_correr(i) for i in range(len(tareas))])]
+        finally:
+            PLANIFICADOR.liberar(turno)
+        for resultado, tarea in zip(resultados, tareas):
+            _registrar(resultado, tarea)
+        resumen = _cerrar_lote(resultados)
+        return JSONResponse(content={
+            "resultados": [_sin_detalles(r) for r in resultados],
+            **resumen
+        })
+
+    pendientes: List[asyncio.Future] = []
+    resultados_entregados: Dict[int, Dict[str, Any]] = {}
+    cierre: Dict[str, Any] = {}
+
+    def _finalizar_lote() -> Dict[str, Any]:
+        """Cancela lo pendiente, libera el turno y devuelve los créditos no entregados (una sola vez)."""
+        if "resumen" not in cierre:
+            cierre["resumen"] = None
+            for futuro in pendientes:
+                futuro.cancel()
+            PLANIFICADOR.liberar(turno)
+            cierre["resumen"] = _cerrar_lote(list(resultados_entregados.values()))
+        return cierre["resumen"]
+
+    async def _generar_ndjson():
+        pendientes.extend(asyncio.ensure_future(_correr(i)) for i in range(len(tareas)))
+        for siguiente in asyncio.as_completed(pendientes):
+            indice, resultado = await siguiente
+            resultados_entregados[indice] = resultado
+            _registrar(resultado, tareas[indice])
+            evento = {"tipo": "reporte", "indice": indice, **_sin_detalles(resultado)}
+            yield json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+        yield json.dumps({"tipo": "resumen", **_finalizar_lote()}, ensure_ascii=False, default=str) + "\n"
+
+    # Si el cliente corta la conexión (incluso antes de empezar a leer), los reportes no entregados no se cobran
+    return _StreamingConCierre(_generar_ndjson(), al_cerrar=_finalizar_lote, media_type="application/x-ndjson")
+
+
 # ----------------------------------------------------------
 # ------------------ FUNCIONES AUXILIARES ------------------
 # ----------------------------------------------------------
@@ -2715,14 +4076,17 @@ async def _handle_report_generation(
     # IDs de los archivos a procesar
     ventas_file_id: Optional[str],
     inventario_file_id: Optional[str],
-    is_unlimited_anonymous: bool = False
+    is_unlimited_anonymous: bool = False,
+    dataframes_precargados: Optional[Dict[str, "pd.DataFrame"]] = None
 ):
     """
     Función central refactorizada que maneja la generación de CUALQUIER reporte
     para usuarios anónimos O registrados, aplicando la lógica de negocio correcta.
+    Si se pasan `dataframes_precargados` ({'ventas': df, 'inventario': df}),
+    se omite la descarga y el parseo de los archivos.
     """
     # --- PASO 1: DETERMINAR EL CONTEXTO Y LA REFERENCIA BASE EN FIRESTORE ---
-    report_config = REPORTS_CONFIG.get(report_key)
+    report_config = configuracion_reportes.REPORTS_CONFIG.get(report_key)
     if not report_config:
         raise HTTPException(status_code=404, detail=f"La configuración para el reporte '{report_key}' no fue encontrada.")
     
@@ -2758,39 +4122,45 @@ async def _handle_report_generation(
     if creditos_restantes < report_cost:
         raise HTTPException(status_code=402, detail=f"Créditos insuficientes. Este reporte requiere {report_cost} créditos y solo tienes {creditos_restantes}.")
 
+    # Turno en el planificador (ver planificador_reportes.py). Va fuera del try para
+    # que un rechazo (413/429/503) llegue tal cual al cliente y no como un 500.
+    memoria_mb = await _estimar_memoria_reporte(report_key, user_id, workspace_id, session_id, ventas_file_id, inventario_file_id, dataframes_precargados)
+    turno = await PLANIFICADOR.adquirir(user_id or session_id, entity_doc.to_dict().get("plan"), memoria_mb, report_key)
+
     # --- PASO 3: PROCESAMIENTO Y GENERACIÓN (DENTRO DE UN TRY/EXCEPT) ---
     # Si algo falla aquí, es un error de ejecución. Lo registraremos como "fallido" sin cobrar.
     try:
         # --- INICIO DE LA NUEVA LÓGICA DE CARGA CONDICIONAL ---
         print("Iniciando carga de datos condicional...")
         
-        tasks = []
-        # Creamos una lista de tareas de descarga solo para los archivos que existen
-        if ventas_file_id:
-            tasks.append(descargar_contenido_de_storage(user_id, workspace_id, session_id, ventas_file_id))
-        if inventario_file_id:
-            tasks.append(descargar_contenido_de_storage(user_id, workspace_id, session_id, inventario_file_id))
-
-        # Ejecutamos las tareas que se añadieron
-        results = await asyncio.gather(*tasks)
+        if dataframes_precargados is not None:
+            # Los DataFrames ya fueron parseados (p. ej. por el pre-flight anónimo)
+            df_ventas = dataframes_precargados.get("ventas", pd.DataFrame())
+            df_inventario = dataframes_precargados.get("inventario", pd.DataFrame())
+        else:
+            # Descarga y parseo solo de los archivos que existen (o lectura desde la
+            # caché de DataFrames, si el workspace ya fue precalculado)
+            df_ventas, df_inventario = await asyncio.gather(
+                precalculo.cargar_ventas(user_id, workspace_id, session_id, ventas_file_id),
+                precalculo.cargar_dataframe(user_id, workspace_id, session_id, inventario_file_id)
+            )
 
-        # Asignamos los resultados de vuelta con cuidado
-        df_ventas = pd.DataFrame() # Default: DataFrame vacío
-        df_inventario = pd.DataFrame() # Default: DataFrame vacío
-        
-        result_index = 0
-        if ventas_file_id:
-            df_ventas = pd.read_csv(io.BytesIO(results[result_index]))
-            result_index += 1
-        if inventario_file_id:
-            df_inventario = pd.read_csv(io.BytesIO(results[result_index]))
+        # El historial condensado no trae comprobantes: el análisis de canasta los lee aparte
+        if _necesita_comprobantes(report_config, processing_params):
+            if dataframes_precargados is not None:
+                df_comprobantes = await asyncio.to_thread(cesta_compras.incidencias_de_ventas, df_ventas)
+            else:
+                df_comprobantes = await precalculo.obtener_comprobantes(user_id, workspace_id, session_id, ventas_file_id)
+            processing_params = {**processing_params, "df_comprobantes": df_comprobantes}
 
         print("✅ Datos cargados y convertidos a DataFrames exitosamente.")
         # --- FIN DE LA NUEVA LÓGICA DE CARGA ---
 
 
-        # Ahora, pasamos los DataFrames ya cargados a la función de lógica
-        processing_result = processing_function(
+        # Ahora, pasamos los DataFrames ya cargados a la función de lógica. Se ejecuta
+        # en un hilo para no bloquear el event loop mientras otros esperan turno.
+        processing_result = await asyncio.to_thread(
+            processing_function,
             df_ventas=df_ventas.copy(), 
             df_inventario=df_inventario.copy(), 
             **processing_params
@@ -2857,19 +4227,7 @@ async def _handle_report_generation(
         # --- INICIO DE LA NUEVA LÓGICA DE LIMPIEZA CENTRALIZADA ---
         print("Ejecutando limpieza de datos centralizada...")
 
-        # 1. Reemplazamos infinitos con NaN
-        df_limpio = resultado_df.replace([np.inf, -np.inf], np.nan)
-        
-        # 2. Convertimos el DataFrame limpio a un diccionario. 
-        #    Este paso puede convertir los pd.NA o NaT a NaN de Python.
-        records = df_limpio.to_dict(orient='records')
-
-        # 3. Iteramos sobre la lista de diccionarios para reemplazar los NaN por None.
-        #    Esta es la forma más segura de garantizar la compatibilidad con JSON.
-        data_for_frontend = [
-            {k: (None if pd.isna(v) else v) for k, v in row.items()}
-            for row in records
-        ]
+        data_for_frontend = _registros_para_frontend(resultado_df)
         print("✅ Limpieza de datos completada.")
 
         insight_text = f"Análisis completado. Se encontraron {len(resultado_df)} productos que cumplen los criterios."
@@ -2941,6 +4299,49 @@ async def _handle_report_generation(
 
         raise HTTPException(status_code=500, detail=user_message)
 
+    finally:
+        PLANIFICADOR.liberar(turno)
+
+
+async def _estimar_memoria_reporte(
+    report_key: str,
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    ventas_file_id: Optional[str],
+    inventario_file_id: Optional[str],
+    dataframes_precargados: Optional[Dict[str, "pd.DataFrame"]] = None
+) -> float:
+    """Costo en memoria de un reporte según las filas de sus archivos (ver planificador_reportes.py)."""
+    if dataframes_precargados is not None:
+        filas_ventas = len(dataframes_precargados.get("ventas", pd.DataFrame()))
+        filas_inventario = len(dataframes_precargados.get("inventario", pd.DataFrame()))
+    else:
+        filas_ventas, filas_inventario = await asyncio.gather(
+            precalculo.contar_filas(user_id, workspace_id, session_id, ventas_file_id),
+            precalculo.contar_filas(user_id, workspace_id, session_id, inventario_file_id)
+        )
+    return estimar_memoria_mb(filas_ventas, filas_inventario, report_key)
+
+
+def _registros_para_frontend(resultado_df: "pd.DataFrame") -> List[Dict[str, Any]]:
+    """
+    Limpieza centralizada del resultado de un reporte antes de enviarlo como JSON.
+    """
+    # 1. Reemplazamos infinitos con NaN
+    df_limpio = resultado_df.replace([np.inf, -np.inf], np.nan)
+    
+    # 2. Convertimos el DataFrame limpio a un diccionario. 
+    #    Este paso puede convertir los pd.NA o NaT a NaN de Python.
+    records = df_limpio.to_dict(orient='records')
+
+    # 3. Iteramos sobre la lista de diccionarios para reemplazar los NaN por None.
+    #    Esta es la forma más segura de garantizar la compatibilidad con JSON.
+    return [
+        {k: (None if pd.isna(v) else v) for k, v in row.items()}
+        for row in records
+    ]
+
 
 def to_excel_with_autofit(df, sheet_name='Sheet1'):
     """
@@ -3048,7 +4449,7 @@ async def run_auditoria_margenes(
     return await _handle_report_generation(
         full_params_for_logging=dict(await request.form()),
         report_key="AuditoriaMargenes", # Una clave interna para este reporte
-        processing_function=auditar_margenes_de_productos,
+        processing_function=track_expenses.auditar_margenes_de_productos,
         processing_params={}, # La función de auditoría no necesita parámetros extra
         output_filename="Auditoria_De_Margenes.xlsx",
         user_id=user_id,
@@ -3184,29 +4585,60 @@ async def validate_anonymous_analysis(
         traceback.print_exc()
         return JSONResponse(status_code=400, content={ "status": "VALIDATION_ERROR", "message": f"No se pudo leer uno de tus archivos. Asegúrate de que sea un CSV válido. ({e})" })
 
-    # --- 3. "Dry Run" del Análisis ---
+    # --- 3. Pre-flight barato y, solo si no es concluyente, "Dry Run" ---
     try:
-        report_config_found = next((v for k, v in REPORTS_CONFIG.items() if v.get("url_key") == report_type), None)
+        report_config_found = next((v for k, v in configuracion_reportes.REPORTS_CONFIG.items() if v.get("url_key") == report_type), None)
         if not report_config_found:
             raise ValueError(f"El tipo de reporte '{report_type}' no es válido.")
 
-        processing_function = globals()[report_config_found['processing_function_name']]
-        
-        # Ejecutamos el análisis con parámetros por defecto
-        analysis_result = processing_function(
-            df_ventas=df_ventas, 
-            df_inventario=df_inventario,
-            **report_config_found.get("default_params", {})
-        )
-        
-        result_df = analysis_result.get("data")
-        
-        # --- 4. Devolver Respuesta Inteligente ---
-        if result_df.empty:
-            return JSONResponse(status_code=200, content={ "status": "EMPTY_RESULT" })
+        default_params = report_config_found.get("default_params", {})
+        evaluacion = factibilidad.evaluar_factibilidad(report_config_found['key'], df_ventas, df_inventario, default_params)
+        preview = {"diagnostico": evaluacion["diagnostico"], "advertencias": evaluacion["advertencias"]}
+
+        if evaluacion["concluyente"]:
+            if evaluacion["motivo"] == "COLUMNAS_FALTANTES":
+                faltantes = evaluacion["columnas_faltantes"]["ventas"] + evaluacion["columnas_faltantes"]["inventario"]
+                return JSONResponse(status_code=400, content={ "status": "VALIDATION_ERROR", "message": f"Faltan columnas requeridas para este análisis: {', '.join(faltantes)}." })
+            tiene_resultados = evaluacion["factible"]
+            preview["rowCount"] = evaluacion["diagnostico"].get("filas_estimadas", 0)
         else:
-            return JSONResponse(status_code=200, content={ "status": "VALIDATION_SUCCESS", "preview": { "rowCount": len(result_df) } })
+            processing_function = getattr(track_expenses, report_config_found['processing_function_name'])
+            # El dry run ejecuta el motor: pide turno al planificador como cualquier reporte gratuito
+            memoria_mb = estimar_memoria_mb(len(df_ventas), len(df_inventario), report_config_found['key'])
+            async with PLANIFICADOR.turno(client_ip, PLAN_ANONIMO, memoria_mb, f"validacion_{report_config_found['key']}"):
+                # Primero sobre una muestra de SKUs; si la muestra no es concluyente, sobre todo el archivo
+                tiene_resultados = await asyncio.to_thread(
+                    factibilidad.dry_run_muestreado, processing_function, df_ventas.copy(), df_inventario.copy(), default_params
+                )
+                if tiene_resultados is None:
+                    analysis_result = await asyncio.to_thread(
+                        processing_function,
+                        df_ventas=df_ventas.copy(),
+                        df_inventario=df_inventario.copy(),
+                        **default_params
+                    )
+                    result_df = analysis_result.get("data")
+                    tiene_resultados = result_df is not None and not result_df.empty
+                    preview["rowCount"] = len(result_df) if result_df is not None else 0
+
+        # --- 4. Devolver Respuesta Inteligente ---
+        if not tiene_resultados:
+            return JSONResponse(status_code=200, content={ "status": "EMPTY_RESULT", "preview": preview })
+
+        # Guardamos los archivos ya parseados para que /anonymous-analysis no los vuelva a leer
+        validation_token = CACHE_VALIDACION_ANONIMA.guardar(
+            {
+                "ip": client_ip,
+                "report_type": report_type,
+                "ventas": {"contenido": ventas_contents, "hash": hashlib.sha256(ventas_contents).hexdigest(), "nombre": ventas_file.filename, "content_type": ventas_file.content_type, "df": df_ventas},
+                "inventario": {"contenido": inventario_contents, "hash": hashlib.sha256(inventario_contents).hexdigest(), "nombre": inventario_file.filename, "content_type": inventario_file.content_type, "df": df_inventario},
+            },
+            tamano_bytes=len(ventas_contents) + len(inventario_contents)
+        )
+        return JSONResponse(status_code=200, content={ "status": "VALIDATION_SUCCESS", "preview": preview, "validation_token": validation_token })
 
+    except HTTPException:
+        raise # Rechazos del planificador (413/429/503): llegan tal cual al cliente
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(status_code=500, content={ "status": "SERVER_ERROR", "message": f"Ocurrió un error interno al procesar el análisis: {e}" })
@@ -3215,12 +4647,15 @@ async def validate_anonymous_analysis(
 @app.post("/api/v1/anonymous-analysis", summary="Ejecuta un análisis para un usuario anónimo", tags=["Análisis Anónimo"])
 async def run_anonymous_analysis(
     request: Request,
-    ventas_file: UploadFile = File(...),
-    inventario_file: UploadFile = File(...),
-    report_type: str = Form(...)
+    ventas_file: Optional[UploadFile] = File(None),
+    inventario_file: Optional[UploadFile] = File(None),
+    report_type: str = Form(...),
+    validation_token: Optional[str] = Form(None)
 ):
     """
     Este endpoint es la puerta de entrada para nuevos usuarios.
+    Si recibe el `validation_token` devuelto por /anonymous-validate, reutiliza
+    los archivos ya leídos y parseados; en ese caso los archivos son opcionales.
     1. Valida si el usuario puede ejecutar un análisis (1 por 24h).
     2. Crea una sesión anónima.
     3. Sube los archivos a esa sesión.
@@ -3245,6 +4680,25 @@ async def run_anonymous_analysis(
                 }
             )
 
+    # --- PASO 1.5: Recuperar lo ya validado (si el token sigue vigente) ---
+    validacion = CACHE_VALIDACION_ANONIMA.extraer(validation_token)
+    if validacion and (validacion["ip"] != client_ip or validacion["report_type"] != report_type):
+        validacion = None
+
+    archivos = {}
+    for tipo, upload in (("ventas", ventas_file), ("inventario", inventario_file)):
+        if upload is not None:
+            contenido = await upload.read()
+            previo = validacion[tipo] if validacion else None
+            # Solo reutilizamos el DataFrame si el archivo re-enviado es idéntico al validado
+            if previo and previo["hash"] != hashlib.sha256(contenido).hexdigest():
+                previo = None
+            archivos[tipo] = {"contenido": contenido, "nombre": upload.filename, "content_type": upload.content_type, "df": previo["df"] if previo else None}
+        elif validacion:
+            archivos[tipo] = validacion[tipo]
+        else:
+            raise HTTPException(status_code=400, detail="Faltan los archivos o el token de validación expiró. Vuelve a subir tus archivos.")
+
     # --- PASO 2 (sin cambios) ---
     session_id = str(uuid.uuid4())
     session_ref = db.collection('sesiones_anonimas').document(session_id)
@@ -3260,8 +4714,9 @@ async def run_anonymous_analysis(
     # --- PASO 3: Subir Archivos a la Nueva Sesión (CORREGIDO) ---
     try:
         # Función auxiliar para encapsular el proceso de subir y registrar
-        async def _upload_and_log_file(file: UploadFile, tipo: str, contents: bytes):
+        async def _upload_and_log_file(archivo: Dict[str, Any], tipo: str):
             timestamp_str = now.strftime('%Y-%m-%d_%H%M%S')
+            contents = archivo["contenido"]
             
             # 1. Subir a Storage
             ruta_storage = upload_to_storage(
@@ -3270,14 +4725,16 @@ async def run_anonymous_analysis(
                 session_id=session_id,
                 file_contents=contents,
                 tipo_archivo=tipo,
-                original_filename=file.filename,
-                content_type=file.content_type,
+                original_filename=archivo["nombre"],
+                content_type=archivo["content_type"],
                 timestamp_str=timestamp_str
             )
             
-            # 2. Registrar en Firestore
+            # 2. Registrar en Firestore (parseamos solo si el pre-flight no lo hizo ya)
             file_id = f"{timestamp_str}_{tipo}"
-            metadata = extraer_metadatos_df(pd.read_csv(io.BytesIO(contents)), tipo)
+            if archivo.get("df") is None:
+                archivo["df"] = pd.read_csv(io.BytesIO(contents))
+            metadata = extraer_metadatos_df(archivo["df"].copy(), tipo)
             
             # --- CORRECCIÓN: Eliminamos el 'await' de una función síncrona ---
             log_file_upload_in_firestore( # <-- AWAIT ELIMINADO
@@ -3286,19 +4743,17 @@ async def run_anonymous_analysis(
                 session_id=session_id,
                 file_id=file_id,
                 tipo_archivo=tipo,
-                nombre_original=file.filename,
+                nombre_original=archivo["nombre"],
                 ruta_storage=ruta_storage,
                 metadata=metadata,
-                timestamp_obj=now
+                timestamp_obj=now,
+                hash_contenido=hashlib.sha256(contents).hexdigest(),
+                tamano_bytes=len(contents)
             )
             return file_id
 
-        # El resto de la lógica de subida no cambia
-        ventas_contents = await ventas_file.read()
-        inventario_contents = await inventario_file.read()
-        
-        ventas_task = asyncio.create_task(_upload_and_log_file(ventas_file, 'ventas', ventas_contents))
-        inventario_task = asyncio.create_task(_upload_and_log_file(inventario_file, 'inventario', inventario_contents))
+        ventas_task = asyncio.create_task(_upload_and_log_file(archivos["ventas"], 'ventas'))
+        inventario_task = asyncio.create_task(_upload_and_log_file(archivos["inventario"], 'inventario'))
         
         ventas_file_id, inventario_file_id = await asyncio.gather(ventas_task, inventario_task)
         
@@ -3307,13 +4762,13 @@ async def run_anonymous_analysis(
         raise HTTPException(status_code=400, detail=f"Error al procesar los archivos CSV: {e}")
 
     # --- PASOS 4, 5 y 6 (sin cambios) ---
-    report_config_found = next((v for k, v in REPORTS_CONFIG.items() if v.get("url_key") == report_type), None)
+    report_config_found = next((v for k, v in configuracion_reportes.REPORTS_CONFIG.items() if v.get("url_key") == report_type), None)
     
     if not report_config_found:
         raise HTTPException(status_code=404, detail=f"El tipo de reporte '{report_type}' no es válido.")
 
     report_key = report_config_found['key']
-    processing_function = globals()[report_config_found['processing_function_name']]
+    processing_function = getattr(track_expenses, report_config_found['processing_function_name'])
 
     try:
         response_from_handler = await _handle_report_generation(
@@ -3327,7 +4782,8 @@ async def run_anonymous_analysis(
             session_id=session_id,
             ventas_file_id=ventas_file_id,
             inventario_file_id=inventario_file_id,
-            is_unlimited_anonymous=True
+            is_unlimited_anonymous=True,
+            dataframes_precargados={"ventas": archivos["ventas"]["df"], "inventario": archivos["inventario"]["df"]}
         )
         analysis_data = json.loads(response_from_handler.body)
     except Exception as e:
@@ -0,0 +1,231 @@
+# motor_duckdb.py
+# ===================================================================================
+# --- BACKEND DE CÁLCULO OPCIONAL: DUCKDB EMBEBIDO ---
+# ===================================================================================
+# Las etapas de agregación más pesadas de los motores (cruce de ventas con
+# inventario y agrupaciones por SKU) pueden ejecutarse en DuckDB en lugar de
+# pandas. DuckDB usa todos los núcleos disponibles y, cuando se queda sin memoria,
+# vuelca a disco (DUCKDB_TEMP_DIR) en vez de reventar el proceso. También condensa
+# los CSV de ventas guardados (ver ventas_por_bloques.py) leyéndolos directamente
+# desde disco, comprimidos, con un GROUP BY.
+#
+# pandas sigue siendo la implementación de referencia: el backend se elige con
+# REPORT_COMPUTE_BACKEND ('pandas' por defecto, o 'duckdb'), la librería es una
+# dependencia opcional (pip install duckdb) y cualquier error de DuckDB hace que
+# el motor repita la etapa con pandas. Ver bench_motor_duckdb.py para la
+# paridad y los tiempos.
+import os
+import tempfile
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from compresion import detectar_codec
+from ventas_por_bloques import (
+    COLUMNA_LINEAS, SKU_COL, NOMBRE_COL, FECHA_COL, CANTIDAD_COL, PRECIO_VENTA_COL
+)
+
+try:
+    import duckdb
+except ImportError: # Dependencia opcional: sin ella todo se calcula con pandas
+    duckdb = None
+
+BACKEND_CALCULO = os.getenv("REPORT_COMPUTE_BACKEND", "pandas").strip().lower()
+# 0 = todos los núcleos
+HILOS_DUCKDB = int(os.getenv("DUCKDB_THREADS", "0"))
+LIMITE_MEMORIA_DUCKDB = os.getenv("DUCKDB_MEMORY_LIMIT", "1GB")
+DIRECTORIO_TEMPORAL_DUCKDB = os.getenv("DUCKDB_TEMP_DIR", os.path.join(tempfile.gettempdir(), "duckdb_spill"))
+
+_lock_bd = threading.Lock()
+_bd = None
+_locales = threading.local()
+
+
+def usar_duckdb() -> bool:
+    return BACKEND_CALCULO == "duckdb" and duckdb is not None
+
+
+def establecer_backend(backend: str) -> str:
+    """Cambia el backend en caliente ('pandas' o 'duckdb'); devuelve el anterior."""
+    global BACKEND_CALCULO
+    if backend not in ("pandas", "duckdb"):
+        raise ValueError(f"Backend de cálculo '{backend}' no reconocido.")
+    anterior, BACKEND_CALCULO = BACKEND_CALCULO, backend
+    return anterior
+
+
+def _conexion():
+    """
+    Una base en memoria compartida por el proceso y un cursor por hilo: los motores
+    corren en hilos (asyncio.to_thread) y cada cursor tiene sus propias tablas registradas.
+    """
+    global _bd
+    if _bd is None:
+        with _lock_bd:
+            if _bd is None:
+                os.makedirs(DIRECTORIO_TEMPORAL_DUCKDB, exist_ok=True)
+                configuracion = {
+                    "memory_limit": LIMITE_MEMORIA_DUCKDB,
+                    "temp_directory": DIRECTORIO_TEMPORAL_DUCKDB,
+                    # El orden de las filas lo fija cada consulta con ORDER BY
+                    "preserve_insertion_order": False,
+                }
+                if HILOS_DUCKDB > 0:
+                    configuracion["threads"] = HILOS_DUCKDB
+                _bd = duckdb.connect(database=":memory:", config=configuracion)
+                print(f"🦆 DuckDB iniciado (memoria {LIMITE_MEMORIA_DUCKDB}, hilos {HILOS_DUCKDB or 'todos'}, spill en {DIRECTORIO_TEMPORAL_DUCKDB}).")
+    cursor = getattr(_locales, "cursor", None)
+    if cursor is None:
+        cursor = _bd.cursor()
+        _locales.cursor = cursor
+    return cursor
+
+
+def _id(nombre: str) -> str:
+    """Identificador SQL entre comillas (los nombres de columna tienen espacios y símbolos)."""
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _ejecutar(sql: str, tablas: dict, parametros: Optional[list] = None) -> Optional[pd.DataFrame]:
+    """Registra los DataFrames como vistas, ejecuta la consulta y devuelve un DataFrame (o None si DuckDB falla)."""
+    con = _conexion()
+    try:
+        for nombre, df in tablas.items():
+            con.register(nombre, df)
+        return con.execute(sql, parametros or []).df()
+    except duckdb.Error as e:
+        print(f"⚠️ DuckDB no pudo ejecutar la etapa ({e}); se usará pandas.")
+        return None
+    finally:
+        for nombre in tablas:
+            try:
+                con.unregister(nombre)
+            except duckdb.Error:
+                pass
+
+
+# --- ETAPAS DE AGREGACIÓN DE LOS MOTORES ---
+def agregar_ventas_por_sku(df_periodo: pd.DataFrame, sku_c: str, fecha_c: str, cant_c: str, p_venta_c: str) -> Optional[pd.DataFrame]:
+    """Equivalente SQL de track_expenses._agregar_ventas_por_sku (rotación, alertas, plan de compra)."""
+    lineas = f"v.{_id(COLUMNA_LINEAS)}" if COLUMNA_LINEAS in df_periodo.columns else "1"
+    precio = f"v.{_id(p_venta_c)}"
+    sql = f"""
+        SELECT v.{_id(sku_c)} AS {_id(sku_c)},
+               COALESCE(SUM(v.{_id(cant_c)}), 0) AS Ventas_Total,
+               COUNT(DISTINCT v.{_id(fecha_c)}) AS Dias_Con_Venta,
+               SUM({precio} * {lineas}) / NULLIF(SUM(CASE WHEN {precio} IS NOT NULL THEN {lineas} END), 0) AS Precio_Venta_Prom
+        FROM ventas v
+        WHERE v.{_id(sku_c)} IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """
+    return _ejecutar(sql, {"ventas": df_periodo})
+
+
+def agrupar_ventas_abc(df_ventas: pd.DataFrame, df_inventario_subset: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Cruce de ventas con inventario y agrupación por (SKU, producto) de process_csv_abc,
+    en una sola consulta: el cruce línea a línea nunca se materializa en pandas.
+    """
+    sku, nombre = _id(SKU_COL), _id(NOMBRE_COL)
+    precio_compra = f"COALESCE(i.{_id('Precio de compra actual (S/.)')}, 0)"
+    sql = f"""
+        SELECT v.{sku} AS {sku},
+               v.{nombre} AS {nombre},
+               SUM(v."Venta total") AS "Venta total",
+               SUM(v.{_id(CANTIDAD_COL)}) AS {_id(CANTIDAD_COL)},
+               SUM((v.{_id(PRECIO_VENTA_COL)} - {precio_compra}) * v.{_id(CANTIDAD_COL)}) AS "Margen total",
+               ANY_VALUE(COALESCE(i."Categoría", 'Desconocida')) AS "Categoría",
+               ANY_VALUE(COALESCE(i."Subcategoría", 'Desconocida')) AS "Subcategoría",
+               ANY_VALUE(i."Marca") AS "Marca",
+               ANY_VALUE(i."Cantidad en stock actual") AS "Cantidad en stock actual"
+        FROM ventas v
+        LEFT JOIN inventario i ON v.{sku} = i.{sku}
+        WHERE v.{sku} IS NOT NULL AND v.{nombre} IS NOT NULL
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+    return _ejecutar(sql, {"ventas": df_ventas, "inventario": df_inventario_subset})
+
+
+def agregar_ventas_stock_muerto(
+    df_ventas: pd.DataFrame, fecha_inicio_reciente: pd.Timestamp, col_recientes: str
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]]:
+    """Ventas totales, última venta y ventas recientes por SKU de procesar_stock_muerto, en una pasada."""
+    sql = f"""
+        SELECT sku,
+               SUM(cantidad_vendida) AS ventas_totales_unds,
+               MAX(fecha_venta) AS ultima_venta,
+               SUM(cantidad_vendida) FILTER (WHERE fecha_venta >= ?) AS {_id(col_recientes)},
+               COUNT(*) FILTER (WHERE fecha_venta >= ?) AS _lineas_recientes
+        FROM ventas
+        WHERE sku IS NOT NULL
+        GROUP BY sku
+        ORDER BY sku
+    """
+    inicio = pd.Timestamp(fecha_inicio_reciente).to_pydatetime()
+    agregados = _ejecutar(sql, {"ventas": df_ventas[['sku', 'fecha_venta', 'cantidad_vendida']]}, [inicio, inicio])
+    if agregados is None:
+        return None
+    agregados['ultima_venta'] = agregados['ultima_venta'].astype('datetime64[ns]')
+    recientes = agregados[agregados['_lineas_recientes'] > 0]
+    return (
+        agregados[['sku', 'ventas_totales_unds']],
+        agregados[['sku', 'ultima_venta']],
+        recientes[['sku', col_recientes]].reset_index(drop=True),
+    )
+
+
+# --- CONDENSADO DE CSV GUARDADOS ---
+_EXTENSIONES = {"gzip": ".csv.gz", "zstd": ".csv.zst", None: ".csv"}
+
+
+def _columnas_del_csv(con, archivos: List[str]) -> List[str]:
+    return [fila[0] for fila in con.execute("DESCRIBE SELECT * FROM read_csv(?, header = true, union_by_name = true)", [archivos]).fetchall()]
+
+
+def condensar_csv(archivos: List[str]) -> Optional[pd.DataFrame]:
+    """
+    Igual que ventas_por_bloques.condensar_ventas, pero DuckDB lee los CSV (también
+    .gz/.zst) directamente desde disco en paralelo. Devuelve None si no puede leerlos.
+    """
+    con = _conexion()
+    try:
+        crudas = {col.strip(): col for col in _columnas_del_csv(con, archivos)}
+        if SKU_COL not in crudas or CANTIDAD_COL not in crudas:
+            raise ValueError(f"El archivo de ventas debe tener las columnas '{SKU_COL}' y '{CANTIDAD_COL}'.")
+        # El SKU se deja con el tipo detectado para que '00123' quede como '123', igual que en pandas
+        como_texto = {crudas[col]: "VARCHAR" for col in (NOMBRE_COL, FECHA_COL, PRECIO_VENTA_COL, CANTIDAD_COL) if col in crudas}
+        claves = [f"COALESCE(TRIM(CAST({_id(crudas[SKU_COL])} AS VARCHAR)), 'nan') AS {_id(SKU_COL)}"]
+        for col in (NOMBRE_COL, FECHA_COL):
+            if col in crudas:
+                claves.append(f"{_id(crudas[col])} AS {_id(col)}")
+        if PRECIO_VENTA_COL in crudas:
+            claves.append(f"TRY_CAST({_id(crudas[PRECIO_VENTA_COL])} AS DOUBLE) AS {_id(PRECIO_VENTA_COL)}")
+        sql = f"""
+            SELECT {', '.join(claves)},
+                   COALESCE(SUM(TRY_CAST({_id(crudas[CANTIDAD_COL])} AS DOUBLE)), 0) AS {_id(CANTIDAD_COL)},
+                   COUNT(*) AS {_id(COLUMNA_LINEAS)}
+            FROM read_csv(?, header = true, union_by_name = true, types = ?)
+            GROUP BY ALL
+        """
+        return con.execute(sql, [archivos, como_texto]).df()
+    except duckdb.Error as e:
+        print(f"⚠️ DuckDB no pudo condensar el historial ({e}); se usará la lectura por bloques de pandas.")
+        return None
+
+
+def condensar_blobs(contenidos: Iterable[bytes]) -> Optional[pd.DataFrame]:
+    """
+    Escribe los blobs de Storage (tal como están, comprimidos) a un directorio temporal
+    y los condensa. Con un generador, solo hay un blob en memoria a la vez.
+    """
+    with tempfile.TemporaryDirectory(dir=DIRECTORIO_TEMPORAL_DUCKDB if os.path.isdir(DIRECTORIO_TEMPORAL_DUCKDB) else None) as directorio:
+        archivos = []
+        for i, contenido in enumerate(contenidos):
+            ruta = os.path.join(directorio, f"segmento_{i:04d}{_EXTENSIONES[detectar_codec(contenido)]}")
+            with open(ruta, "wb") as archivo:
+                archivo.write(contenido)
+            archivos.append(ruta)
+        return condensar_csv(archivos)
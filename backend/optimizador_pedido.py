@@ -0,0 +1,337 @@
+# optimizador_pedido.py
+# ===================================================================================
+# --- OPTIMIZADOR DE PEDIDO PARA ALCANZAR EL MONTO MÍNIMO POR MARCA ---
+# ===================================================================================
+# Muchos proveedores solo despachan si el pedido de su marca supera un monto mínimo.
+# Partiendo del pedido sugerido por el plan de compra, este módulo elige unidades
+# EXTRA de los productos de cada marca que faltan para llegar al mínimo:
+#
+#   maximizar   sum(valor_i * x_i)
+#   sujeto a    deficit <= sum(costo_i * x_i) <= deficit + holgura,   0 <= x_i <= tope_i
+#
+# donde valor_i es el costo del producto ponderado por su urgencia (se prefiere
+# adelantar compras de lo que más se necesita) y la holgura es el exceso que el
+# usuario acepta sobre el mínimo. Es una mochila acotada con cota inferior.
+#
+# Solución (todas las marcas a la vez, sin bucles por marca ni por producto):
+# 1. Voraz por densidad (valor/costo) dentro de cada marca, con sumas acumuladas
+#    por grupo: se toman los productos completos que caben y, del primero que no
+#    cabe, las unidades que entren.
+# 2. Reparación: rondas de relleno del sobrante con productos más baratos que
+#    quedaron fuera, hasta que ninguno quepa.
+# 3. Salvaguarda (el voraz puro puede ser arbitrariamente malo con un producto
+#    grande y valioso): en marcas con pocos candidatos se repite el voraz forzando
+#    primero a cada candidato (semillas); en el resto se compara con la mejor
+#    solución de un solo producto. El resultado nunca vale menos de la mitad del óptimo.
+# 4. Programación dinámica exacta (mochila acotada en céntimos, con las unidades de
+#    cada producto partidas en potencias de 2) para las marcas cuya tabla entra en
+#    el presupuesto de celdas: son las de pocos candidatos o montos chicos, justo
+#    donde la heurística puede alejarse del óptimo. En las marcas grandes cada
+#    producto pesa poco frente a la banda y la brecha contra la cota fraccional es
+#    mínima (ver bench_optimizador_pedido.py).
+#
+# La banda es la que pidió el usuario. Solo si una marca no llega al mínimo dentro
+# de ella, teniendo stock de candidatos suficiente, se vuelve a resolver con la
+# holgura ampliada al costo unitario más alto de sus candidatos (con eso el voraz
+# siempre llega) y la marca se marca con 'holgura_ampliada'.
+# La relajación fraccional se devuelve como cota superior para medir la brecha.
+from typing import Dict
+
+import numpy as np
+
+MAX_RONDAS_REPARACION = 50
+# Marcas con hasta estos candidatos se resuelven además con una semilla por candidato
+CANDIDATOS_PARA_SEMILLAS = 40
+# Tamaño máximo de la tabla de la programación dinámica (trozos x céntimos) por marca y en total
+LIMITE_CELDAS_DP = 4_000_000
+LIMITE_CELDAS_DP_TOTAL = 40_000_000
+EPS = 1e-9
+
+
+def _inicio_de_grupo(grupos_ordenados: np.ndarray) -> np.ndarray:
+    """Índice (en el arreglo ordenado) donde empieza el grupo de cada posición."""
+    inicio = np.r_[True, grupos_ordenados[1:] != grupos_ordenados[:-1]]
+    return np.maximum.accumulate(np.where(inicio, np.arange(len(grupos_ordenados)), 0))
+
+
+def _acumulado_por_grupo(valores: np.ndarray, grupos_ordenados: np.ndarray) -> np.ndarray:
+    """Suma acumulada (inclusiva) que se reinicia en cada grupo."""
+    acumulado = np.cumsum(valores)
+    inicio = _inicio_de_grupo(grupos_ordenados)
+    return acumulado - (acumulado[inicio] - valores[inicio])
+
+
+def _llenar(orden: np.ndarray, grupo: np.ndarray, costo: np.ndarray, x: np.ndarray, tope: np.ndarray, restante: np.ndarray) -> None:
+    """
+    Rondas de llenado voraz (modifica `x` y `restante`). `orden` recorre los
+    productos agrupados por marca y por densidad descendente.
+    """
+    for _ in range(MAX_RONDAS_REPARACION):
+        espacio = tope[orden] - x[orden]
+        elegibles = (espacio > 0) & (costo[orden] <= restante[grupo[orden]] + EPS)
+        if not elegibles.any():
+            return
+        idx, espacio = orden[elegibles], espacio[elegibles]
+        g = grupo[idx]
+        costo_lleno = costo[idx] * espacio
+        acumulado = _acumulado_por_grupo(costo_lleno, g)
+        previo = acumulado - costo_lleno
+        parcial = np.floor((restante[g] - previo + EPS) / costo[idx])
+        toma = np.where(acumulado <= restante[g] + EPS, espacio, np.clip(parcial, 0, espacio))
+        if not toma.any():
+            return
+        x[idx] += toma
+        restante -= np.bincount(g, weights=costo[idx] * toma, minlength=len(restante))
+
+
+def _voraz(grupo: np.ndarray, costo: np.ndarray, densidad: np.ndarray, tope: np.ndarray, capacidad: np.ndarray) -> np.ndarray:
+    orden = np.lexsort((-densidad, grupo))
+    orden = orden[tope[orden] > 0]
+    x = np.zeros(len(costo))
+    _llenar(orden, grupo, costo, x, tope, capacidad.copy())
+    return x
+
+
+def _rangos_por_grupo(grupo_ordenado: np.ndarray):
+    """Para cada posición: inicio y tamaño de su grupo en un arreglo ordenado por grupo."""
+    inicio = _inicio_de_grupo(grupo_ordenado)
+    tamano = np.bincount(grupo_ordenado)[grupo_ordenado]
+    return inicio, tamano
+
+
+def _voraz_con_semillas(grupo, costo, valor, densidad, tope, capacidad, filas):
+    """
+    Para las marcas con pocos candidatos (`filas`): un voraz por cada candidato
+    forzado primero con todas las unidades que quepan (semilla). Todas las
+    combinaciones (marca, semilla) se resuelven en una sola llamada al voraz.
+    Devuelve, por cada combinación, la fila semilla, su marca y la solución.
+    """
+    filas = filas[np.argsort(grupo[filas], kind='stable')]
+    g = grupo[filas]
+    inicio, tamano = _rangos_por_grupo(g)
+    # Pares (semilla j, producto i) de la misma marca, sin bucles
+    semilla = np.repeat(np.arange(len(filas)), tamano)
+    desplazamiento = np.arange(len(semilla)) - np.repeat(np.cumsum(tamano) - tamano, tamano)
+    producto = inicio[semilla] + desplazamiento
+    es_semilla = producto == semilla
+    fila_i = filas[producto]
+
+    capacidad_virtual = capacidad[g]
+    unidades_semilla = np.minimum(tope[filas], np.floor((capacidad_virtual + EPS) / costo[filas]))
+    x = _voraz(
+        semilla, costo[fila_i],
+        np.where(es_semilla, np.inf, densidad[fila_i]),
+        np.where(es_semilla, unidades_semilla[semilla], tope[fila_i]),
+        capacidad_virtual
+    )
+    return filas, g, fila_i, semilla, x
+
+
+def _trozos_binarios(tope: np.ndarray):
+    """Parte `tope` unidades de cada producto en trozos 1, 2, 4, ... y el resto. Devuelve (producto, unidades)."""
+    tope = tope.astype(np.int64)
+    bits = np.floor(np.log2(tope + 1)).astype(np.int64)
+    producto = np.repeat(np.arange(len(tope)), bits)
+    potencia = np.arange(len(producto)) - np.repeat(np.cumsum(bits) - bits, bits)
+    unidades = 2 ** potencia
+    resto = tope - (2 ** bits - 1)
+    con_resto = np.flatnonzero(resto > 0)
+    return np.r_[producto, con_resto], np.r_[unidades, resto[con_resto]]
+
+
+def _dp_exacta(costo_centimos: np.ndarray, valor: np.ndarray, tope: np.ndarray, minimo: int, maximo: int):
+    """
+    Mochila acotada exacta para una marca: máximo valor con un costo (en céntimos)
+    entre `minimo` y `maximo`. Devuelve las unidades por producto, o None si
+    ninguna combinación cae en la banda.
+    """
+    producto, unidades = _trozos_binarios(tope)
+    peso = costo_centimos[producto] * unidades
+    beneficio = valor[producto] * unidades
+    mejor = np.full(maximo + 1, -np.inf)
+    mejor[0] = 0.0
+    toma = np.zeros((len(producto), maximo + 1), dtype=bool)
+    for k in range(len(producto)):
+        w = int(peso[k])
+        if w > maximo:
+            continue
+        candidato = mejor[:len(mejor) - w] + beneficio[k]
+        mejora = candidato > mejor[w:] + EPS
+        toma[k, w:] = mejora
+        mejor[w:] = np.where(mejora, candidato, mejor[w:])
+
+    if minimo > maximo or not np.isfinite(mejor[minimo:]).any():
+        return None
+    c = minimo + int(np.argmax(mejor[minimo:]))
+    x = np.zeros(len(tope))
+    for k in range(len(producto) - 1, -1, -1):
+        if toma[k, c]:
+            x[producto[k]] += unidades[k]
+            c -= int(peso[k])
+    return x
+
+
+def _mejorar_con_dp(grupo, costo, valor, tope, deficit, capacidad, x, limite_celdas):
+    """
+    Reemplaza la solución heurística de cada marca cuya tabla de programación
+    dinámica entra en `limite_celdas` (de menor a mayor, hasta agotar el
+    presupuesto total) por la óptima. Modifica `x`.
+    """
+    costo_centimos = np.round(costo * 100).astype(np.int64)
+    candidato = (tope > 0) & (costo_centimos > 0)
+    # Trozos por producto: los bits de su tope más, a lo sumo, un resto
+    trozos = np.bincount(grupo[candidato], weights=np.floor(np.log2(tope[candidato] + 1)) + 1, minlength=len(deficit))
+    celdas = trozos * (np.floor(capacidad * 100 + EPS) + 1)
+    elegibles = np.flatnonzero((deficit > EPS) & (trozos > 0) & (celdas <= limite_celdas))
+    presupuesto = LIMITE_CELDAS_DP_TOTAL
+    for g in elegibles[np.argsort(celdas[elegibles], kind='stable')]:
+        presupuesto -= celdas[g]
+        if presupuesto < 0:
+            break
+        filas = np.flatnonzero(candidato & (grupo == g))
+        x_dp = _dp_exacta(costo_centimos[filas], valor[filas], tope[filas],
+                          int(np.ceil(deficit[g] * 100 - EPS)), int(np.floor(capacidad[g] * 100 + EPS)))
+        if x_dp is None:
+            continue
+        # Con costos que no son céntimos exactos, la banda se vuelve a comprobar con los costos reales
+        gasto = float(np.dot(costo[filas], x_dp))
+        if not deficit[g] - EPS <= gasto <= capacidad[g] + EPS:
+            continue
+        del_grupo = grupo == g
+        heuristica_factible = np.dot(costo[del_grupo], x[del_grupo]) >= deficit[g] - EPS
+        if not heuristica_factible or np.dot(valor[filas], x_dp) >= np.dot(valor[del_grupo], x[del_grupo]) - EPS:
+            x[del_grupo] = 0
+            x[filas] = x_dp
+
+
+def _resolver(grupo, costo, valor, tope, deficit, capacidad, candidatos_para_semillas, limite_celdas_dp):
+    """Pasos 1 a 4 para todas las marcas con una banda [deficit, capacidad] dada. Devuelve (x, cota_superior)."""
+    num_grupos = len(deficit)
+    candidato = tope > 0
+    densidad = np.divide(valor, costo, out=np.zeros_like(valor), where=costo > 0)
+
+    # 1-2. Voraz por densidad + rondas de reparación
+    x = _voraz(grupo, costo, densidad, tope, capacidad)
+
+    # Cota superior: relajación fraccional (el último producto que no cabe entra en fracción)
+    orden = np.lexsort((-densidad, grupo))
+    orden = orden[candidato[orden]]
+    g = grupo[orden]
+    costo_lleno = costo[orden] * tope[orden]
+    previo = _acumulado_por_grupo(costo_lleno, g) - costo_lleno
+    fraccion = np.clip((capacidad[g] - previo) / np.where(costo_lleno > 0, costo_lleno, 1), 0, 1)
+    cota_superior = np.bincount(g, weights=valor[orden] * tope[orden] * fraccion, minlength=num_grupos)
+
+    def _puntaje(valor_grupo, costo_grupo, deficit_grupo):
+        return np.where(costo_grupo >= deficit_grupo - EPS, valor_grupo, -1.0)
+
+    mejor = _puntaje(np.bincount(grupo, weights=valor * x, minlength=num_grupos),
+                     np.bincount(grupo, weights=costo * x, minlength=num_grupos), deficit)
+
+    # 3a. Marcas con pocos candidatos: voraz con cada candidato como semilla
+    candidatos_por_grupo = np.bincount(grupo[candidato], minlength=num_grupos)
+    pocas = candidato & (candidatos_por_grupo[grupo] <= candidatos_para_semillas)
+    if pocas.any():
+        filas, g_semilla, fila_i, semilla, x_semilla = _voraz_con_semillas(
+            grupo, costo, valor, densidad, tope, capacidad, np.flatnonzero(pocas)
+        )
+        puntaje = _puntaje(np.bincount(semilla, weights=valor[fila_i] * x_semilla, minlength=len(filas)),
+                           np.bincount(semilla, weights=costo[fila_i] * x_semilla, minlength=len(filas)),
+                           deficit[g_semilla])
+        mejor_semilla = np.full(num_grupos, -1.0)
+        np.maximum.at(mejor_semilla, g_semilla, puntaje)
+        gana = mejor_semilla > mejor + EPS
+        if gana.any():
+            # La primera semilla con el mejor puntaje de cada marca ganadora
+            elegida = np.full(num_grupos, -1, dtype=np.int64)
+            ganadoras = np.flatnonzero(gana[g_semilla] & (puntaje >= mejor_semilla[g_semilla] - EPS))
+            elegida[g_semilla[ganadoras[::-1]]] = ganadoras[::-1]
+            usar = gana[grupo[fila_i]] & (semilla == elegida[grupo[fila_i]])
+            x[gana[grupo]] = 0
+            x[fila_i[usar]] = x_semilla[usar]
+            mejor = np.where(gana, mejor_semilla, mejor)
+
+    # 3b. Resto de marcas: la mejor solución de un solo producto que cubra el déficit
+    unidades_solo = np.minimum(tope, np.floor((capacidad[grupo] + EPS) / np.where(costo > 0, costo, 1)))
+    valor_solo = np.where(candidato & ~pocas & (unidades_solo * costo >= deficit[grupo] - EPS), valor * unidades_solo, -1.0)
+    mejor_solo = np.full(num_grupos, -1.0)
+    np.maximum.at(mejor_solo, grupo, valor_solo)
+    usar_solo = mejor_solo > mejor + EPS
+    if usar_solo.any():
+        elegido = np.full(num_grupos, -1, dtype=np.int64)
+        posiciones = np.flatnonzero(valor_solo == mejor_solo[grupo])
+        elegido[grupo[posiciones[::-1]]] = posiciones[::-1] # el primero de cada grupo
+        filas = elegido[usar_solo]
+        x[usar_solo[grupo]] = 0
+        x[filas] = unidades_solo[filas]
+        restante = capacidad - np.bincount(grupo, weights=costo * x, minlength=num_grupos)
+        restante[~usar_solo] = 0
+        _llenar(orden, grupo, costo, x, tope, restante) # el sobrante se vuelve a rellenar
+
+    # 4. Óptimo exacto donde la tabla de la programación dinámica es chica
+    if limite_celdas_dp > 0:
+        _mejorar_con_dp(grupo, costo, valor, tope, deficit, capacidad, x, limite_celdas_dp)
+    return x, cota_superior
+
+
+def optimizar_extras(
+    grupo: np.ndarray,
+    costo: np.ndarray,
+    valor: np.ndarray,
+    tope: np.ndarray,
+    deficit: np.ndarray,
+    holgura: np.ndarray,
+    candidatos_para_semillas: int = CANDIDATOS_PARA_SEMILLAS,
+    limite_celdas_dp: int = LIMITE_CELDAS_DP,
+) -> Dict[str, np.ndarray]:
+    """
+    Unidades extra por producto para que cada grupo (marca) cubra su `deficit`.
+
+    grupo:   código 0..G-1 de la marca de cada producto.
+    costo:   costo unitario (> 0). valor: valor por unidad (>= 0). tope: unidades extra máximas.
+    deficit: monto que falta a cada grupo (0 si ya cumple). holgura: exceso aceptado sobre el déficit.
+    limite_celdas_dp: tamaño máximo de la tabla de programación dinámica por marca (0 la desactiva).
+
+    Devuelve 'extra' (unidades por producto) y, por grupo, 'costo', 'valor',
+    'cota_superior' (relajación fraccional), 'alcanzado' (bool) y
+    'holgura_ampliada' (bool: el mínimo solo se alcanzó pasando la holgura pedida).
+    """
+    grupo = np.asarray(grupo, dtype=np.int64)
+    costo = np.asarray(costo, dtype=np.float64)
+    valor = np.asarray(valor, dtype=np.float64)
+    deficit = np.asarray(deficit, dtype=np.float64)
+    holgura = np.broadcast_to(np.clip(np.asarray(holgura, dtype=np.float64), 0, None), deficit.shape)
+    num_grupos = len(deficit)
+
+    activo = deficit[grupo] > EPS
+    tope = np.where(activo & (costo > 0), np.floor(np.asarray(tope, dtype=np.float64)), 0)
+    candidato = tope > 0
+
+    # Primero con la banda que pidió el usuario
+    x, cota_superior = _resolver(grupo, costo, valor, tope, deficit, deficit + holgura, candidatos_para_semillas, limite_celdas_dp)
+
+    # Marcas que no llegan dentro de la banda pero tienen stock de candidatos suficiente
+    costo_final = np.bincount(grupo, weights=costo * x, minlength=num_grupos)
+    disponible = np.bincount(grupo, weights=costo * tope, minlength=num_grupos)
+    ampliar = (deficit > EPS) & (costo_final < deficit - EPS) & (disponible >= deficit - EPS)
+    if ampliar.any():
+        costo_max = np.zeros(num_grupos)
+        np.maximum.at(costo_max, grupo[candidato], costo[candidato])
+        tope_ampliado = np.where(ampliar[grupo], tope, 0)
+        x_ampliado, cota_ampliada = _resolver(
+            grupo, costo, valor, tope_ampliado, np.where(ampliar, deficit, 0),
+            deficit + np.maximum(holgura, costo_max), candidatos_para_semillas, limite_celdas_dp
+        )
+        x = np.where(ampliar[grupo], x_ampliado, x)
+        cota_superior = np.where(ampliar, cota_ampliada, cota_superior)
+        costo_final = np.bincount(grupo, weights=costo * x, minlength=num_grupos)
+
+    alcanzado = costo_final >= deficit - EPS
+    return {
+        "extra": x,
+        "costo": costo_final,
+        "valor": np.bincount(grupo, weights=valor * x, minlength=num_grupos),
+        "cota_superior": cota_superior,
+        "alcanzado": alcanzado,
+        "holgura_ampliada": ampliar & alcanzado & (costo_final > deficit + holgura + EPS),
+    }
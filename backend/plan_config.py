@@ -7,20 +7,27 @@ PLANS_CONFIG = {
         "workspace_limit": 5, # Límite para usuarios registrados gratuitos
         "can_access_pro_reports": False,
         "can_edit_strategy": False,
-        "max_file_rows": 5000 # Límite de filas en los archivos CSV/Excel
+        "max_file_rows": 5000, # Límite de filas en los archivos CSV/Excel
+        # Planificador de reportes (ver planificador_reportes.py)
+        "max_concurrent_reports": 1, # Reportes del mismo usuario ejecutándose a la vez
+        "scheduler_weight": 1 # Peso en el reparto justo de la capacidad de cálculo
     },
     "pro": {
         "plan_name": "Profesional",
         "workspace_limit": 10, # Límite para el primer nivel de pago
         "can_access_pro_reports": True,
         "can_edit_strategy": True,
-        "max_file_rows": 50000
+        "max_file_rows": 50000,
+        "max_concurrent_reports": 2,
+        "scheduler_weight": 3
     },
     "diamond": {
         "plan_name": "Diamante",
         "workspace_limit": -1, # -1 significa sin límite
         "can_access_pro_reports": True,
         "can_edit_strategy": True,
-        "max_file_rows": -1 # Sin límite de filas
+        "max_file_rows": -1, # Sin límite de filas
+        "max_concurrent_reports": 3,
+        "scheduler_weight": 6
     }
 }
\ No newline at end of file
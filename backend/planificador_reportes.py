@@ -0,0 +1,228 @@
+# planificador_reportes.py
+# ===================================================================================
+# --- PLANIFICADOR JUSTO Y CONTROL DE ADMISIÓN PARA LA EJECUCIÓN DE REPORTES ---
+# ===================================================================================
+# Sin límites, unos cuantos trabajos grandes de usuarios gratuitos pueden dejar sin
+# CPU ni memoria a los usuarios 'pro' y 'diamond'. Antes de cargar los archivos y
+# ejecutar un motor, cada reporte pide un turno al planificador:
+#
+# - Admisión: el costo en memoria se estima con las filas que ya guardamos en los
+#   metadatos del archivo. Un trabajo que no cabe en el presupuesto total se
+#   rechaza (413); si el usuario ya tiene demasiados en cola, 429.
+# - Límites: máximo de reportes en ejecución en el proceso y por usuario según su
+#   plan ("max_concurrent_reports" en PLANS_CONFIG).
+# - Reparto justo ponderado: cada trabajo recibe una etiqueta de tiempo virtual
+#   (costo / "scheduler_weight" del plan) y se atiende primero la menor, así que
+#   un usuario 'diamond' avanza 6 veces más rápido que uno gratuito en la cola,
+#   pero nadie espera para siempre.
+# - Si la espera supera REPORT_QUEUE_TIMEOUT se responde 503 con Retry-After.
+#
+# El planificador es local a cada proceso, igual que las cachés (ver cache_local.py).
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from plan_config import PLANS_CONFIG
+
+MAX_REPORTES_EN_EJECUCION = int(os.getenv("REPORT_SCHEDULER_WORKERS", "3"))
+PRESUPUESTO_MEMORIA_MB = float(os.getenv("REPORT_MEMORY_BUDGET_MB", "2048"))
+SEGUNDOS_MAX_ESPERA = float(os.getenv("REPORT_QUEUE_TIMEOUT", "90"))
+MAX_EN_COLA_POR_USUARIO = int(os.getenv("REPORT_QUEUE_PER_USER", "4"))
+# Un trabajo que no cabe en la memoria libre puede ser adelantado por otros más
+# pequeños, pero solo durante este tiempo: después se le reserva la memoria
+SEGUNDOS_ANTES_DE_RESERVAR = float(os.getenv("REPORT_RESERVE_AFTER", "10"))
+
+# Las sesiones anónimas se planifican como el plan gratuito
+PLAN_ANONIMO = "gratis"
+
+# Memoria aproximada por fila ya parseada (pandas con columnas de texto)
+BYTES_POR_FILA_VENTAS = 450
+BYTES_POR_FILA_INVENTARIO = 900
+# Cuántas veces el tamaño de los datos ocupa un motor en su pico (copias, merges)
+FACTOR_MEMORIA_POR_REPORTE = {
+    "auditoria": 6.0,
+    "ReportePlanDeCompraSugerido": 5.0,
+    "ReporteListaSugeridaParaAlcanzarMontoMinimo": 5.0, # corre el plan de compra completo
+    "ReporteMaestro": 5.0,
+}
+FACTOR_MEMORIA_POR_DEFECTO = 4.0
+MEMORIA_MINIMA_MB = 16.0
+
+
+def configuracion_plan(plan: Optional[str]) -> Dict[str, Any]:
+    return PLANS_CONFIG.get(plan or PLAN_ANONIMO, PLANS_CONFIG[PLAN_ANONIMO])
+
+
+def estimar_memoria_mb(filas_ventas: int, filas_inventario: int, report_key: str) -> float:
+    """Pico de memoria estimado de un reporte a partir de las filas de sus archivos."""
+    datos_mb = (filas_ventas * BYTES_POR_FILA_VENTAS + filas_inventario * BYTES_POR_FILA_INVENTARIO) / (1024 * 1024)
+    return max(MEMORIA_MINIMA_MB, datos_mb * FACTOR_MEMORIA_POR_REPORTE.get(report_key, FACTOR_MEMORIA_POR_DEFECTO))
+
+
+class Turno:
+    _secuencia = itertools.count()
+
+    def __init__(self, usuario: str, plan: str, memoria_mb: float, etiqueta: str, inicio_virtual: float, fin_virtual: float):
+        self.id = next(Turno._secuencia)
+        self.usuario = usuario
+        self.plan = plan
+        self.memoria_mb = memoria_mb
+        self.etiqueta = etiqueta
+        self.inicio_virtual = inicio_virtual
+        self.fin_virtual = fin_virtual
+        self.encolado_en = time.monotonic()
+        self.iniciado_en: Optional[float] = None
+        self.concedido: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class PlanificadorReportes:
+    def __init__(
+        self,
+        max_en_ejecucion: int = MAX_REPORTES_EN_EJECUCION,
+        presupuesto_mb: float = PRESUPUESTO_MEMORIA_MB,
+        segundos_max_espera: float = SEGUNDOS_MAX_ESPERA,
+    ):
+        self.max_en_ejecucion = max_en_ejecucion
+        self.presupuesto_mb = presupuesto_mb
+        self.segundos_max_espera = segundos_max_espera
+        self._pendientes: List[Turno] = []
+        self._en_ejecucion: Dict[int, Turno] = {}
+        self._tiempo_virtual = 0.0
+        self._ultima_etiqueta_usuario: Dict[str, float] = {}
+        self._memoria_en_uso_mb = 0.0
+        self._metricas: Dict[str, Dict[str, Any]] = {
+            plan: {"admitidos": 0, "completados": 0, "rechazados_memoria": 0, "rechazados_cola": 0, "expirados_en_cola": 0}
+            for plan in PLANS_CONFIG
+        }
+        self._esperas: Dict[str, Deque[float]] = {plan: deque(maxlen=500) for plan in PLANS_CONFIG}
+
+    # --- ADMISIÓN ---
+    def _admitir(self, usuario: str, plan: str, memoria_mb: float, etiqueta: str) -> Turno:
+        if memoria_mb > self.presupuesto_mb:
+            self._metricas[plan]["rechazados_memoria"] += 1
+            raise HTTPException(status_code=413, detail={
+                "estado": "rechazado_por_memoria",
+                "mensaje": (f"El análisis necesitaría ~{memoria_mb:,.0f} MB de memoria y el servidor admite {self.presupuesto_mb:,.0f} MB "
+                            "por trabajo. Reduce el período analizado o divide el archivo."),
+                "memoria_estimada_mb": round(memoria_mb),
+            })
+        en_cola_usuario = sum(1 for t in self._pendientes if t.usuario == usuario)
+        if en_cola_usuario >= MAX_EN_COLA_POR_USUARIO:
+            self._metricas[plan]["rechazados_cola"] += 1
+            raise HTTPException(status_code=429, headers={"Retry-After": "10"}, detail={
+                "estado": "rechazado_por_cola",
+                "mensaje": f"Ya tienes {en_cola_usuario} reportes esperando turno. Espera a que terminen antes de pedir más.",
+            })
+
+        # Etiquetas de tiempo virtual (reparto justo ponderado): el costo se divide por el peso del plan
+        peso = configuracion_plan(plan)["scheduler_weight"]
+        inicio = max(self._tiempo_virtual, self._ultima_etiqueta_usuario.get(usuario, 0.0))
+        fin = inicio + memoria_mb / peso
+        self._ultima_etiqueta_usuario[usuario] = fin
+        self._metricas[plan]["admitidos"] += 1
+        return Turno(usuario, plan, memoria_mb, etiqueta, inicio, fin)
+
+    # --- DESPACHO ---
+    def _en_ejecucion_de(self, usuario: str) -> int:
+        return sum(1 for t in self._en_ejecucion.values() if t.usuario == usuario)
+
+    def _conceder(self, turno: Turno):
+        self._pendientes.remove(turno)
+        self._en_ejecucion[turno.id] = turno
+        self._memoria_en_uso_mb += turno.memoria_mb
+        self._tiempo_virtual = max(self._tiempo_virtual, turno.inicio_virtual)
+        turno.iniciado_en = time.monotonic()
+        self._esperas[turno.plan].append(turno.iniciado_en - turno.encolado_en)
+        turno.concedido.set_result(True)
+
+    def _despachar(self):
+        while self._pendientes and len(self._en_ejecucion) < self.max_en_ejecucion:
+            candidatos = sorted(
+                (t for t in self._pendientes if self._en_ejecucion_de(t.usuario) < configuracion_plan(t.plan)["max_concurrent_reports"]),
+                key=lambda t: (t.fin_virtual, t.id)
+            )
+            elegido = None
+            for turno in candidatos:
+                if self._memoria_en_uso_mb + turno.memoria_mb <= self.presupuesto_mb:
+                    elegido = turno
+                    break
+                if time.monotonic() - turno.encolado_en > SEGUNDOS_ANTES_DE_RESERVAR:
+                    break # Reservamos la memoria que se libere para este trabajo
+            if elegido is None:
+                return
+            self._conceder(elegido)
+
+    def liberar(self, turno: Turno):
+        if self._en_ejecucion.pop(turno.id, None) is not None:
+            self._memoria_en_uso_mb -= turno.memoria_mb
+            self._metricas[turno.plan]["completados"] += 1
+        # Una etiqueta ya alcanzada por el tiempo virtual no cambia nada: no la guardamos
+        if self._ultima_etiqueta_usuario.get(turno.usuario, 0.0) <= self._tiempo_virtual:
+            self._ultima_etiqueta_usuario.pop(turno.usuario, None)
+        self._despachar()
+
+    async def adquirir(self, usuario: str, plan: Optional[str], memoria_mb: float, etiqueta: str) -> Turno:
+        plan = plan if plan in PLANS_CONFIG else PLAN_ANONIMO
+        turno = self._admitir(usuario, plan, memoria_mb, etiqueta)
+        self._pendientes.append(turno)
+        self._despachar()
+        try:
+            await asyncio.wait_for(asyncio.shield(turno.concedido), timeout=self.segundos_max_espera)
+        except asyncio.TimeoutError:
+            if turno.concedido.done(): # Se concedió justo al vencer el plazo
+                return turno
+            self._pendientes.remove(turno)
+            self._metricas[plan]["expirados_en_cola"] += 1
+            self._despachar()
+            raise HTTPException(status_code=503, headers={"Retry-After": "30"}, detail={
+                "estado": "en_cola_demasiado_tiempo",
+                "mensaje": "El servidor está procesando muchos reportes en este momento. Inténtalo de nuevo en unos segundos.",
+            })
+        except asyncio.CancelledError:
+            # El cliente se desconectó: liberamos el turno, se haya concedido o no
+            if turno in self._pendientes:
+                self._pendientes.remove(turno)
+            self.liberar(turno)
+            raise
+        return turno
+
+    @asynccontextmanager
+    async def turno(self, usuario: str, plan: Optional[str], memoria_mb: float, etiqueta: str):
+        turno = await self.adquirir(usuario, plan, memoria_mb, etiqueta)
+        try:
+            yield turno
+        finally:
+            self.liberar(turno)
+
+    # --- MÉTRICAS ---
+    def estadisticas(self) -> Dict[str, Any]:
+        ahora = time.monotonic()
+        por_plan = {}
+        for plan, metricas in self._metricas.items():
+            esperas = sorted(self._esperas[plan])
+            en_cola = [t for t in self._pendientes if t.plan == plan]
+            por_plan[plan] = {
+                **metricas,
+                "en_cola": len(en_cola),
+                "en_ejecucion": sum(1 for t in self._en_ejecucion.values() if t.plan == plan),
+                "espera_media_ms": round(sum(esperas) / len(esperas) * 1000, 1) if esperas else None,
+                "espera_p95_ms": round(esperas[int(len(esperas) * 0.95)] * 1000, 1) if esperas else None,
+                "espera_mas_larga_actual_ms": round(max(ahora - t.encolado_en for t in en_cola) * 1000, 1) if en_cola else None,
+            }
+        return {
+            "max_en_ejecucion": self.max_en_ejecucion,
+            "en_ejecucion": len(self._en_ejecucion),
+            "en_cola": len(self._pendientes),
+            "presupuesto_memoria_mb": self.presupuesto_mb,
+            "memoria_en_uso_mb": round(self._memoria_en_uso_mb, 1),
+            "por_plan": por_plan,
+        }
+
+
+PLANIFICADOR = PlanificadorReportes()
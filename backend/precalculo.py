@@ -0,0 +1,677 @@
+# precalculo.py
+# ===================================================================================
+# --- CACHÉ DE DATOS PARSEADOS Y PRECÁLCULO EN SEGUNDO PLANO ("WORKSPACE TIBIO") ---
+# ===================================================================================
+# Después de subir un archivo, lo siguiente que hace el usuario casi siempre es
+# ejecutar la auditoría o un reporte. Cuando un workspace ya tiene sus dos
+# archivos, lanzamos en segundo plano el parseo de ambos, los agregados de ventas
+# por SKU, el cubo por categoría y marca (ver cubo_inventario.py) y la auditoría
+# con parámetros por defecto, y los dejamos en caché para que la primera petición
+# interactiva sea un acierto.
+#
+# Las cachés son locales al proceso (ver cache_local.py): un fallo siempre
+# recae en la descarga y el parseo normales.
+import os
+import asyncio
+import itertools
+import threading
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+from fastapi import HTTPException
+
+import motor_duckdb
+from cache_arrow import CacheArrowDisco, DIRECTORIO_CACHE_ARROW
+from cache_local import CacheTTL
+from compresion import abrir_flujo_descomprimido, detectar_codec
+from cesta_compras import incidencias_de_bloques, incidencias_de_ventas
+from cubo_inventario import construir_hechos, construir_cubo
+from firebase_helpers import obtener_registro_archivo, descargar_blob_de_storage, descargar_detalle_auditoria
+from historial_inventario import construir_foto_inventario, deserializar_foto_inventario
+from planificador_reportes import PLANIFICADOR, PLAN_ANONIMO, estimar_memoria_mb
+from track_expenses import generar_auditoria_inventario
+from ventas_incrementales import (
+    agregar_por_sku_dia, combinar_agregados_diarios, combinar_agregados_sku,
+    construir_indice, construir_indice_por_bloques, deserializar_indice
+)
+from ventas_por_bloques import condensar_bloques, leer_por_bloques, lineas_representadas, COLUMNAS_CONDENSABLES, COLUMNA_LINEAS
+
+PRECALCULO_ACTIVO = os.getenv("PRECOMPUTE_ON_UPLOAD", "true").strip().lower() in ("1", "true", "yes", "si")
+MAX_PRECALCULOS_EN_PARALELO = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))
+# Si hay más trabajos esperando que esto, los nuevos se descartan (se calcularán bajo demanda)
+MAX_PRECALCULOS_EN_COLA = int(os.getenv("PRECOMPUTE_QUEUE_LIMIT", "16"))
+# Historiales de ventas con al menos estas líneas se leen por bloques y se condensan
+# (ver ventas_por_bloques.py) en vez de cargarse completos en memoria
+MIN_LINEAS_VENTAS_POR_BLOQUES = int(os.getenv("CHUNKED_SALES_MIN_ROWS", "1000000"))
+
+SKU_COL = 'SKU / Código de producto'
+FECHA_COL = 'Fecha de venta'
+COMPROBANTE_COL = 'N° de comprobante / boleta'
+CANTIDAD_COL = 'Cantidad vendida'
+PRECIO_VENTA_COL = 'Precio de venta unitario (S/.)'
+
+# Clave: "<contexto>|<file_id>" -> DataFrame tal como lo leen los reportes (pd.read_csv)
+CACHE_DATAFRAMES = CacheTTL(
+    ttl_segundos=30 * 60, max_entradas=64,
+    max_bytes=int(os.getenv("DATAFRAME_CACHE_MB", "512")) * 1024 * 1024
+)
+# Clave: "<contexto>|<ventas_id>" -> DataFrame de agregados por SKU
+CACHE_AGREGADOS_VENTAS = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<ventas_id>|<inventario_id>" -> resultado de generar_auditoria_inventario
+CACHE_AUDITORIAS = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<ventas_id>" -> DataFrame de agregados por (SKU, día)
+CACHE_AGREGADOS_DIARIOS = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<ventas_id>" -> incidencias (comprobante, SKU) para el análisis de canasta
+CACHE_COMPROBANTES = CacheTTL(ttl_segundos=30 * 60, max_entradas=32)
+# Clave: "<contexto>|<ventas_id>" -> índice de claves del historial (ver ventas_incrementales.py)
+CACHE_INDICES_VENTAS = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<ventas_id>|<inventario_id>" -> cubo por Categoría/Subcategoría/Marca (ver cubo_inventario.py)
+CACHE_CUBOS = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<inventario_id>" -> foto por SKU de una carga de inventario (ver historial_inventario.py)
+CACHE_FOTOS_INVENTARIO = CacheTTL(ttl_segundos=30 * 60, max_entradas=64)
+# Clave: "<contexto>|<file_id>" -> registro del archivo en Firestore, para no leerlo dos veces
+# en la misma petición (estimación del planificador y carga)
+CACHE_REGISTROS = CacheTTL(ttl_segundos=60, max_entradas=256)
+# Segundo nivel, en disco y compartido por todos los workers (ver cache_arrow.py): DataFrames
+# con las mismas claves que CACHE_DATAFRAMES, agregados con el prefijo "agregados_sku|" o "agregados_diarios|"
+# y los hechos por SKU del cubo con el prefijo "cubo_hechos|"
+CACHE_DISCO = CacheArrowDisco(
+    DIRECTORIO_CACHE_ARROW,
+    max_bytes=int(os.getenv("ARROW_CACHE_MB", "4096")) * 1024 * 1024,
+    ttl_segundos=float(os.getenv("ARROW_CACHE_TTL_HOURS", "24")) * 3600
+)
+
+
+def clave_contexto(user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str]) -> str:
+    if user_id and workspace_id:
+        return f"u:{user_id}/{workspace_id}"
+    return f"s:{session_id}"
+
+
+# --- MÉTRICAS DE APROVECHAMIENTO ---
+_lock_metricas = threading.Lock()
+_METRICAS = {
+    "programados": 0,
+    "completados": 0,
+    "cancelados": 0,
+    "descartados_por_cola": 0,
+    "descartados_por_planificador": 0,
+    "fallidos": 0,
+    "ms_acumulados": 0.0,
+    # Cuántas entradas precalculadas terminaron siendo leídas por una petición real
+    "dataframes_aprovechados": 0,
+    "auditorias_aprovechadas": 0,
+}
+_claves_precalculadas = {"dataframes": set(), "auditorias": set()}
+_METRICA_DE_USO = {"dataframes": "dataframes_aprovechados", "auditorias": "auditorias_aprovechadas"}
+
+
+def _contar(metrica: str, valor: float = 1):
+    with _lock_metricas:
+        _METRICAS[metrica] += valor
+
+
+def _marcar_precalculada(tipo: str, clave: str):
+    with _lock_metricas:
+        _claves_precalculadas[tipo].add(clave)
+
+
+def _registrar_uso(tipo: str, clave: str):
+    # Solo contamos el primer uso de cada entrada precalculada
+    with _lock_metricas:
+        if clave in _claves_precalculadas[tipo]:
+            _claves_precalculadas[tipo].discard(clave)
+            _METRICAS[_METRICA_DE_USO[tipo]] += 1
+
+
+def metricas_precalculo() -> Dict[str, Any]:
+    with _lock_metricas:
+        metricas = dict(_METRICAS)
+        pendientes_sin_uso = {tipo: len(claves) for tipo, claves in _claves_precalculadas.items()}
+    completados = metricas["completados"]
+    metricas["tasa_aprovechamiento_auditorias"] = round(metricas["auditorias_aprovechadas"] / completados, 3) if completados else None
+    metricas["precalculados_sin_uso_aun"] = pendientes_sin_uso
+    metricas["trabajos_activos"] = len(_trabajos_activos)
+    metricas["caches"] = {
+        "dataframes": CACHE_DATAFRAMES.estadisticas(),
+        "agregados_ventas": CACHE_AGREGADOS_VENTAS.estadisticas(),
+        "auditorias": CACHE_AUDITORIAS.estadisticas(),
+        "agregados_diarios": CACHE_AGREGADOS_DIARIOS.estadisticas(),
+        "indices_ventas": CACHE_INDICES_VENTAS.estadisticas(),
+        "cubos": CACHE_CUBOS.estadisticas(),
+        "fotos_inventario": CACHE_FOTOS_INVENTARIO.estadisticas(),
+        "disco_arrow": CACHE_DISCO.estadisticas(),
+        "registros": CACHE_REGISTROS.estadisticas(),
+    }
+    return metricas
+
+
+# --- CARGA DE DATAFRAMES CON CACHÉ ---
+def _tamano(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _desde_disco(clave: str) -> Optional[pd.DataFrame]:
+    """
+    Busca el DataFrame en la caché Arrow compartida y, si está, lo sube a la caché
+    en memoria. Es de solo lectura (ver CacheArrowDisco.obtener) y queda compartido.
+    """
+    df = CACHE_DISCO.obtener(clave)
+    if df is not None:
+        CACHE_DATAFRAMES.guardar(df, clave=clave, tamano_bytes=_tamano(df))
+    return df
+
+
+async def _guardar_en_caches(clave: str, df: pd.DataFrame, tamano: Optional[int] = None):
+    CACHE_DATAFRAMES.guardar(df, clave=clave, tamano_bytes=_tamano(df) if tamano is None else tamano)
+    await asyncio.to_thread(CACHE_DISCO.guardar, df, clave)
+
+
+def _parsear(contenido: bytes) -> Tuple[pd.DataFrame, int]:
+    df = pd.read_csv(abrir_flujo_descomprimido(contenido))
+    return df, int(df.memory_usage(deep=True).sum())
+
+
+async def _cargar_segmentado(contexto: str, segmentos: list) -> pd.DataFrame:
+    """
+    Arma un historial incremental concatenando sus segmentos. Cada segmento guarda
+    el id del registro que termina en él, así que si el historial anterior sigue
+    en caché solo se descargan y parsean los deltas posteriores.
+    """
+    prefijo, desde = None, 0
+    for i in range(len(segmentos) - 2, -1, -1):
+        clave_prefijo = f"{contexto}|{segmentos[i]['fileId']}"
+        prefijo = CACHE_DATAFRAMES.obtener(clave_prefijo)
+        if prefijo is None:
+            prefijo = await asyncio.to_thread(_desde_disco, clave_prefijo)
+        if prefijo is not None:
+            desde = i + 1
+            break
+
+    partes = [] if prefijo is None else [prefijo]
+    for segmento in segmentos[desde:]:
+        contenido = await asyncio.to_thread(descargar_blob_de_storage, segmento["rutaStorage"])
+        df_segmento, _ = await asyncio.to_thread(_parsear, contenido)
+        partes.append(df_segmento)
+    print(f"🧩 Historial incremental armado con {len(segmentos) - desde} segmento(s) descargados de {len(segmentos)}.")
+    return pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+
+async def _cargar_desde_registro(contexto: str, clave: str, registro: Dict[str, Any]) -> pd.DataFrame:
+    if registro.get("segmentos"):
+        df = await _cargar_segmentado(contexto, registro["segmentos"])
+        await _guardar_en_caches(clave, df)
+        return df
+    print(f"Descargando archivo desde Storage: {registro['rutaStorage']}")
+    contenido = await asyncio.to_thread(descargar_blob_de_storage, registro["rutaStorage"])
+    df, tamano = await asyncio.to_thread(_parsear, contenido)
+    await _guardar_en_caches(clave, df, tamano)
+    return df
+
+
+async def _leer_registro(user_id, workspace_id, session_id, file_id: str) -> Dict[str, Any]:
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{file_id}"
+    registro = CACHE_REGISTROS.obtener(clave)
+    if registro is None:
+        registro = await asyncio.to_thread(obtener_registro_archivo, user_id, workspace_id, session_id, file_id)
+    if not registro or not registro.get("rutaStorage"):
+        raise ValueError(f"No se encontró el registro del archivo con ID '{file_id}' en Firestore.")
+    CACHE_REGISTROS.guardar(registro, clave=clave)
+    return registro
+
+
+async def contar_filas(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    file_id: Optional[str]
+) -> int:
+    """
+    Filas de un archivo para estimar el costo de un reporte (ver planificador_reportes.py):
+    las del DataFrame en caché si ya fue parseado o, si no, las de los metadatos del registro.
+    Un historial que se leerá condensado cuenta como el tope de la lectura por bloques.
+    """
+    if not file_id:
+        return 0
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{file_id}"
+    for clave_cache in (clave, f"{clave}|condensado"):
+        df = CACHE_DATAFRAMES.obtener(clave_cache)
+        if df is not None:
+            return len(df)
+    try:
+        registro = await _leer_registro(user_id, workspace_id, session_id, file_id)
+    except ValueError:
+        return 0 # La carga posterior devolverá el error adecuado
+    metadata = registro.get("metadata") or {}
+    if registro.get("tipoArchivo") == "ventas":
+        return min(int(metadata.get("num_transacciones") or 0), MIN_LINEAS_VENTAS_POR_BLOQUES)
+    return int(metadata.get("num_filas_total") or 0)
+
+
+async def cargar_dataframe(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    file_id: Optional[str],
+    contenido: Optional[bytes] = None
+) -> pd.DataFrame:
+    """
+    Devuelve el DataFrame de un archivo subido, desde la caché si ya fue parseado.
+    El objeto devuelto es compartido: quien lo vaya a modificar debe usar `.copy()`.
+    """
+    if not file_id:
+        return pd.DataFrame()
+
+    contexto = clave_contexto(user_id, workspace_id, session_id)
+    clave = f"{contexto}|{file_id}"
+    df = CACHE_DATAFRAMES.obtener(clave)
+    if df is None:
+        df = await asyncio.to_thread(_desde_disco, clave)
+    if df is not None:
+        _registrar_uso("dataframes", clave)
+        return df
+
+    if contenido is None:
+        registro = await _leer_registro(user_id, workspace_id, session_id, file_id)
+        return await _cargar_desde_registro(contexto, clave, registro)
+    df, tamano = await asyncio.to_thread(_parsear, contenido)
+    await _guardar_en_caches(clave, df, tamano)
+    return df
+
+
+# --- HISTORIALES DE VENTAS GRANDES (LECTURA POR BLOQUES) ---
+def _rutas_de_registro(registro: Dict[str, Any]) -> list:
+    return [s["rutaStorage"] for s in registro["segmentos"]] if registro.get("segmentos") else [registro["rutaStorage"]]
+
+
+def _blobs_de_storage(rutas: list):
+    """Descarga los blobs de uno en uno: solo se tiene en memoria un blob comprimido a la vez."""
+    for ruta in rutas:
+        yield descargar_blob_de_storage(ruta)
+
+
+def _bloques_de_blobs(contenidos, columnas: set):
+    for contenido in contenidos:
+        with abrir_flujo_descomprimido(contenido) as flujo:
+            yield from leer_por_bloques(flujo, columnas=columnas)
+
+
+def _condensar(bloques) -> pd.DataFrame:
+    inicio = perf_counter()
+    df = condensar_bloques(bloques)
+    print(f"🧱 Historial de ventas condensado por bloques: {int(lineas_representadas(df).sum())} líneas -> {len(df)} filas en {(perf_counter() - inicio) * 1000:.0f} ms.")
+    return df
+
+
+def _condensar_blobs(obtener_blobs, previos: list) -> pd.DataFrame:
+    """
+    Condensa los blobs de ventas que entrega `obtener_blobs()`: con DuckDB (ver
+    motor_duckdb.py) si está activo y, si no o si DuckDB falla, por bloques con pandas.
+    """
+    if motor_duckdb.usar_duckdb():
+        condensado = motor_duckdb.condensar_blobs(obtener_blobs())
+        if condensado is not None:
+            return _condensar(itertools.chain(previos, [condensado]))
+    return _condensar(itertools.chain(previos, _bloques_de_blobs(obtener_blobs(), COLUMNAS_CONDENSABLES)))
+
+
+def usa_lectura_por_bloques(registro: Dict[str, Any]) -> bool:
+    lineas = (registro.get("metadata") or {}).get("num_transacciones") or 0
+    return registro.get("tipoArchivo") == "ventas" and lineas >= MIN_LINEAS_VENTAS_POR_BLOQUES
+
+
+async def cargar_ventas(
+    user_id: Optional[str],
+    workspace_id: Optional[str],
+    session_id: Optional[str],
+    file_id: Optional[str],
+    contenido: Optional[bytes] = None
+) -> pd.DataFrame:
+    """
+    Como `cargar_dataframe`, para el historial de ventas que reciben los motores.
+    Si el historial es grande, se devuelve condensado (con la columna COLUMNA_LINEAS)
+    y el pico de memoria queda acotado por el tamaño del bloque, no del archivo.
+    """
+    if not file_id:
+        return pd.DataFrame()
+    contexto = clave_contexto(user_id, workspace_id, session_id)
+    clave = f"{contexto}|{file_id}"
+    for clave_cache in (clave, f"{clave}|condensado"):
+        df = CACHE_DATAFRAMES.obtener(clave_cache)
+        if df is None:
+            df = await asyncio.to_thread(_desde_disco, clave_cache)
+        if df is not None:
+            _registrar_uso("dataframes", clave_cache)
+            return df
+    if contenido is not None:
+        # Recién subido y sin comprimir: contar saltos de línea es barato
+        if detectar_codec(contenido) is not None or contenido.count(b"\n") < MIN_LINEAS_VENTAS_POR_BLOQUES:
+            return await cargar_dataframe(user_id, workspace_id, session_id, file_id, contenido)
+        df = await asyncio.to_thread(_condensar_blobs, lambda: [contenido], [])
+    else:
+        registro = await _leer_registro(user_id, workspace_id, session_id, file_id)
+        if not usa_lectura_por_bloques(registro):
+            return await _cargar_desde_registro(contexto, clave, registro)
+        # En un historial incremental reutilizamos el condensado del historial anterior, si sigue en caché
+        rutas, previos = _rutas_de_registro(registro), []
+        segmentos = registro.get("segmentos") or []
+        for i in range(len(segmentos) - 2, -1, -1):
+            clave_prefijo = f"{contexto}|{segmentos[i]['fileId']}|condensado"
+            prefijo = CACHE_DATAFRAMES.obtener(clave_prefijo)
+            if prefijo is None:
+                prefijo = await asyncio.to_thread(_desde_disco, clave_prefijo)
+            if prefijo is not None:
+                rutas, previos = rutas[i + 1:], [prefijo]
+                break
+        df = await asyncio.to_thread(_condensar_blobs, lambda: _blobs_de_storage(rutas), previos)
+    await _guardar_en_caches(f"{clave}|condensado", df)
+    return df
+
+
+def agregar_ventas_por_sku(df_ventas: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Unidades, ingresos, líneas y primera/última venta por SKU, en una sola pasada."""
+    if df_ventas.empty or SKU_COL not in df_ventas.columns or CANTIDAD_COL not in df_ventas.columns:
+        return None
+    ventas = pd.DataFrame({
+        SKU_COL: df_ventas[SKU_COL].astype(str).str.strip(),
+        "unidades": pd.to_numeric(df_ventas[CANTIDAD_COL], errors='coerce').fillna(0),
+    })
+    if PRECIO_VENTA_COL in df_ventas.columns:
+        ventas["ingresos"] = ventas["unidades"] * pd.to_numeric(df_ventas[PRECIO_VENTA_COL], errors='coerce').fillna(0)
+    if FECHA_COL in df_ventas.columns:
+        ventas["fecha"] = pd.to_datetime(df_ventas[FECHA_COL], format='%d/%m/%Y', errors='coerce')
+
+    ventas["lineas"] = lineas_representadas(df_ventas).to_numpy()
+    agregaciones = {"unidades": ("unidades", "sum"), "lineas": ("lineas", "sum")}
+    if "ingresos" in ventas.columns:
+        agregaciones["ingresos"] = ("ingresos", "sum")
+    if "fecha" in ventas.columns:
+        agregaciones["primera_venta"] = ("fecha", "min")
+        agregaciones["ultima_venta"] = ("fecha", "max")
+    return ventas.groupby(SKU_COL, sort=False).agg(**agregaciones)
+
+
+async def obtener_agregados_ventas(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str], ventas_file_id: str
+) -> Optional[pd.DataFrame]:
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}"
+    agregados = CACHE_AGREGADOS_VENTAS.obtener(clave)
+    if agregados is None:
+        agregados = await asyncio.to_thread(CACHE_DISCO.obtener, f"agregados_sku|{clave}")
+        if agregados is None:
+            df_ventas = await cargar_ventas(user_id, workspace_id, session_id, ventas_file_id)
+            agregados = await asyncio.to_thread(agregar_ventas_por_sku, df_ventas)
+            if agregados is not None:
+                await asyncio.to_thread(CACHE_DISCO.guardar, agregados, f"agregados_sku|{clave}")
+        if agregados is not None:
+            CACHE_AGREGADOS_VENTAS.guardar(agregados, clave=clave)
+    return agregados
+
+
+async def obtener_agregados_diarios(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str], ventas_file_id: str
+) -> pd.DataFrame:
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}"
+    agregados = CACHE_AGREGADOS_DIARIOS.obtener(clave)
+    if agregados is None:
+        agregados = await asyncio.to_thread(CACHE_DISCO.obtener, f"agregados_diarios|{clave}")
+        if agregados is None:
+            df_ventas = await cargar_ventas(user_id, workspace_id, session_id, ventas_file_id)
+            agregados = await asyncio.to_thread(agregar_por_sku_dia, df_ventas)
+            await asyncio.to_thread(CACHE_DISCO.guardar, agregados, f"agregados_diarios|{clave}")
+        CACHE_AGREGADOS_DIARIOS.guardar(agregados, clave=clave)
+    return agregados
+
+
+async def obtener_comprobantes(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str], ventas_file_id: str
+) -> Optional[pd.DataFrame]:
+    """
+    Incidencias (comprobante, SKU) del historial para el análisis de canasta
+    (ver cesta_compras.py). El historial condensado ya no tiene comprobantes, así
+    que en los archivos grandes se leen por bloques solo esas dos columnas.
+    Devuelve None si el archivo no trae el número de comprobante.
+    """
+    if not ventas_file_id:
+        return None
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}"
+    incidencias = CACHE_COMPROBANTES.obtener(clave)
+    if incidencias is not None:
+        return incidencias
+    incidencias = await asyncio.to_thread(CACHE_DISCO.obtener, f"comprobantes|{clave}")
+    if incidencias is None:
+        df_ventas = CACHE_DATAFRAMES.obtener(clave)
+        if df_ventas is None:
+            registro = await _leer_registro(user_id, workspace_id, session_id, ventas_file_id)
+            if usa_lectura_por_bloques(registro):
+                columnas = {COMPROBANTE_COL, SKU_COL}
+                incidencias = await asyncio.to_thread(lambda: incidencias_de_bloques(_bloques_de_blobs(_blobs_de_storage(_rutas_de_registro(registro)), columnas)))
+            else:
+                df_ventas = await cargar_dataframe(user_id, workspace_id, session_id, ventas_file_id)
+        if df_ventas is not None:
+            incidencias = await asyncio.to_thread(incidencias_de_ventas, df_ventas)
+        if incidencias is None:
+            return None
+        await asyncio.to_thread(CACHE_DISCO.guardar, incidencias, f"comprobantes|{clave}")
+    CACHE_COMPROBANTES.guardar(incidencias, clave=clave)
+    return incidencias
+
+
+async def obtener_cubo(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: str, inventario_file_id: str
+) -> Dict[str, Any]:
+    """
+    Cubo de totales por Categoría/Subcategoría/Marca para este par de archivos. Se
+    arma desde los agregados de ventas por SKU (no desde las líneas): tras un delta
+    de ventas, propagar_delta_a_caches ya dejó los agregados combinados y el cubo
+    del nuevo historial cuesta un recorrido por los SKUs del inventario.
+    """
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}|{inventario_file_id}"
+    cubo = CACHE_CUBOS.obtener(clave)
+    if cubo is not None:
+        return cubo
+    hechos = await asyncio.to_thread(CACHE_DISCO.obtener, f"cubo_hechos|{clave}")
+    if hechos is None:
+        agregados, df_inventario = await asyncio.gather(
+            obtener_agregados_ventas(user_id, workspace_id, session_id, ventas_file_id),
+            cargar_dataframe(user_id, workspace_id, session_id, inventario_file_id)
+        )
+        hechos = await asyncio.to_thread(construir_hechos, df_inventario, agregados)
+        await asyncio.to_thread(CACHE_DISCO.guardar, hechos, f"cubo_hechos|{clave}")
+    cubo = await asyncio.to_thread(construir_cubo, hechos)
+    CACHE_CUBOS.guardar(cubo, clave=clave)
+    return cubo
+
+
+async def obtener_foto_inventario(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    inventario_file_id: str
+) -> pd.DataFrame:
+    """
+    Foto por SKU (stock, costo, precio) de una carga de inventario. Las cargas
+    nuevas la guardan en Storage al subirse; para una carga anterior al historial
+    se arma una vez desde su DataFrame.
+    """
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{inventario_file_id}"
+    foto = CACHE_FOTOS_INVENTARIO.obtener(clave)
+    if foto is not None:
+        return foto
+    registro = await _leer_registro(user_id, workspace_id, session_id, inventario_file_id)
+    if registro.get("fotoInventario"):
+        contenido = await asyncio.to_thread(descargar_detalle_auditoria, registro["fotoInventario"])
+        foto = await asyncio.to_thread(deserializar_foto_inventario, contenido)
+    else:
+        df_inventario = await cargar_dataframe(user_id, workspace_id, session_id, inventario_file_id)
+        foto = await asyncio.to_thread(construir_foto_inventario, df_inventario)
+    CACHE_FOTOS_INVENTARIO.guardar(foto, clave=clave)
+    return foto
+
+
+# --- HISTORIAL DE VENTAS INCREMENTAL ---
+async def obtener_indice_ventas(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: str, registro: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Índice de claves (comprobante, SKU, fecha) del historial `ventas_file_id`.
+    Los historiales incrementales lo guardan en Storage; para un archivo subido
+    completo se construye una sola vez a partir de su DataFrame.
+    """
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}"
+    indice = CACHE_INDICES_VENTAS.obtener(clave)
+    if indice is not None:
+        return indice
+    if registro.get("indiceVentas"):
+        contenido = await asyncio.to_thread(descargar_detalle_auditoria, registro["indiceVentas"])
+        indice = deserializar_indice(contenido)
+    else:
+        df_ventas = CACHE_DATAFRAMES.obtener(clave)
+        if df_ventas is not None:
+            indice = await asyncio.to_thread(construir_indice, df_ventas)
+        else:
+            # Solo se necesitan tres columnas: se leen por bloques sin armar el DataFrame completo
+            columnas = {COMPROBANTE_COL, SKU_COL, FECHA_COL}
+            indice = await asyncio.to_thread(lambda: construir_indice_por_bloques(_bloques_de_blobs(_blobs_de_storage(_rutas_de_registro(registro)), columnas)))
+    CACHE_INDICES_VENTAS.guardar(indice, clave=clave)
+    return indice
+
+
+def propagar_delta_a_caches(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    base_file_id: str, nuevo_file_id: str, df_nuevas: pd.DataFrame, indice: Dict[str, Any]
+) -> Dict[str, bool]:
+    """
+    Deja en caché, para el nuevo historial, el índice y los agregados por SKU y por
+    (SKU, día) derivados de los del historial base más el delta. Si los del base
+    no están en caché no se hace nada: se calcularán bajo demanda. Solo se usa la
+    caché en memoria: la de disco se llena cuando otro worker los pida.
+    """
+    contexto = clave_contexto(user_id, workspace_id, session_id)
+    clave_base, clave_nueva = f"{contexto}|{base_file_id}", f"{contexto}|{nuevo_file_id}"
+    CACHE_INDICES_VENTAS.guardar(indice, clave=clave_nueva)
+
+    propagados = {"agregados_sku": False, "agregados_diarios": False}
+    base_sku = CACHE_AGREGADOS_VENTAS.obtener(clave_base)
+    if base_sku is not None:
+        combinados = combinar_agregados_sku(base_sku, df_nuevas, agregar_ventas_por_sku)
+        if combinados is not None:
+            CACHE_AGREGADOS_VENTAS.guardar(combinados, clave=clave_nueva)
+            propagados["agregados_sku"] = True
+    base_diarios = CACHE_AGREGADOS_DIARIOS.obtener(clave_base)
+    if base_diarios is not None:
+        CACHE_AGREGADOS_DIARIOS.guardar(combinar_agregados_diarios(base_diarios, agregar_por_sku_dia(df_nuevas)), clave=clave_nueva)
+        propagados["agregados_diarios"] = True
+    return propagados
+
+
+def obtener_auditoria_precalculada(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: str, inventario_file_id: str
+) -> Optional[Dict[str, Any]]:
+    """Auditoría con parámetros por defecto ya calculada para este par de archivos, si existe."""
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}|{inventario_file_id}"
+    auditoria = CACHE_AUDITORIAS.obtener(clave)
+    if auditoria is not None:
+        _registrar_uso("auditorias", clave)
+    return auditoria
+
+
+def guardar_auditoria_en_cache(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: str, inventario_file_id: str, auditoria: Dict[str, Any]
+) -> str:
+    clave = f"{clave_contexto(user_id, workspace_id, session_id)}|{ventas_file_id}|{inventario_file_id}"
+    return CACHE_AUDITORIAS.guardar(auditoria, clave=clave)
+
+
+# --- PLANIFICADOR DE PRECÁLCULOS ---
+_semaforo_precalculo: Optional[asyncio.Semaphore] = None
+# contexto -> (ventas_id, inventario_id, tarea)
+_trabajos_activos: Dict[str, Tuple[str, str, asyncio.Task]] = {}
+
+
+async def _precalcular(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: str, inventario_file_id: str, contenidos: Dict[str, bytes]
+):
+    global _semaforo_precalculo
+    if _semaforo_precalculo is None:
+        _semaforo_precalculo = asyncio.Semaphore(MAX_PRECALCULOS_EN_PARALELO)
+
+    contexto = clave_contexto(user_id, workspace_id, session_id)
+    try:
+        async with _semaforo_precalculo:
+            inicio = perf_counter()
+            # Las cancelaciones llegan en estos puntos de espera: entre etapas
+            df_ventas = await cargar_ventas(user_id, workspace_id, session_id, ventas_file_id, contenidos.get(ventas_file_id))
+            sufijo_ventas = "|condensado" if COLUMNA_LINEAS in df_ventas.columns else ""
+            _marcar_precalculada("dataframes", f"{contexto}|{ventas_file_id}{sufijo_ventas}")
+            df_inventario = await cargar_dataframe(user_id, workspace_id, session_id, inventario_file_id, contenidos.get(inventario_file_id))
+            _marcar_precalculada("dataframes", f"{contexto}|{inventario_file_id}")
+
+            await obtener_agregados_ventas(user_id, workspace_id, session_id, ventas_file_id)
+            await obtener_cubo(user_id, workspace_id, session_id, ventas_file_id, inventario_file_id)
+
+            if CACHE_AUDITORIAS.obtener(f"{contexto}|{ventas_file_id}|{inventario_file_id}") is None:
+                # La auditoría es lo más pesado: pide turno al planificador como un usuario
+                # gratuito propio, sin ocupar la cola del dueño del workspace
+                memoria_mb = estimar_memoria_mb(len(df_ventas), len(df_inventario), "auditoria")
+                async with PLANIFICADOR.turno(f"precalculo|{contexto}", PLAN_ANONIMO, memoria_mb, "precalculo_auditoria"):
+                    auditoria = await asyncio.to_thread(generar_auditoria_inventario, df_ventas, df_inventario)
+                clave = guardar_auditoria_en_cache(user_id, workspace_id, session_id, ventas_file_id, inventario_file_id, auditoria)
+                _marcar_precalculada("auditorias", clave)
+
+            ms = (perf_counter() - inicio) * 1000
+            _contar("completados")
+            _contar("ms_acumulados", ms)
+            print(f"🔥 Workspace '{contexto}' precalculado en {ms:.0f} ms.")
+    except asyncio.CancelledError:
+        _contar("cancelados")
+        print(f"⏹️ Precálculo de '{contexto}' cancelado: llegó un archivo más nuevo.")
+        raise
+    except HTTPException as e:
+        # Sin memoria o sin turno a tiempo: la auditoría se calculará bajo demanda
+        _contar("descartados_por_planificador")
+        print(f"⏭️ Auditoría precalculada de '{contexto}' descartada por el planificador ({e.status_code}).")
+    except Exception as e:
+        _contar("fallidos")
+        print(f"⚠️ Falló el precálculo de '{contexto}' (se calculará bajo demanda): {e}")
+    finally:
+        trabajo = _trabajos_activos.get(contexto)
+        if trabajo and trabajo[2] is asyncio.current_task():
+            _trabajos_activos.pop(contexto, None)
+
+
+def programar_precalculo(
+    user_id: Optional[str], workspace_id: Optional[str], session_id: Optional[str],
+    ventas_file_id: Optional[str], inventario_file_id: Optional[str],
+    contenidos: Optional[Dict[str, bytes]] = None
+) -> bool:
+    """
+    Agenda el precálculo de un workspace con sus dos archivos actuales. Si ya había
+    uno en curso para otros archivos, se cancela. Devuelve True si se agendó.
+    `contenidos` ({file_id: bytes}) evita volver a descargar lo que se acaba de subir.
+    """
+    if not PRECALCULO_ACTIVO or not ventas_file_id or not inventario_file_id:
+        return False
+
+    contexto = clave_contexto(user_id, workspace_id, session_id)
+    trabajo = _trabajos_activos.get(contexto)
+    if trabajo:
+        if trabajo[0] == ventas_file_id and trabajo[1] == inventario_file_id:
+            return False # Ya está en curso para estos mismos archivos
+        trabajo[2].cancel()
+        _trabajos_activos.pop(contexto, None)
+
+    if len(_trabajos_activos) >= MAX_PRECALCULOS_EN_COLA:
+        _contar("descartados_por_cola")
+        return False
+
+    tarea = asyncio.create_task(
+        _precalcular(user_id, workspace_id, session_id, ventas_file_id, inventario_file_id, contenidos or {})
+    )
+    _trabajos_activos[contexto] = (ventas_file_id, inventario_file_id, tarea)
+    _contar("programados")
+    return True
@@ -0,0 +1,307 @@
+# pronostico_demanda.py
+# ===================================================================================
+# --- PRONÓSTICO DE DEMANDA INTERMITENTE Y ESTACIONAL (VECTORIZADO) ---
+# ===================================================================================
+# Los motores de reposición usan un único PDA_Final armado con dos promedios de
+# ventana. En una ferretería la mayoría de los SKUs se venden de forma intermitente
+# (muchas semanas en cero), y ahí un promedio simple reacciona tarde y mal. Este
+# módulo ajusta, para TODOS los SKUs a la vez, los métodos clásicos de demanda
+# intermitente sobre una matriz SKU x periodo:
+#
+# - SES: suavizado exponencial simple (demanda regular).
+# - Croston: suaviza por separado el tamaño de la demanda y el intervalo entre ventas.
+# - SBA: Croston con la corrección de sesgo de Syntetos-Boylan (1 - alfa/2).
+# - TSB: suaviza la probabilidad de venta en cada periodo (reacciona a la obsolescencia).
+#
+# La estacionalidad se estima como índices multiplicativos por semana del año a
+# nivel de categoría (un SKU intermitente no tiene datos suficientes por sí solo)
+# y solo cuando hay al menos dos años de historia. La serie se desestacionaliza,
+# se pronostica y se vuelve a estacionalizar con los índices del horizonte.
+#
+# Cada método se evalúa con el error cuadrático del pronóstico un paso adelante en
+# los últimos periodos, para varios alfas a la vez, y cada SKU se queda con la
+# combinación de menor error. El único bucle de Python es sobre los periodos
+# (p. ej. 104 semanas): cada paso opera sobre arreglos (alfas x SKUs).
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+FECHA_COL = 'Fecha de venta'
+CANTIDAD_COL = 'Cantidad vendida'
+CATEGORIA_COL = 'Categoría'
+
+DIAS_POR_PERIODO = 7
+PERIODOS_POR_TEMPORADA = 52
+PERIODOS_HISTORIA = 104
+PERIODOS_EVALUACION = 13
+ALFAS = (0.05, 0.1, 0.2, 0.3)
+# Umbrales de Syntetos-Boylan para clasificar el patrón de demanda
+UMBRAL_ADI = 1.32
+UMBRAL_CV2 = 0.49
+
+METODOS = ("SES", "Croston", "SBA", "TSB")
+# Índice = 2 * (ADI alto) + (CV² alto)
+PATRONES = np.array(["Regular", "Errática", "Intermitente", "Irregular"])
+
+
+def matriz_ventas_por_periodo(
+    df_ventas: pd.DataFrame,
+    num_periodos: int = PERIODOS_HISTORIA,
+    dias_por_periodo: int = DIAS_POR_PERIODO,
+    fecha_fin: Optional[pd.Timestamp] = None
+) -> Tuple[pd.Index, np.ndarray, pd.Timestamp]:
+    """
+    Suma las unidades vendidas por SKU y periodo. Los periodos se cuentan hacia atrás
+    desde la última venta (como las ventanas de los motores) y la última columna es
+    el periodo más reciente. Funciona igual con un historial condensado.
+    """
+    fechas = df_ventas[FECHA_COL]
+    if not pd.api.types.is_datetime64_any_dtype(fechas):
+        fechas = pd.to_datetime(fechas, format='%d/%m/%Y', errors='coerce')
+    cantidades = pd.to_numeric(df_ventas[CANTIDAD_COL], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    validas = fechas.notna().to_numpy()
+    if fecha_fin is None:
+        fecha_fin = fechas.max()
+    if pd.isna(fecha_fin):
+        return pd.Index([], name=SKU_COL), np.zeros((0, num_periodos)), fecha_fin
+
+    dias_atras = (fecha_fin.normalize() - fechas.dt.normalize()).dt.days.to_numpy(dtype=np.float64, na_value=np.nan)
+    periodo = np.floor_divide(np.nan_to_num(dias_atras, nan=-1), dias_por_periodo).astype(np.int64)
+    en_rango = validas & (periodo >= 0) & (periodo < num_periodos)
+
+    codigos, skus = pd.factorize(df_ventas[SKU_COL].astype(str).str.strip().to_numpy()[en_rango])
+    columna = num_periodos - 1 - periodo[en_rango]
+    matriz = np.bincount(
+        codigos * num_periodos + columna, weights=cantidades[en_rango], minlength=len(skus) * num_periodos
+    ).reshape(len(skus), num_periodos)
+    # Las devoluciones netas de un periodo no son demanda negativa
+    return pd.Index(skus, name=SKU_COL), np.clip(matriz, 0, None), fecha_fin
+
+
+def _primer_periodo_con_venta(matriz: np.ndarray) -> np.ndarray:
+    con_venta = matriz > 0
+    return np.where(con_venta.any(axis=1), con_venta.argmax(axis=1), matriz.shape[1])
+
+
+def clasificar_patron(matriz: np.ndarray, inicio: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ADI (periodos promedio entre ventas), CV² del tamaño de las ventas y patrón de Syntetos-Boylan."""
+    con_venta = matriz > 0
+    num_ventas = con_venta.sum(axis=1)
+    divisor = np.maximum(num_ventas, 1)
+    adi = np.where(num_ventas > 0, (matriz.shape[1] - inicio) / divisor, np.nan)
+
+    media = matriz.sum(axis=1) / divisor
+    varianza = np.where(con_venta, matriz ** 2, 0.0).sum(axis=1) / divisor - media ** 2
+    cv2 = np.where((num_ventas > 1) & (media > 0), np.clip(varianza, 0, None) / np.maximum(media, 1e-12) ** 2, 0.0)
+    indice = (np.nan_to_num(adi) >= UMBRAL_ADI) * 2 + (cv2 >= UMBRAL_CV2)
+    return adi, cv2, np.where(num_ventas > 0, PATRONES[indice], "Sin ventas")
+
+
+def indices_estacionales(
+    matriz: np.ndarray,
+    grupos: np.ndarray,
+    periodos_por_temporada: int = PERIODOS_POR_TEMPORADA,
+    suavizado: int = 3
+) -> np.ndarray:
+    """
+    Índices multiplicativos por grupo (p. ej. categoría) y posición en la temporada,
+    con la forma (grupos, periodos_por_temporada) y promedio 1. Un grupo con menos de
+    dos temporadas completas de historia, o sin ventas, queda sin estacionalidad (1.0).
+    """
+    num_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+    num_periodos = matriz.shape[1]
+    temporadas = num_periodos // periodos_por_temporada
+    indices = np.ones((num_grupos, periodos_por_temporada))
+    if temporadas < 2 or num_grupos == 0:
+        return indices
+
+    # Sumamos las filas de cada grupo y nos quedamos con las temporadas completas más recientes
+    orden = np.argsort(grupos, kind='stable')
+    presentes, desde = np.unique(grupos[orden], return_index=True)
+    por_grupo = np.zeros((num_grupos, num_periodos))
+    por_grupo[presentes] = np.add.reduceat(matriz[orden], desde, axis=0)
+    desfase = num_periodos - temporadas * periodos_por_temporada
+    por_temporada = por_grupo[:, desfase:].reshape(num_grupos, temporadas, periodos_por_temporada)
+
+    # Ratio de cada periodo contra el promedio de su temporada, promediado entre temporadas con ventas.
+    # Una temporada que empieza antes de la primera venta del grupo no cuenta: sus ceros no son estacionalidad.
+    promedio_temporada = por_temporada.mean(axis=2, keepdims=True)
+    inicio_temporada = desfase + np.arange(temporadas) * periodos_por_temporada
+    completa = inicio_temporada[None, :] >= _primer_periodo_con_venta(por_grupo)[:, None]
+    con_ventas = (promedio_temporada > 0) & completa[:, :, None]
+    ratios = np.where(con_ventas, por_temporada / np.where(con_ventas, promedio_temporada, 1.0), 0.0)
+    temporadas_validas = con_ventas[:, :, 0].sum(axis=1)
+    crudos = ratios.sum(axis=1) / np.maximum(temporadas_validas, 1)[:, None]
+
+    # Media móvil circular para no perseguir el ruido de una semana puntual
+    if suavizado > 1:
+        desplazamientos = range(-(suavizado // 2), suavizado // 2 + 1)
+        crudos = np.mean([np.roll(crudos, d, axis=1) for d in desplazamientos], axis=0)
+    medias = crudos.mean(axis=1, keepdims=True)
+    crudos = crudos / np.where(medias > 0, medias, 1.0)
+    # La columna k de la temporada recortada corresponde a la posición (desfase + k) del calendario
+    crudos = np.roll(crudos, desfase, axis=1)
+    indices[temporadas_validas >= 2] = crudos[temporadas_validas >= 2]
+    return np.clip(indices, 0.2, 5.0)
+
+
+def _inicializar(matriz: np.ndarray, inicio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Tamaño medio de las ventas y ADI de cada SKU, para arrancar los suavizados."""
+    con_venta = matriz > 0
+    num_ventas = con_venta.sum(axis=1)
+    tamano = np.where(num_ventas > 0, matriz.sum(axis=1) / np.maximum(num_ventas, 1), 0.0)
+    intervalo = np.where(num_ventas > 0, (matriz.shape[1] - inicio) / np.maximum(num_ventas, 1), 1.0)
+    return tamano, intervalo
+
+
+def _ajustar(
+    matriz: np.ndarray,
+    inicio: np.ndarray,
+    alfas: Sequence[float],
+    periodos_evaluacion: int
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Recorre los periodos una sola vez y actualiza todos los métodos y alfas a la vez.
+    Devuelve, por método, el pronóstico final (alfas x SKUs) y su error cuadrático
+    medio un paso adelante en los últimos `periodos_evaluacion` periodos.
+    """
+    num_skus, num_periodos = matriz.shape
+    a = np.asarray(alfas, dtype=np.float64)[:, None]
+    tamano_ini, intervalo_ini = _inicializar(matriz, inicio)
+
+    nivel = np.broadcast_to(tamano_ini / intervalo_ini, (len(alfas), num_skus)).copy() # SES
+    tamano = np.broadcast_to(tamano_ini, (len(alfas), num_skus)).copy() # Croston / SBA
+    intervalo = np.broadcast_to(intervalo_ini, (len(alfas), num_skus)).copy()
+    desde_ultima = np.zeros((len(alfas), num_skus))
+    tamano_tsb = tamano.copy() # TSB
+    probabilidad = np.broadcast_to(1.0 / intervalo_ini, (len(alfas), num_skus)).copy()
+    beta = a / 2 # TSB actualiza la probabilidad más despacio que el tamaño
+
+    errores = {metodo: np.zeros((len(alfas), num_skus)) for metodo in METODOS}
+    evaluados = np.zeros(num_skus)
+    inicio_evaluacion = num_periodos - periodos_evaluacion
+
+    for t in range(num_periodos):
+        activo = t >= inicio
+        y = matriz[:, t]
+        if t >= inicio_evaluacion:
+            pronosticos = {
+                "SES": nivel,
+                "Croston": tamano / intervalo,
+                "SBA": (1 - a / 2) * tamano / intervalo,
+                "TSB": probabilidad * tamano_tsb,
+            }
+            for metodo, pronostico in pronosticos.items():
+                errores[metodo] += np.where(activo, (y - pronostico) ** 2, 0.0)
+            evaluados += activo
+
+        hubo_venta = activo & (y > 0)
+        nivel = np.where(activo, nivel + a * (y - nivel), nivel)
+        desde_ultima = desde_ultima + activo
+        tamano = np.where(hubo_venta, tamano + a * (y - tamano), tamano)
+        intervalo = np.where(hubo_venta, intervalo + a * (desde_ultima - intervalo), intervalo)
+        desde_ultima = np.where(hubo_venta, 0.0, desde_ultima)
+        probabilidad = np.where(activo, probabilidad + beta * (hubo_venta - probabilidad), probabilidad)
+        tamano_tsb = np.where(hubo_venta, tamano_tsb + a * (y - tamano_tsb), tamano_tsb)
+
+    finales = {
+        "SES": nivel,
+        "Croston": tamano / intervalo,
+        "SBA": (1 - a / 2) * tamano / intervalo,
+        "TSB": probabilidad * tamano_tsb,
+    }
+    divisor = np.maximum(evaluados, 1)
+    return {metodo: (finales[metodo], errores[metodo] / divisor) for metodo in METODOS}
+
+
+def pronosticar_matriz(
+    matriz: np.ndarray,
+    horizonte_periodos: int = 1,
+    grupos: Optional[np.ndarray] = None,
+    periodos_por_temporada: int = PERIODOS_POR_TEMPORADA,
+    alfas: Sequence[float] = ALFAS,
+    periodos_evaluacion: int = PERIODOS_EVALUACION,
+    metodo: Optional[str] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Pronóstico por periodo (promedio de los próximos `horizonte_periodos`) para cada
+    fila de `matriz`. Con `metodo` se fuerza un método; si no, se elige por SKU.
+    """
+    if metodo is not None and metodo not in METODOS:
+        raise ValueError(f"Método de pronóstico desconocido: '{metodo}'. Opciones: {', '.join(METODOS)}.")
+    num_skus, num_periodos = matriz.shape
+    inicio = _primer_periodo_con_venta(matriz)
+    grupos = np.zeros(num_skus, dtype=np.int64) if grupos is None else grupos
+
+    indices = indices_estacionales(matriz, grupos, periodos_por_temporada)
+    posiciones = np.arange(num_periodos) % periodos_por_temporada
+    indices_sku = indices[grupos] # (SKUs, periodos_por_temporada)
+    desestacionalizada = matriz / indices_sku[:, posiciones]
+
+    ajustes = _ajustar(desestacionalizada, inicio, alfas, min(periodos_evaluacion, num_periodos))
+    candidatos = [m for m in METODOS if metodo is None or m == metodo]
+    pronosticos = np.stack([ajustes[m][0] for m in candidatos]) # (métodos, alfas, SKUs)
+    errores = np.stack([ajustes[m][1] for m in candidatos])
+    planos = errores.reshape(-1, num_skus)
+    mejor = planos.argmin(axis=0)
+    filas = np.arange(num_skus)
+    nivel = pronosticos.reshape(-1, num_skus)[mejor, filas]
+
+    futuras = (num_periodos + np.arange(horizonte_periodos)) % periodos_por_temporada
+    factor_horizonte = indices_sku[:, futuras].mean(axis=1)
+    adi, cv2, patron = clasificar_patron(matriz, inicio)
+    sin_ventas = inicio >= num_periodos
+    return {
+        "pronostico": np.where(sin_ventas, 0.0, np.clip(nivel * factor_horizonte, 0, None)),
+        "metodo": np.where(sin_ventas, "Sin ventas", np.array(candidatos)[mejor // len(alfas)]),
+        "alfa": np.asarray(alfas)[mejor % len(alfas)],
+        "error": np.sqrt(planos[mejor, filas]),
+        "factor_estacional": factor_horizonte,
+        "adi": adi,
+        "cv2": cv2,
+        "patron": patron,
+    }
+
+
+def pronosticar_demanda(
+    df_ventas: pd.DataFrame,
+    df_inventario: Optional[pd.DataFrame] = None,
+    horizonte_dias: float = DIAS_POR_PERIODO,
+    num_periodos: int = PERIODOS_HISTORIA,
+    dias_por_periodo: int = DIAS_POR_PERIODO,
+    metodo: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Pronóstico por SKU para los próximos `horizonte_dias`. Si se pasa el inventario,
+    la estacionalidad se estima por su columna de categoría.
+    Columnas: SKU, Pronostico_Diario, Pronostico_Periodo, Metodo_Pronostico, ...
+    """
+    columnas = [SKU_COL, 'Pronostico_Diario', 'Pronostico_Periodo', 'Metodo_Pronostico', 'Alfa_Pronostico',
+                'Error_Pronostico', 'Factor_Estacional', 'Patron_Demanda', 'ADI', 'CV2']
+    if df_ventas is None or df_ventas.empty or not {SKU_COL, FECHA_COL, CANTIDAD_COL} <= set(df_ventas.columns):
+        return pd.DataFrame(columns=columnas)
+    skus, matriz, _ = matriz_ventas_por_periodo(df_ventas, num_periodos, dias_por_periodo)
+    if matriz.size == 0:
+        return pd.DataFrame(columns=columnas)
+
+    grupos = None
+    if df_inventario is not None and CATEGORIA_COL in df_inventario.columns and SKU_COL in df_inventario.columns:
+        categorias = df_inventario.assign(**{SKU_COL: df_inventario[SKU_COL].astype(str).str.strip()}).drop_duplicates(SKU_COL).set_index(SKU_COL)[CATEGORIA_COL]
+        grupos, _ = pd.factorize(categorias.reindex(skus).fillna('Sin categoría'))
+
+    horizonte_periodos = max(1, int(np.ceil(horizonte_dias / dias_por_periodo)))
+    resultado = pronosticar_matriz(matriz, horizonte_periodos, grupos, metodo=metodo)
+    return pd.DataFrame({
+        SKU_COL: skus,
+        'Pronostico_Diario': resultado["pronostico"] / dias_por_periodo,
+        'Pronostico_Periodo': resultado["pronostico"],
+        'Metodo_Pronostico': resultado["metodo"],
+        'Alfa_Pronostico': resultado["alfa"],
+        'Error_Pronostico': resultado["error"],
+        'Factor_Estacional': resultado["factor_estacional"],
+        'Patron_Demanda': resultado["patron"],
+        'ADI': resultado["adi"],
+        'CV2': resultado["cv2"],
+    })
@@ -15,6 +15,7 @@ REPORTS_CONFIG = {
   "ReporteAuditoriaMargenes": {
       "label": '💸 Auditoría de Desviación de Margen',
       "endpoint": '/auditoria-margenes',
+      "processing_function_name": 'auditar_margenes_de_productos_nuevo',
       "isPro": False, # Es un reporte "Estratega"
       "costo": 5,
       "categoria": "📋 Auditorías de Datos",
@@ -67,7 +68,8 @@ REPORTS_CONFIG = {
               "options": [
                   { "value": "desviacion_negativa", "label": "Desviación Negativa (Venta por debajo del precio de lista)" },
                   { "value": "margen_negativo", "label": "Margen Negativo (Venta por debajo del costo)" },
-                  { "value": "todas_las_desviaciones", "label": "Todas las Desviaciones (Positivas y Negativas)" }
+                  { "value": "todas_las_desviaciones", "label": "Todas las Desviaciones (Positivas y Negativas)" },
+                  { "value": "alza_de_costo", "label": "Alza de Costo sin Ajuste de Precio (desde el inventario anterior)" }
               ]
           },
           {
@@ -99,7 +101,8 @@ REPORTS_CONFIG = {
       "detalle_columns": [
           "SKU / Código de producto", "Nombre del producto", "Categoría", "Subcategoría", "Marca",
           "Precio de compra actual (S/.)", "Precio Venta de Lista (S/.)", "Precio Venta Promedio (S/.)",
-          "Margen Teórico (S/.)", "Margen Real (S/.)", "Desviación de Margen (%)", "Cantidad vendida", "Impacto Financiero Total (S/.)"
+          "Margen Teórico (S/.)", "Margen Real (S/.)", "Desviación de Margen (%)", "Cantidad vendida", "Impacto Financiero Total (S/.)",
+          "Costo Anterior (S/.)", "Variación de Costo (%)", "Precio de Lista Anterior (S/.)", "Alerta de Costo"
       ],
       "preview_details": [
           { "label": "Margen de Lista (Esperado)", "data_key": "Margen Teórico (S/.)", "prefix": "S/ " },
@@ -110,6 +113,7 @@ REPORTS_CONFIG = {
   "ReporteDiagnosticoCatalogo": {
       "label": '🔎 Auditoría de Integridad de Catálogo',
       "endpoint": '/diagnostico-catalogo',
+      "processing_function_name": 'diagnosticar_catalogo',
       "isPro": False, # Es un reporte "Estratega"
       "costo": 5,
       "categoria": "📋 Auditorías de Datos",
@@ -200,6 +204,7 @@ REPORTS_CONFIG = {
   "ReporteAuditoriaCalidadDatos": {
       "label": '🧹 Auditoría de Calidad de Datos',
       "endpoint": '/auditoria-calidad-datos',
+      "processing_function_name": 'auditar_calidad_datos',
       "isPro": False, # Es un reporte "Estratega"
       "costo": 5,
       "categoria": "📋 Auditorías de Datos",
@@ -219,7 +224,7 @@ REPORTS_CONFIG = {
           {
               "title": "Misión: Unificación de Catálogo",
               "periodicity": "Cuándo: Trimestralmente o si sospechas de errores.",
-              "recipe": "Selecciona el criterio 'Nombres de Producto Duplicados'. Esto revela si tienes el mismo item físico registrado con múltiples SKUs. Unificar estos registros es crucial para que tus cálculos de stock y ventas sean correctos."
+              "recipe": "Selecciona el criterio 'Nombres Similares'. Esto revela si tienes el mismo item físico registrado con múltiples SKUs, aunque esté escrito distinto ('TORNILLO 1/2 X 2' y 'Tornillo 1/2x2'). Revisa cada 'Grupo de Duplicados' empezando por el de mayor valor en stock y unifícalo bajo el 'Nombre de Referencia': es crucial para que tus cálculos de stock y ventas sean correctos."
           },
           {
               "title": "Misión: Optimización de la Experiencia Online",
@@ -245,27 +250,31 @@ REPORTS_CONFIG = {
               "type": "multi-select",
               "optionsKey": "criterios_auditoria", # Usaremos una clave estática
               "tooltip_key": "criterios_auditoria",
-              "defaultValue": ["marca_faltante", "categoria_faltante", "precio_compra_cero", "precio_venta_menor_costo", "nombres_duplicados"],
+              "defaultValue": ["marca_faltante", "categoria_faltante", "precio_compra_cero", "precio_venta_menor_costo", "nombres_similares"],
               # Opciones estáticas, ya que no dependen de los datos del usuario
               "static_options": [
                   { "value": "marca_faltante", "label": "Marca Faltante" },
                   { "value": "categoria_faltante", "label": "Categoría Faltante" },
                   { "value": "precio_compra_cero", "label": "Precio de Compra en Cero" },
                   { "value": "precio_venta_menor_costo", "label": "Precio de Venta menor al Costo" },
-                  { "value": "nombres_duplicados", "label": "Nombres de Producto Duplicados" }
+                  { "value": "nombres_duplicados", "label": "Nombres de Producto Duplicados" },
+                  { "value": "nombres_similares", "label": "Nombres Similares (Posibles Duplicados)" }
               ]
           },
           { "name": "incluir_solo_categorias", "label": "Filtrar por Categorías", "type": "multi-select", "optionsKey": "categorias", "defaultValue": [], "tooltip_key": "filtro_categorias" },
           { "name": "incluir_solo_marcas", "label": "Filtrar por Marcas", "type": "multi-select", "optionsKey": "marcas", "defaultValue": [], "tooltip_key": "filtro_marcas" }
       ],
-      "advanced_parameters": [],
+      "advanced_parameters": [
+          { "name": 'umbral_similitud_nombres', "label": 'Similitud Mínima entre Nombres (0.5-1.0)', "type": 'number', "tooltip_key": "umbral_similitud_nombres", "defaultValue": 0.7, "min": 0.5, "max": 1, "step": 0.05 }
+      ],
       "accionable_columns": [
           "SKU / Código de producto", "Nombre del producto", "Problema Detectado",
           "Stock Actual (Unds)", "Valor stock (S/.)"
       ],
       "detalle_columns": [
         "SKU / Código de producto", "Nombre del producto", "Categoría", "Subcategoría", "Marca",
-        "Stock Actual (Unds)", "Valor stock (S/.)", "Problema Detectado"
+        "Stock Actual (Unds)", "Valor stock (S/.)", "Problema Detectado",
+        "Grupo de Duplicados", "Nombre de Referencia"
       ],
       "preview_details": [
           { "label": "Problema Detectado", "data_key": "Problema Detectado" },
@@ -476,6 +485,7 @@ REPORTS_CONFIG = {
   "ReporteMaestro": {
     "label": "⭐ Reporte Maestro de Inventario",
     "endpoint": "/reporte-maestro-inventario",
+    "processing_function_name": 'generar_reporte_maestro_inventario',
     # "key": 'ReporteMaestro',
     "categoria": "🧠 Análisis Estratégico",
     "isPro": False,
@@ -705,6 +715,7 @@ REPORTS_CONFIG = {
   "ReportePuntosAlertaStock": {
     "label": '⚙️ Parámetros de Reposición para POS',
     "endpoint": '/reporte-puntos-alerta-stock',
+    "processing_function_name": 'process_csv_puntos_alerta_stock',
     # "key": 'ReportePuntosAlertaStock',
     "categoria": "📦 Planificación de Compras Estratégicas",
     "isPro": False,
@@ -783,7 +794,16 @@ REPORTS_CONFIG = {
         "defaultValue": 1.5,
         "step": 0.1,
         "tooltip_key": "factor_importancia"
-      }
+      },
+      { "name": 'metodo_stock_seguridad', "label": 'Cálculo del Stock de Seguridad', "type": 'select', "tooltip_key": "metodo_stock_seguridad",
+        "options": [
+          { "value": 'dias', "label": 'Días de seguridad (clásico)' },
+          { "value": 'variabilidad', "label": 'Nivel de servicio según la variabilidad de la demanda' }
+        ],
+        "defaultValue": 'dias'
+      },
+      { "name": 'nivel_servicio', "label": 'Nivel de Servicio Objetivo (0.50-0.99)', "type": 'number', "tooltip_key": "nivel_servicio", "defaultValue": 0.95, "min": 0.5, "max": 0.99, "step": 0.01 },
+      { "name": 'coef_variacion_lead_time', "label": 'Variabilidad del Tiempo de Entrega (0.0-1.0)', "type": 'number', "tooltip_key": "coef_variacion_lead_time", "defaultValue": 0.25, "min": 0, "max": 1, "step": 0.05 }
     ],
     "accionable_columns": [
         "SKU / Código de producto", "Nombre del producto", "Cantidad en stock actual",
@@ -799,6 +819,7 @@ REPORTS_CONFIG = {
   "ReportePlanDeCompra": {
     "label": '📋 Plan de Compra Sugerido',
     "endpoint": '/lista-basica-reposicion-historico',
+    "processing_function_name": 'process_csv_plan_compra_sugerido',
     # "key": 'ReportePlanDeCompra',
     "categoria": "📦 Planificación de Compras Estratégicas",
     "isPro": False,
@@ -905,6 +926,29 @@ REPORTS_CONFIG = {
       { "name": 'lead_time_dias', "label": 'Tiempo de Entrega del Proveedor en Días', "type": 'number', "tooltip_key": "lead_time_dias", "defaultValue": 7, "min": 0 },
       { "name": 'dias_cobertura_ideal_base', "label": 'Días de Cobertura Ideal Base', "type": 'number', "tooltip_key": "dias_cobertura_ideal_base", "defaultValue": 10, "min": 3 },
       { "name": 'peso_ventas_historicas', "label": 'Peso Ventas Históricas (0.0-1.0)', "type": 'number', "tooltip_key": "peso_ventas_historicas", "defaultValue": 0.6, "min": 0, "max": 1, "step": 0.1 },
+      { "name": 'fuente_demanda', "label": 'Fuente de la Demanda Diaria', "type": 'select', "tooltip_key": "fuente_demanda",
+        "options": [
+          { "value": 'promedios', "label": 'Promedios de ventas (clásico)' },
+          { "value": 'pronostico', "label": 'Pronóstico por producto (Croston/SBA/TSB + temporada)' }
+        ],
+        "defaultValue": 'promedios'
+      },
+      { "name": 'metodo_stock_seguridad', "label": 'Cálculo del Stock de Seguridad', "type": 'select', "tooltip_key": "metodo_stock_seguridad",
+        "options": [
+          { "value": 'dias', "label": 'Días de seguridad (clásico)' },
+          { "value": 'variabilidad', "label": 'Nivel de servicio según la variabilidad de la demanda' }
+        ],
+        "defaultValue": 'dias'
+      },
+      { "name": 'nivel_servicio', "label": 'Nivel de Servicio Objetivo (0.50-0.99)', "type": 'number', "tooltip_key": "nivel_servicio", "defaultValue": 0.95, "min": 0.5, "max": 0.99, "step": 0.01 },
+      { "name": 'coef_variacion_lead_time', "label": 'Variabilidad del Tiempo de Entrega (0.0-1.0)', "type": 'number', "tooltip_key": "coef_variacion_lead_time", "defaultValue": 0.25, "min": 0, "max": 1, "step": 0.05 },
+      { "name": 'incluir_comprados_juntos', "label": '¿Mostrar productos que se compran juntos?', "type": 'boolean_select', "tooltip_key": "incluir_comprados_juntos",
+        "options": [
+          { "value": 'true', "label": 'Sí, agregar la columna' },
+          { "value": 'false', "label": 'No' }
+        ],
+        "defaultValue": 'false'
+      },
       {
           "name": 'score_ventas',
           "label": 'Peso de Ventas (Popularidad)',
@@ -939,13 +983,365 @@ REPORTS_CONFIG = {
       }
     ]
   },
-  "ReporteListaSugeridaParaAlcanzarMontoMinimo": { "label": '🎯 Optimizador de Pedido por Línea', "endpoint": '/rotacion', "categoria": "📦 Planificación de Compras Estratégicas", "isPro": True, "costo": 10, "basic_parameters": [] },
+  "ReporteListaSugeridaParaAlcanzarMontoMinimo": {
+    "label": '🎯 Optimizador de Pedido por Línea',
+    "endpoint": '/optimizador-pedido-minimo',
+    "processing_function_name": 'process_csv_optimizador_pedido_minimo',
+    "categoria": "📦 Planificación de Compras Estratégicas",
+    "isPro": True,
+    "costo": 10,
+    "description": "Si tu proveedor solo despacha desde un monto mínimo, este reporte completa el pedido de cada marca con los productos que más te conviene adelantar, sin pasarte del mínimo más de lo necesario.",
+    "how_it_works": "Parte del Plan de Compra Sugerido y suma el pedido de cada marca. Para las marcas que no llegan al mínimo, elige unidades extra entre sus productos con rotación, dando prioridad a los más urgentes e importantes, hasta quedar entre el mínimo y el exceso que aceptas.",
+    "planes_de_accion": [
+        {
+            "title": "Misión: Cerrar el Pedido al Proveedor",
+            "periodicity": "Cuándo: Antes de enviar cada orden de compra",
+            "recipe": "Ejecuta el reporte con el monto mínimo de tu proveedor y filtra por su marca. La columna 'Pedido Final (Unds)' ya es tu orden: las 'Unidades Extra' son lo que se agregó para llegar al mínimo."
+        },
+        {
+            "title": "Misión: Decidir si Conviene Esperar",
+            "periodicity": "Cuándo: Cuando una marca aparece como 'No alcanzable'",
+            "recipe": "Si la marca no llega al mínimo ni con todos sus productos con rotación, no fuerces la compra: junta el pedido con el de la próxima semana o pide al proveedor un despacho consolidado."
+        }
+    ],
+    "accionable_columns": [
+        "Marca", "SKU / Código de producto", "Nombre del producto",
+        "Pedido Base (Unds)", "Unidades Extra (Unds)", "Pedido Final (Unds)"
+    ],
+    "preview_details": [
+        { "label": "Pedido Base", "data_key": "Pedido Base (Unds)", "suffix": " Unds" },
+        { "label": "Extra", "data_key": "Unidades Extra (Unds)", "suffix": " Unds" },
+        { "label": "Total Marca", "data_key": "Monto Final de la Marca (S/.)", "prefix": "S/ " },
+        { "label": "Estado", "data_key": "Estado de la Marca" }
+    ],
+    "basic_parameters": [
+      { "name": 'monto_minimo_por_marca', "label": 'Monto Mínimo de Pedido por Marca (S/.)', "type": 'number', "tooltip_key": "monto_minimo_por_marca", "defaultValue": 500, "min": 0, "step": 50 },
+      { "name": 'tolerancia_exceso_pct', "label": 'Exceso Aceptado sobre el Mínimo (%)', "type": 'number', "tooltip_key": "tolerancia_exceso_pct", "defaultValue": 10, "min": 0, "max": 100 },
+      { "name": "incluir_solo_marcas", "label": "Filtrar por Marcas", "type": "multi-select", "optionsKey": "marcas", "defaultValue": [], "tooltip_key": "filtro_marcas" }
+    ],
+    "advanced_parameters": [
+      { "name": 'base_pedido', "label": 'Pedido de Partida', "type": 'select', "tooltip_key": "base_pedido",
+        "options": [
+          { "value": 'minimo', "label": 'Pedido Mínimo Sugerido' },
+          { "value": 'ideal', "label": 'Pedido Ideal Sugerido' }
+        ],
+        "defaultValue": 'minimo'
+      },
+      { "name": 'dias_cobertura_extra', "label": 'Días de Venta Adicionales Permitidos', "type": 'number', "tooltip_key": "dias_cobertura_extra", "defaultValue": 15, "min": 0, "max": 90 },
+      { "name": 'lead_time_dias', "label": 'Tiempo de Entrega del Proveedor en Días', "type": 'number', "tooltip_key": "lead_time_dias", "defaultValue": 7, "min": 0 }
+    ]
+  },
+  "ReporteProductosCompradosJuntos": {
+    "label": '🛒 Productos que se Compran Juntos',
+    "endpoint": '/productos-comprados-juntos',
+    "processing_function_name": 'process_csv_comprados_juntos',
+    "categoria": "📦 Planificación de Compras Estratégicas",
+    "isPro": True,
+    "costo": 10,
+    # El motor recibe las incidencias (comprobante, SKU) en `df_comprobantes` (ver cesta_compras.py)
+    "usa_comprobantes": True,
+    "description": "Descubre qué productos salen juntos en la misma boleta. Si se te acaba uno, pierdes también la venta del otro: úsalo para armar exhibiciones, combos y para no reponer uno sin el otro.",
+    "how_it_works": "Usamos el N° de comprobante de tu archivo de ventas para ver qué productos comparten boleta. Para cada producto mostramos sus compañeros más fuertes: en cuántas boletas aparecen juntos, qué porcentaje de quienes compran uno llevan el otro (confianza) y cuántas veces más de lo esperado por azar se compran juntos (lift).",
+    "planes_de_accion": [
+        {
+            "title": "Misión: Reponer en Pareja",
+            "periodicity": "Cuándo: Al preparar cada pedido",
+            "recipe": "Filtra por los productos de tu pedido y revisa la columna 'Stock Relacionado (Unds)'. Si el compañero está bajo, agrégalo al mismo pedido: sin él, también se frena la venta del principal."
+        },
+        {
+            "title": "Misión: Armar Exhibiciones y Combos",
+            "periodicity": "Cuándo: Una vez al mes",
+            "recipe": "Ordena por 'Lift' y toma las parejas con más de 10 comprobantes juntos. Ubícalas cerca en el mostrador o arma un combo con un pequeño descuento."
+        }
+    ],
+    "accionable_columns": [
+        "SKU / Código de producto", "Nombre del producto", "Producto Relacionado",
+        "Stock Relacionado (Unds)", "Confianza (%)", "Lift"
+    ],
+    "preview_details": [
+        { "label": "Se compra con", "data_key": "Producto Relacionado" },
+        { "label": "Confianza", "data_key": "Confianza (%)", "suffix": "%" },
+        { "label": "Lift", "data_key": "Lift" }
+    ],
+    "basic_parameters": [
+      { "name": 'ordenar_por', "label": 'Ordenar Compañeros por', "type": 'select', "tooltip_key": "ordenar_por_canasta",
+        "options": [
+          { "value": 'lift', "label": 'Fuerza de la asociación (Lift)' },
+          { "value": 'confianza', "label": 'Confianza (% de boletas)' },
+          { "value": 'frecuencia', "label": 'Boletas en común' }
+        ],
+        "defaultValue": 'lift'
+      },
+      { "name": "incluir_solo_categorias", "label": "Filtrar por Categorías", "type": "multi-select", "optionsKey": "categorias", "defaultValue": [], "tooltip_key": "filtro_categorias" },
+      { "name": "incluir_solo_marcas", "label": "Filtrar por Marcas", "type": "multi-select", "optionsKey": "marcas", "defaultValue": [], "tooltip_key": "filtro_marcas" }
+    ],
+    "advanced_parameters": [
+      { "name": 'top_k', "label": 'Compañeros a Mostrar por Producto', "type": 'number', "tooltip_key": "top_k_comprados_juntos", "defaultValue": 5, "min": 1, "max": 20 },
+      { "name": 'min_comprobantes_juntos', "label": 'Mínimo de Boletas en Común', "type": 'number', "tooltip_key": "min_comprobantes_juntos", "defaultValue": 3, "min": 2 },
+      { "name": 'min_lift', "label": 'Lift Mínimo', "type": 'number', "tooltip_key": "min_lift", "defaultValue": 1.0, "min": 0, "step": 0.1 }
+    ]
+  },
   "ReportePedidoOptimizadoPorMarcas": { "label": '💎 Descubridor de Productos Estrella', "endpoint": '/rotacion', "categoria": "📦 Planificación de Compras Estratégicas", "isPro": True, "costo": 10, "basic_parameters": [] },
-  "ReporteReposicionInteligentePorCategoria": { "label": '🗓️ Pronóstico de Demanda Estacional', "endpoint": '/rotacion', "categoria": "📦 Planificación de Compras Estratégicas", "isPro": True, "costo": 10, "basic_parameters": [] },
+  "ReporteReposicionInteligentePorCategoria": {
+    "label": '🗓️ Pronóstico de Demanda Estacional',
+    "endpoint": '/pronostico-demanda',
+    "processing_function_name": 'process_csv_pronostico_demanda',
+    "categoria": "📦 Planificación de Compras Estratégicas",
+    "isPro": True,
+    "costo": 10,
+    "description": "Pronostica cuántas unidades venderás de cada producto en las próximas semanas, incluso de los que se venden de forma esporádica, y te avisa cuáles no alcanzarán con tu stock actual.",
+    "how_it_works": "Para cada producto se prueban varios métodos de pronóstico (SES, Croston, SBA y TSB) sobre sus ventas semanales y se elige el que tuvo menor error en las últimas semanas. Si tienes dos años de historia, el pronóstico se ajusta además por la temporada de la categoría.",
+    "planes_de_accion": [
+        {
+            "title": "Misión: Preparar la Temporada",
+            "periodicity": "Cuándo: Un mes antes de una temporada alta de tu negocio",
+            "recipe": "Ejecuta el reporte ordenando por \"Estacionalidad\". Los productos con 'Factor Estacional' mayor a 1 se venderán más que su promedio en las próximas semanas: revisa su faltante antes que el resto."
+        },
+        {
+            "title": "Misión: Compra de Productos Esporádicos",
+            "periodicity": "Cuándo: Al planificar el pedido mensual",
+            "recipe": "Revisa la columna 'Patrón de Demanda'. Para los productos Intermitentes o Irregulares, el pronóstico semanal es una expectativa, no un mínimo: compra el faltante solo si su importancia lo justifica."
+        }
+    ],
+    "accionable_columns": [
+        "SKU / Código de producto", "Nombre del producto", "Stock Actual (Unds)",
+        "Pronóstico Semanal (Unds)", "Faltante para el Horizonte (Unds)"
+    ],
+    "preview_details": [
+        { "label": "Stock Actual", "data_key": "Stock Actual (Unds)", "suffix": " Unds" },
+        { "label": "Pronóstico Semanal", "data_key": "Pronóstico Semanal (Unds)", "suffix": " Unds" },
+        { "label": "Patrón", "data_key": "Patrón de Demanda" },
+        { "label": "Cobertura", "data_key": "Cobertura Actual (Semanas)", "suffix": " sem." }
+    ],
+    "basic_parameters": [
+      { "name": 'horizonte_semanas', "label": 'Semanas a Pronosticar', "type": 'number', "tooltip_key": "horizonte_semanas", "defaultValue": 4, "min": 1, "max": 26 },
+      { "name": 'ordenar_por', "label": 'Ordenar reporte por', "type": 'select', "tooltip_key": "ordenar_pronostico_por",
+        "options": [
+          { "value": 'demanda_pronosticada', "label": 'Mayor Demanda Pronosticada' },
+          { "value": 'faltante', "label": 'Mayor Faltante para el Horizonte' },
+          { "value": 'cobertura', "label": 'Menor Cobertura Actual' },
+          { "value": 'estacionalidad', "label": 'Mayor Alza por Temporada' }
+        ],
+        "defaultValue": 'faltante'
+      },
+      { "name": 'incluir_solo_categorias', "label": 'Filtrar por Categorías', "type": 'multi-select', "tooltip_key": "incluir_solo_categorias", "optionsKey": 'categorias', "defaultValue": [] },
+      { "name": 'incluir_solo_marcas', "label": 'Filtrar por Marcas', "type": 'multi-select', "tooltip_key": "incluir_solo_marcas", "optionsKey": 'marcas', "defaultValue": [] }
+    ],
+    "advanced_parameters": [
+      { "name": 'semanas_historia', "label": 'Semanas de Historia a Usar', "type": 'number', "tooltip_key": "semanas_historia", "defaultValue": 104, "min": 8, "max": 260 },
+      { "name": 'metodo_pronostico', "label": 'Método de Pronóstico', "type": 'select', "tooltip_key": "metodo_pronostico",
+        "options": [
+          { "value": '', "label": 'Automático (Recomendado)' },
+          { "value": 'SES', "label": 'SES (ventas regulares)' },
+          { "value": 'Croston', "label": 'Croston' },
+          { "value": 'SBA', "label": 'SBA (Croston corregido)' },
+          { "value": 'TSB', "label": 'TSB (productos en declive)' }
+        ],
+        "defaultValue": ''
+      },
+      { "name": 'excluir_sin_ventas', "label": '¿Excluir productos con CERO ventas?', "type": 'boolean_select', "tooltip_key": "excluir_sin_ventas",
+        "options": [
+          { "value": 'true', "label": 'Sí, excluir (Recomendado)' },
+          { "value": 'false', "label": 'No, incluirlos' }
+        ],
+        "defaultValue": 'true'
+      }
+    ]
+  },
   "ReporteSugerenciaCompinadaPorZona": { "label": '🗺 Radar de Mercado Local', "endpoint": '/rotacion', "categoria": "📦 Planificación de Compras Estratégicas", "isPro": True, "costo": 10, "basic_parameters": [] },
   
 
   # "📊 Simulación y ROI de Compra"
+  "ReporteBacktestPoliticaReposicion": {
+    "label": '🔁 Simulador de Política de Reposición',
+    "endpoint": '/backtest-politica-reposicion',
+    "processing_function_name": 'process_csv_backtest_politica_reposicion',
+    "categoria": "📊 Simulación y ROI de Compra",
+    "isPro": True,
+    "costo": 10,
+    "description": "Comprueba, con tus ventas reales del último año, si tus parámetros de reposición (tiempo de entrega, días de cobertura y de seguridad) habrían evitado quedarte sin stock, y cuánto inventario habrías necesitado para lograrlo.",
+    "how_it_works": "Se re-juega día por día la venta de cada producto: cada semana se recalculan el Punto de Alerta y el Stock Ideal solo con las ventas conocidas hasta ese día, y cuando el stock (más lo pedido) cae al Punto de Alerta se pide hasta el Stock Ideal, que llega según el tiempo de entrega. Se mide cuánta demanda se habría atendido, los días sin stock y el inventario promedio.",
+    "planes_de_accion": [
+        {
+            "title": "Misión: Calibrar el Stock de Seguridad",
+            "periodicity": "Cuándo: Antes de cambiar los parámetros de los Puntos de Alerta o del Plan de Compra",
+            "recipe": "Ejecuta el simulador con tus parámetros actuales y anota el 'Fill Rate Simulado' y el 'Inventario Promedio'. Vuelve a ejecutarlo subiendo los días de seguridad (o cambiando a 'Nivel de servicio'): quédate con la combinación que alcanza tu meta de servicio con menos inventario."
+        },
+        {
+            "title": "Misión: Productos que Siempre se Quiebran",
+            "periodicity": "Cuándo: Mensualmente",
+            "recipe": "Ordena por \"Menor Fill Rate\". Los productos de la parte superior se quiebran incluso siguiendo la política: revisa si su venta es muy irregular o si el proveedor demora más de lo que indicas."
+        }
+    ],
+    "accionable_columns": [
+        "SKU / Código de producto", "Nombre del producto", "Fill Rate (%)",
+        "Días con Quiebre", "Inventario Promedio (S/.)"
+    ],
+    "preview_details": [
+        { "label": "Fill Rate", "data_key": "Fill Rate (%)", "suffix": "%" },
+        { "label": "Días con Quiebre", "data_key": "Días con Quiebre" },
+        { "label": "Inventario Promedio", "data_key": "Inventario Promedio (S/.)", "prefix": "S/ " },
+        { "label": "Venta Perdida", "data_key": "Venta Perdida a Costo (S/.)", "prefix": "S/ " }
+    ],
+    "basic_parameters": [
+      { "name": 'lead_time_dias', "label": 'Tiempo de Entrega del Proveedor en Días', "type": 'number', "tooltip_key": "lead_time_dias", "defaultValue": 7, "min": 0 },
+      { "name": 'dias_cobertura_ideal_base', "label": 'Días de Cobertura Ideal Base', "type": 'number', "tooltip_key": "dias_cobertura_ideal_base", "defaultValue": 10, "min": 1 },
+      { "name": 'dias_seguridad_base', "label": 'Días de Seguridad Base', "type": 'number', "tooltip_key": "dias_seguridad_base", "defaultValue": 0, "min": 0 },
+      { "name": 'ordenar_por', "label": 'Ordenar reporte por', "type": 'select', "tooltip_key": "ordenar_backtest_por",
+        "options": [
+          { "value": 'fill_rate', "label": 'Menor Fill Rate' },
+          { "value": 'dias_quiebre', "label": 'Más Días con Quiebre' },
+          { "value": 'venta_perdida', "label": 'Mayor Venta Perdida' },
+          { "value": 'inventario', "label": 'Mayor Inventario Promedio' }
+        ],
+        "defaultValue": 'fill_rate'
+      },
+      { "name": 'incluir_solo_categorias', "label": 'Filtrar por Categorías', "type": 'multi-select', "tooltip_key": "incluir_solo_categorias", "optionsKey": 'categorias', "defaultValue": [] },
+      { "name": 'incluir_solo_marcas', "label": 'Filtrar por Marcas', "type": 'multi-select', "tooltip_key": "incluir_solo_marcas", "optionsKey": 'marcas', "defaultValue": [] }
+    ],
+    "advanced_parameters": [
+      { "name": 'dias_simulacion', "label": 'Días a Simular', "type": 'number', "tooltip_key": "dias_simulacion", "defaultValue": 365, "min": 28, "max": 730 },
+      { "name": 'peso_ventas_historicas', "label": 'Peso Ventas Históricas (0.0-1.0)', "type": 'number', "tooltip_key": "peso_ventas_historicas", "defaultValue": 0.6, "min": 0, "max": 1, "step": 0.1 },
+      { "name": 'dias_analisis_ventas_recientes', "label": 'Período de Análisis Reciente (días)', "type": 'number', "tooltip_key": "dias_analisis_ventas_recientes", "defaultValue": 30, "min": 7 },
+      { "name": 'dias_analisis_ventas_general', "label": 'Período de Análisis General (días)', "type": 'number', "tooltip_key": "dias_analisis_ventas_general", "defaultValue": 90, "min": 30 },
+      { "name": 'metodo_stock_seguridad', "label": 'Cálculo del Stock de Seguridad', "type": 'select', "tooltip_key": "metodo_stock_seguridad",
+        "options": [
+          { "value": 'dias', "label": 'Días de seguridad (clásico)' },
+          { "value": 'variabilidad', "label": 'Nivel de servicio según la variabilidad de la demanda' }
+        ],
+        "defaultValue": 'dias'
+      },
+      { "name": 'nivel_servicio', "label": 'Nivel de Servicio Objetivo (0.50-0.99)', "type": 'number', "tooltip_key": "nivel_servicio", "defaultValue": 0.95, "min": 0.5, "max": 0.99, "step": 0.01 },
+      { "name": 'coef_variacion_lead_time', "label": 'Variabilidad del Tiempo de Entrega (0.0-1.0)', "type": 'number', "tooltip_key": "coef_variacion_lead_time", "defaultValue": 0.25, "min": 0, "max": 1, "step": 0.05 },
+      { "name": 'dias_entre_recalculos', "label": 'Recalcular la Política Cada (días)', "type": 'number', "tooltip_key": "dias_entre_recalculos", "defaultValue": 7, "min": 1, "max": 30 },
+      { "name": 'excluir_sin_ventas', "label": '¿Excluir productos con CERO ventas?', "type": 'boolean_select', "tooltip_key": "excluir_sin_ventas",
+        "options": [
+          { "value": 'true', "label": 'Sí, excluir (Recomendado)' },
+          { "value": 'false', "label": 'No, incluirlos' }
+        ],
+        "defaultValue": 'true'
+      }
+    ]
+  },
+  "ReportePlanDeCompraEscenarios": {
+    "label": '🧮 Simulador de Escenarios del Plan de Compra',
+    "endpoint": '/plan-compra-escenarios',
+    "processing_function_name": 'process_csv_plan_compra_escenarios',
+    "categoria": "📊 Simulación y ROI de Compra",
+    "isPro": True,
+    "costo": 10,
+    "description": "Compara en una sola tabla cuánto tendrías que invertir, cuántos productos reponer y cuántos quedarían en alerta con distintas estrategias de compra (días de cobertura, tiempo de entrega, días de seguridad, peso de las ventas históricas), sin generar el Plan de Compra una vez por cada combinación.",
+    "how_it_works": "Las ventas de cada producto se resumen una sola vez y luego se aplican las mismas fórmulas del Plan de Compra a todas las combinaciones de valores que elijas a la vez. Cada fila de la tabla es un escenario con sus KPIs: inversión, SKUs y unidades a pedir, margen potencial y productos bajo el punto de alerta.",
+    "planes_de_accion": [
+        {
+            "title": "Misión: Ajustar la Estrategia a tu Presupuesto",
+            "periodicity": "Cuándo: Antes de cada ciclo de compras",
+            "recipe": "Elige varios 'Días de Cobertura' y 'Tiempos de Entrega' y ordena por \"Mayor Inversión\". Busca la combinación más alta cuya inversión entre en tu presupuesto y úsala como estrategia en el Plan de Compra."
+        },
+        {
+            "title": "Misión: Cuánto Cuesta la Seguridad",
+            "periodicity": "Cuándo: Al definir el stock de seguridad",
+            "recipe": "Compara escenarios con distintos 'Días de Seguridad' (o niveles de servicio). La diferencia de inversión entre dos filas es lo que pagas por tener menos productos en 'Alerta Crítica'."
+        }
+    ],
+    "accionable_columns": [
+        "Días de Cobertura Ideal", "Lead Time (Días)", "Inversión Total Sugerida (S/.)",
+        "SKUs a Reponer", "SKUs en Alerta Crítica"
+    ],
+    "preview_details": [
+        { "label": "Inversión", "data_key": "Inversión Total Sugerida (S/.)", "prefix": "S/ " },
+        { "label": "SKUs a Reponer", "data_key": "SKUs a Reponer" },
+        { "label": "Unidades", "data_key": "Unidades Totales a Pedir" },
+        { "label": "En Alerta Crítica", "data_key": "SKUs en Alerta Crítica" }
+    ],
+    "basic_parameters": [
+      { "name": 'valores_dias_cobertura_ideal_base', "label": 'Días de Cobertura Ideal a Comparar', "type": 'multi-select', "tooltip_key": "valores_escenario", "defaultValue": ["5", "10", "15"],
+        "static_options": [
+            { "value": "3", "label": "3 días" },
+            { "value": "5", "label": "5 días" },
+            { "value": "7", "label": "7 días" },
+            { "value": "10", "label": "10 días" },
+            { "value": "15", "label": "15 días" },
+            { "value": "20", "label": "20 días" },
+            { "value": "30", "label": "30 días" },
+            { "value": "45", "label": "45 días" },
+            { "value": "60", "label": "60 días" }
+        ]
+      },
+      { "name": 'valores_lead_time_dias', "label": 'Tiempos de Entrega a Comparar', "type": 'multi-select', "tooltip_key": "valores_escenario", "defaultValue": ["3", "7"],
+        "static_options": [
+            { "value": "1", "label": "1 días" },
+            { "value": "2", "label": "2 días" },
+            { "value": "3", "label": "3 días" },
+            { "value": "5", "label": "5 días" },
+            { "value": "7", "label": "7 días" },
+            { "value": "10", "label": "10 días" },
+            { "value": "14", "label": "14 días" },
+            { "value": "21", "label": "21 días" },
+            { "value": "30", "label": "30 días" }
+        ]
+      },
+      { "name": 'valores_dias_seguridad_base', "label": 'Días de Seguridad a Comparar', "type": 'multi-select', "tooltip_key": "valores_escenario", "defaultValue": [],
+        "static_options": [
+            { "value": "0", "label": "0 días" },
+            { "value": "1", "label": "1 días" },
+            { "value": "2", "label": "2 días" },
+            { "value": "3", "label": "3 días" },
+            { "value": "5", "label": "5 días" },
+            { "value": "7", "label": "7 días" }
+        ]
+      },
+      { "name": 'ordenar_por', "label": 'Ordenar reporte por', "type": 'select', "tooltip_key": "ordenar_escenarios_por",
+        "options": [
+          { "value": 'grilla', "label": 'Orden de los Parámetros' },
+          { "value": 'inversion', "label": 'Mayor Inversión' },
+          { "value": 'unidades', "label": 'Más Unidades a Pedir' },
+          { "value": 'margen', "label": 'Mayor Margen Potencial' },
+          { "value": 'alertas_criticas', "label": 'Menos SKUs en Alerta Crítica' }
+        ],
+        "defaultValue": 'grilla'
+      },
+      { "name": 'incluir_solo_categorias', "label": 'Filtrar por Categorías', "type": 'multi-select', "tooltip_key": "incluir_solo_categorias", "optionsKey": 'categorias', "defaultValue": [] },
+      { "name": 'incluir_solo_marcas', "label": 'Filtrar por Marcas', "type": 'multi-select', "tooltip_key": "incluir_solo_marcas", "optionsKey": 'marcas', "defaultValue": [] }
+    ],
+    "advanced_parameters": [
+      { "name": 'valores_peso_ventas_historicas', "label": 'Pesos de Ventas Históricas a Comparar', "type": 'multi-select', "tooltip_key": "valores_escenario", "defaultValue": [],
+        "static_options": [
+            { "value": "0.2", "label": "0.2" },
+            { "value": "0.4", "label": "0.4" },
+            { "value": "0.6", "label": "0.6" },
+            { "value": "0.8", "label": "0.8" }
+        ]
+      },
+      { "name": 'metodo_stock_seguridad', "label": 'Cálculo del Stock de Seguridad', "type": 'select', "tooltip_key": "metodo_stock_seguridad",
+        "options": [
+          { "value": 'dias', "label": 'Días de seguridad (clásico)' },
+          { "value": 'variabilidad', "label": 'Nivel de servicio según la variabilidad de la demanda' }
+        ],
+        "defaultValue": 'dias'
+      },
+      { "name": 'valores_nivel_servicio', "label": 'Niveles de Servicio a Comparar', "type": 'multi-select', "tooltip_key": "valores_escenario", "defaultValue": [],
+        "static_options": [
+            { "value": "0.90", "label": "90%" },
+            { "value": "0.95", "label": "95%" },
+            { "value": "0.98", "label": "98%" },
+            { "value": "0.99", "label": "99%" }
+        ]
+      },
+      { "name": 'lead_time_dias', "label": 'Tiempo de Entrega Base en Días', "type": 'number', "tooltip_key": "lead_time_dias", "defaultValue": 7, "min": 0 },
+      { "name": 'dias_cobertura_ideal_base', "label": 'Días de Cobertura Ideal Base', "type": 'number', "tooltip_key": "dias_cobertura_ideal_base", "defaultValue": 10, "min": 1 },
+      { "name": 'peso_ventas_historicas', "label": 'Peso Ventas Históricas Base (0.0-1.0)', "type": 'number', "tooltip_key": "peso_ventas_historicas", "defaultValue": 0.6, "min": 0, "max": 1, "step": 0.1 },
+      { "name": 'dias_analisis_ventas_recientes', "label": 'Período de Análisis Reciente (días)', "type": 'number', "tooltip_key": "dias_analisis_ventas_recientes", "defaultValue": 30, "min": 7 },
+      { "name": 'dias_analisis_ventas_general', "label": 'Período de Análisis General (días)', "type": 'number', "tooltip_key": "dias_analisis_ventas_general", "defaultValue": 180, "min": 30 },
+      { "name": 'excluir_sin_ventas', "label": '¿Excluir productos con CERO ventas?', "type": 'boolean_select', "tooltip_key": "excluir_sin_ventas",
+        "options": [
+          { "value": 'true', "label": 'Sí, excluir (Recomendado)' },
+          { "value": 'false', "label": 'No, incluirlos' }
+        ],
+        "defaultValue": 'true'
+      }
+    ]
+  },
   "ReporteSimulacionAhorroCompraGrupal": { "label": 'Simulación de ahorro en compra por volumen grupal', "endpoint": '/sobrestock', "categoria": "📊 Simulación y ROI de Compra", "isPro": True, "costo":10, "basic_parameters": [] },
   "ReporteSimulacionAhorroImportacionGrupal": { "label": 'Simulación de ahorro en importación grupal', "endpoint": '/sobrestock', "categoria": "📊 Simulación y ROI de Compra", "isPro": True, "costo":10, "basic_parameters": [] },
   "ReporteAnalisisDePreciosMercado": { "label": 'Analisis de precios en base al Mercado', "endpoint": '/sobrestock', "categoria": "📊 Simulación y ROI de Compra", "isPro": True, "costo":10, "basic_parameters": [] },
@@ -0,0 +1,14 @@
+# conftest.py
+# Los módulos del backend son planos (sin paquete): se importan desde backend/.
+# firebase_config exige sus variables de entorno aunque no se conecte; en modo
+# 'lazy' los clientes no se crean hasta el primer uso, que los tests no hacen.
+import os
+import sys
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+os.environ.setdefault("STARTUP_MODE", "lazy")
+os.environ.setdefault("FIREBASE_CREDS_PATH", "no-usado.json")
+os.environ.setdefault("FIREBASE_STORAGE_BUCKET_URL", "no-usado.appspot.com")
@@ -0,0 +1,136 @@
+import asyncio
+
+import httpx
+import pytest
+
+import afinidad_nodos
+from afinidad_nodos import AnilloConsistente, ClusterAfinidad, MiddlewareAfinidad, clave_afinidad
+
+NODOS = ["http://nodo-a", "http://nodo-b", "http://nodo-c"]
+
+
+def _scope(ruta="/reporte", query=b"", cabeceras=()):
+    return {"type": "http", "method": "POST", "path": ruta, "raw_path": ruta.encode(), "query_string": query,
+            "headers": [(k.encode(), v.encode()) for k, v in cabeceras], "client": ("10.0.0.1", 1234)}
+
+
+@pytest.mark.parametrize("scope, esperada", [
+    (_scope("/workspaces/w1/archivos"), "ws:w1"),
+    (_scope(query=b"workspace_id=w2"), "ws:w2"),
+    (_scope(cabeceras=[("X-Workspace-ID", "w3"), ("X-Session-ID", "s1")]), "ws:w3"),
+    (_scope(cabeceras=[("X-Session-ID", "s1")]), "s:s1"),
+    (_scope(), None),
+])
+def test_clave_de_afinidad_sin_leer_el_cuerpo(scope, esperada):
+    assert clave_afinidad(scope) == esperada
+
+
+def test_anillo_mueve_pocas_claves_al_agregar_un_nodo():
+    antes = AnilloConsistente(NODOS)
+    despues = AnilloConsistente(NODOS + ["http://nodo-d"])
+    claves = [f"ws:{i}" for i in range(4000)]
+    movidas = sum(antes.candidatos(c)[0] != despues.candidatos(c)[0] for c in claves)
+    # Lo ideal es 1/4; ninguna clave se mueve entre nodos que ya existían
+    assert movidas / len(claves) < 0.35
+    assert all(despues.candidatos(c)[0] in (antes.candidatos(c)[0], "http://nodo-d") for c in claves)
+
+
+def test_nodo_caido_solo_tras_fallos_seguidos(monkeypatch):
+    monkeypatch.setattr(afinidad_nodos, "FALLOS_PARA_CAIDA", 3)
+    cluster = ClusterAfinidad(NODOS, NODOS[0])
+    cluster.registrar_fallo(NODOS[1])
+    cluster.registrar_fallo(NODOS[1])
+    cluster.registrar_exito(NODOS[1]) # un sondeo sano reinicia la cuenta
+    cluster.registrar_fallo(NODOS[1])
+    cluster.registrar_fallo(NODOS[1])
+    assert cluster.esta_sano(NODOS[1])
+    cluster.registrar_fallo(NODOS[1])
+    assert not cluster.esta_sano(NODOS[1])
+    cluster.registrar_exito(NODOS[1])
+    assert cluster.esta_sano(NODOS[1])
+
+
+def _clave_de(cluster, dueno):
+    return next(f"w{i}" for i in range(1000) if cluster.anillo.candidatos(f"ws:w{i}")[0] == dueno)
+
+
+async def _llamar(middleware, scope, partes):
+    """Envía el cuerpo en varias partes y devuelve (estado, cuerpo, cabeceras) de la respuesta."""
+    pendientes = [{"type": "http.request", "body": p, "more_body": i < len(partes) - 1} for i, p in enumerate(partes)]
+    enviados = []
+
+    async def receive():
+        return pendientes.pop(0) if pendientes else {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    await middleware(scope, receive, send)
+    inicio = next(m for m in enviados if m["type"] == "http.response.start")
+    cuerpo = b"".join(m.get("body", b"") for m in enviados if m["type"] == "http.response.body")
+    return inicio["status"], cuerpo, dict(inicio["headers"])
+
+
+async def _app_eco(scope, receive, send):
+    cuerpo = b""
+    while True:
+        mensaje = await receive()
+        cuerpo += mensaje.get("body", b"")
+        if not mensaje.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"x-atendido", b"local")]})
+    await send({"type": "http.response.body", "body": cuerpo, "more_body": False})
+
+
+def test_reenvio_pasa_el_cuerpo_en_streaming_al_dueno():
+    cluster = ClusterAfinidad(NODOS, NODOS[0])
+    recibido = {}
+
+    async def dueno(request: httpx.Request):
+        recibido["url"] = str(request.url)
+        recibido["reenviado_por"] = request.headers.get(afinidad_nodos.CABECERA_REENVIO)
+        recibido["cuerpo"] = b"".join([parte async for parte in request.stream])
+
+        async def respuesta():
+            yield b"ok:"
+            yield recibido["cuerpo"]
+        return httpx.Response(201, content=respuesta())
+
+    cluster._cliente = httpx.AsyncClient(transport=httpx.MockTransport(dueno))
+    workspace = _clave_de(cluster, NODOS[1])
+    scope = _scope(cabeceras=[("X-Workspace-ID", workspace), ("Content-Length", "9")])
+    estado, cuerpo, cabeceras = asyncio.run(_llamar(MiddlewareAfinidad(_app_eco, cluster), scope, [b"abc", b"def", b"ghi"]))
+
+    assert estado == 201 and cuerpo == b"ok:abcdefghi"
+    assert recibido["url"] == NODOS[1] + "/reporte" and recibido["reenviado_por"] == NODOS[0]
+    assert cabeceras[afinidad_nodos.CABECERA_NODO.encode()] == NODOS[1].encode()
+    assert cluster.metricas["reenviadas"] == 1
+
+
+class _TransporteCaido(httpx.AsyncBaseTransport):
+    """Como un transporte real ante un puerto cerrado: falla al conectar, antes de leer el cuerpo."""
+    async def handle_async_request(self, request):
+        raise httpx.ConnectError("conexión rechazada", request=request)
+
+
+def test_dueno_inalcanzable_se_atiende_en_el_siguiente_del_anillo():
+    cluster = ClusterAfinidad(NODOS[:2], NODOS[0])
+    cluster._cliente = httpx.AsyncClient(transport=_TransporteCaido())
+    workspace = _clave_de(cluster, NODOS[1])
+    estado, cuerpo, cabeceras = asyncio.run(
+        _llamar(MiddlewareAfinidad(_app_eco, cluster), _scope(query=f"workspace_id={workspace}".encode()), [b"datos", b"!"])
+    )
+    # El cuerpo no se tocó antes del fallo de conexión: la app local lo recibe completo
+    assert estado == 200 and cuerpo == b"datos!" and cabeceras[b"x-atendido"] == b"local"
+    assert cluster.metricas["reenvios_fallidos"] == 1 and cluster.metricas["atendidas_por_respaldo"] == 1
+    # Un solo fallo no saca al nodo del anillo
+    assert cluster.esta_sano(NODOS[1])
+
+
+def test_peticion_sin_clave_o_ya_reenviada_se_atiende_localmente():
+    cluster = ClusterAfinidad(NODOS, NODOS[0])
+    middleware = MiddlewareAfinidad(_app_eco, cluster)
+    assert asyncio.run(_llamar(middleware, _scope(), [b"x"]))[1] == b"x"
+    reenviada = _scope(cabeceras=[("X-Workspace-ID", _clave_de(cluster, NODOS[1])), (afinidad_nodos.CABECERA_REENVIO, NODOS[2])])
+    assert asyncio.run(_llamar(middleware, reenviada, [b"y"]))[1] == b"y"
+    assert cluster.metricas["sin_clave"] == 1 and cluster.metricas["recibidas_reenviadas"] == 1
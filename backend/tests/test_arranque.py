@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from bench_import_time import PAQUETES_DIFERIDOS
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importar_main_no_carga_los_paquetes_diferidos():
+    # En un proceso limpio: en este, otros tests ya pudieron importar pandas
+    codigo = f"import sys, json, main; print(json.dumps([m for m in {list(PAQUETES_DIFERIDOS)!r} if m in sys.modules]))"
+    proceso = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=DIRECTORIO_BACKEND, env=os.environ.copy(),
+        capture_output=True, text=True, check=True
+    )
+    assert json.loads(proceso.stdout.strip().splitlines()[-1]) == []
+
+
+def test_readiness_listo_aunque_falle_el_calentamiento(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.firebase_config, "STARTUP_MODE", "background")
+    monkeypatch.setitem(main.ESTADO_ARRANQUE, "calentamiento_completo", False)
+    monkeypatch.setitem(main.ESTADO_ARRANQUE, "error", None)
+    monkeypatch.setitem(main.ESTADO_ARRANQUE, "modulos_con_error", {})
+    cliente = TestClient(main.app)
+    assert cliente.get("/readiness").status_code == 503
+
+    monkeypatch.setitem(main.ESTADO_ARRANQUE, "calentamiento_completo", True)
+    monkeypatch.setitem(main.ESTADO_ARRANQUE, "error", "credenciales no encontradas")
+    respuesta = cliente.get("/readiness")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["status"] == "degraded"
+    assert respuesta.json()["errores"]["calentamiento"] == "credenciales no encontradas"
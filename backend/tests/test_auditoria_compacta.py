@@ -0,0 +1,79 @@
+import copy
+import json
+
+from auditoria_compacta import FORMATO_COMPACTO, detalle_de_tarea, hidratar_informe, separar_informe, serializar_detalle
+
+
+def _tarea(task_id, skus, con_preview=True):
+    tarea = {"id": task_id, "titulo": f"Tarea {task_id}", "impacto": {"valor": 120.5}, "skus_afectados": skus}
+    if con_preview:
+        tarea["preview_data"] = [{"SKU": s, "Stock": i} for i, s in enumerate(skus)]
+    return tarea
+
+
+def _informe():
+    return {
+        "tipo": "evolucion",
+        "puntaje_actual": 72,
+        "kpis": {"Capital en Riesgo": 1500.0},
+        "source_files": {"ventas_id": "v1", "inventario_id": "i1"},
+        "plan_de_accion": [_tarea("quiebre", ["A", "B", "C"]), _tarea("sin_preview", ["D"], con_preview=False)],
+        "log_eventos": {
+            "nuevos_problemas": [_tarea("muerto", ["E", "F"])],
+            "problemas_resueltos": [_tarea("resuelto", [])],
+            "resumen": "2 nuevos, 1 resuelto",
+        },
+    }
+
+
+def _sin_campos_del_compacto(informe):
+    """Quita lo que agrega el formato compacto: la marca de formato y el conteo de SKUs por tarea."""
+    informe = copy.deepcopy(informe)
+    informe.pop("formato", None)
+    tareas = informe["plan_de_accion"] + informe["log_eventos"]["nuevos_problemas"] + informe["log_eventos"]["problemas_resueltos"]
+    for tarea in tareas:
+        tarea.pop("num_skus_afectados", None)
+    return informe
+
+
+def test_separar_e_hidratar_devuelve_el_informe_original():
+    informe = _informe()
+    original = copy.deepcopy(informe)
+    compacto, detalle = separar_informe(informe)
+    assert informe == original # el informe de entrada no se toca
+    # Como se guarda: detalle en JSON (Storage) y compacto con la referencia al detalle
+    detalle = json.loads(serializar_detalle(detalle))
+    hidratado = hidratar_informe({**compacto, "detalle": {"rutaStorage": "x"}}, detalle)
+    assert "detalle" not in hidratado
+    assert _sin_campos_del_compacto(hidratado) == original
+
+
+def test_compacto_sin_campos_pesados_y_con_conteo():
+    compacto, detalle = separar_informe(_informe())
+    assert compacto["formato"] == FORMATO_COMPACTO
+    tareas = compacto["plan_de_accion"] + compacto["log_eventos"]["nuevos_problemas"] + compacto["log_eventos"]["problemas_resueltos"]
+    assert all("preview_data" not in t and "skus_afectados" not in t for t in tareas)
+    assert [t["num_skus_afectados"] for t in tareas] == [3, 1, 2, 0]
+    assert compacto["log_eventos"]["resumen"] == "2 nuevos, 1 resuelto"
+    assert set(detalle) == {"plan_de_accion", "nuevos_problemas", "problemas_resueltos"}
+    assert detalle_de_tarea(detalle, "muerto")["skus_afectados"] == ["E", "F"]
+    assert detalle_de_tarea(detalle, "sin_preview") == {"skus_afectados": ["D"]}
+    assert detalle_de_tarea(detalle, "no_existe") is None
+
+
+def test_informe_sin_log_eventos_ni_tareas():
+    informe = {"tipo": "inicial", "puntaje_salud": 80, "plan_de_accion": []}
+    compacto, detalle = separar_informe(informe)
+    assert detalle == {"plan_de_accion": {}}
+    hidratado = hidratar_informe(compacto, detalle)
+    hidratado.pop("formato")
+    assert hidratado == informe
+
+
+def test_hidratar_sin_detalle_deja_los_encabezados():
+    compacto, _ = separar_informe(_informe())
+    hidratado = hidratar_informe(compacto, {})
+    assert [t["id"] for t in hidratado["log_eventos"]["nuevos_problemas"]] == ["muerto"]
+    assert "skus_afectados" not in hidratado["plan_de_accion"][0]
+    # hidratar no modifica el documento compacto
+    assert "skus_afectados" not in compacto["log_eventos"]["nuevos_problemas"][0]
@@ -0,0 +1,126 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_politicas import resumen_escenarios, simular_politica
+from bench_backtest_politicas import generar_demanda
+from track_expenses import process_csv_backtest_politica_reposicion
+
+SKU_COL = 'SKU / Código de producto'
+ESCENARIOS = dict(lead_time_dias=[3, 7.5, 14], dias_cobertura_ideal_base=[5, 10, 20], dias_seguridad_base=[0, 2, 5],
+                  peso_ventas_historicas=[0.2, 0.6, 0.9], dias_analisis_ventas_recientes=[7, 30, 15],
+                  dias_analisis_ventas_general=[30, 60, 45])
+
+
+def _simular_un_sku(d, dias_historia, lead_time, cobertura, seguridad, peso, dias_rec, dias_gen, metodo, servicio, cv_lt, recalculo):
+    """Referencia escalar: recalcula el PDA desde las ventanas completas."""
+    def politica(t):
+        rec, gen = d[t - dias_rec:t], d[t - dias_gen:t]
+        pda_rec = rec.sum() / (rec > 0).sum() if (rec > 0).sum() else 0.0
+        pda_gen = gen.sum() / (gen > 0).sum() if (gen > 0).sum() else 0.0
+        pda_rec = pda_rec if pda_rec > 0 else pda_gen
+        pda_gen = pda_gen if pda_gen > 0 else gen.sum() / dias_gen
+        pda = round(pda_rec * (1 - peso) + pda_gen * peso, 2)
+        if metodo == 'variabilidad':
+            z = NormalDist().inv_cdf(servicio)
+            media = gen.sum() / dias_gen
+            varianza = max((gen.astype(float) ** 2).sum() / dias_gen - media ** 2, 0)
+            ss = round(z * math.sqrt(lead_time * varianza + media ** 2 * (cv_lt * lead_time) ** 2))
+        else:
+            ss = round(pda * seguridad)
+        return round(pda * lead_time) + ss, max(round(pda * cobertura), 0)
+
+    entrega = max(1, math.ceil(lead_time - 1e-9))
+    alerta, ideal = politica(dias_historia)
+    stock, transito, llegadas = float(ideal), 0.0, {}
+    demanda = atendida = acumulado = 0.0
+    quiebres = pedidos = 0
+    for t in range(dias_historia, len(d)):
+        if t > dias_historia and (t - dias_historia) % recalculo == 0:
+            alerta, ideal = politica(t)
+        llega = llegadas.pop(t, 0.0)
+        stock += llega
+        transito -= llega
+        vendido = min(stock, float(d[t]))
+        stock -= vendido
+        demanda += d[t]
+        atendida += vendido
+        quiebres += vendido < d[t]
+        acumulado += stock
+        if stock + transito <= alerta:
+            pedido = math.ceil(max(ideal - stock - transito, 0))
+            if pedido > 0:
+                llegadas[t + entrega] = llegadas.get(t + entrega, 0.0) + pedido
+                transito += pedido
+                pedidos += 1
+    return demanda, atendida, quiebres, acumulado / (len(d) - dias_historia), pedidos
+
+
+@pytest.mark.parametrize("metodo", ["dias", "variabilidad"])
+def test_simulacion_vectorizada_igual_a_la_de_un_sku(metodo):
+    dias_historia, num_skus = 60, 60
+    demanda = generar_demanda(num_skus, dias_historia + 120, semilla=7)
+    resultado = simular_politica(demanda, dias_historia, np.ones(num_skus), metodo_stock_seguridad=metodo,
+                                 dias_entre_recalculos=5, **ESCENARIOS)
+    for k in range(3):
+        parametros = [ESCENARIOS[p][k] for p in ESCENARIOS]
+        for j in range(num_skus):
+            esperado = _simular_un_sku(demanda[:, j], dias_historia, *parametros, metodo, 0.95, 0.25, 5)
+            obtenido = tuple(resultado[m][k, j] for m in ('demanda', 'atendida', 'dias_quiebre', 'stock_promedio', 'pedidos'))
+            np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-6)
+
+
+def test_sku_sin_demanda_y_columnas_repetidas():
+    demanda = generar_demanda(5, 150, semilla=3)
+    demanda = np.c_[demanda, np.zeros(150, dtype=np.float32), demanda[:, :1]]
+    resultado = simular_politica(demanda, 60, np.ones(7))
+    assert resultado['demanda'][0, 5] == 0 and resultado['dias_quiebre'][0, 5] == 0 and resultado['pedidos'][0, 5] == 0
+    for metrica in ('atendida', 'dias_quiebre', 'stock_promedio', 'pedidos'):
+        assert resultado[metrica][0, 6] == resultado[metrica][0, 0]
+    total = resumen_escenarios(resultado, np.ones(7)).iloc[0]
+    assert 0 <= total['Fill Rate'] <= 1
+
+
+def _archivos(num_skus=3, dias=200):
+    demanda = generar_demanda(num_skus, dias, semilla=9)
+    fechas = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(dias), unit="D")
+    dia, sku = np.nonzero(demanda)
+    ventas = pd.DataFrame({
+        SKU_COL: [f"SKU{s}" for s in sku],
+        'Fecha de venta': fechas[dia].strftime("%d/%m/%Y"),
+        'Cantidad vendida': demanda[dia, sku],
+    })
+    inventario = pd.DataFrame({
+        SKU_COL: [f"SKU{s}" for s in range(num_skus)],
+        'Nombre del producto': [f"Producto {s}" for s in range(num_skus)],
+        'Precio de compra actual (S/.)': [10.0] * num_skus,
+    })
+    return ventas, inventario
+
+
+def test_reporte_con_un_solo_sku_y_sku_duplicado_en_inventario():
+    ventas, inventario = _archivos()
+    inventario = pd.concat([inventario, inventario.iloc[[0]].assign(**{SKU_COL: " SKU0 "})], ignore_index=True)
+    reporte = process_csv_backtest_politica_reposicion(ventas, inventario, dias_simulacion=60, dias_analisis_ventas_general=60)
+    assert sorted(reporte["data"][SKU_COL]) == ["SKU0", "SKU1", "SKU2"]
+    solo = process_csv_backtest_politica_reposicion(ventas, inventario, dias_simulacion=60, dias_analisis_ventas_general=60,
+                                                    filtro_skus=["SKU1"])
+    # El resultado de un SKU no depende de qué otros SKUs quedaron en el filtro
+    assert len(solo["data"]) == 1
+    pd.testing.assert_series_equal(solo["data"].set_index(SKU_COL).iloc[0], reporte["data"].set_index(SKU_COL).loc["SKU1"])
+
+
+@pytest.mark.parametrize("caso", ["sin_ventas", "fechas_vacias", "historia_corta"])
+def test_reporte_sin_historia_suficiente(caso):
+    ventas, inventario = _archivos()
+    if caso == "sin_ventas":
+        ventas = ventas.iloc[0:0]
+    elif caso == "fechas_vacias":
+        ventas = ventas.assign(**{'Fecha de venta': np.nan})
+    else:
+        ventas = ventas[pd.to_datetime(ventas['Fecha de venta'], format="%d/%m/%Y") >= "2024-06-01"]
+    reporte = process_csv_backtest_politica_reposicion(ventas, inventario, dias_simulacion=60, dias_analisis_ventas_general=60)
+    assert reporte["data"].empty and "al menos" in reporte["summary"]["insight"]
@@ -0,0 +1,114 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import cache_arrow
+from cache_arrow import EXTENSION, CacheArrowDisco
+
+
+def _df(filas: int = 200, semilla: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        "unidades": rng.integers(0, 100, filas),
+        "ingresos": rng.uniform(0, 500, filas),
+        "marca": np.array(["TRUPER", "STANLEY", None], dtype=object)[rng.integers(0, 3, filas)],
+    }, index=pd.Index([f"SKU{i:05d}" for i in range(filas)], name="sku"))
+    df.loc[df.index[::7], "ingresos"] = np.nan
+    return df
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheArrowDisco(str(tmp_path), max_bytes=10**9, ttl_segundos=3600)
+
+
+def _envejecer(ruta: str, segundos: float):
+    antes = time.time() - segundos
+    os.utime(ruta, (antes, antes))
+
+
+def test_ida_y_vuelta_con_indice_y_nulos_como_nan(cache):
+    df = _df()
+    assert cache.guardar(df, "ws|ventas")
+    leido = cache.obtener("ws|ventas")
+    pd.testing.assert_frame_equal(leido, df)
+    # Los nulos de texto vuelven como NaN (como los deja pd.read_csv), no como None
+    assert all(isinstance(v, float) and np.isnan(v) for v in leido["marca"][leido["marca"].isna()])
+    assert cache.obtener("ws|otro") is None
+    assert cache.estadisticas()["aciertos"] == 1 and cache.estadisticas()["fallos"] == 1
+
+
+def test_dataframe_leido_es_de_solo_lectura(cache):
+    cache.guardar(_df(), "k")
+    leido = cache.obtener("k")
+    with pytest.raises(ValueError, match="read-only"):
+        leido.loc[leido.index[0], "unidades"] = 5
+    copia = leido.copy()
+    copia.loc[copia.index[0], "unidades"] = 5
+    assert copia["unidades"].iloc[0] == 5
+    # La entrada en disco no cambió
+    assert cache.obtener("k")["unidades"].iloc[0] == _df()["unidades"].iloc[0]
+
+
+def test_entrada_vencida_se_borra(cache):
+    cache.guardar(_df(), "k")
+    ruta = cache._ruta("k")
+    _envejecer(ruta, cache.ttl_segundos + 10)
+    assert cache.obtener("k") is None and not os.path.exists(ruta)
+    # También se borran las vencidas al desalojar tras otra escritura
+    cache.guardar(_df(), "a")
+    _envejecer(cache._ruta("a"), cache.ttl_segundos + 10)
+    cache.guardar(_df(), "b")
+    assert not os.path.exists(cache._ruta("a")) and os.path.exists(cache._ruta("b"))
+
+
+def test_desalojo_lru_por_tamano_total(tmp_path):
+    cache = CacheArrowDisco(str(tmp_path), max_bytes=10**9, ttl_segundos=3600)
+    cache.guardar(_df(semilla=1), "a")
+    tamano = os.path.getsize(cache._ruta("a"))
+    cache.max_bytes = int(tamano * 2.5) # caben dos entradas
+    cache.guardar(_df(semilla=2), "b")
+    _envejecer(cache._ruta("a"), 30)
+    _envejecer(cache._ruta("b"), 20)
+    assert cache.obtener("a") is not None # 'a' pasa a ser la más reciente
+    cache.guardar(_df(semilla=3), "c")
+    assert [os.path.exists(cache._ruta(k)) for k in "abc"] == [True, False, True]
+    assert cache.estadisticas()["bytes"] <= cache.max_bytes
+
+
+def test_temporales_huerfanos_se_limpian(cache, tmp_path):
+    huerfano = tmp_path / f"abc{EXTENSION}.123.dead.tmp"
+    en_curso = tmp_path / f"def{EXTENSION}.456.live.tmp"
+    huerfano.write_bytes(b"x")
+    en_curso.write_bytes(b"y")
+    _envejecer(str(huerfano), cache_arrow.SEGUNDOS_TEMPORAL_HUERFANO + 10)
+    cache.guardar(_df(), "k")
+    # Una escritura en curso de otro worker no se toca
+    assert not huerfano.exists() and en_curso.exists()
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp") and n != en_curso.name]
+
+
+@pytest.mark.parametrize("dano", ["truncado", "basura"])
+def test_archivo_corrupto_devuelve_none_y_se_borra(cache, dano):
+    cache.guardar(_df(), "k")
+    ruta = cache._ruta("k")
+    with open(ruta, "rb") as archivo:
+        contenido = archivo.read()
+    with open(ruta, "wb") as archivo:
+        archivo.write(contenido[: len(contenido) // 2] if dano == "truncado" else b"no es arrow" * 100)
+    assert cache.obtener("k") is None
+    assert not os.path.exists(ruta) and cache.estadisticas()["corruptos"] == 1
+    # Se vuelve a parsear y a guardar sin problema
+    assert cache.guardar(_df(), "k") and cache.obtener("k") is not None
+
+
+def test_sin_pyarrow_la_cache_esta_vacia(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache_arrow, "pa", None)
+    cache = CacheArrowDisco(str(tmp_path / "sin"), max_bytes=10**9, ttl_segundos=3600)
+    assert not cache.guardar(_df(), "k") and cache.obtener("k") is None
+    assert cache.estadisticas()["entradas"] == 0
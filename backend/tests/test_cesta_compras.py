@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_cesta_compras import generar_ventas
+from cesta_compras import (
+    CLAVE_COMPROBANTE, COMPROBANTE_COL, SKU_COL, coocurrencias, incidencias_de_bloques, pares_frecuentes,
+    resumen_comprados_juntos
+)
+
+
+def _ventas(filas):
+    return pd.DataFrame(filas, columns=[COMPROBANTE_COL, SKU_COL])
+
+
+def _pares(resultado) -> dict:
+    skus = resultado["skus"]
+    return {(skus[i], skus[j]): n for i, j, n in zip(resultado["i"], resultado["j"], resultado["juntos"])}
+
+
+def test_producto_disperso_igual_al_self_merge_de_pandas():
+    ventas, _ = generar_ventas(30_000, 800, pares_sembrados=20)
+    incidencias = incidencias_de_bloques([ventas])
+    # El presupuesto diminuto fuerza varios tramos y baja el tope de SKUs por comprobante
+    resultado = coocurrencias(incidencias, min_comprobantes_juntos=2, max_skus_por_comprobante=1000, presupuesto_mb=2)
+    assert resultado["tramos"] > 1
+
+    unico = incidencias.assign(**{SKU_COL: incidencias[SKU_COL].astype(str)})
+    tamano = unico.groupby(CLAVE_COMPROBANTE)[SKU_COL].transform('size')
+    unico = unico[tamano <= resultado["max_skus_por_comprobante"]]
+    cruce = unico.merge(unico, on=CLAVE_COMPROBANTE)
+    posicion = {s: p for p, s in enumerate(resultado["skus"])}
+    cruce = cruce[cruce[f"{SKU_COL}_x"].map(posicion) < cruce[f"{SKU_COL}_y"].map(posicion)]
+    esperado = cruce.groupby([f"{SKU_COL}_x", f"{SKU_COL}_y"]).size()
+    assert _pares(resultado) == esperado[esperado >= 2].to_dict()
+
+
+def test_pares_sembrados_salen_con_lift_alto():
+    ventas, sembrados = generar_ventas(60_000, 2000, pares_sembrados=30)
+    pares = pares_frecuentes(incidencias_de_bloques([ventas]), top_k=5)["pares"]
+    encontrados = pares[pares[SKU_COL].map(sembrados) == pares['SKU Relacionado']]
+    assert encontrados[SKU_COL].nunique() / len(sembrados) > 0.9
+    assert (encontrados['Lift'] > 5).all()
+    assert pares.groupby(SKU_COL).size().max() <= 5
+
+
+def test_sin_ventas():
+    vacio = incidencias_de_bloques([])
+    assert vacio.empty
+    assert pares_frecuentes(vacio)["pares"].empty
+    assert pares_frecuentes(incidencias_de_bloques([_ventas([])]))["pares"].empty
+
+
+def test_un_solo_sku_no_forma_pares():
+    incidencias = incidencias_de_bloques([_ventas([(f"B{c}", "A") for c in range(10)])])
+    resultado = pares_frecuentes(incidencias, min_comprobantes_juntos=1)
+    assert resultado["comprobantes"] == 10 and resultado["pares"].empty
+
+
+def test_lineas_repetidas_y_codigos_con_espacios_cuentan_una_vez():
+    filas = [(f"B{c}", sku) for c in range(4) for sku in ("A", " A ", "B", "B")]
+    incidencias = incidencias_de_bloques([_ventas(filas)])
+    assert len(incidencias) == 8
+    assert _pares(coocurrencias(incidencias, min_comprobantes_juntos=1)) == {("A", "B"): 4}
+
+
+def test_comprobante_partido_entre_bloques_y_comprobantes_vacios():
+    filas = [(f"B{c}", "A") for c in range(3)] + [(f"B{c}", "B") for c in range(3)] + [(np.nan, "A"), ("", "B"), (np.nan, "B")]
+    ventas = _ventas(filas)
+    incidencias = incidencias_de_bloques([ventas.iloc[:3], ventas.iloc[3:]])
+    resultado = coocurrencias(incidencias, min_comprobantes_juntos=1)
+    assert resultado["comprobantes"] == 3 and _pares(resultado) == {("A", "B"): 3}
+
+
+def test_comprobantes_enormes_no_cuentan():
+    enorme = [("GRANDE", f"S{s}") for s in range(60)]
+    normales = [(f"B{c}", sku) for c in range(3) for sku in ("S0", "S1")]
+    resultado = coocurrencias(incidencias_de_bloques([_ventas(enorme + normales)]), min_comprobantes_juntos=1, max_skus_por_comprobante=50)
+    assert resultado["comprobantes"] == 3 and _pares(resultado) == {("S0", "S1"): 3}
+
+
+def test_falta_columna_obligatoria():
+    with pytest.raises(ValueError):
+        incidencias_de_bloques([pd.DataFrame({SKU_COL: ["A"]})])
+
+
+def test_resumen_usa_nombres_y_omite_confianza_baja():
+    pares = pd.DataFrame({SKU_COL: ["A", "A", "B"], 'SKU Relacionado': ["B", "C", "A"], 'Confianza': [0.5, 0.01, 0.25]})
+    resumen = resumen_comprados_juntos(pares, pd.Series({"B": "Brocha"}))
+    assert resumen.to_dict() == {"A": "Brocha (50%)", "B": "A (25%)"}
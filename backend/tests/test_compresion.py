@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import compresion
+from bench_storage_compression import generar_csv_ventas
+from compresion import abrir_flujo_descomprimido, comprimir_contenido, descomprimir_contenido, detectar_codec
+
+CODECS = ["gzip"] + (["zstd"] if compresion.zstandard else [])
+
+
+@pytest.fixture(scope="module")
+def csv_ventas():
+    return generar_csv_ventas(3000, num_skus=200)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_ida_y_vuelta(csv_ventas, codec):
+    almacenado, usado = comprimir_contenido(csv_ventas, codec)
+    assert usado == codec and detectar_codec(almacenado) == codec
+    assert len(almacenado) < len(csv_ventas)
+    assert descomprimir_contenido(almacenado) == csv_ventas
+
+
+@pytest.mark.parametrize("codec", CODECS + ["none"])
+def test_lectura_en_flujo_igual_al_csv_original(csv_ventas, codec):
+    almacenado, _ = comprimir_contenido(csv_ventas, codec)
+    esperado = pd.read_csv(abrir_flujo_descomprimido(csv_ventas))
+    pd.testing.assert_frame_equal(pd.read_csv(abrir_flujo_descomprimido(almacenado)), esperado)
+
+
+def test_sin_comprimir_se_lee_igual_que_antes(csv_ventas):
+    almacenado, usado = comprimir_contenido(csv_ventas, "none")
+    assert usado is None and almacenado is csv_ventas
+    assert detectar_codec(csv_ventas) is None
+    assert descomprimir_contenido(csv_ventas) is csv_ventas
+
+
+@pytest.mark.parametrize("contenido", [b"", b"a"])
+def test_contenido_que_no_se_reduce_queda_sin_comprimir(contenido):
+    for codec in CODECS:
+        assert comprimir_contenido(contenido, codec) == (contenido, None)
+
+
+def test_zstd_sin_libreria_usa_gzip(monkeypatch, csv_ventas):
+    monkeypatch.setattr(compresion, "zstandard", None)
+    almacenado, usado = comprimir_contenido(csv_ventas, "zstd")
+    assert usado == "gzip" and descomprimir_contenido(almacenado) == csv_ventas
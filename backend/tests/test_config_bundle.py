@@ -0,0 +1,31 @@
+import gzip
+
+import pytest
+
+import config_bundle
+
+
+@pytest.mark.parametrize("accept_encoding, esperado", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br, gzip;q=0.5", True),
+    ("GZIP ; q=1.0", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0.0, br", False),
+    ("*;q=0.1, gzip;q=0", False),
+    ("deflate, *;q=0", False),
+    ("identity", False),
+    ("gzip;q=abc", False),
+    ("", False),
+    (None, False),
+])
+def test_acepta_gzip_respeta_q_values(accept_encoding, esperado):
+    assert config_bundle._acepta_gzip(accept_encoding) is esperado
+
+
+def test_paquete_gzip_tiene_el_mismo_contenido_y_etag_estable():
+    paquete = config_bundle.obtener_paquete("catalogo")
+    assert gzip.decompress(paquete["cuerpo_gzip"]) == paquete["cuerpo"]
+    assert config_bundle._construir_paquete(config_bundle._contenido_de_seccion("catalogo"))["etag"] == paquete["etag"]
+    assert config_bundle.obtener_paquete("no-existe") is None
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_cubo_inventario import generar_datos
+from cubo_inventario import DIAS_SIN_VENTA_MUERTO, consultar_cubo, construir_cubo, construir_hechos
+from precalculo import agregar_ventas_por_sku
+from ventas_incrementales import combinar_agregados_sku
+
+SKU_COL = 'SKU / Código de producto'
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return generar_datos(2_000, 60_000)
+
+
+def _cubo(ventas, inventario):
+    return construir_cubo(construir_hechos(inventario, agregar_ventas_por_sku(ventas)))
+
+
+def _totales_directos(ventas: pd.DataFrame, inventario: pd.DataFrame, nivel: str) -> pd.DataFrame:
+    """Referencia: ventas, margen y stock muerto por `nivel` calculados desde las líneas."""
+    inv = inventario.drop_duplicates(subset=[SKU_COL]).copy()
+    inv[nivel] = inv[nivel].fillna('Sin ' + nivel)
+    costo = inv.set_index(SKU_COL)['Precio de compra actual (S/.)']
+    lineas = ventas.merge(inv[[SKU_COL, nivel]], on=SKU_COL, how='inner')
+    lineas['ingresos'] = lineas['Cantidad vendida'] * lineas['Precio de venta unitario (S/.)']
+    lineas['margen'] = lineas['ingresos'] - lineas['Cantidad vendida'] * lineas[SKU_COL].map(costo)
+    por_nivel = lineas.groupby(nivel)[['ingresos', 'margen']].sum()
+
+    fechas = pd.to_datetime(ventas['Fecha de venta'], format='%d/%m/%Y')
+    ultima = fechas.groupby(ventas[SKU_COL]).max()
+    dias = (fechas.max() - inv[SKU_COL].map(ultima)).dt.days
+    stock = inv['Cantidad en stock actual'].clip(lower=0)
+    muerto = (stock > 0) & ~(dias < DIAS_SIN_VENTA_MUERTO)
+    inv['valor_stock_muerto'] = np.where(muerto, stock * inv['Precio de compra actual (S/.)'], 0)
+    por_nivel['valor_stock_muerto'] = inv.groupby(nivel)['valor_stock_muerto'].sum()
+    return por_nivel.fillna(0)
+
+
+@pytest.mark.parametrize("nivel", ["Categoría", "Marca"])
+def test_totales_iguales_al_calculo_directo_desde_las_lineas(datos, nivel):
+    ventas, inventario = datos
+    cubo = _cubo(ventas, inventario)
+    esperado = _totales_directos(ventas, inventario, nivel)
+    obtenido = cubo["niveles"][1] if nivel == "Categoría" else cubo["niveles"][3].groupby(level='Marca').sum()
+    obtenido = obtenido[esperado.columns].reindex(esperado.index)
+    np.testing.assert_allclose(obtenido.to_numpy(), esperado.to_numpy(), rtol=1e-9, atol=1e-6)
+
+
+def test_cubo_tras_un_delta_igual_al_armado_desde_cero(datos):
+    ventas, inventario = datos
+    corte = int(len(ventas) * 0.9)
+    combinados = combinar_agregados_sku(agregar_ventas_por_sku(ventas.iloc[:corte]), ventas.iloc[corte:], agregar_ventas_por_sku)
+    incremental = construir_cubo(construir_hechos(inventario, combinados))
+    for a, b in zip(incremental["niveles"], _cubo(ventas, inventario)["niveles"]):
+        pd.testing.assert_frame_equal(a.sort_index(), b.sort_index(), check_exact=False, rtol=1e-9)
+
+
+def test_cada_nivel_suma_lo_mismo_que_el_total(datos):
+    niveles = _cubo(*datos)["niveles"]
+    for nivel in niveles[1:]:
+        pd.testing.assert_series_equal(nivel.sum(), niveles[0].iloc[0], check_names=False, check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("caso", ["sin_ventas", "fechas_vacias"])
+def test_sin_ventas_todo_el_stock_es_muerto(datos, caso):
+    ventas, inventario = datos
+    ventas = ventas.iloc[0:0] if caso == "sin_ventas" else ventas.assign(**{'Fecha de venta': np.nan})
+    hechos = construir_hechos(inventario, agregar_ventas_por_sku(ventas))
+    assert hechos['stock_muerto'].sum() == (hechos['stock_unidades'] > 0).sum()
+    totales = consultar_cubo(construir_cubo(hechos))["totales"]
+    assert totales['valor_stock_muerto'] == totales['valor_stock']
+    if caso == "sin_ventas":
+        assert totales['skus_sin_ventas'] == totales['skus'] and totales['ingresos'] == 0
+
+
+def test_un_solo_sku_y_sku_repetido_en_inventario(datos):
+    ventas, inventario = datos
+    sku = ventas[SKU_COL].iloc[0]
+    fila = inventario[inventario[SKU_COL] == sku]
+    repetido = pd.concat([fila, fila.assign(**{SKU_COL: f" {sku} ", 'Cantidad en stock actual': 999})], ignore_index=True)
+    cubo = _cubo(ventas, repetido)
+    raiz = consultar_cubo(cubo)
+    # Como en process_csv_abc: el único SKU acumula el 100% de los ingresos y queda en C
+    assert raiz["totales"]["skus"] == 1 and raiz["totales"]["skus_C"] == 1
+    assert raiz["totales"]["stock_unidades"] == max(float(fila['Cantidad en stock actual'].iloc[0]), 0)
+    ruta = [raiz["hijos"][0]["nombre"]]
+    ruta.append(consultar_cubo(cubo, *ruta)["hijos"][0]["nombre"])
+    ruta.append(consultar_cubo(cubo, *ruta)["hijos"][0]["nombre"])
+    hoja = consultar_cubo(cubo, *ruta, pagina=7, tam_pagina=0)
+    assert [s["sku"] for s in hoja["skus"]] == [sku] and (hoja["pagina"], hoja["total_paginas"]) == (1, 1)
+
+
+def test_categoria_vacia_y_paginas_de_skus(datos):
+    ventas, inventario = datos
+    cubo = _cubo(ventas, inventario)
+    assert 'Sin Categoría' in cubo["niveles"][1].index
+    marcas = consultar_cubo(cubo, 'Pinturas', 'General')["hijos"]
+    total = marcas[0]["skus"]
+    hoja = consultar_cubo(cubo, 'Pinturas', 'General', marcas[0]["nombre"], ordenar_por='ingresos', tam_pagina=10, pagina=2)
+    assert hoja["total_skus"] == total and hoja["total_paginas"] == -(-total // 10)
+    ingresos = [s["ingresos"] for s in hoja["skus"]]
+    assert len(ingresos) == 10 and ingresos == sorted(ingresos, reverse=True)
+
+
+def test_consultas_invalidas(datos):
+    cubo = _cubo(*datos)
+    with pytest.raises(ValueError):
+        consultar_cubo(cubo, subcategoria='General')
+    with pytest.raises(ValueError):
+        consultar_cubo(cubo, ordenar_por='precio')
+    with pytest.raises(KeyError):
+        consultar_cubo(cubo, 'No existe')
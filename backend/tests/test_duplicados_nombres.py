@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from bench_duplicados_nombres import generar_catalogo
+from duplicados_nombres import NGRAMA, UMBRAL_SIMILITUD, agrupar_nombres_similares, normalizar_nombres
+
+
+def _jaccard_exacto(normalizados: pd.DataFrame):
+    """Jaccard de trigramas (conjuntos) de todos los pares, con un producto disperso."""
+    trigramas = [{t[k:k + NGRAMA] for k in range(max(1, len(t) - NGRAMA + 1))} for t in normalizados["texto"].str.pad(NGRAMA, side='right')]
+    vocabulario = {g: i for i, g in enumerate(set().union(*trigramas))}
+    filas = np.repeat(np.arange(len(trigramas)), [len(t) for t in trigramas])
+    columnas = [vocabulario[g] for t in trigramas for g in t]
+    a = sparse.csr_matrix((np.ones(len(columnas)), (filas, columnas)), shape=(len(trigramas), len(vocabulario)))
+    interseccion = (a @ a.T).tocoo()
+    tamano = np.asarray(a.sum(axis=1)).ravel()
+    i, j, inter = interseccion.row, interseccion.col, interseccion.data
+    return i, j, inter / (tamano[i] + tamano[j] - inter)
+
+
+def test_recall_del_lsh_contra_fuerza_bruta():
+    nombres, _ = generar_catalogo(3000, fraccion_variantes=0.3, semilla=5)
+    grupo = agrupar_nombres_similares(nombres)["grupo"]
+    normalizados = normalizar_nombres(nombres)
+    i, j, jaccard = _jaccard_exacto(normalizados)
+    numeros = normalizados["numeros"].to_numpy()
+    claro = (i < j) & (jaccard >= UMBRAL_SIMILITUD + 0.1) & (numeros[i] == numeros[j])
+    assert claro.sum() > 100
+    assert (grupo[i[claro]] == grupo[j[claro]]).mean() >= 0.97
+
+
+def test_variantes_sembradas_quedan_con_su_original():
+    nombres, base = generar_catalogo(5000)
+    grupo = agrupar_nombres_similares(nombres)["grupo"]
+    num_bases = int((np.arange(len(base)) == base).sum())
+    variantes = np.arange(num_bases, len(base))
+    assert (grupo[variantes] == grupo[base[variantes]]).mean() > 0.9
+
+
+def test_numeros_distintos_nunca_se_agrupan():
+    nombres = pd.Series(["TORNILLO 1/2 X 2 STANLEY", "Tornillo 1/2 x 2 Stanley", "TORNILLO 3/8 X 2 STANLEY"])
+    resultado = agrupar_nombres_similares(nombres)
+    assert resultado["grupo"][0] == resultado["grupo"][1] != resultado["grupo"][2]
+
+
+def test_catalogo_vacio_y_nombres_vacios():
+    vacio = agrupar_nombres_similares(pd.Series([], dtype=object))
+    assert len(vacio["grupo"]) == 0 and vacio["nombres_distintos"] == 0
+    assert list(agrupar_nombres_similares(pd.Series([np.nan, "  "]))["grupo"]) == [-1, -1]
+    resultado = agrupar_nombres_similares(pd.Series([np.nan, "  ", "CANDADO FORTE 40MM"]))
+    assert list(resultado["grupo"][:2]) == [-1, -1] and resultado["grupo"][2] >= 0
+
+
+def test_un_solo_nombre():
+    resultado = agrupar_nombres_similares(pd.Series(["CANDADO FORTE 40MM"]))
+    assert list(resultado["grupo"]) == [0] and resultado["similitud"][0] == 0.0
+
+
+def test_nombres_repetidos_quedan_juntos_con_similitud_uno():
+    nombres = pd.Series(["MARTILLO DE UÑA TRUPER 16OZ", "martillo uña truper 16oz", "  MARTILLO DE UNA TRUPER 16OZ ", "FOCO LED 9W"])
+    resultado = agrupar_nombres_similares(nombres)
+    assert len(set(resultado["grupo"][:3])) == 1 and resultado["grupo"][3] != resultado["grupo"][0]
+    assert resultado["nombres_distintos"] == 2
+    assert list(resultado["similitud"][:3]) == [1.0, 1.0, 1.0]
+
+
+@pytest.mark.parametrize("nombre, texto, numeros", [
+    ("Martillo de Uña 16OZ", "martillouna16oz", "16"),
+    ("PINTURA LÁTEX 3/4 GL", "pinturalatex3/4gl", "3/4"),
+    ("TUBO PVC 1/2 X 3", "tubopvc1/2x3", "1/2|3"),
+])
+def test_normalizacion(nombre, texto, numeros):
+    normalizado = normalizar_nombres(pd.Series([nombre])).iloc[0]
+    assert (normalizado["texto"], normalizado["numeros"]) == (texto, numeros)
@@ -0,0 +1,118 @@
+import io
+import itertools
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_escenarios_plan_compra import generar_datos
+from escenarios_plan_compra import COLUMNAS_KPI, MAX_ESCENARIOS, grilla_de_escenarios
+from track_expenses import process_csv_plan_compra_escenarios, process_csv_plan_compra_sugerido
+
+SKU_COL = 'SKU / Código de producto'
+BASE = dict(score_ventas=8, score_ingreso=6, score_margen=4, score_dias_venta=2, peso_ventas_historicas=0.6,
+            dias_cobertura_ideal_base=10, lead_time_dias=7.0, dias_seguridad_base=0, nivel_servicio=0.95)
+
+# Las columnas de parámetros de la superficie vienen con su etiqueta; se vuelven a su nombre
+ETIQUETAS_INVERSAS = {
+    'Score Ventas': 'score_ventas', 'Score Margen': 'score_margen', 'Peso Ventas Históricas': 'peso_ventas_historicas',
+    'Días de Cobertura Ideal': 'dias_cobertura_ideal_base', 'Lead Time (Días)': 'lead_time_dias',
+    'Días de Seguridad': 'dias_seguridad_base', 'Nivel de Servicio': 'nivel_servicio',
+}
+GRILLAS = {
+    'dias': {'score_ventas': [8, 2], 'peso_ventas_historicas': [0.3, 0.6], 'dias_cobertura_ideal_base': [5, 15],
+             'lead_time_dias': [3, 10], 'dias_seguridad_base': [0, 2]},
+    'variabilidad': {'nivel_servicio': [0.9, 0.98], 'lead_time_dias': [4, 12], 'score_margen': [0, 9]},
+}
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return generar_datos(400, 15_000)
+
+
+def _a_numero(texto) -> float:
+    return float(str(texto).replace('S/', '').replace(',', '').strip())
+
+
+def _en_silencio(funcion, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcion(*args, **kwargs)
+
+
+def _comparar_con_el_plan(ventas, inventario, metodo, grilla, **filtros):
+    """Cada fila de la superficie contra una ejecución completa del Plan de Compra con esos parámetros."""
+    superficie = _en_silencio(
+        process_csv_plan_compra_escenarios, ventas, inventario, grilla_escenarios=grilla, metodo_stock_seguridad=metodo, **BASE, **filtros
+    )["data"].rename(columns=ETIQUETAS_INVERSAS).set_index(list(grilla))
+    assert len(superficie) == int(np.prod([len(v) for v in grilla.values()]))
+    for valores in itertools.product(*grilla.values()):
+        params = {**BASE, **dict(zip(grilla, valores))}
+        scores = [params.pop(f'score_{p}') for p in ('ventas', 'ingreso', 'margen', 'dias_venta')]
+        pesos = {p: s / sum(scores) for p, s in zip(('ventas', 'ingreso', 'margen', 'dias_venta'), scores)}
+        plan = _en_silencio(process_csv_plan_compra_sugerido, ventas, inventario, pesos_importancia=pesos,
+                            metodo_stock_seguridad=metodo, **params, **filtros)
+        df, kpis = plan["data"], plan["summary"]["kpis"]
+        esperado = [
+            _a_numero(kpis["Inversión Total Sugerida"]), kpis["SKUs a Reponer"], kpis["Unidades Totales a Pedir"],
+            _a_numero(kpis["Margen Potencial de la Compra"]),
+            int((df['¿Pedir Ahora?'] == 'Sí').sum()),
+            int((df['Stock Actual (Unds)'] < df['Punto de Alerta Ideal (Unds)']).sum()),
+        ]
+        clave = tuple(float(v) for v in valores)
+        obtenido = superficie.loc[clave if len(clave) > 1 else clave[0], list(COLUMNAS_KPI.values())].tolist()
+        np.testing.assert_allclose(obtenido, esperado, atol=0.011, err_msg=f"'{metodo}', escenario {dict(zip(grilla, valores))}")
+
+
+@pytest.mark.parametrize("metodo", list(GRILLAS))
+def test_superficie_igual_al_plan_de_compra_completo(datos, metodo):
+    _comparar_con_el_plan(*datos, metodo, GRILLAS[metodo])
+
+
+def test_un_solo_sku(datos):
+    ventas, inventario = datos
+    _comparar_con_el_plan(ventas, inventario, 'dias', {'lead_time_dias': [3, 10], 'dias_cobertura_ideal_base': [5, 15]},
+                          filtro_skus=[ventas[SKU_COL].iloc[0]])
+
+
+def test_sku_repetido_en_inventario_cuenta_una_vez(datos):
+    ventas, inventario = datos
+    repetidos = inventario.iloc[[0, 1]].assign(**{SKU_COL: lambda d: " " + d[SKU_COL]})
+    con_repetidos = pd.concat([inventario, repetidos], ignore_index=True)
+    plan = _en_silencio(process_csv_plan_compra_sugerido, ventas, con_repetidos)["data"]
+    assert not plan[SKU_COL].duplicated().any()
+    grilla = {'lead_time_dias': [3, 10]}
+    pd.testing.assert_frame_equal(
+        _en_silencio(process_csv_plan_compra_escenarios, ventas, con_repetidos, grilla_escenarios=grilla)["data"],
+        _en_silencio(process_csv_plan_compra_escenarios, ventas, inventario, grilla_escenarios=grilla)["data"],
+    )
+    _comparar_con_el_plan(ventas, con_repetidos, 'dias', grilla)
+
+
+@pytest.mark.parametrize("caso", ["sin_ventas", "fechas_vacias", "filtro_sin_coincidencias"])
+def test_sin_productos_para_simular(datos, caso):
+    ventas, inventario = datos
+    filtros = {}
+    if caso == "sin_ventas":
+        ventas = ventas.iloc[0:0]
+    elif caso == "fechas_vacias":
+        ventas = ventas.assign(**{'Fecha de venta': np.nan})
+    else:
+        filtros = {'incluir_solo_marcas': ['NO EXISTE']}
+    resultado = _en_silencio(process_csv_plan_compra_escenarios, ventas, inventario, grilla_escenarios={'lead_time_dias': [3, 7]}, **filtros)
+    assert resultado["data"].empty and resultado["summary"]["kpis"] == {}
+
+
+def test_grilla_vacia_es_un_solo_escenario_con_los_valores_base():
+    escenarios = grilla_de_escenarios(BASE, {'lead_time_dias': [], 'dias_seguridad_base': 2, 'score_ventas': [8, 8, 5]})
+    assert len(escenarios) == 2
+    assert set(escenarios['lead_time_dias']) == {7.0} and set(escenarios['dias_seguridad_base']) == {2.0}
+
+
+def test_grilla_invalida():
+    with pytest.raises(ValueError):
+        grilla_de_escenarios(BASE, {'parametro_inventado': [1, 2]})
+    demasiados = {p: list(range(int(MAX_ESCENARIOS ** 0.25) + 2)) for p in ('score_ventas', 'score_margen', 'lead_time_dias', 'dias_seguridad_base')}
+    with pytest.raises(ValueError):
+        grilla_de_escenarios(BASE, demasiados)
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from evolucion_skus import SKU_COL, comparar_snapshots, construir_snapshot_skus, deserializar_snapshot, serializar_snapshot
+
+COLUMNAS = [
+    SKU_COL, 'Clasificación BCG', 'Alerta de Stock', 'Clasificación Diagnóstica', 'Margen Real (S/.)',
+    'Inversión Stock Actual (S/.)', 'Stock Actual (Unds)', 'Stock Ideal Sugerido (Unds)', 'Precio Compra (S/.)'
+]
+
+
+def _maestro(filas):
+    return pd.DataFrame(filas, columns=COLUMNAS)
+
+
+@pytest.fixture
+def fotos():
+    previo = construir_snapshot_skus(_maestro([
+        ("A", "Estrella", "Saludable", "Saludable", 100.0, 300.0, 20, 20, 15.0),
+        ("B", "Estrella", "Saludable", "Saludable", 80.0, 200.0, 10, 10, 20.0),
+        ("C", "Vaca Lechera", "Sobre-stock", "Saludable", 50.0, 150.0, 30, 10, 5.0), # en riesgo: (30-10)*5 = 100
+        ("D", "Perro", "Saludable", "Stock Muerto", 0.0, 500.0, 50, 0, 10.0),       # en riesgo: 500
+        ("E", "Perro", "Saludable", "Baja Rotación", 5.0, 80.0, 8, 2, 10.0),
+        ("R", "Perro", "Saludable", "Stock Muerto", 0.0, 50.0, 5, 0, 10.0),          # en riesgo: 50, se retira
+    ]))
+    actual = construir_snapshot_skus(_maestro([
+        (" A ", "Estrella", "Agotado", "Saludable", 90.0, 0.0, 0, 20, 15.0),
+        ("B", "Estrella", "Stock Bajo", "Saludable", 70.0, 40.0, 2, 10, 20.0),
+        ("C", "Vaca Lechera", "Saludable", "Saludable", 55.0, 50.0, 10, 10, 5.0),
+        ("D", "Perro", "Saludable", "Stock Muerto", 0.0, 400.0, 40, 0, 10.0),       # en riesgo: 400
+        ("E", "Perro", "Saludable", "Stock Muerto", 0.0, 80.0, 8, 0, 10.0),         # en riesgo: 80
+        ("N", "Interrogante", "Saludable", "Saludable", 10.0, 60.0, 6, 6, 10.0),
+    ]))
+    return previo, actual
+
+
+def test_foto_por_sku_con_valor_en_riesgo(fotos):
+    previo, actual = fotos
+    assert previo.set_index("sku")["valor_en_riesgo"].to_dict() == {"A": 0.0, "B": 0.0, "C": 100.0, "D": 500.0, "E": 0.0, "R": 50.0}
+    assert actual["sku"].tolist()[0] == "A"
+
+
+def test_comparacion_con_cambios_conocidos(fotos):
+    previo, actual = fotos
+    resumen = comparar_snapshots(actual, previo)
+    assert (resumen["skus_en_comun"], resumen["skus_nuevos"], resumen["skus_retirados"]) == (5, 1, 1)
+
+    alertas = {(t["desde"], t["hacia"]): (t["cantidad"], sorted(t["skus_ejemplo"])) for t in resumen["transiciones"]["alerta_stock"]}
+    assert alertas == {
+        ("Saludable", "Agotado"): (1, ["A"]),
+        ("Saludable", "Stock Bajo"): (1, ["B"]),
+        ("Sobre-stock", "Saludable"): (1, ["C"]),
+    }
+    assert resumen["transiciones"]["clase_bcg"] == []
+    diagnostico = resumen["transiciones"]["diagnostico"]
+    assert [(t["desde"], t["hacia"], t["skus_ejemplo"]) for t in diagnostico] == [("Baja Rotación", "Stock Muerto", ["E"])]
+
+    eventos = {e["tipo"]: e for e in resumen["eventos_destacados"]}
+    assert eventos["entraron_en_quiebre"]["clase_bcg"] == "Estrella"
+    assert sorted(eventos["entraron_en_quiebre"]["skus_ejemplo"]) == ["A", "B"]
+    assert eventos["nuevo_stock_muerto"]["skus_ejemplo"] == ["E"]
+
+    assert resumen["valor_en_riesgo"] == {"previo": 650.0, "actual": 480.0, "delta": -170.0}
+    # Solo SKUs en común: A -10, B -10, C +5, D 0, E -5
+    assert resumen["margen_real_delta_skus_en_comun"] == -20.0
+
+
+def test_serializar_y_deserializar_da_la_misma_comparacion(fotos):
+    previo, actual = fotos
+    leidos = [deserializar_snapshot(serializar_snapshot(f)) for f in (actual, previo)]
+    for leido, foto in zip(leidos, (actual, previo)):
+        pd.testing.assert_frame_equal(leido, foto, check_categorical=False)
+    assert comparar_snapshots(*leidos) == comparar_snapshots(actual, previo)
+
+
+def test_sin_foto_previa_no_hay_comparacion(fotos):
+    _, actual = fotos
+    assert comparar_snapshots(actual, None) is None
+    assert comparar_snapshots(actual, actual.iloc[0:0]) is None
+
+
+def test_sin_cambios_y_columnas_faltantes():
+    foto = construir_snapshot_skus(pd.DataFrame({SKU_COL: ["A", "A", "B"], 'Clasificación BCG': ["Estrella", "Perro", None]}))
+    # SKU repetido: queda la primera fila; sin columnas de alerta o valor, N/A y ceros
+    assert foto["sku"].tolist() == ["A", "B"] and foto["clase_bcg"].astype(str).tolist() == ["Estrella", "N/A"]
+    assert (foto["valor_en_riesgo"] == 0).all() and (foto["alerta_stock"] == "N/A").all()
+    resumen = comparar_snapshots(foto, foto)
+    assert all(t == [] for t in resumen["transiciones"].values())
+    assert resumen["eventos_destacados"] == [] and resumen["valor_en_riesgo"]["delta"] == 0
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_gastos_bancarios import (
+    _process_csv_por_filas, _standardise_categories_por_filas, generar_categorias, generar_extracto
+)
+from track_expenses import clean_data, process_csv, standardise_categories, summarise_expenses
+
+
+@pytest.mark.parametrize("formato", ["westpac", "simple"])
+def test_pipeline_igual_a_la_implementacion_fila_por_fila(formato):
+    extracto = generar_extracto(5000, formato)
+    nuevo, referencia = process_csv(extracto), _process_csv_por_filas(extracto)
+    pd.testing.assert_frame_equal(nuevo, referencia)
+    # clean_data (exportación) = columnas + categorías estandarizadas + orden por fecha
+    exportado = _standardise_categories_por_filas(referencia[['Date', 'Category', 'Amount', 'Month', 'Week']].copy())
+    pd.testing.assert_frame_equal(clean_data(nuevo), exportado.sort_values(by='Date', ascending=False))
+    assert summarise_expenses(nuevo) == summarise_expenses(referencia)
+
+
+def test_categorias_iguales_a_la_implementacion_fila_por_fila():
+    categorias = generar_categorias(5000)
+    pd.testing.assert_frame_equal(standardise_categories(categorias.copy()), _standardise_categories_por_filas(categorias.copy()))
+
+
+@pytest.mark.parametrize("formato", ["westpac", "simple"])
+def test_una_sola_linea(formato):
+    extracto = generar_extracto(400, formato)
+    valida = process_csv(extracto).index[0]
+    pd.testing.assert_frame_equal(process_csv(extracto.loc[[valida]]), _process_csv_por_filas(extracto.loc[[valida]]))
+
+
+@pytest.mark.parametrize("formato", ["westpac", "simple"])
+def test_extracto_vacio_o_sin_fechas_validas(formato):
+    extracto = generar_extracto(200, formato)
+    for sin_lineas in (extracto.iloc[0:0], extracto.assign(Date="2023-13-45"), extracto.assign(Date=None)):
+        procesado = process_csv(sin_lineas)
+        assert procesado.empty and {'Date', 'Category', 'Amount', 'Week', 'Month'} <= set(procesado.columns)
+        assert summarise_expenses(procesado) is None and clean_data(procesado) is None
+
+
+def test_narrativas_repetidas_y_no_textuales():
+    extracto = pd.DataFrame({
+        "Date": ["01/02/2023"] * 4,
+        "Description": ["EFTPOS DEBIT BEEM IT 1", "EFTPOS DEBIT BEEM IT 1", np.nan, 123],
+        "Amount": [10.0, 10.0, 5.0, 7.0],
+    })
+    procesado = process_csv(extracto)
+    assert list(procesado['Category']) == ["Beem Debit", "Beem Debit"] and procesado['Amount'].sum() == 20.0
+
+
+def test_categoria_vacia_se_conserva_y_sin_columna_no_cambia():
+    df = pd.DataFrame({"Category": [None, "netflix.com", "Tienda rara"]})
+    resultado = standardise_categories(df.copy())
+    assert resultado['Category'].iloc[0] is None and resultado['Category'].iloc[2] == 'General / Miscellaneous'
+    sin_categoria = pd.DataFrame({"Amount": [1.0]})
+    pd.testing.assert_frame_equal(standardise_categories(sin_categoria.copy()), sin_categoria)
+
+
+def test_formato_desconocido():
+    with pytest.raises(ValueError):
+        process_csv(pd.DataFrame({"Fecha": ["01/02/2023"], "Monto": [1.0]}))
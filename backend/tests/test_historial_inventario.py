@@ -0,0 +1,128 @@
+import io
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_historial_inventario import generar_inventarios
+from historial_inventario import (
+    ALERTA_ALZA_CON_AJUSTE, ALERTA_ALZA_SIN_AJUSTE, ALERTA_BAJA, TOLERANCIA, UMBRAL_CAMBIO_COSTO_PCT, alertas_de_costo,
+    comparar_fotos_inventario, construir_foto_inventario, deserializar_foto_inventario, resumen_foto,
+    serializar_foto_inventario
+)
+from track_expenses import auditar_margenes_de_productos_nuevo
+
+SKU_COL = 'SKU / Código de producto'
+
+
+@pytest.fixture(scope="module")
+def inventarios():
+    return generar_inventarios(5_000)
+
+
+def _diferencia_directa(previo: pd.DataFrame, actual: pd.DataFrame) -> dict:
+    """Referencia: recorrido SKU por SKU con diccionarios."""
+    def filas(df):
+        return {
+            str(sku).strip(): (float(stock), float(costo), float(precio))
+            for sku, stock, costo, precio in zip(df[SKU_COL], df['Cantidad en stock actual'], df['Precio de compra actual (S/.)'], df['Precio de venta actual (S/.)'])
+        }
+    antes, despues = filas(previo), filas(actual)
+    distinto = lambda a, b: not (np.isnan(a) or np.isnan(b)) and abs(a - b) > TOLERANCIA
+    comunes = antes.keys() & despues.keys()
+    return {
+        "nuevo": set(despues) - set(antes),
+        "retirado": set(antes) - set(despues),
+        "modificado": {s for s in comunes if abs(antes[s][0] - despues[s][0]) > TOLERANCIA or distinto(antes[s][1], despues[s][1]) or distinto(antes[s][2], despues[s][2])},
+        "alza_sin_ajuste": {
+            s for s in comunes
+            if distinto(antes[s][1], despues[s][1]) and (despues[s][1] - antes[s][1]) / antes[s][1] * 100 >= UMBRAL_CAMBIO_COSTO_PCT
+            and not despues[s][2] - antes[s][2] > TOLERANCIA
+        },
+    }
+
+
+def _inventario(filas):
+    return pd.DataFrame(filas, columns=[SKU_COL, 'Cantidad en stock actual', 'Precio de compra actual (S/.)', 'Precio de venta actual (S/.)'])
+
+
+def test_diferencia_igual_a_la_comparacion_directa(inventarios):
+    previo, actual = inventarios
+    cambios = comparar_fotos_inventario(construir_foto_inventario(actual), construir_foto_inventario(previo))["cambios"]
+    esperado = _diferencia_directa(previo, actual)
+    for estado in ('nuevo', 'retirado', 'modificado'):
+        assert set(cambios.loc[cambios["estado"] == estado, "sku"]) == esperado[estado]
+    alertas = alertas_de_costo(cambios)
+    assert set(alertas.index[alertas["alerta"] == ALERTA_ALZA_SIN_AJUSTE]) == esperado["alza_sin_ajuste"]
+
+
+def test_fotos_serializadas_dan_la_misma_diferencia(inventarios):
+    foto_previa, foto_actual = (construir_foto_inventario(df) for df in inventarios)
+    assert foto_previa["costo"].isna().any()
+    ida_y_vuelta = [deserializar_foto_inventario(serializar_foto_inventario(f)) for f in (foto_actual, foto_previa)]
+    pd.testing.assert_frame_equal(ida_y_vuelta[1], foto_previa)
+    assert comparar_fotos_inventario(*ida_y_vuelta)["resumen"] == comparar_fotos_inventario(foto_actual, foto_previa)["resumen"]
+
+
+def test_auditoria_alza_de_costo_lista_los_skus_esperados(inventarios):
+    previo, actual = inventarios
+    esperado = _diferencia_directa(previo, actual)["alza_sin_ajuste"]
+    ventas = pd.DataFrame({
+        SKU_COL: actual[SKU_COL].str.strip().repeat(2).to_numpy(),
+        'Fecha de venta': '15/06/2024',
+        'Cantidad vendida': 1,
+        'Precio de venta unitario (S/.)': np.repeat(actual['Precio de venta actual (S/.)'].to_numpy(), 2),
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        reporte = auditar_margenes_de_productos_nuevo(
+            ventas, actual, tipo_analisis_margen='alza_de_costo', foto_inventario_previa=construir_foto_inventario(previo),
+            periodo_analisis_dias=0
+        )
+    assert set(reporte["data"][SKU_COL]) == esperado
+    assert reporte["summary"]["kpis"].get("# SKUs con Alza de Costo sin Ajuste de Precio") == len(esperado)
+
+
+def test_inventarios_vacios():
+    vacia = construir_foto_inventario(_inventario([]))
+    assert vacia.empty and resumen_foto(vacia) == {"skus": 0, "unidades": 0.0, "valor_stock": 0.0}
+    assert deserializar_foto_inventario(serializar_foto_inventario(vacia)).empty
+    assert comparar_fotos_inventario(vacia, vacia)["cambios"].empty
+
+    foto = construir_foto_inventario(_inventario([("A", 3, 10.0, 14.0)]))
+    assert comparar_fotos_inventario(foto, vacia)["resumen"]["skus_nuevos"] == 1
+    assert comparar_fotos_inventario(vacia, foto)["resumen"]["skus_retirados"] == 1
+    assert alertas_de_costo(comparar_fotos_inventario(vacia, foto)["cambios"]).empty
+
+
+def test_un_solo_sku_con_alertas_de_costo():
+    previa = construir_foto_inventario(_inventario([("A", 3, 10.0, 14.0)]))
+    casos = {
+        (11.0, 14.0): ALERTA_ALZA_SIN_AJUSTE,
+        (11.0, 15.5): ALERTA_ALZA_CON_AJUSTE,
+        (9.0, 14.0): ALERTA_BAJA,
+    }
+    for (costo, precio), alerta in casos.items():
+        actual = construir_foto_inventario(_inventario([("A", 3, costo, precio)]))
+        alertas = alertas_de_costo(comparar_fotos_inventario(actual, previa)["cambios"])
+        assert alertas.loc["A", "alerta"] == alerta
+    # Un cambio por debajo del umbral modifica el SKU pero no genera alerta
+    actual = construir_foto_inventario(_inventario([("A", 3, 10.2, 14.0)]))
+    cambios = comparar_fotos_inventario(actual, previa)["cambios"]
+    assert list(cambios["estado"]) == ["modificado"] and alertas_de_costo(cambios).empty
+
+
+def test_sku_repetido_se_queda_con_su_primera_fila():
+    foto = construir_foto_inventario(_inventario([("A", 3, 10.0, 14.0), (" A ", 99, 50.0, 70.0), ("B", 1, 2.0, 3.0)]))
+    assert list(foto["sku"]) == ["A", "B"] and foto.loc[0, "stock"] == 3
+
+
+def test_costos_faltantes_no_son_variaciones():
+    previa = construir_foto_inventario(_inventario([("A", 3, np.nan, 14.0), ("B", 2, 8.0, "sin precio")]))
+    actual = construir_foto_inventario(_inventario([("A", 3, 10.0, 14.0), ("B", 2, np.nan, 12.0)]))
+    diferencia = comparar_fotos_inventario(actual, previa)
+    assert diferencia["cambios"].empty and diferencia["resumen"]["skus_con_cambio_costo"] == 0
+    # Sin la columna de precio, la foto la guarda como faltante
+    sin_precio = construir_foto_inventario(_inventario([("A", 3, 10.0, 14.0)]).drop(columns=['Precio de venta actual (S/.)']))
+    assert sin_precio["precio"].isna().all()
+    assert deserializar_foto_inventario(serializar_foto_inventario(sin_precio))["precio"].isna().all()
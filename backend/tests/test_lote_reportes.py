@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from main import _StreamingConCierre
+
+
+def _respuesta(cierres: list, iniciado: list):
+    async def contenido():
+        iniciado.append(True)
+        yield b'{"tipo": "reporte"}\n'
+        yield b'{"tipo": "resumen"}\n'
+    return _StreamingConCierre(contenido(), al_cerrar=lambda: cierres.append(True), media_type="application/x-ndjson")
+
+
+def _scope(version_asgi: str):
+    return {"type": "http", "asgi": {"version": "3.0", "spec_version": version_asgi}}
+
+
+async def _sin_desconexion():
+    await asyncio.sleep(3600)
+
+
+def test_cierra_una_vez_al_terminar_la_respuesta():
+    cierres, iniciado, enviados = [], [], []
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    asyncio.run(_respuesta(cierres, iniciado)(_scope("2.4"), _sin_desconexion, send))
+    assert cierres == [True]
+    assert b"".join(m.get("body", b"") for m in enviados if m["type"] == "http.response.body").count(b"\n") == 2
+
+
+def test_cierra_si_el_cliente_se_desconecta_antes_de_leer():
+    cierres, iniciado = [], []
+
+    async def send(mensaje):
+        raise OSError("conexión cerrada por el cliente")
+
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(_respuesta(cierres, iniciado)(_scope("2.4"), _sin_desconexion, send))
+    # El generador nunca empezó (su finally no habría corrido) y aun así se liberó el turno
+    assert iniciado == [] and cierres == [True]
+
+
+def test_cierra_si_el_cliente_se_desconecta_con_asgi_anterior():
+    cierres, iniciado = [], []
+
+    async def desconectado():
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        await asyncio.sleep(0.01)
+
+    asyncio.run(_respuesta(cierres, iniciado)(_scope("2.0"), desconectado, send))
+    assert cierres == [True]
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+import motor_duckdb
+from bench_motor_duckdb import MOTORES
+from bench_ventas_por_bloques import SKU_COL, _normalizar, generar_bloque_ventas, generar_inventario
+from compresion import comprimir_contenido
+from ventas_por_bloques import COLUMNAS_CLAVE, CANTIDAD_COL, condensar_ventas
+
+
+@pytest.fixture(scope="module")
+def inventario():
+    return generar_inventario(300)
+
+
+@pytest.fixture(scope="module")
+def ventas(inventario):
+    return generar_bloque_ventas(0, 20_000, inventario, 365, np.random.default_rng(42))
+
+
+def _con_backend(backend, motor, df_ventas, df_inventario):
+    anterior = motor_duckdb.establecer_backend(backend)
+    try:
+        return _normalizar(motor(df_ventas.copy(), df_inventario.copy()))
+    finally:
+        motor_duckdb.establecer_backend(anterior)
+
+
+def _iguales(obtenido, esperado):
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_exact=False, rtol=1e-9, atol=0.0101)
+
+
+@pytest.mark.parametrize("nombre", list(MOTORES))
+def test_motores_iguales_con_duckdb_y_pandas(nombre, ventas, inventario):
+    _iguales(_con_backend("duckdb", MOTORES[nombre], ventas, inventario), _con_backend("pandas", MOTORES[nombre], ventas, inventario))
+
+
+@pytest.mark.parametrize("nombre", list(MOTORES))
+@pytest.mark.parametrize("caso", ["sin_ventas", "un_sku", "fechas_vacias", "sku_duplicado_en_inventario"])
+def test_casos_borde_iguales_con_duckdb_y_pandas(nombre, caso, ventas, inventario):
+    if caso == "sin_ventas":
+        df_ventas = ventas.iloc[0:0]
+        df_inventario = inventario
+    elif caso == "un_sku":
+        df_ventas = ventas[ventas[SKU_COL] == ventas[SKU_COL].iloc[0]]
+        df_inventario = inventario
+    elif caso == "fechas_vacias":
+        df_ventas = ventas.iloc[:300].assign(**{"Fecha de venta": np.nan})
+        df_inventario = inventario
+    else:
+        df_ventas = ventas
+        df_inventario = pd.concat([inventario, inventario.iloc[:20]], ignore_index=True)
+    try:
+        esperado = _con_backend("pandas", MOTORES[nombre], df_ventas, df_inventario)
+    except Exception as e:
+        # Si pandas rechaza el caso, DuckDB debe rechazarlo igual
+        with pytest.raises(type(e)):
+            _con_backend("duckdb", MOTORES[nombre], df_ventas, df_inventario)
+        return
+    _iguales(_con_backend("duckdb", MOTORES[nombre], df_ventas, df_inventario), esperado)
+
+
+def _ordenar(df):
+    return df.sort_values(COLUMNAS_CLAVE).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("codec", ["gzip", "none"])
+def test_condensado_desde_disco_igual_al_de_pandas(tmp_path, ventas, codec):
+    contenido, usado = comprimir_contenido(ventas.to_csv(index=False).encode("utf-8"), codec)
+    ruta = tmp_path / ("ventas.csv.gz" if usado == "gzip" else "ventas.csv")
+    ruta.write_bytes(contenido)
+    esperado = condensar_ventas(str(ruta))
+    obtenido = motor_duckdb.condensar_csv([str(ruta)])
+    assert obtenido is not None
+    _iguales(_ordenar(obtenido[esperado.columns]), _ordenar(esperado))
+
+
+def test_condensado_de_varios_segmentos(ventas):
+    mitad = len(ventas) // 2
+    blobs = [comprimir_contenido(parte.to_csv(index=False).encode("utf-8"), "gzip")[0] for parte in (ventas.iloc[:mitad], ventas.iloc[mitad:])]
+    obtenido = motor_duckdb.condensar_blobs(iter(blobs))
+    assert obtenido is not None
+    assert obtenido[CANTIDAD_COL].sum() == ventas[CANTIDAD_COL].sum()
+
+
+def test_condensado_sin_columnas_obligatorias(tmp_path, ventas):
+    ruta = tmp_path / "ventas.csv"
+    ruta.write_text(ventas.drop(columns=[CANTIDAD_COL]).to_csv(index=False), encoding="utf-8")
+    with pytest.raises(ValueError):
+        motor_duckdb.condensar_csv([os.fspath(ruta)])
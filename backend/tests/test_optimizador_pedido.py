@@ -0,0 +1,118 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from optimizador_pedido import optimizar_extras
+
+BRECHA_MAXIMA_HEURISTICA = 0.5
+
+
+def _fuerza_bruta(costo, valor, tope, deficit, capacidad):
+    """Mejor valor entre todas las combinaciones que cumplen el mínimo sin pasar la capacidad (-1 si no hay)."""
+    mejor = -1.0
+    for x in itertools.product(*(range(int(t) + 1) for t in tope)):
+        gasto = float(np.dot(costo, x))
+        if deficit - 1e-9 <= gasto <= capacidad + 1e-9:
+            mejor = max(mejor, float(np.dot(valor, x)))
+    return mejor
+
+
+def _casos_chicos(cantidad, semilla, holgura_minima_costo_max=False):
+    rng = np.random.default_rng(semilla)
+    for _ in range(cantidad):
+        n = int(rng.integers(2, 7))
+        costo = np.round(rng.uniform(1, 60, n), 2)
+        valor = costo * rng.uniform(0.05, 1.5, n)
+        tope = rng.integers(0, 4, n)
+        deficit = float(rng.uniform(1, max(0.8 * float(np.dot(costo, tope)), 2)))
+        holgura = float(rng.uniform(0, 30)) + (costo.max() if holgura_minima_costo_max else 0)
+        yield costo, valor, tope, deficit, holgura
+
+
+def _resolver_una_marca(costo, valor, tope, deficit, holgura, **kwargs):
+    n = len(costo)
+    return optimizar_extras(np.zeros(n, dtype=int), costo, valor, tope, np.array([deficit]), np.array([holgura]), **kwargs)
+
+
+def test_programacion_dinamica_da_el_optimo_dentro_de_la_banda():
+    casos = 0
+    for costo, valor, tope, deficit, holgura in _casos_chicos(400, semilla=3):
+        optimo = _fuerza_bruta(costo, valor, tope, deficit, deficit + holgura)
+        if optimo < 0:
+            continue
+        resultado = _resolver_una_marca(costo, valor, tope, deficit, holgura)
+        casos += 1
+        assert resultado["alcanzado"][0] and not resultado["holgura_ampliada"][0]
+        assert deficit - 1e-6 <= resultado["costo"][0] <= deficit + holgura + 1e-6
+        assert np.all(resultado["extra"] <= tope)
+        assert resultado["valor"][0] == pytest.approx(optimo, rel=1e-9, abs=1e-9)
+    assert casos > 200
+
+
+def test_holgura_ampliada_solo_si_la_banda_del_usuario_no_tiene_solucion():
+    ampliadas = 0
+    for costo, valor, tope, deficit, holgura in _casos_chicos(400, semilla=11):
+        resultado = _resolver_una_marca(costo, valor, tope, deficit, holgura)
+        en_banda = _fuerza_bruta(costo, valor, tope, deficit, deficit + holgura) >= 0
+        capacidad_ampliada = deficit + max(holgura, costo[tope > 0].max(initial=0))
+        ampliable = _fuerza_bruta(costo, valor, tope, deficit, capacidad_ampliada) >= 0
+        assert resultado["holgura_ampliada"][0] == (not en_banda and ampliable)
+        assert resultado["alcanzado"][0] == (en_banda or ampliable)
+        if resultado["holgura_ampliada"][0]:
+            ampliadas += 1
+            assert resultado["costo"][0] <= capacidad_ampliada + 1e-6
+    assert ampliadas > 0
+
+
+def test_heuristica_sin_programacion_dinamica_respeta_la_brecha_maxima():
+    # Con holgura >= costo unitario más alto el voraz siempre llega al mínimo y nunca vale menos de la mitad del óptimo
+    brechas = []
+    for costo, valor, tope, deficit, holgura in _casos_chicos(400, semilla=5, holgura_minima_costo_max=True):
+        optimo = _fuerza_bruta(costo, valor, tope, deficit, deficit + holgura)
+        if optimo <= 0:
+            continue
+        resultado = _resolver_una_marca(costo, valor, tope, deficit, holgura, limite_celdas_dp=0)
+        assert resultado["alcanzado"][0] and not resultado["holgura_ampliada"][0]
+        brechas.append((optimo - resultado["valor"][0]) / optimo)
+    assert max(brechas) <= BRECHA_MAXIMA_HEURISTICA
+    assert np.mean(brechas) < 0.02
+
+
+def test_varias_marcas_a_la_vez_igual_que_por_separado():
+    casos = list(_casos_chicos(30, semilla=8))
+    grupo = np.concatenate([np.full(len(c[0]), g) for g, c in enumerate(casos)])
+    conjunto = optimizar_extras(
+        grupo, np.concatenate([c[0] for c in casos]), np.concatenate([c[1] for c in casos]),
+        np.concatenate([c[2] for c in casos]), np.array([c[3] for c in casos]), np.array([c[4] for c in casos])
+    )
+    for g, caso in enumerate(casos):
+        separado = _resolver_una_marca(*caso)
+        assert conjunto["valor"][g] == pytest.approx(separado["valor"][0])
+        assert conjunto["alcanzado"][g] == separado["alcanzado"][0]
+
+
+def test_sin_productos():
+    vacio = np.array([])
+    resultado = optimizar_extras(vacio.astype(int), vacio, vacio, vacio, np.array([]), np.array([]))
+    assert len(resultado["extra"]) == 0 and len(resultado["alcanzado"]) == 0
+
+
+def test_marca_que_ya_cumple_no_recibe_extras():
+    resultado = optimizar_extras(np.array([0, 0]), np.array([10.0, 5.0]), np.array([10.0, 5.0]), np.array([5, 5]),
+                                 np.array([0.0]), np.array([10.0]))
+    assert resultado["alcanzado"][0]
+    assert resultado["extra"].sum() == 0
+
+
+def test_un_solo_producto():
+    resultado = _resolver_una_marca(np.array([12.5]), np.array([3.0]), np.array([10]), 30.0, 10.0)
+    # 3 unidades (37.50) es lo máximo que entra en la banda [30, 40]
+    assert resultado["extra"].tolist() == [3.0]
+    assert not resultado["holgura_ampliada"][0]
+
+
+def test_stock_insuficiente_no_alcanza():
+    resultado = _resolver_una_marca(np.array([10.0, 20.0]), np.array([1.0, 1.0]), np.array([1, 1]), 100.0, 10.0)
+    assert not resultado["alcanzado"][0]
+    assert not resultado["holgura_ampliada"][0]
@@ -0,0 +1,169 @@
+import asyncio
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import planificador_reportes
+import precalculo
+from planificador_reportes import MAX_EN_COLA_POR_USUARIO, PlanificadorReportes
+
+
+async def _encolar(planificador, usuario, plan, memoria_mb):
+    """Pide un turno en segundo plano y deja que llegue a la cola (o lo reciba)."""
+    tarea = asyncio.create_task(planificador.adquirir(usuario, plan, memoria_mb, "reporte"))
+    await asyncio.sleep(0)
+    return tarea
+
+
+async def _concedidos(*tareas):
+    # La tarea despierta unas vueltas del loop después de que se le concede el turno
+    for _ in range(5):
+        await asyncio.sleep(0)
+    return [t.done() and not t.cancelled() for t in tareas]
+
+
+def test_diamond_se_atiende_antes_que_gratis():
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=1, presupuesto_mb=1000, segundos_max_espera=5)
+        ocupado = await planificador.adquirir("otro", "pro", 50, "reporte")
+        gratis = await _encolar(planificador, "g", "gratis", 100)
+        diamond = await _encolar(planificador, "d", "diamond", 100) # llega después
+        planificador.liberar(ocupado)
+        assert await _concedidos(gratis, diamond) == [False, True]
+        planificador.liberar(diamond.result())
+        assert await _concedidos(gratis) == [True]
+        planificador.liberar(gratis.result())
+        assert planificador.estadisticas()["en_ejecucion"] == 0
+    asyncio.run(escenario())
+
+
+def test_cola_llena_de_un_usuario_responde_429():
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=1, presupuesto_mb=1000, segundos_max_espera=5)
+        ocupado = await planificador.adquirir("otro", "gratis", 50, "reporte")
+        en_cola = [await _encolar(planificador, "u", "gratis", 20) for _ in range(MAX_EN_COLA_POR_USUARIO)]
+        with pytest.raises(HTTPException) as error:
+            await planificador.adquirir("u", "gratis", 20, "reporte")
+        assert error.value.status_code == 429 and "Retry-After" in error.value.headers
+        # Otro usuario sí puede encolar
+        ajeno = await _encolar(planificador, "v", "gratis", 20)
+        assert planificador.estadisticas()["por_plan"]["gratis"]["rechazados_cola"] == 1
+        for tarea in en_cola + [ajeno]:
+            tarea.cancel()
+        await asyncio.gather(*en_cola, ajeno, return_exceptions=True)
+        planificador.liberar(ocupado)
+    asyncio.run(escenario())
+
+
+def test_trabajo_mayor_que_el_presupuesto_responde_413():
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=2, presupuesto_mb=100, segundos_max_espera=5)
+        with pytest.raises(HTTPException) as error:
+            await planificador.adquirir("u", "diamond", 101, "auditoria")
+        assert error.value.status_code == 413 and error.value.detail["memoria_estimada_mb"] == 101
+        assert planificador.estadisticas()["por_plan"]["diamond"]["rechazados_memoria"] == 1
+        assert planificador.estadisticas()["en_cola"] == 0
+    asyncio.run(escenario())
+
+
+def test_espera_mayor_al_plazo_responde_503():
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=1, presupuesto_mb=1000, segundos_max_espera=0.05)
+        ocupado = await planificador.adquirir("otro", "gratis", 50, "reporte")
+        with pytest.raises(HTTPException) as error:
+            await planificador.adquirir("u", "pro", 50, "reporte")
+        assert error.value.status_code == 503 and error.value.headers["Retry-After"] == "30"
+        estadisticas = planificador.estadisticas()
+        assert estadisticas["en_cola"] == 0 and estadisticas["por_plan"]["pro"]["expirados_en_cola"] == 1
+        planificador.liberar(ocupado)
+    asyncio.run(escenario())
+
+
+def test_cancelar_libera_el_turno():
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=1, presupuesto_mb=1000, segundos_max_espera=5)
+        ocupado = await planificador.adquirir("otro", "gratis", 50, "reporte")
+        # Cancelado mientras espera: sale de la cola
+        esperando = await _encolar(planificador, "u", "gratis", 50)
+        esperando.cancel()
+        await asyncio.gather(esperando, return_exceptions=True)
+        assert planificador.estadisticas()["en_cola"] == 0
+
+        # Cancelado justo después de recibir el turno: la memoria y el cupo se devuelven
+        concedido = await _encolar(planificador, "u", "gratis", 50)
+        siguiente = await _encolar(planificador, "w", "gratis", 50)
+        planificador.liberar(ocupado)
+        concedido.cancel()
+        await asyncio.gather(concedido, return_exceptions=True)
+        assert concedido.cancelled()
+        assert await _concedidos(siguiente) == [True]
+        planificador.liberar(siguiente.result())
+        estadisticas = planificador.estadisticas()
+        assert estadisticas["en_ejecucion"] == 0 and estadisticas["memoria_en_uso_mb"] == 0
+    asyncio.run(escenario())
+
+
+def test_trabajo_grande_se_reserva_tras_la_espera(monkeypatch):
+    async def escenario(reservar_tras):
+        monkeypatch.setattr(planificador_reportes, "SEGUNDOS_ANTES_DE_RESERVAR", reservar_tras)
+        planificador = PlanificadorReportes(max_en_ejecucion=3, presupuesto_mb=100, segundos_max_espera=5)
+        ocupado = await planificador.adquirir("a", "gratis", 60, "reporte")
+        grande = await _encolar(planificador, "b", "diamond", 80) # primero por tiempo virtual, pero no cabe
+        chico = await _encolar(planificador, "c", "gratis", 30)   # cabe en la memoria libre
+        concedidos = await _concedidos(grande, chico)
+        for tarea in (grande, chico):
+            tarea.cancel()
+        await asyncio.gather(grande, chico, return_exceptions=True)
+        planificador.liberar(ocupado)
+        return concedidos
+
+    # Al principio el chico puede adelantar al grande...
+    assert asyncio.run(escenario(10.0)) == [False, True]
+    # ...pero tras SEGUNDOS_ANTES_DE_RESERVAR la memoria que se libere es para el grande
+    assert asyncio.run(escenario(-1.0)) == [False, False]
+
+
+def test_grande_reservado_recibe_la_memoria_liberada(monkeypatch):
+    monkeypatch.setattr(planificador_reportes, "SEGUNDOS_ANTES_DE_RESERVAR", -1.0)
+
+    async def escenario():
+        planificador = PlanificadorReportes(max_en_ejecucion=3, presupuesto_mb=100, segundos_max_espera=5)
+        ocupado = await planificador.adquirir("a", "gratis", 60, "reporte")
+        grande = await _encolar(planificador, "b", "diamond", 80)
+        chico = await _encolar(planificador, "c", "gratis", 30)
+        planificador.liberar(ocupado)
+        assert await _concedidos(grande, chico) == [True, False]
+        planificador.liberar(grande.result())
+        assert await _concedidos(chico) == [True]
+        planificador.liberar(chico.result())
+    asyncio.run(escenario())
+
+
+def test_auditoria_precalculada_pide_turno(monkeypatch):
+    planificador = PlanificadorReportes(max_en_ejecucion=1, presupuesto_mb=1000, segundos_max_espera=0.05)
+    ocupados_al_auditar = []
+
+    async def cargar(*args, **kwargs):
+        return pd.DataFrame({"SKU / Código de producto": ["A"]})
+
+    async def sin_agregados(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(precalculo, "PLANIFICADOR", planificador)
+    monkeypatch.setattr(precalculo, "_semaforo_precalculo", None) # se crea en el loop de este test
+    monkeypatch.setattr(precalculo, "cargar_ventas", cargar)
+    monkeypatch.setattr(precalculo, "cargar_dataframe", cargar)
+    monkeypatch.setattr(precalculo, "obtener_agregados_ventas", sin_agregados)
+    monkeypatch.setattr(precalculo, "obtener_cubo", sin_agregados)
+    monkeypatch.setattr(precalculo, "generar_auditoria_inventario", lambda v, i: ocupados_al_auditar.append(planificador.estadisticas()["en_ejecucion"]) or {})
+
+    async def escenario():
+        ocupado = await planificador.adquirir("u", "diamond", 10, "reporte")
+        # Sin turno a tiempo: la auditoría no se ejecuta (se calculará bajo demanda)
+        await precalculo._precalcular("u", "w1", None, "v1", "i1", {})
+        assert ocupados_al_auditar == []
+        planificador.liberar(ocupado)
+        await precalculo._precalcular("u", "w2", None, "v1", "i1", {})
+        assert ocupados_al_auditar == [1] and planificador.estadisticas()["en_ejecucion"] == 0
+    asyncio.run(escenario())
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_pronostico_demanda import generar_demanda
+from pronostico_demanda import (
+    CANTIDAD_COL, FECHA_COL, SKU_COL, _ajustar, _primer_periodo_con_venta, indices_estacionales,
+    pronosticar_demanda, pronosticar_matriz
+)
+
+
+def _referencia(serie: np.ndarray, alfa: float) -> dict:
+    """Croston, SBA y TSB de libro para una sola serie, con la misma inicialización."""
+    inicio = int(np.argmax(serie > 0))
+    ventas = serie[serie > 0]
+    tamano = ventas.mean()
+    intervalo = (len(serie) - inicio) / len(ventas)
+    probabilidad, tamano_tsb, desde_ultima = 1 / intervalo, tamano, 0
+    for y in serie[inicio:]:
+        desde_ultima += 1
+        probabilidad += alfa / 2 * ((y > 0) - probabilidad)
+        if y > 0:
+            tamano += alfa * (y - tamano)
+            tamano_tsb += alfa * (y - tamano_tsb)
+            intervalo += alfa * (desde_ultima - intervalo)
+            desde_ultima = 0
+    return {"Croston": tamano / intervalo, "SBA": (1 - alfa / 2) * tamano / intervalo, "TSB": probabilidad * tamano_tsb}
+
+
+@pytest.fixture(scope="module")
+def matriz():
+    return generar_demanda(300, 112)[0]
+
+
+def test_vectorizado_igual_a_la_referencia_por_sku(matriz):
+    sub = matriz[(matriz > 0).any(axis=1)]
+    alfas = (0.1, 0.3)
+    ajustes = _ajustar(sub, _primer_periodo_con_venta(sub), alfas, periodos_evaluacion=4)
+    for i in range(len(sub)):
+        for j, alfa in enumerate(alfas):
+            for metodo, valor in _referencia(sub[i], alfa).items():
+                assert ajustes[metodo][0][j, i] == pytest.approx(valor, abs=1e-9)
+
+
+def test_sku_sin_ventas_pronostica_cero(matriz):
+    con_cero = np.vstack([matriz[:5], np.zeros(matriz.shape[1])])
+    resultado = pronosticar_matriz(con_cero)
+    assert resultado["pronostico"][-1] == 0 and resultado["metodo"][-1] == "Sin ventas"
+    assert resultado["patron"][-1] == "Sin ventas"
+    assert (resultado["pronostico"] >= 0).all()
+
+
+def test_sin_estacionalidad_con_menos_de_dos_temporadas(matriz):
+    indices = indices_estacionales(matriz[:, :80], np.zeros(len(matriz), dtype=np.int64))
+    assert (indices == 1.0).all()
+    con_historia = indices_estacionales(matriz, np.zeros(len(matriz), dtype=np.int64))
+    assert con_historia.mean() == pytest.approx(1.0, abs=0.05)
+
+
+def test_metodo_forzado_y_desconocido(matriz):
+    assert set(pronosticar_matriz(matriz[:20], metodo="TSB")["metodo"]) <= {"TSB", "Sin ventas"}
+    with pytest.raises(ValueError):
+        pronosticar_matriz(matriz[:20], metodo="ARIMA")
+
+
+def _ventas(skus, fechas, cantidades):
+    return pd.DataFrame({SKU_COL: skus, FECHA_COL: fechas, CANTIDAD_COL: cantidades})
+
+
+def test_ventas_vacias_o_sin_fechas_validas():
+    assert pronosticar_demanda(_ventas([], [], [])).empty
+    assert pronosticar_demanda(None).empty
+    sin_fechas = _ventas(["A", "B"], [np.nan, np.nan], [3, 4])
+    assert pronosticar_demanda(sin_fechas).empty
+
+
+def test_un_solo_sku_y_codigos_duplicados_con_espacios():
+    fechas = pd.date_range("2024-01-01", periods=60, freq="7D").strftime("%d/%m/%Y")
+    ventas = _ventas(["A"] * 30 + [" A "] * 30, list(fechas), [2] * 60)
+    resultado = pronosticar_demanda(ventas, horizonte_dias=14)
+    assert list(resultado[SKU_COL]) == ["A"]
+    # Demanda constante de 2 por semana
+    assert resultado["Pronostico_Periodo"].iloc[0] == pytest.approx(2.0, rel=0.05)
+    assert resultado["Pronostico_Diario"].iloc[0] == pytest.approx(2.0 / 7, rel=0.05)
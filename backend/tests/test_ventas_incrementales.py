@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from precalculo import agregar_ventas_por_sku
+from ventas_incrementales import (
+    COMPROBANTE_COL, FECHA_COL, SKU_COL, actualizar_metadatos_ventas, agregar_por_sku_dia, combinar_agregados_diarios,
+    combinar_agregados_sku, construir_indice, deduplicar_delta, deserializar_indice, serializar_indice
+)
+
+
+def _ventas(num_lineas: int, desde_comprobante: int, semilla: int) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    fechas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 200, num_lineas), unit="D")
+    return pd.DataFrame({
+        COMPROBANTE_COL: [f"B{desde_comprobante + i // 3:06d}" for i in range(num_lineas)],
+        SKU_COL: [f"SKU{s:04d}" for s in rng.integers(0, 150, num_lineas)],
+        FECHA_COL: fechas.strftime("%d/%m/%Y"),
+        'Cantidad vendida': rng.integers(1, 10, num_lineas),
+        'Precio de venta unitario (S/.)': np.round(rng.uniform(1, 100, num_lineas), 2),
+    }).drop_duplicates(subset=[COMPROBANTE_COL, SKU_COL, FECHA_COL], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def historial():
+    return _ventas(3000, 0, semilla=1)
+
+
+@pytest.fixture(scope="module")
+def delta(historial):
+    nuevas = _ventas(600, 5000, semilla=2)
+    # 100 líneas que ya están en el historial y 20 repetidas dentro del propio delta
+    return pd.concat([historial.iloc[:100], nuevas, nuevas.iloc[:20]], ignore_index=True), nuevas
+
+
+def test_quita_lineas_del_historial_y_repetidas_en_el_delta(historial, delta):
+    df_delta, nuevas = delta
+    df_nuevas, resumen = deduplicar_delta(df_delta, construir_indice(historial))
+    pd.testing.assert_frame_equal(df_nuevas, nuevas)
+    assert resumen["lineas_recibidas"] == len(df_delta)
+    assert (resumen["lineas_nuevas"], resumen["lineas_duplicadas_historial"], resumen["lineas_duplicadas_en_delta"]) == (len(nuevas), 100, 20)
+    assert resumen["comprobantes_nuevos"] == nuevas[COMPROBANTE_COL].nunique()
+
+
+def test_fechas_sin_ceros_y_espacios_son_la_misma_venta():
+    base = pd.DataFrame({COMPROBANTE_COL: ["B1"], SKU_COL: ["A"], FECHA_COL: ["01/02/2024"], 'Cantidad vendida': [1]})
+    variantes = pd.DataFrame({
+        COMPROBANTE_COL: ["B1", " B1", "B2", "B2"],
+        SKU_COL: ["A ", "A", "A", "A"],
+        FECHA_COL: ["1/2/2024", "01/02/2024", "1/2/2024", "01/02/2024"],
+        'Cantidad vendida': [1, 1, 1, 1],
+    })
+    df_nuevas, resumen = deduplicar_delta(variantes, construir_indice(base))
+    assert df_nuevas[COMPROBANTE_COL].tolist() == ["B2"]
+    assert (resumen["lineas_duplicadas_historial"], resumen["lineas_duplicadas_en_delta"], resumen["comprobantes_nuevos"]) == (2, 1, 1)
+
+
+def test_delta_vacio(historial):
+    indice = construir_indice(historial)
+    df_nuevas, resumen = deduplicar_delta(historial.iloc[0:0], indice)
+    assert df_nuevas.empty and resumen["lineas_nuevas"] == 0 and resumen["comprobantes_nuevos"] == 0
+    np.testing.assert_array_equal(resumen["indice"]["claves"], indice["claves"])
+    metadata = {"num_transacciones": len(historial), "num_receipts": 10, "fecha_primera_venta": "2024-01-01T00:00:00", "fecha_ultima_venta": "2024-07-18T00:00:00"}
+    actualizada = actualizar_metadatos_ventas(metadata, df_nuevas, resumen)
+    assert actualizada["num_transacciones"] == len(historial) and actualizada["rango_dias_historico"] == 199
+
+
+def test_indice_sigue_ordenado_e_igual_al_reconstruido(historial, delta):
+    df_delta, nuevas = delta
+    _, resumen = deduplicar_delta(df_delta, construir_indice(historial))
+    indice = resumen["indice"]
+    assert all(np.all(np.diff(indice[k].astype(np.float64)) >= 0) and indice[k].dtype == np.uint64 for k in indice)
+    reconstruido = construir_indice(pd.concat([historial, nuevas], ignore_index=True))
+    for clave in ("claves", "comprobantes"):
+        np.testing.assert_array_equal(indice[clave], reconstruido[clave])
+    # Un segundo envío del mismo delta ya no trae nada nuevo
+    assert deduplicar_delta(df_delta, indice)[1]["lineas_nuevas"] == 0
+
+
+def test_indice_serializado_ida_y_vuelta(historial):
+    indice = construir_indice(historial)
+    leido = deserializar_indice(serializar_indice(indice))
+    for clave in ("claves", "comprobantes"):
+        np.testing.assert_array_equal(leido[clave], indice[clave])
+        assert leido[clave].dtype == np.uint64
+    vacio = {"claves": np.array([], dtype=np.uint64), "comprobantes": np.array([], dtype=np.uint64)}
+    assert len(deserializar_indice(serializar_indice(vacio))["claves"]) == 0
+
+
+@pytest.mark.parametrize("primera, ultima", [
+    (datetime(2024, 1, 5, tzinfo=timezone.utc), datetime(2024, 3, 1, tzinfo=timezone.utc)), # Firestore
+    ("2024-01-05T00:00:00", "2024-03-01T00:00:00"), # ISO sin zona horaria
+])
+def test_metadatos_con_fechas_de_firestore_o_iso(primera, ultima):
+    df_nuevas = pd.DataFrame({COMPROBANTE_COL: ["B9", "B9"], SKU_COL: ["A", "B"], FECHA_COL: ["02/01/2024", "15/04/2024"], 'Cantidad vendida': [1, 2]})
+    resumen = {"lineas_nuevas": 2, "comprobantes_nuevos": 1}
+    metadata = actualizar_metadatos_ventas(
+        {"num_transacciones": 10, "num_receipts": 4, "fecha_primera_venta": primera, "fecha_ultima_venta": ultima}, df_nuevas, resumen
+    )
+    assert (metadata["num_transacciones"], metadata["num_receipts"]) == (12, 5)
+    assert metadata["fecha_primera_venta"] == pd.Timestamp("2024-01-02") and metadata["fecha_primera_venta"].tzinfo is None
+    assert metadata["fecha_ultima_venta"] == pd.Timestamp("2024-04-15")
+    assert metadata["rango_dias_historico"] == 104
+    # Sin metadatos previos (primer archivo)
+    assert actualizar_metadatos_ventas(None, df_nuevas, resumen)["rango_dias_historico"] == 104
+
+
+def test_agregados_incrementales_iguales_a_recalcular(historial, delta):
+    df_delta, _ = delta
+    df_nuevas, _ = deduplicar_delta(df_delta, construir_indice(historial))
+    completo = pd.concat([historial, df_nuevas], ignore_index=True)
+
+    diarios = combinar_agregados_diarios(agregar_por_sku_dia(historial), agregar_por_sku_dia(df_nuevas))
+    pd.testing.assert_frame_equal(diarios.sort_index(), agregar_por_sku_dia(completo).sort_index(), check_dtype=False)
+
+    por_sku = combinar_agregados_sku(agregar_ventas_por_sku(historial), df_nuevas, agregar_ventas_por_sku)
+    esperado = agregar_ventas_por_sku(completo).sort_index()
+    pd.testing.assert_frame_equal(por_sku.sort_index()[esperado.columns], esperado, check_dtype=False)
+
+
+def test_agregados_sin_base_o_sin_lineas_nuevas(historial):
+    diarios = agregar_por_sku_dia(historial)
+    assert combinar_agregados_diarios(None, diarios) is diarios
+    pd.testing.assert_frame_equal(combinar_agregados_diarios(diarios, agregar_por_sku_dia(historial.iloc[0:0])), diarios, check_dtype=False)
+    por_sku = agregar_ventas_por_sku(historial)
+    # Un delta que ya estaba entero en el historial no invalida los agregados
+    assert combinar_agregados_sku(por_sku, historial.iloc[0:0], agregar_ventas_por_sku) is por_sku
+    assert combinar_agregados_sku(None, historial, agregar_ventas_por_sku) is None
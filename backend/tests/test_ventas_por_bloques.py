@@ -0,0 +1,101 @@
+import io
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_ventas_por_bloques import MOTORES, SKU_COL, _normalizar, escribir_historial, generar_bloque_ventas, generar_inventario
+from ventas_por_bloques import COLUMNA_LINEAS, CANTIDAD_COL, condensar_ventas, metadatos_ventas_por_bloques
+
+FILAS_POR_BLOQUE = 2_000
+# Versión reducida del techo de bench_ventas_por_bloques.py (~22 MB de CSV; leerlo entero pide ~47 MB)
+LINEAS_TECHO = 400_000
+TECHO_MB = 24
+
+
+@pytest.fixture(scope="module")
+def inventario():
+    return generar_inventario(300)
+
+
+@pytest.fixture(scope="module")
+def ventas(inventario):
+    return generar_bloque_ventas(0, 20_000, inventario, 365, np.random.default_rng(42))
+
+
+def _csv(df: pd.DataFrame) -> io.StringIO:
+    return io.StringIO(df.to_csv(index=False))
+
+
+@pytest.mark.parametrize("nombre", list(MOTORES))
+def test_motores_dan_lo_mismo_con_el_historial_condensado(nombre, ventas, inventario):
+    motor = MOTORES[nombre]
+    completo = pd.read_csv(_csv(ventas))
+    condensado = condensar_ventas(_csv(ventas), filas_por_bloque=FILAS_POR_BLOQUE)
+    assert len(condensado) < len(completo)
+    esperado = _normalizar(motor(completo, inventario.copy()))
+    obtenido = _normalizar(motor(condensado, inventario.copy()))
+    # atol de un céntimo: las sumas en otro orden pueden cambiar un redondeo a 2 decimales
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_exact=False, rtol=1e-9, atol=0.0101)
+
+
+def test_condensado_conserva_unidades_y_lineas(ventas):
+    condensado = condensar_ventas(_csv(ventas), filas_por_bloque=FILAS_POR_BLOQUE)
+    assert condensado[CANTIDAD_COL].sum() == ventas[CANTIDAD_COL].sum()
+    assert condensado[COLUMNA_LINEAS].sum() == len(ventas)
+    # Un bloque o muchos: el mismo resultado
+    en_un_bloque = condensar_ventas(_csv(ventas), filas_por_bloque=len(ventas) + 1)
+    clave = [c for c in condensado.columns if c not in (CANTIDAD_COL, COLUMNA_LINEAS)]
+    pd.testing.assert_frame_equal(
+        condensado.sort_values(clave).reset_index(drop=True), en_un_bloque.sort_values(clave).reset_index(drop=True)
+    )
+
+
+def test_historial_vacio(ventas):
+    condensado = condensar_ventas(_csv(ventas.iloc[0:0]))
+    assert condensado.empty and {SKU_COL, CANTIDAD_COL, COLUMNA_LINEAS} <= set(condensado.columns)
+    assert metadatos_ventas_por_bloques(_csv(ventas.iloc[0:0])) == {"num_transacciones": 0}
+
+
+def test_un_solo_sku_y_codigos_con_espacios(ventas):
+    un_sku = ventas.iloc[:50].assign(**{SKU_COL: "SKU000001"})
+    un_sku.loc[un_sku.index[::2], SKU_COL] = " SKU000001 "
+    condensado = condensar_ventas(_csv(un_sku), filas_por_bloque=7)
+    assert set(condensado[SKU_COL]) == {"SKU000001"}
+    assert condensado[CANTIDAD_COL].sum() == un_sku[CANTIDAD_COL].sum()
+
+
+def test_fechas_vacias_no_pierden_ventas(ventas):
+    sin_fechas = ventas.iloc[:500].assign(**{"Fecha de venta": np.nan})
+    condensado = condensar_ventas(_csv(sin_fechas), filas_por_bloque=100)
+    assert condensado[CANTIDAD_COL].sum() == sin_fechas[CANTIDAD_COL].sum()
+    metadatos = metadatos_ventas_por_bloques(_csv(sin_fechas), filas_por_bloque=100)
+    assert metadatos["num_transacciones"] == 500 and "fecha_primera_venta" not in metadatos
+
+
+def test_metadatos_iguales_a_una_lectura_completa(ventas):
+    metadatos = metadatos_ventas_por_bloques(_csv(ventas), filas_por_bloque=FILAS_POR_BLOQUE)
+    fechas = pd.to_datetime(ventas["Fecha de venta"], format="%d/%m/%Y")
+    assert metadatos["num_transacciones"] == len(ventas)
+    assert metadatos["num_receipts"] == ventas["N° de comprobante / boleta"].nunique()
+    assert (metadatos["fecha_primera_venta"], metadatos["fecha_ultima_venta"]) == (fechas.min(), fechas.max())
+
+
+def test_falta_columna_obligatoria(ventas):
+    with pytest.raises(ValueError):
+        condensar_ventas(_csv(ventas.drop(columns=[CANTIDAD_COL])))
+
+
+def test_techo_de_memoria_al_condensar_desde_disco(tmp_path):
+    ruta = tmp_path / "ventas.csv"
+    # Catálogo y ventana pequeños: el condensado es chico y el pico depende de la lectura
+    escribir_historial(str(ruta), LINEAS_TECHO, generar_inventario(50), 30, lineas_por_bloque=50_000)
+    tracemalloc.start()
+    try:
+        condensado = condensar_ventas(str(ruta), filas_por_bloque=20_000)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert condensado[COLUMNA_LINEAS].sum() == LINEAS_TECHO
+    assert pico / 1e6 < TECHO_MB
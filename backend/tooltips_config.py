@@ -6,6 +6,7 @@ TOOLTIPS_GLOSSARY = {
     
     # --- Parámetros de Auditoría de Calidad de Datos ---
     "criterios_auditoria": "Selecciona uno o más problemas de calidad de datos que quieras encontrar en tu archivo de inventario. Esto te ayudará a limpiar tu catálogo y mejorar la precisión de todos los demás reportes.",
+    "umbral_similitud_nombres": "Qué tan parecidos deben ser dos nombres para marcarlos como posible duplicado (1.0 = iguales salvo mayúsculas, tildes y espacios). Los números del nombre siempre deben coincidir: 'Tornillo 1/2 x 2' y 'Tornillo 1/2 x 3' nunca se agrupan.",
     "ordenar_auditoria_por": "Elige el criterio principal para ordenar la lista de problemas. 'Mayor Valor' te mostrará primero los errores en los productos que representan más capital, mientras que 'Mayor Stock' se enfocará en el impacto logístico.",
 
     # --- Parámetros de Auditoría de Stock Fantasma ---
@@ -15,7 +16,7 @@ TOOLTIPS_GLOSSARY = {
     "ordenar_catalogo_por": "Elige el criterio principal para ordenar la lista. 'Mayor Valor' te mostrará primero el capital inmovilizado más grande, mientras que 'Mayor Cantidad' se enfocará en el espacio físico.",
 
     # --- Parámetros de Auditoría de Desviación de Margen ---
-    "tipo_analisis_margen": "Elige qué tipo de problema de precios quieres auditar. 'Desviación Negativa' te muestra productos rentables pero que se venden más barato de lo esperado. 'Margen Negativo' te muestra los productos que te están generando pérdidas directas.",
+    "tipo_analisis_margen": "Elige qué tipo de problema de precios quieres auditar. 'Desviación Negativa' te muestra productos rentables pero que se venden más barato de lo esperado. 'Margen Negativo' te muestra los productos que te están generando pérdidas directas. 'Alza de Costo' compara con tu carga de inventario anterior y te muestra los productos cuyo costo subió sin que subieras su precio de lista.",
     "umbral_desviacion": "Filtra los resultados para ignorar pequeñas diferencias de precio. Pon '20' para encontrar solo los productos cuyo margen real se desvía más de un 20% de su margen de lista.",
     "ordenar_auditoria_por": "Elige el criterio principal para ordenar el reporte. 'Impacto Financiero' te mostrará primero las fugas de dinero más grandes, mientras que 'Peor Margen' se enfocará en los productos que generan pérdidas directas.",
     "periodo_analisis_margen": "Define el rango de tiempo de las ventas que se usarán para este análisis. Un período más corto refleja tendencias recientes, mientras que uno más largo muestra la estabilidad histórica.",
@@ -79,6 +80,34 @@ TOOLTIPS_GLOSSARY = {
     "dias_cobertura_ideal_base": "Tu meta de inventario. ¿Para cuántos días de venta quieres tener stock después de que llegue un nuevo pedido?",
     "peso_ventas_historicas": "Balancea la predicción de ventas entre la tendencia reciente (valor bajo) y el comportamiento histórico a largo plazo (valor alto).",
     "dias_seguridad_base": "Días de stock extra que quieres tener como colchón para protegerte contra retrasos de proveedores o picos inesperados de demanda.",
+    "fuente_demanda": "Cómo se estima la venta diaria de cada producto. 'Promedios' usa las ventanas de análisis. 'Pronóstico' elige para cada producto el método que mejor predice su historial (ideal para productos que se venden de forma esporádica) y ajusta por la temporada de su categoría.",
+    "metodo_stock_seguridad": "'Días de seguridad' guarda un número fijo de días de venta como colchón. 'Nivel de servicio' mide cuánto varía la venta diaria de cada producto (contando los días sin venta) y la demora del proveedor, y guarda solo el colchón necesario: más para los productos irregulares, menos para los estables.",
+    "nivel_servicio": "Probabilidad de no quedarte sin stock mientras esperas un pedido. 0.95 significa que en 95 de cada 100 pedidos no habrá quiebre. Subirlo a 0.99 aumenta bastante el stock de seguridad.",
+    "coef_variacion_lead_time": "Qué tanto varía la demora de tu proveedor respecto a su promedio. 0.25 significa que un pedido de 8 días suele llegar entre 6 y 10 días. Usa 0 si siempre entrega a tiempo.",
+
+    # --- Parámetros de Pronóstico de Demanda ---
+    "horizonte_semanas": "Cuántas semanas hacia adelante quieres pronosticar. Usa el tiempo que tarda tu próximo pedido en llegar más el tiempo que quieres que te dure.",
+    "semanas_historia": "Cuántas semanas de ventas se usan para ajustar el pronóstico. Con 104 semanas (dos años) o más, el pronóstico también detecta la estacionalidad de cada categoría.",
+    "metodo_pronostico": "Deja 'Automático' para que cada producto use el método con menor error en sus últimas semanas. Croston y SBA están pensados para ventas esporádicas; TSB reacciona mejor a productos que están dejando de venderse.",
+    "ordenar_pronostico_por": "Elige el criterio principal para ordenar el reporte. 'Faltante' te muestra primero lo que no alcanzará con tu stock actual.",
+
+    # --- Parámetros del Optimizador de Pedido por Línea ---
+    "monto_minimo_por_marca": "El monto mínimo que tu proveedor exige para despachar un pedido de una marca. Las marcas cuyo pedido no llega a este monto se completan con productos extra.",
+    "tolerancia_exceso_pct": "Cuánto aceptas pasarte del mínimo. Con 10%, para un mínimo de S/ 500 el pedido quedará entre S/ 500 y S/ 550 (o un poco más si un solo producto cuesta más que ese margen).",
+    "base_pedido": "El pedido del que se parte antes de agregar extras. 'Mínimo' deja más espacio para elegir qué adelantar; 'Ideal' parte de la compra completa recomendada.",
+    "dias_cobertura_extra": "Cuántos días de venta adicionales se permite adelantar de cada producto al completar el mínimo. Solo se agregan productos que se venden: nunca stock sin rotación.",
+    "incluir_comprados_juntos": "Agrega la columna 'Se Compra Junto Con' con hasta 3 productos que suelen ir en la misma boleta y el % de clientes que los llevan juntos. Requiere el N° de comprobante en tu archivo de ventas.",
+    "ordenar_por_canasta": "'Lift' muestra primero las asociaciones más sorprendentes (se compran juntos muchas más veces de lo esperado). 'Confianza' muestra los compañeros más habituales. 'Boletas en común' muestra las parejas con más ventas.",
+    "top_k_comprados_juntos": "Cuántos productos relacionados se muestran para cada producto.",
+    "min_comprobantes_juntos": "Una pareja solo se muestra si aparece en al menos estas boletas. Súbelo para quedarte con las asociaciones más confiables; bájalo si vendes poco.",
+    "min_lift": "Un lift de 1 significa que se compran juntos lo mismo que si fuera por azar. Con 2 solo verás parejas que se compran juntas al menos el doble de lo esperado.",
+
+    # --- Parámetros del Backtesting de Políticas de Reposición ---
+    "dias_simulacion": "Cuántos días del pasado se re-juegan. Se necesitan además los días del 'Período de Análisis General' antes de ese tramo para el primer cálculo del promedio de venta.",
+    "dias_entre_recalculos": "Cada cuántos días se recalculan los puntos de alerta durante la simulación, como si volvieras a generar el reporte. 7 equivale a revisarlo una vez por semana.",
+    "ordenar_backtest_por": "'Fill Rate' muestra primero los productos donde la política atendió menos demanda. 'Venta perdida' prioriza por dinero; 'Inventario' muestra dónde la política inmoviliza más capital.",
+    "valores_escenario": "Elige varios valores para comparar: el simulador calcula un escenario por cada combinación de los valores elegidos en todos los parámetros. Si no eliges ninguno, se usa el valor base.",
+    "ordenar_escenarios_por": "'Orden de los Parámetros' deja la tabla como una grilla fácil de leer. 'Mayor Inversión' o 'Menos SKUs en Alerta Crítica' ponen arriba los escenarios más caros o los más seguros.",
 
     # --- Parámetros de Filtro Avanzado ---
     "min_importancia": "Filtra el reporte para mostrar únicamente los productos que superen este umbral de importancia (de 0 a 1).",
@@ -1,13 +1,25 @@
 import re
+import time
 # from datetime import datetime
 import pandas as pd
 import numpy as np
 # from typing import Optional,  # Necesario para Optional
 from typing import Optional, Dict, Any, Tuple, List # Any para pd.ExcelWriter
 from datetime import datetime # Para pd.Timestamp.now()
+from statistics import NormalDist
 from dateutil.relativedelta import relativedelta
 from audit_knowledge_base import AUDIT_KNOWLEDGE_BASE
 from report_config import REPORTS_CONFIG
+from evolucion_skus import construir_snapshot_skus
+from historial_inventario import construir_foto_inventario, comparar_fotos_inventario, alertas_de_costo, ALERTA_ALZA_SIN_AJUSTE
+from ventas_por_bloques import COLUMNA_LINEAS
+from pronostico_demanda import pronosticar_demanda, matriz_ventas_por_periodo
+from backtest_politicas import simular_politica, resumen_escenarios, DIAS_SIMULACION, DIAS_MINIMOS_SIMULACION
+from escenarios_plan_compra import grilla_de_escenarios, kpis_por_escenario, PARAMETROS_BARRIBLES, COLUMNAS_KPI
+from optimizador_pedido import optimizar_extras
+from cesta_compras import incidencias_de_ventas, pares_frecuentes, resumen_comprados_juntos
+from duplicados_nombres import agrupar_nombres_similares
+import motor_duckdb
 
 # Narrative Filters
 INCLUDE_CODES = [
@@ -56,22 +68,57 @@ def clean_narrative(narrative):
         narrative = re.sub(r'\b' + word + r'\b', '', narrative, flags=re.IGNORECASE)
     return re.sub(r'\s+', ' ', narrative).strip()
 
+# Column-wise versions of the helpers above: one compiled pattern per rule, applied
+# once per distinct value. Removing whole words one at a time or all at once gives
+# the same text (a removed word is always surrounded by non-word characters).
+INCLUDE_PATTERN = re.compile('|'.join(label.pattern for label in INCLUDE_CODES), re.IGNORECASE)
+REMOVE_PATTERN = re.compile(r'\b(?:' + '|'.join(REMOVE_KEYWORDS) + r')\b', re.IGNORECASE)
+CATEGORY_PATTERNS = [(re.compile(rf"\b{re.escape(keyword)}\b"), category) for keyword, category in CATEGORY_KEYWORDS.items()]
+
+def _per_unique_value(series, func):
+    """Apply a column-wise `func` to the distinct values only and broadcast the result back."""
+    codes, uniques = pd.factorize(series)
+    result = np.asarray(func(pd.Series(uniques, dtype=object)), dtype=object)
+    return np.append(result, None)[codes] # code -1 (missing) -> None
+
+def expense_narratives(narratives):
+    """
+    is_valid_expense + clean_narrative over a whole column, once per distinct narrative.
+    Returns (valid mask, cleaned narratives); values that are not text are never expenses.
+    """
+    codes, uniques = pd.factorize(narratives)
+    uniques = pd.Series(uniques, dtype=object)
+    is_text = uniques.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    upper = uniques.where(is_text, '').str.upper()
+    valid = is_text & upper.str.contains(INCLUDE_PATTERN, regex=True).to_numpy(dtype=bool)
+
+    cleaned = np.full(len(uniques), None, dtype=object)
+    text, upper = uniques[valid], upper[valid]
+    beem = upper.str.contains("BEEM", regex=False).to_numpy(dtype=bool)
+    cleaned[np.flatnonzero(valid)[~beem]] = (
+        text[~beem].str.replace(REMOVE_PATTERN, '', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+    ).to_numpy(dtype=object)
+    cleaned[np.flatnonzero(valid)[beem]] = np.select(
+        [upper[beem].str.contains("EFTPOS CREDIT", regex=False), upper[beem].str.contains("EFTPOS DEBIT", regex=False)],
+        ["Beem Credit", "Beem Debit"], "Beem"
+    ).astype(object)
+    return np.append(valid, False)[codes], np.append(cleaned, None)[codes]
+
 def standardise_categories(df):
     if 'Category' not in df.columns:
         return df
 
-    def match_category(original):
-        # check for empty record
-        if pd.isna(original):
-            return original
-        # convert category value to a string
-        text = str(original).lower()
-        for keyword, mapped_category in CATEGORY_KEYWORDS.items():
-            if re.search(rf"\b{re.escape(keyword)}\b", text):
-                return mapped_category
-        return 'General / Miscellaneous';
-
-    df['Category'] = df['Category'].apply(match_category)
+    # First keyword in CATEGORY_KEYWORDS order wins, as in a per-row scan
+    def _match(uniques):
+        text = uniques.map(str).str.lower()
+        conditions = [text.str.contains(pattern, regex=True).to_numpy(dtype=bool) for pattern, _ in CATEGORY_PATTERNS]
+        return np.select(conditions, [category for _, category in CATEGORY_PATTERNS], 'General / Miscellaneous').astype(object)
+
+    original = df['Category']
+    missing = original.isna().to_numpy()
+    categories = original.to_numpy(dtype=object).copy() # empty records keep their original value
+    categories[~missing] = _per_unique_value(original[~missing], _match)
+    df['Category'] = categories
     return df
 
 def get_top_expenses_by_month(df):
@@ -88,56 +135,57 @@ def get_top_expenses_by_month(df):
     return monthly_top_expenses
 
 
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except Exception:
+        return None # rows with bad dates are skipped
+
+def _format_per_unique(dates, fmt):
+    codes, uniques = pd.factorize(dates)
+    return pd.DatetimeIndex(uniques).strftime(fmt).to_numpy(dtype=object)[codes]
+
 def process_csv(df):
-    records = []
-    
     if {'Date', 'Narrative', 'Debit Amount', 'Credit Amount'}.issubset(df.columns):
         format_type = 'westpac'
+        narrative_col = 'Narrative'
     elif {'Date', 'Description', 'Amount'}.issubset(df.columns):
         format_type = 'simple'
+        narrative_col = 'Description'
     else:
         raise ValueError("Unrecognized CSV format")
 
-    for _, row in df.iterrows():
-        try:
-            date_str = row['Date']
-            date = datetime.strptime(date_str, "%d/%m/%Y")
-        except Exception:
-            continue  # skip rows with bad dates
-
-        if format_type == 'westpac':
-            narrative = row['Narrative']
-            if not is_valid_expense(narrative):
-                continue
-            debit = float(row['Debit Amount']) if pd.notna(row['Debit Amount']) else 0.0
-            credit = float(row['Credit Amount']) if pd.notna(row['Credit Amount']) else 0.0
-            amount = debit if debit > 0 else -credit
-            cleaned_narrative = clean_narrative(narrative)
-
-        elif format_type == 'simple':
-            narrative = row['Description']
-            if not is_valid_expense(narrative):
-                continue
-            amount = float(row['Amount'])
-            cleaned_narrative = clean_narrative(narrative)
-            debit = amount if amount > 0 else 0.0
-            credit = -amount if amount < 0 else 0.0
-
-        records.append({
-            'Date': date,
-            'Category': cleaned_narrative,
-            'Debit': debit,
-            'Credit': credit,
-            'Amount': amount,
-        })
+    # Dates are parsed once per distinct value, with the same rules as strptime per row
+    date_codes, date_values = pd.factorize(df['Date'])
+    parsed = np.array([_parse_date(v) for v in date_values] + [None], dtype='datetime64[ns]')
+    dates = parsed[date_codes] # code -1 (missing) -> the trailing NaT
 
-    processed_df = pd.DataFrame(records)
+    valid, cleaned = expense_narratives(df[narrative_col])
+    keep = ~np.isnat(dates) & valid
+    rows = df.loc[keep]
 
-    # Enrich with time periods
-    processed_df['WeekStart'] = processed_df['Date'].dt.to_period('W').apply(lambda r: r.start_time)
-    processed_df['MonthStart'] = processed_df['Date'].dt.to_period('M').apply(lambda r: r.start_time)
-    processed_df['Week'] = processed_df['WeekStart'].dt.strftime('%d %b %Y')
-    processed_df['Month'] = processed_df['MonthStart'].dt.strftime('%B %Y')
+    if format_type == 'westpac':
+        debit = rows['Debit Amount'].where(rows['Debit Amount'].notna(), 0.0).astype(float).to_numpy()
+        credit = rows['Credit Amount'].where(rows['Credit Amount'].notna(), 0.0).astype(float).to_numpy()
+        amount = np.where(debit > 0, debit, -credit)
+    else:
+        amount = rows['Amount'].astype(float).to_numpy()
+        debit = np.where(amount > 0, amount, 0.0)
+        credit = np.where(amount < 0, -amount, 0.0)
+
+    processed_df = pd.DataFrame({
+        'Date': dates[keep],
+        'Category': cleaned[keep],
+        'Debit': debit,
+        'Credit': credit,
+        'Amount': amount,
+    })
+
+    # Enrich with time periods (labels are formatted once per distinct week / month)
+    processed_df['WeekStart'] = processed_df['Date'].dt.to_period('W').dt.start_time
+    processed_df['MonthStart'] = processed_df['Date'].dt.to_period('M').dt.start_time
+    processed_df['Week'] = _format_per_unique(processed_df['WeekStart'], '%d %b %Y')
+    processed_df['Month'] = _format_per_unique(processed_df['MonthStart'], '%B %Y')
 
     return processed_df
 
@@ -148,6 +196,42 @@ def process_csv(df):
 # ============== INICIO: FULL REPORTES ==============
 # ===================================================
 
+def _agrupar_ventas_abc(df_ventas: pd.DataFrame, df_inventario_subset: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cruza las ventas con el inventario y agrupa por (SKU, producto). Con el backend
+    DuckDB (ver motor_duckdb.py) se hace en una consulta; pandas es la referencia.
+    """
+    if motor_duckdb.usar_duckdb():
+        ventas_agrupadas = motor_duckdb.agrupar_ventas_abc(df_ventas, df_inventario_subset)
+        if ventas_agrupadas is not None:
+            return ventas_agrupadas
+
+    df_merged = pd.merge(df_ventas, df_inventario_subset, on='SKU / Código de producto', how='left')
+    
+    # Llenar NaN en Categoría/Subcategoría después del merge
+    df_merged['Categoría'] = df_merged['Categoría'].fillna('Desconocida')
+    df_merged['Subcategoría'] = df_merged['Subcategoría'].fillna('Desconocida')
+    df_merged['Precio de compra actual (S/.)'] = df_merged['Precio de compra actual (S/.)'].fillna(0)
+
+
+    df_merged['Margen unitario'] = df_merged['Precio de venta unitario (S/.)'] - df_merged['Precio de compra actual (S/.)']
+    df_merged['Margen total'] = df_merged['Margen unitario'] * df_merged['Cantidad vendida']
+
+    # Agrupar por Producto y Agregar Métricas
+    agg_funcs = {
+        'Venta total': 'sum',
+        'Cantidad vendida': 'sum',
+        'Margen total': 'sum',
+        'Categoría': 'first', # Tomar la primera categoría (debería ser única por SKU)
+        'Subcategoría': 'first', # Tomar la primera subcategoría
+        'Marca': 'first',
+        'Cantidad en stock actual': 'first'
+    }
+    return df_merged.groupby(
+        ['SKU / Código de producto', 'Nombre del producto'], as_index=False
+    ).agg(agg_funcs)
+
+
 def process_csv_abc(
     df_ventas: pd.DataFrame,
     df_inventario: pd.DataFrame,
@@ -222,30 +306,8 @@ def process_csv_abc(
     df_ventas['SKU / Código de producto'] = df_ventas['SKU / Código de producto'].astype(str)
     df_inventario_subset['SKU / Código de producto'] = df_inventario_subset['SKU / Código de producto'].astype(str)
 
-    df_merged = pd.merge(df_ventas, df_inventario_subset, on='SKU / Código de producto', how='left')
-    
-    # Llenar NaN en Categoría/Subcategoría después del merge
-    df_merged['Categoría'] = df_merged['Categoría'].fillna('Desconocida')
-    df_merged['Subcategoría'] = df_merged['Subcategoría'].fillna('Desconocida')
-    df_merged['Precio de compra actual (S/.)'] = df_merged['Precio de compra actual (S/.)'].fillna(0)
-
-
-    df_merged['Margen unitario'] = df_merged['Precio de venta unitario (S/.)'] - df_merged['Precio de compra actual (S/.)']
-    df_merged['Margen total'] = df_merged['Margen unitario'] * df_merged['Cantidad vendida']
-
     # --- 4. Agrupar por Producto y Agregar Métricas ---
-    agg_funcs = {
-        'Venta total': 'sum',
-        'Cantidad vendida': 'sum',
-        'Margen total': 'sum',
-        'Categoría': 'first', # Tomar la primera categoría (debería ser única por SKU)
-        'Subcategoría': 'first', # Tomar la primera subcategoría
-        'Marca': 'first',
-        'Cantidad en stock actual': 'first'
-    }
-    ventas_agrupadas = df_merged.groupby(
-        ['SKU / Código de producto', 'Nombre del producto'], as_index=False
-    ).agg(agg_funcs)
+    ventas_agrupadas = _agrupar_ventas_abc(df_ventas, df_inventario_subset)
 
     if ventas_agrupadas.empty:
          return pd.DataFrame() # Devolver DataFrame vacío si no hay datos agrupados
@@ -639,6 +701,94 @@ def generar_reporte_maestro_inventario(
             }
         }
 
+def _agregar_ventas_por_sku(df_periodo: pd.DataFrame, sku_c: str, fecha_c: str, cant_c: str, p_venta_c: str) -> pd.DataFrame:
+    """
+    Ventas totales, días con venta y precio de venta promedio por línea, por SKU.
+    Si las ventas vienen condensadas (ver ventas_por_bloques.py), cada fila vale
+    COLUMNA_LINEAS líneas y el promedio se pondera para dar el mismo resultado.
+    """
+    if motor_duckdb.usar_duckdb():
+        agg_ventas = motor_duckdb.agregar_ventas_por_sku(df_periodo, sku_c, fecha_c, cant_c, p_venta_c)
+        if agg_ventas is not None:
+            return agg_ventas
+
+    if COLUMNA_LINEAS not in df_periodo.columns:
+        return df_periodo.groupby(sku_c).agg(Ventas_Total=(cant_c, 'sum'), Dias_Con_Venta=(fecha_c, 'nunique'), Precio_Venta_Prom=(p_venta_c, 'mean')).reset_index()
+
+    # Igual que 'mean', las líneas sin precio no cuentan para el promedio
+    lineas_con_precio = df_periodo[COLUMNA_LINEAS].where(df_periodo[p_venta_c].notna(), 0)
+    df_pesos = df_periodo.assign(_precio_x_lineas=df_periodo[p_venta_c] * lineas_con_precio, _lineas_con_precio=lineas_con_precio)
+    agg_ventas = df_pesos.groupby(sku_c).agg(
+        Ventas_Total=(cant_c, 'sum'),
+        Dias_Con_Venta=(fecha_c, 'nunique'),
+        _suma_precios=('_precio_x_lineas', 'sum'),
+        _lineas=('_lineas_con_precio', 'sum')
+    ).reset_index()
+    agg_ventas['Precio_Venta_Prom'] = agg_ventas['_suma_precios'] / agg_ventas['_lineas'].replace(0, np.nan)
+    return agg_ventas.drop(columns=['_suma_precios', '_lineas'])
+
+
+# Hasta este tamaño (~64 MB en float64) la demanda diaria se acumula en una matriz densa SKU x día
+CELDAS_MAX_DEMANDA_DIARIA_DENSA = 8_000_000
+
+
+def _demanda_diaria_por_sku(df_ventas_proc: pd.DataFrame, sku_c: str, fecha_c: str, cant_c: str, fecha_max: pd.Timestamp, dias_ventana: int) -> pd.DataFrame:
+    """
+    Media y desviación estándar de la demanda diaria por SKU en la ventana, contando
+    los días sin venta como cero. Un SKU que empezó a venderse dentro de la ventana
+    solo cuenta los días desde su primera venta. Una sola agrupación por (SKU, día):
+    el costo es lineal en las líneas de venta, también con ventas condensadas.
+    """
+    columnas = [sku_c, 'Demanda_Diaria_Media', 'Demanda_Diaria_Desv']
+    if df_ventas_proc.empty:
+        return pd.DataFrame(columns=columnas)
+    dias_atras = (np.datetime64(fecha_max.normalize(), 'D') - df_ventas_proc[fecha_c].to_numpy().astype('datetime64[D]')).astype(np.int64)
+    cantidades = pd.to_numeric(df_ventas_proc[cant_c], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    codigos, skus = pd.factorize(df_ventas_proc[sku_c])
+
+    # Días desde la primera venta de cada SKU (en todo el historial, no solo en la ventana)
+    antiguedad = np.zeros(len(skus), dtype=np.int64)
+    np.maximum.at(antiguedad, codigos, dias_atras)
+
+    en_ventana = dias_atras <= dias_ventana
+    clave = codigos[en_ventana].astype(np.int64) * (dias_ventana + 1) + dias_atras[en_ventana]
+    celdas = len(skus) * (dias_ventana + 1)
+    if celdas <= max(4 * len(clave), CELDAS_MAX_DEMANDA_DIARIA_DENSA):
+        # Matriz densa SKU x día: más rápida que agrupar mientras quepa en memoria
+        matriz = np.bincount(clave, weights=cantidades[en_ventana], minlength=celdas).reshape(len(skus), dias_ventana + 1)
+        suma, suma_cuadrados = matriz.sum(axis=1), (matriz ** 2).sum(axis=1)
+    else:
+        por_dia = pd.Series(cantidades[en_ventana]).groupby(clave).sum()
+        sku_de_dia = (por_dia.index.to_numpy() // (dias_ventana + 1)).astype(np.int64)
+        suma = np.bincount(sku_de_dia, weights=por_dia.to_numpy(), minlength=len(skus))
+        suma_cuadrados = np.bincount(sku_de_dia, weights=por_dia.to_numpy() ** 2, minlength=len(skus))
+
+    dias_observados = np.minimum(dias_ventana, antiguedad) + 1
+    media = suma / dias_observados
+    varianza = np.clip(suma_cuadrados / dias_observados - media ** 2, 0, None)
+    return pd.DataFrame({sku_c: skus, 'Demanda_Diaria_Media': media, 'Demanda_Diaria_Desv': np.sqrt(varianza)})
+
+
+def _stock_seguridad_por_variabilidad(
+    demanda_diaria: pd.DataFrame,
+    skus: pd.Series,
+    lead_time_dias: float,
+    nivel_servicio: float,
+    coef_variacion_lead_time: float
+) -> pd.Series:
+    """
+    Stock de seguridad para un nivel de servicio (probabilidad de no quebrar en el
+    ciclo), con demanda diaria y tiempo de entrega variables:
+        SS = z * sqrt(L * sd_d^2 + media_d^2 * sd_L^2), con sd_L = coef_variacion_lead_time * L
+    """
+    z = NormalDist().inv_cdf(min(max(nivel_servicio, 0.5), 0.999))
+    por_sku = demanda_diaria.set_index(demanda_diaria.columns[0])
+    media = skus.map(por_sku['Demanda_Diaria_Media']).fillna(0)
+    desviacion = skus.map(por_sku['Demanda_Diaria_Desv']).fillna(0)
+    desviacion_lead_time = coef_variacion_lead_time * lead_time_dias
+    return (z * np.sqrt(lead_time_dias * desviacion ** 2 + media ** 2 * desviacion_lead_time ** 2)).round()
+
+
 def process_csv_analisis_estrategico_rotacion(
     df_ventas: pd.DataFrame,
     df_inventario: pd.DataFrame,
@@ -736,11 +886,7 @@ def process_csv_analisis_estrategico_rotacion(
         df_periodo = df_v[df_v[fecha_c] >= fecha_inicio]
         if df_periodo.empty:
              return pd.DataFrame(columns=[sku_c, f'Ventas_Total{sufijo}', f'Dias_Con_Venta{sufijo}', f'Precio_Venta_Prom{sufijo}'])
-        agg_ventas = df_periodo.groupby(sku_c).agg(
-            Ventas_Total=(cant_c, 'sum'),
-            Dias_Con_Venta=(fecha_c, 'nunique'),
-            Precio_Venta_Prom=(p_venta_c, 'mean')
-        ).reset_index()
+        agg_ventas = _agregar_ventas_por_sku(df_periodo, sku_c, fecha_c, cant_c, p_venta_c)
         agg_ventas.columns = [sku_c] + [f'{col}{sufijo}' for col in agg_ventas.columns[1:]]
         return agg_ventas
 
@@ -1301,6 +1447,10 @@ def process_csv_puntos_alerta_stock(
     ordenar_por: str = 'Importancia',
     filtro_categorias: Optional[List[str]] = None,
     filtro_marcas: Optional[List[str]] = None,
+    # 'dias' (PDA x días de seguridad) o 'variabilidad' (nivel de servicio sobre la demanda diaria)
+    metodo_stock_seguridad: str = 'dias',
+    nivel_servicio: float = 0.95,
+    coef_variacion_lead_time: float = 0.25,
     **kwargs
 ) -> Dict[str, Any]:
     """
@@ -1369,7 +1519,7 @@ def process_csv_puntos_alerta_stock(
         fecha_inicio = fecha_max - pd.Timedelta(days=periodo_dias)
         df_periodo = df_v[df_v[fecha_c] >= fecha_inicio].copy()
         if df_periodo.empty: return pd.DataFrame(columns=[sku_c, f'Ventas_Total{sufijo}', f'Dias_Con_Venta{sufijo}', f'Precio_Venta_Prom{sufijo}'])
-        agg_ventas = df_periodo.groupby(sku_c).agg(Ventas_Total=(cant_c, 'sum'), Dias_Con_Venta=(fecha_c, 'nunique'), Precio_Venta_Prom=(p_venta_c, 'mean')).reset_index()
+        agg_ventas = _agregar_ventas_por_sku(df_periodo, sku_c, fecha_c, cant_c, p_venta_c)
         agg_ventas.columns = [sku_c] + [f'{col}{sufijo}' for col in agg_ventas.columns[1:]]
         return agg_ventas
 
@@ -1440,7 +1590,13 @@ def process_csv_puntos_alerta_stock(
     # Stock de Seguridad en unidades
     dias_seguridad_adicionales = df_analisis['Importancia_Dinamica'] * factor_importancia_seguridad
     dias_seguridad_totales = dias_seguridad_base + dias_seguridad_adicionales
-    df_analisis['Stock_de_Seguridad_Unds'] = (df_analisis['PDA_Final'] * dias_seguridad_totales).round()
+    if metodo_stock_seguridad == 'variabilidad':
+        demanda_diaria = _demanda_diaria_por_sku(df_ventas_proc, sku_col, fecha_col_ventas, cantidad_col_ventas, fecha_max_venta, final_dias_general)
+        df_analisis['Stock_de_Seguridad_Unds'] = _stock_seguridad_por_variabilidad(
+            demanda_diaria, df_analisis[sku_col], lead_time_dias, nivel_servicio, coef_variacion_lead_time
+        )
+    else:
+        df_analisis['Stock_de_Seguridad_Unds'] = (df_analisis['PDA_Final'] * dias_seguridad_totales).round()
 
     # Demanda Durante el Tiempo de Entrega (Lead Time)
     df_analisis['Demanda_Lead_Time_Unds'] = (df_analisis['PDA_Final'] * lead_time_dias).round()
@@ -1455,9 +1611,7 @@ def process_csv_puntos_alerta_stock(
 
 
     # --- PASO 3: Cálculo de Puntos de Alerta ---
-    dias_seguridad_adicionales = df_analisis['Importancia_Dinamica'] * factor_importancia_seguridad
-    dias_seguridad_totales = dias_seguridad_base + dias_seguridad_adicionales
-    df_analisis['Stock_de_Seguridad_Unds'] = (df_analisis['PDA_Final'] * dias_seguridad_totales).round()
+    # (el Stock_de_Seguridad_Unds ya se calculó arriba según `metodo_stock_seguridad`)
     df_analisis['Demanda_Lead_Time_Unds'] = (df_analisis['PDA_Final'] * lead_time_dias).round()
     df_analisis['Punto_de_Alerta_Ideal_Unds'] = df_analisis['Demanda_Lead_Time_Unds'] + df_analisis['Stock_de_Seguridad_Unds']
     df_analisis['Punto_de_Alerta_Minimo_Unds'] = df_analisis['Stock_de_Seguridad_Unds'].round()
@@ -2456,49 +2610,30 @@ def process_csv_plan_compra_sugerido_bkp(
     }
 
 
-def process_csv_plan_compra_sugerido(
+def _preparar_analisis_plan_compra(
     df_ventas: pd.DataFrame,
     df_inventario: pd.DataFrame,
-    dias_analisis_ventas_recientes: Optional[int] = 30,
-    dias_analisis_ventas_general: Optional[int] = 180,
-    peso_ventas_historicas: float = 0.6,
-    dias_cobertura_ideal_base: int = 10,
-    coef_importancia_para_cobertura_ideal: float = 0.05,
-    coef_rotacion_para_stock_ideal: float = 0.1,
-    dias_cubrir_con_pedido_minimo: int = 3,
-    coef_importancia_para_pedido_minimo: float = 0.1,
-    coef_rotacion_para_stock_minimo: float = 0.15,
-    importancia_minima_para_redondeo_a_1: float = 0.1,
-    incluir_productos_pasivos: bool = True,
-    cantidad_reposicion_para_pasivos: int = 1,
-    excluir_productos_sin_sugerencia_ideal: bool = False,
-    lead_time_dias: float = 7.0,
-    dias_seguridad_base: float = 0,
-    factor_importancia_seguridad: float = 1.0,
-    # --- NUEVOS PARÁMETROS ---
-    pesos_importancia: Optional[Dict[str, float]] = None,
-    excluir_sin_ventas: bool = True,
-    incluir_solo_categorias: Optional[List[str]] = None,
-    incluir_solo_marcas: Optional[List[str]] = None,
-    ordenar_por: str = 'Importancia',
-    filtro_skus: Optional[List[str]] = None,
-) -> pd.DataFrame:
-    # --- 1. Definición de Nombres de Columna Única y Clara ---
+    dias_analisis_ventas_recientes: Optional[int],
+    dias_analisis_ventas_general: Optional[int],
+    excluir_sin_ventas: bool,
+    incluir_solo_categorias: Optional[List[str]],
+    incluir_solo_marcas: Optional[List[str]],
+    filtro_skus: Optional[List[str]]
+) -> Optional[Dict[str, Any]]:
+    """
+    Agregados por SKU del Plan de Compra (ventas, días con venta y precio de las
+    ventanas reciente y general) ya unidos al inventario y filtrados. Lo comparten
+    el Plan de Compra y su simulador de escenarios. None si no hay ventas válidas.
+    """
     sku_col = 'SKU / Código de producto'
     fecha_col_ventas = 'Fecha de venta'
     cantidad_col_ventas = 'Cantidad vendida'
     precio_venta_col_ventas = 'Precio de venta unitario (S/.)'
     marca_col_stock = 'Marca'
     stock_actual_col_stock = 'Cantidad en stock actual'
-    nombre_prod_col_stock = 'Nombre del producto'
     categoria_col_stock = 'Categoría'
-    subcategoria_col_stock = 'Subcategoría'
     precio_compra_actual_col_stock = 'Precio de compra actual (S/.)'
     precio_venta_actual_col_stock = 'Precio de venta actual (S/.)' # Columna del inventario
-    
-    # Nombres para columnas calculadas
-    precio_venta_prom_col = 'Precio_Venta_Prom_Reciente'
-    sugerencia_ideal_col = 'Sugerencia_Pedido_Ideal_Unds'
 
     # --- 2. Pre-procesamiento y Estandarización de Tipos ---
     df_ventas_proc = df_ventas.copy()
@@ -2507,6 +2642,8 @@ def process_csv_plan_compra_sugerido(
     # Forzamos la columna de unión a ser string
     df_ventas_proc[sku_col] = df_ventas_proc[sku_col].astype(str).str.strip()
     df_inventario_proc[sku_col] = df_inventario_proc[sku_col].astype(str).str.strip()
+    # Un SKU repetido en el inventario se cuenta una vez (si no, multiplica sus filas en las uniones)
+    df_inventario_proc = df_inventario_proc.drop_duplicates(subset=[sku_col])
     df_inventario_proc[stock_actual_col_stock] = pd.to_numeric(df_inventario_proc[stock_actual_col_stock], errors='coerce').fillna(0)
 
     if filtro_skus:
@@ -2528,9 +2665,9 @@ def process_csv_plan_compra_sugerido(
     
     df_ventas_proc[fecha_col_ventas] = pd.to_datetime(df_ventas_proc[fecha_col_ventas], format='%d/%m/%Y', errors='coerce')
     df_ventas_proc.dropna(subset=[fecha_col_ventas], inplace=True)
-    if df_ventas_proc.empty: return pd.DataFrame()
+    if df_ventas_proc.empty: return None
     fecha_max_venta = df_ventas_proc[fecha_col_ventas].max()
-    if pd.isna(fecha_max_venta): return pd.DataFrame()
+    if pd.isna(fecha_max_venta): return None
     
     final_dias_recientes, final_dias_general = dias_analisis_ventas_recientes, dias_analisis_ventas_general
     if dias_analisis_ventas_recientes is None or dias_analisis_ventas_general is None:
@@ -2547,7 +2684,7 @@ def process_csv_plan_compra_sugerido(
         fecha_inicio = fecha_max - pd.Timedelta(days=periodo_dias)
         df_periodo = df_v[df_v[fecha_c] >= fecha_inicio].copy()
         if df_periodo.empty: return pd.DataFrame(columns=[sku_c, f'Ventas_Total{sufijo}', f'Dias_Con_Venta{sufijo}', f'Precio_Venta_Prom{sufijo}'])
-        agg_ventas = df_periodo.groupby(sku_c).agg(Ventas_Total=(cant_c, 'sum'), Dias_Con_Venta=(fecha_c, 'nunique'), Precio_Venta_Prom=(p_venta_c, 'mean')).reset_index()
+        agg_ventas = _agregar_ventas_por_sku(df_periodo, sku_c, fecha_c, cant_c, p_venta_c)
         agg_ventas.columns = [sku_c] + [f'{col}{sufijo}' for col in agg_ventas.columns[1:]]
         return agg_ventas
 
@@ -2588,7 +2725,79 @@ def process_csv_plan_compra_sugerido(
             df_analisis[marca_col_stock].str.strip().str.lower().isin(marcas_normalizadas)
         ].copy()
     # print(f"DEBUG: 4. Después de filtrar por marcas, quedan {len(df_analisis)} filas.")
+
+    return {
+        "df_ventas_proc": df_ventas_proc,
+        "df_inventario_proc": df_inventario_proc,
+        "df_analisis": df_analisis,
+        "fecha_max_venta": fecha_max_venta,
+        "final_dias_recientes": final_dias_recientes,
+        "final_dias_general": final_dias_general,
+    }
+
+
+def process_csv_plan_compra_sugerido(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    dias_analisis_ventas_recientes: Optional[int] = 30,
+    dias_analisis_ventas_general: Optional[int] = 180,
+    peso_ventas_historicas: float = 0.6,
+    dias_cobertura_ideal_base: int = 10,
+    coef_importancia_para_cobertura_ideal: float = 0.05,
+    coef_rotacion_para_stock_ideal: float = 0.1,
+    dias_cubrir_con_pedido_minimo: int = 3,
+    coef_importancia_para_pedido_minimo: float = 0.1,
+    coef_rotacion_para_stock_minimo: float = 0.15,
+    importancia_minima_para_redondeo_a_1: float = 0.1,
+    incluir_productos_pasivos: bool = True,
+    cantidad_reposicion_para_pasivos: int = 1,
+    excluir_productos_sin_sugerencia_ideal: bool = False,
+    lead_time_dias: float = 7.0,
+    dias_seguridad_base: float = 0,
+    factor_importancia_seguridad: float = 1.0,
+    # --- NUEVOS PARÁMETROS ---
+    pesos_importancia: Optional[Dict[str, float]] = None,
+    excluir_sin_ventas: bool = True,
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    ordenar_por: str = 'Importancia',
+    filtro_skus: Optional[List[str]] = None,
+    # 'promedios' (PDA de ventanas) o 'pronostico' (ver pronostico_demanda.py)
+    fuente_demanda: str = 'promedios',
+    # 'dias' (PDA x días de seguridad) o 'variabilidad' (nivel de servicio sobre la demanda diaria)
+    metodo_stock_seguridad: str = 'dias',
+    nivel_servicio: float = 0.95,
+    coef_variacion_lead_time: float = 0.25,
+    # Columna "Se Compra Junto Con" (ver cesta_compras.py); df_comprobantes: incidencias ya preparadas
+    incluir_comprados_juntos: bool = False,
+    df_comprobantes: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    # --- 1. Definición de Nombres de Columna Única y Clara ---
+    sku_col = 'SKU / Código de producto'
+    fecha_col_ventas = 'Fecha de venta'
+    cantidad_col_ventas = 'Cantidad vendida'
+    marca_col_stock = 'Marca'
+    stock_actual_col_stock = 'Cantidad en stock actual'
+    nombre_prod_col_stock = 'Nombre del producto'
+    categoria_col_stock = 'Categoría'
+    subcategoria_col_stock = 'Subcategoría'
+    precio_compra_actual_col_stock = 'Precio de compra actual (S/.)'
+    precio_venta_actual_col_stock = 'Precio de venta actual (S/.)' # Columna del inventario
     
+    # Nombres para columnas calculadas
+    precio_venta_prom_col = 'Precio_Venta_Prom_Reciente'
+    sugerencia_ideal_col = 'Sugerencia_Pedido_Ideal_Unds'
+
+    # --- 2. Pre-procesamiento, ventanas de análisis y filtros (compartido con el simulador de escenarios) ---
+    base = _preparar_analisis_plan_compra(
+        df_ventas, df_inventario, dias_analisis_ventas_recientes, dias_analisis_ventas_general,
+        excluir_sin_ventas, incluir_solo_categorias, incluir_solo_marcas, filtro_skus
+    )
+    if base is None: return pd.DataFrame()
+    df_ventas_proc, df_inventario_proc, df_analisis = base["df_ventas_proc"], base["df_inventario_proc"], base["df_analisis"]
+    fecha_max_venta = base["fecha_max_venta"]
+    final_dias_recientes, final_dias_general = base["final_dias_recientes"], base["final_dias_general"]
+
     if df_analisis.empty:
         # print("❌ DEBUG: El DataFrame está vacío ANTES del último filtro. La función terminará aquí.")
         return {
@@ -2634,6 +2843,15 @@ def process_csv_plan_compra_sugerido(
     # Conversión explícita a Serie de Pandas ANTES de llamar a .fillna()
     df_analisis['PDA_Final'] = pd.Series(resultado_pda_array, index=df_analisis.index).fillna(0).round(2)
 
+    if fuente_demanda == 'pronostico':
+        # Demanda diaria pronosticada (Croston/SBA/TSB/SES con estacionalidad por categoría)
+        # para el horizonte que cubre el pedido; los SKUs sin historial conservan el PDA de ventanas
+        df_pronostico = pronosticar_demanda(df_ventas_proc, df_inventario_proc, horizonte_dias=lead_time_dias + dias_cobertura_ideal_base)
+        pronostico_por_sku = df_pronostico.set_index(sku_col)
+        pda_pronosticada = df_analisis[sku_col].map(pronostico_por_sku['Pronostico_Diario'])
+        df_analisis['PDA_Final'] = pda_pronosticada.fillna(df_analisis['PDA_Final']).round(2)
+        df_analisis['Metodo_Pronostico'] = df_analisis[sku_col].map(pronostico_por_sku['Metodo_Pronostico']).fillna('Promedios')
+
 
 
     factores_por_categoria_default = {'DEFAULT': 1.0}
@@ -2652,7 +2870,13 @@ def process_csv_plan_compra_sugerido(
     
     dias_seguridad_adicionales = df_analisis['Importancia_Dinamica'] * factor_importancia_seguridad
     dias_seguridad_totales = dias_seguridad_base + dias_seguridad_adicionales
-    df_analisis['Stock_de_Seguridad_Unds'] = (df_analisis['PDA_Final'] * dias_seguridad_totales).round()
+    if metodo_stock_seguridad == 'variabilidad':
+        demanda_diaria = _demanda_diaria_por_sku(df_ventas_proc, sku_col, fecha_col_ventas, cantidad_col_ventas, fecha_max_venta, final_dias_general)
+        df_analisis['Stock_de_Seguridad_Unds'] = _stock_seguridad_por_variabilidad(
+            demanda_diaria, df_analisis[sku_col], lead_time_dias, nivel_servicio, coef_variacion_lead_time
+        )
+    else:
+        df_analisis['Stock_de_Seguridad_Unds'] = (df_analisis['PDA_Final'] * dias_seguridad_totales).round()
     df_analisis['Demanda_Lead_Time_Unds'] = (df_analisis['PDA_Final'] * lead_time_dias).round()
     df_analisis['Punto_de_Alerta_Ideal_Unds'] = df_analisis['Demanda_Lead_Time_Unds'] + df_analisis['Stock_de_Seguridad_Unds']
     
@@ -2695,7 +2919,7 @@ def process_csv_plan_compra_sugerido(
     df_bcg_resultados = resultado_bcg_dict.get("data")
 
     if df_bcg_resultados is not None and not df_bcg_resultados.empty:
-        df_clasificacion = df_bcg_resultados[['SKU / Código de producto', 'Clasificación BCG']]
+        df_clasificacion = df_bcg_resultados[['SKU / Código de producto', 'Clasificación BCG']].drop_duplicates(subset=['SKU / Código de producto'])
         df_analisis = pd.merge(df_analisis, df_clasificacion, on='SKU / Código de producto', how='left')
         df_analisis['Clasificación BCG'].fillna('N/A', inplace=True)
     else:
@@ -2829,7 +3053,7 @@ def process_csv_plan_compra_sugerido(
         'Clasificación BCG', 'Accion_Requerida', 'Stock_de_Seguridad_Unds',
         'Stock_Minimo_Unds', 'Stock_Ideal_Unds', 
         'Sugerencia_Pedido_Minimo_Unds', 'Sugerencia_Pedido_Ideal_Unds', 
-        'Importancia_Dinamica', 'Índice de Urgencia', 'PDA_Final',
+        'Importancia_Dinamica', 'Índice de Urgencia', 'PDA_Final', 'Metodo_Pronostico',
         'Ventas_Total_Reciente', 'Ventas_Total_General'
         # precio_venta_prom_col,
         # 'debug_margen_promedio',
@@ -2847,6 +3071,7 @@ def process_csv_plan_compra_sugerido(
             stock_actual_col_stock: 'Stock Actual (Unds)',
             precio_compra_actual_col_stock: 'Precio Compra Actual (S/.)',
             'PDA_Final': 'Promedio Venta Diaria (Unds)',
+            'Metodo_Pronostico': 'Método de Pronóstico',
             'Dias_Cobertura_Stock_Actual': 'Cobertura Actual (Días)',
             'Punto_de_Alerta_Ideal_Unds': 'Punto de Alerta Ideal (Unds)',
             'Punto_de_Alerta_Minimo_Unds': 'Punto de Alerta Mínimo (Unds)',
@@ -2866,6 +3091,19 @@ def process_csv_plan_compra_sugerido(
         }
         df_resultado_final.rename(columns=column_rename_map, inplace=True)
 
+    # --- PASO 10b: PRODUCTOS QUE SE COMPRAN JUNTOS (OPCIONAL) ---
+    # Al pedir un producto conviene revisar el stock de los que se venden con él
+    if incluir_comprados_juntos and not df_resultado_final.empty:
+        incidencias = df_comprobantes if df_comprobantes is not None else incidencias_de_ventas(df_ventas)
+        if incidencias is not None and not incidencias.empty:
+            # Por confianza: "de cada 100 que compran este, cuántos llevan también el otro"
+            pares = pares_frecuentes(incidencias, top_k=3, ordenar_por='confianza', min_lift=1.2)["pares"]
+            nombres = pd.Series(dtype=object)
+            if nombre_prod_col_stock in df_inventario.columns:
+                nombres = df_inventario.assign(**{sku_col: df_inventario[sku_col].astype(str).str.strip()}) \
+                    .drop_duplicates(subset=[sku_col]).set_index(sku_col)[nombre_prod_col_stock]
+            df_resultado_final['Se Compra Junto Con'] = df_resultado_final[sku_col].map(resumen_comprados_juntos(pares, nombres))
+
     # --- PASO 11: LIMPIEZA FINAL PARA COMPATIBILIDAD CON JSON ---
     # Este bloque ahora se aplica de forma segura al final.
     if not df_resultado_final.empty:
@@ -2884,6 +3122,629 @@ def process_csv_plan_compra_sugerido(
     }
 
 
+def process_csv_plan_compra_escenarios(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    grilla_escenarios: Optional[Dict[str, List[float]]] = None,
+    dias_analisis_ventas_recientes: Optional[int] = 30,
+    dias_analisis_ventas_general: Optional[int] = 180,
+    score_ventas: float = 8,
+    score_ingreso: float = 6,
+    score_margen: float = 4,
+    score_dias_venta: float = 2,
+    peso_ventas_historicas: float = 0.6,
+    dias_cobertura_ideal_base: int = 10,
+    coef_importancia_para_cobertura_ideal: float = 0.05,
+    coef_rotacion_para_stock_ideal: float = 0.1,
+    dias_cubrir_con_pedido_minimo: int = 3,
+    coef_rotacion_para_stock_minimo: float = 0.15,
+    incluir_productos_pasivos: bool = True,
+    cantidad_reposicion_para_pasivos: int = 1,
+    lead_time_dias: float = 7.0,
+    dias_seguridad_base: float = 0,
+    factor_importancia_seguridad: float = 1.0,
+    metodo_stock_seguridad: str = 'dias',
+    nivel_servicio: float = 0.95,
+    coef_variacion_lead_time: float = 0.25,
+    excluir_sin_ventas: bool = True,
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    ordenar_por: str = 'grilla',
+    filtro_skus: Optional[List[str]] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Simulador de Escenarios del Plan de Compra: evalúa los KPIs del Plan de Compra
+    (inversión, SKUs y unidades a pedir, margen potencial, alertas) para cada
+    combinación de `grilla_escenarios` ({parámetro: [valores]}). Los agregados por
+    SKU se calculan una vez; ver escenarios_plan_compra.py. La demanda es la de
+    'promedios' (PDA de ventanas), sin el pronóstico por producto.
+    """
+    sku_col = 'SKU / Código de producto'
+    stock_actual_col_stock = 'Cantidad en stock actual'
+    categoria_col_stock = 'Categoría'
+    precio_compra_actual_col_stock = 'Precio de compra actual (S/.)'
+    precio_venta_actual_col_stock = 'Precio de venta actual (S/.)'
+
+    valores_base = {
+        'score_ventas': score_ventas, 'score_ingreso': score_ingreso, 'score_margen': score_margen,
+        'score_dias_venta': score_dias_venta, 'peso_ventas_historicas': peso_ventas_historicas,
+        'dias_cobertura_ideal_base': dias_cobertura_ideal_base, 'lead_time_dias': lead_time_dias,
+        'dias_seguridad_base': dias_seguridad_base, 'nivel_servicio': nivel_servicio,
+    }
+    escenarios = grilla_de_escenarios(valores_base, grilla_escenarios or {})
+
+    base = _preparar_analisis_plan_compra(
+        df_ventas, df_inventario, dias_analisis_ventas_recientes, dias_analisis_ventas_general,
+        excluir_sin_ventas, incluir_solo_categorias, incluir_solo_marcas, filtro_skus
+    )
+    if base is None or base["df_analisis"].empty:
+        return {"data": pd.DataFrame(), "summary": {"insight": "No se encontraron productos que coincidan con los filtros aplicados.", "kpis": {}}}
+    df_analisis = base["df_analisis"]
+    final_dias_recientes, final_dias_general = base["final_dias_recientes"], base["final_dias_general"]
+
+    # --- Agregados por SKU (una sola vez para todos los escenarios) ---
+    factores_por_categoria = {'DEFAULT': 1.0, 'Herramientas manuales': 1.1, 'Herramientas eléctricas': 1.05, 'Material eléctrico': 1.3, 'Tornillería': 1.5, 'Adhesivos y selladores': 1.2}
+    if categoria_col_stock in df_analisis.columns:
+        factor_categoria = df_analisis[categoria_col_stock].map(factores_por_categoria).fillna(factores_por_categoria['DEFAULT'])
+    else:
+        factor_categoria = pd.Series(factores_por_categoria['DEFAULT'], index=df_analisis.index)
+    precio_venta_lista = df_analisis[precio_venta_actual_col_stock] if precio_venta_actual_col_stock in df_analisis.columns else pd.Series(0.0, index=df_analisis.index)
+    skus = {
+        'ventas_rec': df_analisis['Ventas_Total_Reciente'].to_numpy(dtype=np.float64),
+        'dias_venta_rec': df_analisis['Dias_Con_Venta_Reciente'].to_numpy(dtype=np.float64),
+        'ventas_gen': df_analisis['Ventas_Total_General'].to_numpy(dtype=np.float64),
+        'dias_venta_gen': df_analisis['Dias_Con_Venta_General'].to_numpy(dtype=np.float64),
+        'precio_venta_rec': df_analisis['Precio_Venta_Prom_Reciente'].to_numpy(dtype=np.float64),
+        'precio_compra': pd.to_numeric(df_analisis[precio_compra_actual_col_stock], errors='coerce').to_numpy(dtype=np.float64),
+        'precio_venta_lista': pd.to_numeric(precio_venta_lista, errors='coerce').to_numpy(dtype=np.float64),
+        'stock': df_analisis[stock_actual_col_stock].fillna(0).to_numpy(dtype=np.float64),
+        'factor_categoria': factor_categoria.to_numpy(dtype=np.float64),
+        'codigo_sku': pd.factorize(df_analisis[sku_col])[0],
+    }
+    if metodo_stock_seguridad == 'variabilidad':
+        demanda_diaria = _demanda_diaria_por_sku(
+            base["df_ventas_proc"], sku_col, 'Fecha de venta', 'Cantidad vendida', base["fecha_max_venta"], final_dias_general
+        ).set_index(sku_col)
+        skus['demanda_media'] = df_analisis[sku_col].map(demanda_diaria['Demanda_Diaria_Media']).fillna(0).to_numpy(dtype=np.float64)
+        skus['demanda_desv'] = df_analisis[sku_col].map(demanda_diaria['Demanda_Diaria_Desv']).fillna(0).to_numpy(dtype=np.float64)
+
+    inicio = time.perf_counter()
+    superficie = kpis_por_escenario(
+        skus, escenarios, final_dias_recientes, final_dias_general,
+        coef_importancia_para_cobertura_ideal=coef_importancia_para_cobertura_ideal,
+        coef_rotacion_para_stock_ideal=coef_rotacion_para_stock_ideal,
+        coef_rotacion_para_stock_minimo=coef_rotacion_para_stock_minimo,
+        dias_cubrir_con_pedido_minimo=dias_cubrir_con_pedido_minimo,
+        factor_importancia_seguridad=factor_importancia_seguridad,
+        incluir_productos_pasivos=incluir_productos_pasivos,
+        cantidad_reposicion_para_pasivos=cantidad_reposicion_para_pasivos,
+        metodo_stock_seguridad=metodo_stock_seguridad,
+        coef_variacion_lead_time=coef_variacion_lead_time,
+    )
+    segundos = time.perf_counter() - inicio
+    print(f"🧮 Escenarios: {len(superficie):,} combinaciones x {len(df_analisis):,} SKUs en {segundos:.2f} s")
+
+    # --- Superficie compacta: solo los parámetros que varían y los KPIs ---
+    etiquetas = {
+        'score_ventas': 'Score Ventas', 'score_ingreso': 'Score Ingreso', 'score_margen': 'Score Margen',
+        'score_dias_venta': 'Score Días con Venta', 'peso_ventas_historicas': 'Peso Ventas Históricas',
+        'dias_cobertura_ideal_base': 'Días de Cobertura Ideal', 'lead_time_dias': 'Lead Time (Días)',
+        'dias_seguridad_base': 'Días de Seguridad', 'nivel_servicio': 'Nivel de Servicio',
+    }
+    variados = [p for p in PARAMETROS_BARRIBLES if superficie[p].nunique() > 1]
+    df_resultado = superficie[(variados or list(PARAMETROS_BARRIBLES)) + list(COLUMNAS_KPI.values())].rename(columns=etiquetas)
+
+    criterios_orden = {
+        'inversion': (COLUMNAS_KPI['inversion'], False),
+        'unidades': (COLUMNAS_KPI['unidades'], False),
+        'margen': (COLUMNAS_KPI['margen'], False),
+        'alertas_criticas': (COLUMNAS_KPI['criticos'], True),
+    }
+    if ordenar_por in criterios_orden:
+        columna_orden, ascendente = criterios_orden[ordenar_por]
+        df_resultado = df_resultado.sort_values(columna_orden, ascending=ascendente, kind='stable')
+
+    # --- RESUMEN ---
+    inversion = superficie[COLUMNAS_KPI['inversion']]
+    skus_a_reponer = superficie[COLUMNAS_KPI['skus']]
+    insight_text = (
+        f"Se evaluaron {len(superficie):,} escenarios sobre {len(df_analisis):,} productos. "
+        f"La inversión sugerida va de S/ {inversion.min():,.2f} a S/ {inversion.max():,.2f} "
+        f"y los SKUs a reponer de {skus_a_reponer.min()} a {skus_a_reponer.max()}."
+    )
+    kpis = {
+        "Escenarios Evaluados": len(superficie),
+        "Parámetros Variados": ", ".join(etiquetas[p] for p in variados) or "Ninguno",
+        "Inversión Mínima": f"S/ {inversion.min():,.2f}",
+        "Inversión Máxima": f"S/ {inversion.max():,.2f}",
+        "Tiempo de Cálculo": f"{segundos:.2f} s",
+    }
+    return {"data": df_resultado, "summary": {"insight": insight_text, "kpis": kpis}}
+
+
+def process_csv_pronostico_demanda(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    horizonte_semanas: int = 4,
+    semanas_historia: int = 104,
+    metodo_pronostico: Optional[str] = None,
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    excluir_sin_ventas: bool = True,
+    ordenar_por: str = 'demanda_pronosticada',
+    filtro_skus: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Pronóstico de Demanda Estacional: demanda esperada por SKU para las próximas
+    `horizonte_semanas`, con el método (SES, Croston, SBA o TSB) que mejor predice
+    cada producto y la estacionalidad de su categoría. Ver pronostico_demanda.py.
+    """
+    sku_col = 'SKU / Código de producto'
+    nombre_prod_col = 'Nombre del producto'
+    categoria_col = 'Categoría'
+    marca_col = 'Marca'
+    stock_col = 'Cantidad en stock actual'
+    precio_compra_col = 'Precio de compra actual (S/.)'
+
+    df_inventario_proc = df_inventario.copy()
+    df_inventario_proc[sku_col] = df_inventario_proc[sku_col].astype(str).str.strip()
+    df_inventario_proc[stock_col] = pd.to_numeric(df_inventario_proc[stock_col], errors='coerce').fillna(0)
+    if precio_compra_col in df_inventario_proc.columns:
+        df_inventario_proc[precio_compra_col] = pd.to_numeric(df_inventario_proc[precio_compra_col], errors='coerce').fillna(0)
+    df_ventas_proc = df_ventas
+    if filtro_skus:
+        df_inventario_proc = df_inventario_proc[df_inventario_proc[sku_col].isin(filtro_skus)]
+        df_ventas_proc = df_ventas[df_ventas[sku_col].astype(str).str.strip().isin(filtro_skus)]
+
+    horizonte_semanas = max(1, int(horizonte_semanas))
+    df_pronostico = pronosticar_demanda(
+        df_ventas_proc, df_inventario_proc, horizonte_dias=horizonte_semanas * 7,
+        num_periodos=max(8, int(semanas_historia)), metodo=metodo_pronostico
+    )
+    df_analisis = pd.merge(df_inventario_proc, df_pronostico, on=sku_col, how='left')
+    df_analisis['Pronostico_Periodo'] = df_analisis['Pronostico_Periodo'].fillna(0)
+    df_analisis['Metodo_Pronostico'] = df_analisis['Metodo_Pronostico'].fillna('Sin ventas')
+    df_analisis['Patron_Demanda'] = df_analisis['Patron_Demanda'].fillna('Sin ventas')
+
+    if excluir_sin_ventas:
+        df_analisis = df_analisis[df_analisis['Metodo_Pronostico'] != 'Sin ventas']
+    if incluir_solo_categorias and categoria_col in df_analisis.columns:
+        categorias_normalizadas = [cat.strip().lower() for cat in incluir_solo_categorias]
+        df_analisis = df_analisis[df_analisis[categoria_col].astype(str).str.strip().str.lower().isin(categorias_normalizadas)]
+    if incluir_solo_marcas and marca_col in df_analisis.columns:
+        marcas_normalizadas = [marca.strip().lower() for marca in incluir_solo_marcas]
+        df_analisis = df_analisis[df_analisis[marca_col].astype(str).str.strip().str.lower().isin(marcas_normalizadas)]
+    if df_analisis.empty:
+        return {"data": pd.DataFrame(), "summary": {"insight": "No hay historial de ventas suficiente para pronosticar con los filtros aplicados.", "kpis": {}}}
+    df_analisis = df_analisis.copy()
+
+    df_analisis['Demanda_Horizonte'] = (df_analisis['Pronostico_Periodo'] * horizonte_semanas).round(1)
+    df_analisis['Cobertura_Semanas'] = np.where(
+        df_analisis['Pronostico_Periodo'] > 1e-6, df_analisis[stock_col] / df_analisis['Pronostico_Periodo'], 9999
+    ).round(1)
+    df_analisis['Faltante_Horizonte'] = (df_analisis['Demanda_Horizonte'] - df_analisis[stock_col]).clip(lower=0).apply(np.ceil)
+    if precio_compra_col in df_analisis.columns:
+        df_analisis['Inversion_Faltante'] = (df_analisis['Faltante_Horizonte'] * df_analisis[precio_compra_col]).round(2)
+
+    criterios_orden = {
+        'demanda_pronosticada': ('Demanda_Horizonte', False),
+        'cobertura': ('Cobertura_Semanas', True),
+        'faltante': ('Faltante_Horizonte', False),
+        'estacionalidad': ('Factor_Estacional', False),
+    }
+    columna_orden, ascendente = criterios_orden.get(ordenar_por, criterios_orden['demanda_pronosticada'])
+    df_analisis = df_analisis.sort_values(columna_orden, ascending=ascendente)
+
+    # --- RESUMEN ---
+    total_skus = len(df_analisis)
+    intermitentes = int(df_analisis['Patron_Demanda'].isin(['Intermitente', 'Irregular']).sum())
+    en_riesgo = int((df_analisis['Faltante_Horizonte'] > 0).sum())
+    kpis = {
+        "SKUs Pronosticados": total_skus,
+        "Unidades Esperadas": f"{df_analisis['Demanda_Horizonte'].sum():,.0f} en {horizonte_semanas} semanas",
+        "Demanda Intermitente": f"{intermitentes / total_skus:.0%} de los SKUs",
+        "SKUs con Stock Insuficiente": en_riesgo,
+    }
+    if 'Inversion_Faltante' in df_analisis.columns:
+        kpis["Inversión para Cubrir el Horizonte"] = f"S/ {df_analisis['Inversion_Faltante'].sum():,.2f}"
+    insight_text = (f"Para las próximas {horizonte_semanas} semanas, {en_riesgo} de {total_skus} productos no alcanzan "
+                    f"la demanda pronosticada con su stock actual. El {intermitentes / total_skus:.0%} se vende de forma intermitente.")
+
+    columnas_salida = [
+        sku_col, nombre_prod_col, categoria_col, marca_col, stock_col, precio_compra_col,
+        'Patron_Demanda', 'Metodo_Pronostico', 'Pronostico_Periodo', 'Demanda_Horizonte',
+        'Factor_Estacional', 'Cobertura_Semanas', 'Faltante_Horizonte', 'Inversion_Faltante', 'Error_Pronostico'
+    ]
+    df_resultado = df_analisis[[col for col in columnas_salida if col in df_analisis.columns]].copy()
+    df_resultado['Pronostico_Periodo'] = df_resultado['Pronostico_Periodo'].round(2)
+    for col in ('Factor_Estacional', 'Error_Pronostico'):
+        if col in df_resultado.columns:
+            df_resultado[col] = df_resultado[col].round(2)
+    df_resultado.rename(columns={
+        stock_col: 'Stock Actual (Unds)',
+        precio_compra_col: 'Precio Compra Actual (S/.)',
+        'Patron_Demanda': 'Patrón de Demanda',
+        'Metodo_Pronostico': 'Método de Pronóstico',
+        'Pronostico_Periodo': 'Pronóstico Semanal (Unds)',
+        'Demanda_Horizonte': f'Demanda Pronosticada {horizonte_semanas} Semanas (Unds)',
+        'Factor_Estacional': 'Factor Estacional',
+        'Cobertura_Semanas': 'Cobertura Actual (Semanas)',
+        'Faltante_Horizonte': 'Faltante para el Horizonte (Unds)',
+        'Inversion_Faltante': 'Inversión para Cubrir (S/.)',
+        'Error_Pronostico': 'Error Típico Semanal (Unds)',
+    }, inplace=True)
+
+    return {
+        "data": df_resultado,
+        "summary": {"insight": insight_text, "kpis": kpis}
+    }
+
+
+def process_csv_optimizador_pedido_minimo(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    monto_minimo_por_marca: float = 500.0,
+    montos_minimos_por_marca: Optional[Dict[str, float]] = None,
+    tolerancia_exceso_pct: float = 10.0,
+    base_pedido: str = 'minimo',
+    dias_cobertura_extra: int = 15,
+    peso_importancia: float = 0.1,
+    solo_marcas_con_pedido: bool = True,
+    lead_time_dias: float = 7.0,
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    filtro_skus: Optional[List[str]] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Optimizador de Pedido por Línea: parte del Plan de Compra Sugerido y, para cada
+    marca cuyo pedido no llega al monto mínimo del proveedor, elige unidades extra
+    que completan el monto dando prioridad a los productos más urgentes.
+    Ver optimizador_pedido.py.
+    """
+    sku_col = 'SKU / Código de producto'
+    marca_col = 'Marca'
+    precio_col = 'Precio Compra Actual (S/.)'
+    urgencia_col = 'Índice de Urgencia'
+    importancia_col = 'Índice de Importancia'
+    pda_col = 'Promedio Venta Diaria (Unds)'
+    col_ideal, col_minimo = 'Pedido Ideal Sugerido (Unds)', 'Pedido Mínimo Sugerido (Unds)'
+
+    plan = process_csv_plan_compra_sugerido(
+        df_ventas, df_inventario, lead_time_dias=lead_time_dias,
+        incluir_solo_categorias=incluir_solo_categorias, incluir_solo_marcas=incluir_solo_marcas,
+        filtro_skus=filtro_skus, ordenar_por='Índice de Urgencia'
+    )
+    df = plan["data"] if isinstance(plan, dict) else plan
+    if df is None or df.empty:
+        return {"data": pd.DataFrame(), "summary": {"insight": "No hay productos en el plan de compra para optimizar.", "kpis": {}}}
+    if marca_col not in df.columns:
+        return {"data": pd.DataFrame(), "summary": {"insight": "Tu inventario no tiene la columna 'Marca': no se puede agrupar el pedido por proveedor.", "kpis": {}}}
+
+    df = df.copy()
+    for col in (precio_col, urgencia_col, importancia_col, pda_col, col_ideal, col_minimo):
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0) if col in df.columns else 0.0
+    df[marca_col] = df[marca_col].fillna('Sin marca').astype(str)
+
+    # --- Pedido base y candidatos a unidades extra ---
+    col_base = col_ideal if base_pedido == 'ideal' else col_minimo
+    base = df[col_base].clip(lower=0).to_numpy()
+    costo = df[precio_col].to_numpy()
+    # Extra: lo que falta para el pedido ideal más unos días de venta adicionales
+    tope = (df[col_ideal] - df[col_base]).clip(lower=0) + np.ceil(df[pda_col] * max(0, dias_cobertura_extra))
+    tope = np.where(costo > 0, tope.to_numpy(), 0)
+    prioridad = df[urgencia_col] + peso_importancia * df[importancia_col] + 0.01
+    valor = costo * prioridad.to_numpy()
+
+    codigos, marcas = pd.factorize(df[marca_col])
+    monto_base = np.bincount(codigos, weights=base * costo, minlength=len(marcas))
+    montos = montos_minimos_por_marca or {}
+    minimo = np.array([float(montos.get(marca, monto_minimo_por_marca)) for marca in marcas])
+    considerada = monto_base > 0 if solo_marcas_con_pedido else np.ones(len(marcas), dtype=bool)
+    deficit = np.where(considerada, np.clip(minimo - monto_base, 0, None), 0)
+
+    inicio = time.perf_counter()
+    resultado = optimizar_extras(codigos, costo, valor, tope, deficit, minimo * tolerancia_exceso_pct / 100)
+    print(f"🎯 Optimizador de pedido: {len(df):,} productos, {int((deficit > 0).sum())} marcas bajo el mínimo, "
+          f"resuelto en {time.perf_counter() - inicio:.3f} s")
+
+    # Si la marca no llega al mínimo ni con todos sus candidatos, no sugerimos extras a medias
+    extra = np.where(resultado["alcanzado"][codigos], resultado["extra"], 0)
+    costo_extra = np.bincount(codigos, weights=extra * costo, minlength=len(marcas))
+    df['Pedido_Base'] = base
+    df['Unidades_Extra'] = extra
+    df['Pedido_Final'] = base + extra
+    df['Subtotal_Final'] = (df['Pedido_Final'] * costo).round(2)
+    monto_final = monto_base + costo_extra
+    # Si no hubo combinación dentro de la tolerancia pedida, la marca se resolvió con una más amplia y se avisa
+    ampliada = resultado["holgura_ampliada"]
+    estado = np.select(
+        [deficit <= 0, resultado["alcanzado"] & ~ampliada, resultado["alcanzado"]],
+        ['Cumple sin cambios', 'Alcanzado con extras', 'Alcanzado excediendo la tolerancia'],
+        'No alcanzable con los productos de la marca'
+    )
+    df['Monto_Minimo_Marca'] = minimo[codigos]
+    df['Monto_Final_Marca'] = monto_final[codigos].round(2)
+    df['Estado_Marca'] = estado[codigos]
+
+    df_resultado = df[considerada[codigos] & (df['Pedido_Final'] > 0)].sort_values(
+        by=[marca_col, 'Unidades_Extra', urgencia_col], ascending=[True, False, False]
+    )
+
+    marcas_con_deficit = int((deficit > 0).sum())
+    marcas_alcanzadas = int(((deficit > 0) & resultado["alcanzado"]).sum())
+    inversion_extra = float(costo_extra.sum())
+    kpis = {
+        "Marcas con Pedido": int(considerada.sum()),
+        "Marcas bajo el Mínimo": marcas_con_deficit,
+        "Marcas que Alcanzan el Mínimo": marcas_alcanzadas,
+        "Inversión Extra Sugerida": f"S/ {inversion_extra:,.2f}",
+    }
+    marcas_ampliadas = int(ampliada.sum())
+    if marcas_ampliadas:
+        kpis["Marcas que Exceden la Tolerancia"] = marcas_ampliadas
+    if marcas_con_deficit == 0:
+        insight_text = "Todos los pedidos por marca ya cumplen el monto mínimo. No hace falta agregar productos."
+    else:
+        insight_text = (f"{marcas_con_deficit} marcas no llegaban al monto mínimo. Agregando S/ {inversion_extra:,.2f} en los productos "
+                        f"más urgentes, {marcas_alcanzadas} de ellas lo alcanzan.")
+        if marcas_ampliadas:
+            insight_text += (f" En {marcas_ampliadas} no hay combinación dentro del {tolerancia_exceso_pct:g}% de tolerancia: "
+                             "el pedido sugerido la excede (revisa la columna 'Estado de la Marca').")
+        if marcas_alcanzadas < marcas_con_deficit:
+            insight_text += " Para el resto no hay suficientes productos con rotación: considera consolidar el pedido con otra fecha."
+
+    columnas_salida = [
+        marca_col, sku_col, 'Nombre del producto', 'Categoría', precio_col, 'Stock Actual (Unds)', urgencia_col,
+        'Pedido_Base', 'Unidades_Extra', 'Pedido_Final', 'Subtotal_Final',
+        'Monto_Minimo_Marca', 'Monto_Final_Marca', 'Estado_Marca'
+    ]
+    df_resultado = df_resultado[[col for col in columnas_salida if col in df_resultado.columns]].rename(columns={
+        'Pedido_Base': 'Pedido Base (Unds)',
+        'Unidades_Extra': 'Unidades Extra (Unds)',
+        'Pedido_Final': 'Pedido Final (Unds)',
+        'Subtotal_Final': 'Subtotal Final (S/.)',
+        'Monto_Minimo_Marca': 'Monto Mínimo de la Marca (S/.)',
+        'Monto_Final_Marca': 'Monto Final de la Marca (S/.)',
+        'Estado_Marca': 'Estado de la Marca',
+    })
+
+    return {
+        "data": df_resultado,
+        "summary": {"insight": insight_text, "kpis": kpis}
+    }
+
+
+def process_csv_comprados_juntos(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    df_comprobantes: Optional[pd.DataFrame] = None,
+    top_k: int = 5,
+    min_comprobantes_juntos: int = 3,
+    ordenar_por: str = 'lift',
+    min_lift: float = 1.0,
+    max_skus_por_comprobante: int = 50,
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    filtro_skus: Optional[List[str]] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Productos Comprados Juntos: análisis de canasta sobre el N° de comprobante.
+    Para cada SKU devuelve los `top_k` productos que más aparecen en sus mismos
+    comprobantes, con soporte, confianza y lift. Ver cesta_compras.py.
+
+    `df_comprobantes` son las incidencias (comprobante, SKU) ya preparadas; si no
+    llegan, se arman desde `df_ventas` (que debe traer la columna de comprobante).
+    """
+    sku_col = 'SKU / Código de producto'
+    nombre_col = 'Nombre del producto'
+    categoria_col = 'Categoría'
+    marca_col = 'Marca'
+    stock_col = 'Cantidad en stock actual'
+
+    incidencias = df_comprobantes if df_comprobantes is not None else incidencias_de_ventas(df_ventas)
+    if incidencias is None or incidencias.empty:
+        return {"data": pd.DataFrame(), "summary": {
+            "insight": "Tu archivo de ventas no trae el 'N° de comprobante / boleta': sin él no se puede saber qué productos se venden juntos.",
+            "kpis": {}
+        }}
+
+    inicio = time.perf_counter()
+    # Las estadísticas se calculan sobre todos los comprobantes; los filtros solo limitan qué SKUs se muestran
+    resultado = pares_frecuentes(
+        incidencias, top_k=max(1, int(top_k)), min_comprobantes_juntos=max(2, int(min_comprobantes_juntos)),
+        ordenar_por=ordenar_por, min_lift=min_lift, max_skus_por_comprobante=max(2, int(max_skus_por_comprobante))
+    )
+    pares = resultado["pares"]
+    print(f"🛒 Canasta: {resultado['comprobantes']:,} comprobantes, {len(pares):,} pares, "
+          f"{resultado['tramos']} tramos, calculado en {time.perf_counter() - inicio:.3f} s")
+
+    # --- Datos del inventario para ambos lados del par ---
+    inventario = pd.DataFrame(index=pd.Index([], name=sku_col))
+    if not df_inventario.empty and sku_col in df_inventario.columns:
+        inventario = df_inventario.assign(**{sku_col: df_inventario[sku_col].astype(str).str.strip()})
+        inventario = inventario.drop_duplicates(subset=[sku_col]).set_index(sku_col)
+
+    if filtro_skus:
+        pares = pares[pares[sku_col].isin([str(s).strip() for s in filtro_skus])]
+    for columna, valores in ((categoria_col, incluir_solo_categorias), (marca_col, incluir_solo_marcas)):
+        if valores and columna in inventario.columns:
+            pares = pares[pares[sku_col].map(inventario[columna]).isin(valores)]
+
+    df_resultado = pd.DataFrame({sku_col: pares[sku_col]})
+    for columna in (nombre_col, categoria_col):
+        if columna in inventario.columns:
+            df_resultado[columna] = pares[sku_col].map(inventario[columna])
+    df_resultado['SKU Relacionado'] = pares['SKU Relacionado']
+    for columna, nuevo in ((nombre_col, 'Producto Relacionado'), (categoria_col, 'Categoría Relacionada')):
+        if columna in inventario.columns:
+            df_resultado[nuevo] = pares['SKU Relacionado'].map(inventario[columna])
+    if stock_col in inventario.columns:
+        df_resultado['Stock Relacionado (Unds)'] = pd.to_numeric(pares['SKU Relacionado'].map(inventario[stock_col]), errors='coerce')
+    df_resultado['Comprobantes Juntos'] = pares['Comprobantes Juntos']
+    df_resultado['Soporte (%)'] = (pares['Soporte'] * 100).round(3)
+    df_resultado['Confianza (%)'] = (pares['Confianza'] * 100).round(1)
+    df_resultado['Lift'] = pares['Lift'].round(2)
+
+    skus_con_pares = int(df_resultado[sku_col].nunique())
+    kpis = {
+        "Comprobantes Analizados": f"{resultado['comprobantes']:,}",
+        "SKUs con Asociaciones": skus_con_pares,
+        "Pares Encontrados": len(df_resultado),
+        "Productos por Comprobante (Prom.)": round(resultado['skus_por_comprobante_promedio'], 2),
+    }
+    if df_resultado.empty:
+        insight_text = (f"Analizamos {resultado['comprobantes']:,} comprobantes y no encontramos productos que se compren juntos "
+                        f"en al menos {min_comprobantes_juntos} comprobantes. Prueba bajando ese mínimo.")
+    else:
+        mejor = df_resultado.loc[df_resultado['Lift'].idxmax()]
+        producto = mejor.get(nombre_col) if pd.notna(mejor.get(nombre_col)) else mejor[sku_col]
+        relacionado = mejor.get('Producto Relacionado') if pd.notna(mejor.get('Producto Relacionado')) else mejor['SKU Relacionado']
+        insight_text = (f"En {resultado['comprobantes']:,} comprobantes, {skus_con_pares} productos tienen compañeros de compra frecuentes. "
+                        f"La asociación más fuerte: quien compra {producto} lleva {relacionado} {mejor['Lift']:.1f} veces más de lo esperado. "
+                        f"Exhíbelos juntos y cuida que no falte ninguno de los dos.")
+
+    return {
+        "data": df_resultado.reset_index(drop=True),
+        "summary": {"insight": insight_text, "kpis": kpis}
+    }
+
+
+def process_csv_backtest_politica_reposicion(
+    df_ventas: pd.DataFrame,
+    df_inventario: pd.DataFrame,
+    dias_simulacion: int = DIAS_SIMULACION,
+    lead_time_dias: float = 7.0,
+    dias_cobertura_ideal_base: int = 10,
+    dias_seguridad_base: float = 0,
+    peso_ventas_historicas: float = 0.6,
+    dias_analisis_ventas_recientes: int = 30,
+    dias_analisis_ventas_general: int = 90,
+    metodo_stock_seguridad: str = 'dias',
+    nivel_servicio: float = 0.95,
+    coef_variacion_lead_time: float = 0.25,
+    dias_entre_recalculos: int = 7,
+    excluir_sin_ventas: bool = True,
+    ordenar_por: str = 'fill_rate',
+    incluir_solo_categorias: Optional[List[str]] = None,
+    incluir_solo_marcas: Optional[List[str]] = None,
+    filtro_skus: Optional[List[str]] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Backtesting de la Política de Reposición: re-juega la demanda diaria de los
+    últimos `dias_simulacion` días contra los parámetros de los Puntos de Alerta /
+    Plan de Compra y mide, por SKU y en total, el fill rate, los días con quiebre
+    y el inventario promedio valorizado. Ver backtest_politicas.py.
+    """
+    sku_col = 'SKU / Código de producto'
+    nombre_col = 'Nombre del producto'
+    categoria_col = 'Categoría'
+    marca_col = 'Marca'
+    precio_compra_col = 'Precio de compra actual (S/.)'
+
+    df_inventario_proc = df_inventario.copy()
+    df_inventario_proc[sku_col] = df_inventario_proc[sku_col].astype(str).str.strip()
+    df_inventario_proc = df_inventario_proc.drop_duplicates(subset=[sku_col])
+    df_inventario_proc[precio_compra_col] = pd.to_numeric(df_inventario_proc[precio_compra_col], errors='coerce').fillna(0)
+    if filtro_skus:
+        df_inventario_proc = df_inventario_proc[df_inventario_proc[sku_col].isin([str(s).strip() for s in filtro_skus])]
+    if incluir_solo_categorias and categoria_col in df_inventario_proc.columns:
+        categorias_normalizadas = [cat.strip().lower() for cat in incluir_solo_categorias]
+        df_inventario_proc = df_inventario_proc[df_inventario_proc[categoria_col].astype(str).str.strip().str.lower().isin(categorias_normalizadas)]
+    if incluir_solo_marcas and marca_col in df_inventario_proc.columns:
+        marcas_normalizadas = [marca.strip().lower() for marca in incluir_solo_marcas]
+        df_inventario_proc = df_inventario_proc[df_inventario_proc[marca_col].astype(str).str.strip().str.lower().isin(marcas_normalizadas)]
+
+    # --- Demanda diaria (días x SKUs del inventario), contando hacia atrás desde la última venta ---
+    dias_analisis_ventas_recientes = max(1, int(dias_analisis_ventas_recientes))
+    dias_analisis_ventas_general = max(dias_analisis_ventas_recientes, int(dias_analisis_ventas_general))
+    dias_simulacion = max(DIAS_MINIMOS_SIMULACION, int(dias_simulacion))
+    skus_ventas, matriz, _ = matriz_ventas_por_periodo(
+        df_ventas, num_periodos=dias_analisis_ventas_general + dias_simulacion, dias_por_periodo=1
+    )
+    fila = skus_ventas.get_indexer(df_inventario_proc[sku_col])
+    con_ventas = fila >= 0
+    if excluir_sin_ventas:
+        df_inventario_proc, fila = df_inventario_proc[con_ventas], fila[con_ventas]
+    # Solo cuentan los días desde la primera venta del archivo (antes no hay historia, no demanda cero),
+    # sin importar qué SKUs dejaron los filtros
+    dias_con_datos = np.flatnonzero(matriz.any(axis=0))
+    primer_dia = dias_con_datos[0] if len(dias_con_datos) else matriz.shape[1]
+    demanda = np.zeros((matriz.shape[1] - primer_dia, len(fila)), dtype=np.float32)
+    demanda[:, fila >= 0] = matriz[fila[fila >= 0], primer_dia:].T
+    del matriz
+    dias_simulados = len(demanda) - dias_analisis_ventas_general
+    if df_inventario_proc.empty or dias_simulados < DIAS_MINIMOS_SIMULACION:
+        return {"data": pd.DataFrame(), "summary": {
+            "insight": (f"Para simular la política se necesitan al menos {dias_analisis_ventas_general + DIAS_MINIMOS_SIMULACION} días "
+                        f"de ventas ({dias_analisis_ventas_general} para el primer cálculo del PDA y {DIAS_MINIMOS_SIMULACION} para simular)."),
+            "kpis": {}
+        }}
+
+    factores_por_categoria = {'DEFAULT': 1.0, 'Herramientas manuales': 1.1, 'Herramientas eléctricas': 1.05, 'Material eléctrico': 1.3, 'Tornillería': 1.5, 'Adhesivos y selladores': 1.2}
+    if categoria_col in df_inventario_proc.columns:
+        factor_cobertura = df_inventario_proc[categoria_col].map(factores_por_categoria).fillna(factores_por_categoria['DEFAULT']).to_numpy()
+    else:
+        factor_cobertura = None
+    costo = df_inventario_proc[precio_compra_col].to_numpy(dtype=np.float64)
+
+    inicio = time.perf_counter()
+    resultado = simular_politica(
+        demanda, dias_analisis_ventas_general, costo,
+        lead_time_dias=lead_time_dias, dias_cobertura_ideal_base=dias_cobertura_ideal_base,
+        dias_seguridad_base=dias_seguridad_base, peso_ventas_historicas=peso_ventas_historicas,
+        dias_analisis_ventas_recientes=dias_analisis_ventas_recientes, dias_analisis_ventas_general=dias_analisis_ventas_general,
+        factor_cobertura=factor_cobertura, metodo_stock_seguridad=metodo_stock_seguridad,
+        nivel_servicio=nivel_servicio, coef_variacion_lead_time=coef_variacion_lead_time,
+        dias_entre_recalculos=max(1, int(dias_entre_recalculos))
+    )
+    print(f"🔁 Backtest: {demanda.shape[1]:,} SKUs x {dias_simulados} días simulados en {time.perf_counter() - inicio:.2f} s")
+
+    # --- Resultado por SKU (un solo escenario: fila 0) ---
+    df_resultado = df_inventario_proc[[c for c in (sku_col, nombre_col, categoria_col, marca_col, precio_compra_col) if c in df_inventario_proc.columns]].copy()
+    perdidas = resultado['demanda'][0] - resultado['atendida'][0]
+    df_resultado['Demanda Simulada (Unds)'] = resultado['demanda'][0].round(0)
+    df_resultado['Unidades Perdidas'] = perdidas.round(0)
+    df_resultado['Fill Rate (%)'] = (resultado['fill_rate'][0] * 100).round(1)
+    df_resultado['Días con Quiebre'] = resultado['dias_quiebre'][0]
+    df_resultado['Stock Promedio (Unds)'] = resultado['stock_promedio'][0].round(1)
+    df_resultado['Inventario Promedio (S/.)'] = resultado['valor_inventario_promedio'][0].round(2)
+    df_resultado['Venta Perdida a Costo (S/.)'] = (perdidas * costo).round(2)
+    df_resultado['Pedidos Colocados'] = resultado['pedidos'][0]
+
+    criterios_orden = {
+        'fill_rate': ('Fill Rate (%)', True),
+        'dias_quiebre': ('Días con Quiebre', False),
+        'venta_perdida': ('Venta Perdida a Costo (S/.)', False),
+        'inventario': ('Inventario Promedio (S/.)', False),
+    }
+    columna_orden, ascendente = criterios_orden.get(ordenar_por, criterios_orden['fill_rate'])
+    df_resultado = df_resultado.sort_values(columna_orden, ascending=ascendente)
+    df_resultado.rename(columns={precio_compra_col: 'Precio Compra Actual (S/.)'}, inplace=True)
+
+    # --- RESUMEN ---
+    total = resumen_escenarios(resultado, costo).iloc[0]
+    skus_con_quiebre = int((resultado['dias_quiebre'][0] > 0).sum())
+    kpis = {
+        "Fill Rate Simulado": f"{total['Fill Rate']:.1%}",
+        "SKUs con Algún Quiebre": f"{skus_con_quiebre} de {len(df_resultado)}",
+        "Días-SKU en Quiebre": f"{int(total['Dias SKU en Quiebre']):,} ({total['Dias SKU en Quiebre (%)']:.1%})",
+        "Inventario Promedio": f"S/ {total['Inventario Promedio Valorizado']:,.2f}",
+        "Venta Perdida (a Costo)": f"S/ {total['Venta Perdida a Costo']:,.2f}",
+    }
+    insight_text = (f"Con estos parámetros, en los últimos {dias_simulados} días habrías atendido el {total['Fill Rate']:.1%} de la demanda "
+                    f"con un inventario promedio de S/ {total['Inventario Promedio Valorizado']:,.2f}. "
+                    f"{skus_con_quiebre} productos habrían tenido al menos un día sin stock suficiente.")
+
+    return {
+        "data": df_resultado.reset_index(drop=True),
+        "summary": {"insight": insight_text, "kpis": kpis}
+    }
+
+
 def generar_plan_compra_semaforo(
     df_ventas: pd.DataFrame,
     df_inventario: pd.DataFrame,
@@ -3150,12 +4011,16 @@ def procesar_stock_muerto(
     hoy = pd.to_datetime(datetime.now().date())
     fecha_inicio_analisis_reciente = hoy - relativedelta(months=meses_analisis_calc)
     
-    ventas_totales_sku = df_ventas.groupby('sku')['cantidad_vendida'].sum().reset_index(name='ventas_totales_unds')
-    ultima_venta_sku = df_ventas.groupby('sku')['fecha_venta'].max().reset_index(name='ultima_venta')
-    
     col_ventas_recientes_nombre = f'total_vendido_ultimos_{meses_analisis_calc}_meses_unds'
-    df_ventas_recientes = df_ventas[df_ventas['fecha_venta'] >= fecha_inicio_analisis_reciente]
-    ventas_ultimos_x_meses_sku = df_ventas_recientes.groupby('sku')['cantidad_vendida'].sum().reset_index(name=col_ventas_recientes_nombre)
+    agregados_duckdb = motor_duckdb.agregar_ventas_stock_muerto(df_ventas, fecha_inicio_analisis_reciente, col_ventas_recientes_nombre) if motor_duckdb.usar_duckdb() else None
+    if agregados_duckdb is not None:
+        ventas_totales_sku, ultima_venta_sku, ventas_ultimos_x_meses_sku = agregados_duckdb
+    else:
+        ventas_totales_sku = df_ventas.groupby('sku')['cantidad_vendida'].sum().reset_index(name='ventas_totales_unds')
+        ultima_venta_sku = df_ventas.groupby('sku')['fecha_venta'].max().reset_index(name='ultima_venta')
+
+        df_ventas_recientes = df_ventas[df_ventas['fecha_venta'] >= fecha_inicio_analisis_reciente]
+        ventas_ultimos_x_meses_sku = df_ventas_recientes.groupby('sku')['cantidad_vendida'].sum().reset_index(name=col_ventas_recientes_nombre)
 
     # --- PASO 2: Cálculo de Métricas y Clasificación ---
     # --- 3. Combinar datos y Calcular Métricas Derivadas ---
@@ -3706,11 +4571,14 @@ def auditar_margenes_de_productos_nuevo(
     filtro_marcas: Optional[List[str]] = None,
     periodo_analisis_dias: int = 30,
     ordenar_por: str = 'impacto_financiero',
+    foto_inventario_previa: Optional[pd.DataFrame] = None,
     **kwargs
 ) -> Dict[str, Any]:
     """
     Genera un reporte de auditoría para identificar productos con desviaciones
     de margen, comparando el precio de venta promedio con el precio de lista.
+    Con `foto_inventario_previa` (la foto de la carga de inventario anterior, ver
+    historial_inventario.py) se agregan las alertas de cambio de costo.
     """
     # --- 1. Pre-procesamiento y cálculo de precios ---
     # ... (Tu lógica para limpiar datos, calcular `Precio_Venta_Prom_Reciente` y hacer merge)
@@ -3794,8 +4662,27 @@ def auditar_margenes_de_productos_nuevo(
         0
     )
 
+    # --- 2b. Alertas de cambio de costo desde la carga de inventario anterior ---
+    # Solo se compara contra la foto guardada: el CSV anterior no se vuelve a leer
+    skus_alza_sin_ajuste = 0
+    if foto_inventario_previa is not None:
+        diferencia = comparar_fotos_inventario(construir_foto_inventario(df_inventario_proc), foto_inventario_previa)
+        alertas = alertas_de_costo(diferencia["cambios"]).rename(columns={
+            'costo_previo': 'Costo Anterior (S/.)',
+            'variacion_costo_pct': 'Variación de Costo (%)',
+            'precio_previo': 'Precio de Lista Anterior (S/.)',
+            'alerta': 'Alerta de Costo',
+        })
+        df_auditoria = df_auditoria.merge(alertas, left_on=sku_col, right_index=True, how='left')
+        skus_alza_sin_ajuste = int(df_auditoria.loc[df_auditoria['Alerta de Costo'] == ALERTA_ALZA_SIN_AJUSTE, sku_col].nunique())
+
     # --- 3. Filtrado según los parámetros del usuario ---
-    if tipo_analisis_margen == 'desviacion_negativa':
+    if tipo_analisis_margen == 'alza_de_costo':
+        if 'Alerta de Costo' in df_auditoria.columns:
+            df_resultado = (df_auditoria[df_auditoria['Alerta de Costo'] == ALERTA_ALZA_SIN_AJUSTE]).round(2)
+        else:
+            df_resultado = df_auditoria.iloc[0:0]
+    elif tipo_analisis_margen == 'desviacion_negativa':
         df_resultado = (df_auditoria[df_auditoria['Desviación de Margen (%)'] < -umbral_desviacion_porcentaje]).round(2)
     elif tipo_analisis_margen == 'margen_negativo':
         df_resultado = (df_auditoria[df_auditoria['Margen Real (S/.)'] < 0]).round(2)
@@ -3848,6 +4735,10 @@ def auditar_margenes_de_productos_nuevo(
         "Peor Infractor (%)": f"{peor_infractor['Desviación de Margen (%)']:.1f}% ({peor_infractor['Nombre del producto']})" if peor_infractor is not None else "N/A",
         "# SKUs con Pérdida": skus_con_perdida
     }
+    if foto_inventario_previa is not None:
+        kpis["# SKUs con Alza de Costo sin Ajuste de Precio"] = skus_alza_sin_ajuste
+        if skus_alza_sin_ajuste:
+            insight_text += f" Además, {skus_alza_sin_ajuste} productos subieron de costo desde la carga de inventario anterior sin que se ajustara su precio de lista."
 
 
     if ordenar_por == 'impacto_financiero':
@@ -3863,6 +4754,12 @@ def auditar_margenes_de_productos_nuevo(
     # --- 5. Formateo y Limpieza Final ---
     # ... (Tu lógica para seleccionar, renombrar y limpiar el `df_resultado` para JSON)
     # --- PASO 6: Formateo y Limpieza Final (sin cambios en la lógica, solo en el return) ---
+    if df_resultado.empty and tipo_analisis_margen == 'alza_de_costo':
+        mensaje = (
+            "No hay una carga de inventario anterior con la cual comparar los costos." if foto_inventario_previa is None
+            else "Ningún producto subió de costo sin ajuste de precio desde la carga de inventario anterior."
+        )
+        return {"data": pd.DataFrame({"Resultado": [mensaje]}), "summary": {"insight": mensaje, "kpis": kpis}}
     if df_resultado.empty:
         print("✅ Auditoría completada. No se encontraron productos con márgenes negativos.")
         # Devolvemos la estructura de diccionario esperada, con un DataFrame vacío
@@ -4045,11 +4942,14 @@ def auditar_calidad_datos(
     filtro_marcas: Optional[List[str]] = None,
     ordenar_por: str = 'valor_stock_s',
     filtro_skus: Optional[List[str]] = None,
+    umbral_similitud_nombres: float = 0.7,
     **kwargs
 ) -> Dict[str, Any]:
     """
     Analiza el DataFrame de inventario para encontrar una variedad de problemas de
     calidad de datos, incluyendo datos faltantes, problemas de rentabilidad y duplicados.
+    El criterio 'nombres_similares' agrupa además los casi duplicados
+    ("TORNILLO 1/2 X 2" / "Tornillo 1/2x2"), ver duplicados_nombres.py.
     """
     print("Iniciando Auditoría de Calidad de Datos Avanzada...")
 
@@ -4106,7 +5006,8 @@ def auditar_calidad_datos(
         df_problema['Problema Detectado'] = 'Precio Venta < Costo'
         problem_dfs.append(df_problema)
 
-    if 'nombres_duplicados' in criterios_auditoria:
+    # 'nombres_similares' ya incluye los nombres idénticos: no se repite la búsqueda exacta
+    if 'nombres_duplicados' in criterios_auditoria and 'nombres_similares' not in criterios_auditoria:
         # Buscamos nombres de producto que correspondan a más de un SKU
         duplicated_names = df_audit.groupby(NOMBRE_PROD)[SKU].nunique()
         duplicated_names = duplicated_names[duplicated_names > 1].index
@@ -4115,6 +5016,30 @@ def auditar_calidad_datos(
             df_problema['Problema Detectado'] = 'Nombre Duplicado'
             problem_dfs.append(df_problema)
 
+    if 'nombres_similares' in criterios_auditoria:
+        # Grupos de casi duplicados con MinHash-LSH sobre trigramas, sin comparar todos contra todos
+        inicio = time.perf_counter()
+        df_nombres = df_audit.drop_duplicates(subset=[SKU]).reset_index(drop=True)
+        similares = agrupar_nombres_similares(df_nombres[NOMBRE_PROD], umbral_similitud=umbral_similitud_nombres)
+        df_nombres['Grupo_Duplicados'] = similares["grupo"]
+        df_nombres['Similitud_Nombre'] = similares["similitud"]
+        skus_por_grupo = df_nombres[df_nombres['Grupo_Duplicados'] >= 0].groupby('Grupo_Duplicados')[SKU].transform('size')
+        df_problema = df_nombres.loc[skus_por_grupo[skus_por_grupo > 1].index].copy()
+        print(f"🔎 Nombres similares: {similares['nombres_distintos']:,} nombres distintos, {similares['pares_candidatos']:,} pares candidatos, "
+              f"{len(df_problema):,} SKUs en grupos de duplicados ({time.perf_counter() - inicio:.2f} s)")
+        if not df_problema.empty:
+            grupo = df_problema.groupby('Grupo_Duplicados')
+            df_problema['SKUs_en_Grupo'] = grupo[SKU].transform('size')
+            df_problema['Valor_Stock_Grupo'] = grupo[VALOR_STOCK].transform('sum')
+            # El nombre del SKU con más valor en stock sirve de referencia para unificar
+            referencia = df_problema.sort_values(VALOR_STOCK, ascending=False).drop_duplicates('Grupo_Duplicados')
+            df_problema['Nombre_Referencia'] = df_problema['Grupo_Duplicados'].map(referencia.set_index('Grupo_Duplicados')[NOMBRE_PROD])
+            # Numeramos los grupos de mayor a menor valor en stock
+            orden = df_problema.groupby('Grupo_Duplicados')['Valor_Stock_Grupo'].first().rank(method='first', ascending=False).astype(int)
+            df_problema['Grupo_Duplicados'] = df_problema['Grupo_Duplicados'].map(orden)
+            df_problema['Problema Detectado'] = 'Nombre Similar (Posible Duplicado)'
+            problem_dfs.append(df_problema)
+
     if not problem_dfs:
         return {"data": pd.DataFrame(), "summary": {"insight": "¡Excelente! No se encontraron problemas de calidad de datos con los criterios seleccionados.", "kpis": {}}}
 
@@ -4162,15 +5087,24 @@ def auditar_calidad_datos(
     
     # ... (Tu lógica para seleccionar, renombrar y limpiar el `df_resultado` para JSON)
         # --- PASO 4: FORMATEO FINAL DE SALIDA ---
-    columnas_finales = [SKU, NOMBRE_PROD, CATEGORIA, MARCA, STOCK_ACTUAL, VALOR_STOCK, 'Problema Detectado']
+    columnas_finales = [SKU, NOMBRE_PROD, CATEGORIA, MARCA, STOCK_ACTUAL, VALOR_STOCK, 'Problema Detectado',
+                        'Grupo_Duplicados', 'Nombre_Referencia', 'SKUs_en_Grupo', 'Valor_Stock_Grupo', 'Similitud_Nombre']
     df_final = df_resultado[[col for col in columnas_finales if col in df_resultado.columns]].copy()
     
 
     df_final.rename(columns={
         SKU: 'SKU / Código de producto', NOMBRE_PROD: 'Nombre del producto',
         CATEGORIA: 'Categoría', MARCA: 'Marca',
-        STOCK_ACTUAL: 'Stock Actual (Unds)', VALOR_STOCK: 'Valor stock (S/.)'
+        STOCK_ACTUAL: 'Stock Actual (Unds)', VALOR_STOCK: 'Valor stock (S/.)',
+        'Grupo_Duplicados': 'Grupo de Duplicados', 'Nombre_Referencia': 'Nombre de Referencia',
+        'SKUs_en_Grupo': 'SKUs en el Grupo', 'Valor_Stock_Grupo': 'Valor Stock del Grupo (S/.)',
+        'Similitud_Nombre': 'Similitud del Nombre'
     }, inplace=True)
+    if 'Grupo de Duplicados' in df_final.columns:
+        # Enteros aunque otras filas (otros problemas) no tengan grupo
+        for col in ('Grupo de Duplicados', 'SKUs en el Grupo'):
+            df_final[col] = df_final[col].astype('Int64')
+        df_final['Similitud del Nombre'] = df_final['Similitud del Nombre'].round(2)
 
     df_final = df_final.replace([np.inf, -np.inf], np.nan).where(pd.notna(df_final), None)
     
@@ -4791,7 +5725,10 @@ def generar_auditoria_inventario(
         "puntaje_salud": puntaje_salud,
         "kpis_dolor": kpis_dolor,
         "plan_de_accion": tasks,
-        "insight": insight_text # Aseguramos que el insight se actualice
+        "insight": insight_text, # Aseguramos que el insight se actualice
+        # Foto por SKU (DataFrame) para el Informe de Evolución. No se guarda en
+        # Firestore: quien persista la auditoría debe separarla antes.
+        "snapshot_skus": construir_snapshot_skus(df_maestro)
     }
 
 
@@ -0,0 +1,201 @@
+# ventas_incrementales.py
+# ===================================================================================
+# --- CARGA INCREMENTAL DEL HISTORIAL DE VENTAS (DELTAS) ---
+# ===================================================================================
+# En lugar de volver a subir todo el historial cada semana, el cliente sube solo
+# las ventas nuevas. Cada delta se deduplica contra el historial por
+# (N° de comprobante, SKU, fecha) usando un índice ordenado de hashes de 64 bits,
+# se guarda como un segmento más del archivo y actualiza metadatos y agregados
+# sumando solo lo nuevo: nunca se vuelve a leer ni parsear el historial completo.
+import io
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ventas_por_bloques import lineas_representadas
+
+SKU_COL = 'SKU / Código de producto'
+FECHA_COL = 'Fecha de venta'
+COMPROBANTE_COL = 'N° de comprobante / boleta'
+CANTIDAD_COL = 'Cantidad vendida'
+PRECIO_VENTA_COL = 'Precio de venta unitario (S/.)'
+
+COLUMNAS_REQUERIDAS_DELTA = [COMPROBANTE_COL, SKU_COL, FECHA_COL, CANTIDAD_COL]
+
+
+def _texto_normalizado(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip()
+
+
+def _fechas(df: pd.DataFrame) -> pd.Series:
+    return pd.to_datetime(df[FECHA_COL], format='%d/%m/%Y', errors='coerce')
+
+
+def _hash_64(columnas: Dict[str, pd.Series]) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.DataFrame(columnas), index=False).to_numpy(dtype=np.uint64)
+
+
+def claves_de_ventas(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash de 64 bits de (comprobante, SKU, fecha) por línea. La fecha se normaliza
+    a AAAA-MM-DD para que '1/2/2024' y '01/02/2024' sean la misma venta.
+    """
+    return _hash_64({
+        "comprobante": _texto_normalizado(df[COMPROBANTE_COL]),
+        "sku": _texto_normalizado(df[SKU_COL]),
+        "fecha": _fechas(df).dt.strftime('%Y-%m-%d').fillna(_texto_normalizado(df[FECHA_COL])),
+    })
+
+
+def claves_de_comprobantes(df: pd.DataFrame) -> np.ndarray:
+    return _hash_64({"comprobante": _texto_normalizado(df[COMPROBANTE_COL])})
+
+
+def construir_indice(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Índice ordenado de claves de línea y de comprobantes de un historial completo."""
+    return {
+        "claves": np.unique(claves_de_ventas(df)),
+        "comprobantes": np.unique(claves_de_comprobantes(df)),
+    }
+
+
+def construir_indice_por_bloques(bloques: Iterable[pd.DataFrame]) -> Dict[str, np.ndarray]:
+    """Igual que `construir_indice`, leyendo el historial por bloques (ver ventas_por_bloques.py)."""
+    claves, comprobantes = [], []
+    for bloque in bloques:
+        claves.append(np.unique(claves_de_ventas(bloque)))
+        comprobantes.append(np.unique(claves_de_comprobantes(bloque)))
+    if not claves:
+        return {"claves": np.array([], dtype=np.uint64), "comprobantes": np.array([], dtype=np.uint64)}
+    return {"claves": np.unique(np.concatenate(claves)), "comprobantes": np.unique(np.concatenate(comprobantes))}
+
+
+def _contiene(indice_ordenado: np.ndarray, valores: np.ndarray) -> np.ndarray:
+    """Pertenencia por búsqueda binaria: O(d log n) para d valores en un índice de n."""
+    if len(indice_ordenado) == 0:
+        return np.zeros(len(valores), dtype=bool)
+    posiciones = np.searchsorted(indice_ordenado, valores)
+    posiciones[posiciones == len(indice_ordenado)] = 0
+    return indice_ordenado[posiciones] == valores
+
+
+def _insertar_ordenado(indice_ordenado: np.ndarray, valores: np.ndarray) -> np.ndarray:
+    """Inserta valores nuevos (no presentes) en un índice ordenado: O(n) de copia, sin reordenar."""
+    valores = np.unique(valores)
+    return np.insert(indice_ordenado, np.searchsorted(indice_ordenado, valores), valores)
+
+
+def deduplicar_delta(df_delta: pd.DataFrame, indice: Dict[str, np.ndarray]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Quita del delta las líneas que ya están en el historial (o repetidas dentro
+    del propio delta). Devuelve (líneas_nuevas, resumen con conteos y el índice actualizado).
+    """
+    claves = claves_de_ventas(df_delta)
+    ya_en_historial = _contiene(indice["claves"], claves)
+    repetida_en_delta = pd.Series(claves).duplicated().to_numpy()
+    es_nueva = ~ya_en_historial & ~repetida_en_delta
+    df_nuevas = df_delta[es_nueva].reset_index(drop=True)
+
+    comprobantes = claves_de_comprobantes(df_nuevas)
+    comprobantes_nuevos = np.unique(comprobantes[~_contiene(indice["comprobantes"], comprobantes)])
+
+    resumen = {
+        "lineas_recibidas": int(len(df_delta)),
+        "lineas_nuevas": int(es_nueva.sum()),
+        "lineas_duplicadas_historial": int(ya_en_historial.sum()),
+        "lineas_duplicadas_en_delta": int((repetida_en_delta & ~ya_en_historial).sum()),
+        "comprobantes_nuevos": int(len(comprobantes_nuevos)),
+        "indice": {
+            # Insertar en un arreglo ordenado es una copia de memoria, no un re-parseo del historial
+            "claves": _insertar_ordenado(indice["claves"], claves[es_nueva]),
+            "comprobantes": _insertar_ordenado(indice["comprobantes"], comprobantes_nuevos),
+        },
+    }
+    return df_nuevas, resumen
+
+
+def serializar_indice(indice: Dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, claves=indice["claves"], comprobantes=indice["comprobantes"])
+    return buffer.getvalue()
+
+
+def deserializar_indice(contenido: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(contenido)) as datos:
+        return {"claves": datos["claves"], "comprobantes": datos["comprobantes"]}
+
+
+def _como_fecha(valor: Any) -> pd.Timestamp:
+    # Firestore devuelve las fechas con zona horaria (UTC); las del CSV no la tienen
+    fecha = pd.Timestamp(valor)
+    return fecha.tz_convert(None) if fecha.tzinfo is not None else fecha
+
+
+def actualizar_metadatos_ventas(metadata_base: Dict[str, Any], df_nuevas: pd.DataFrame, resumen: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Metadatos del historial + delta, calculados solo con las líneas nuevas.
+    Las fechas base pueden venir de Firestore (con zona horaria) o como ISO; se
+    devuelven como Timestamp, igual que en `extraer_metadatos_df`.
+    """
+    metadata = dict(metadata_base or {})
+    metadata['num_transacciones'] = int(metadata.get('num_transacciones', 0)) + resumen["lineas_nuevas"]
+    metadata['num_receipts'] = int(metadata.get('num_receipts', 0)) + resumen["comprobantes_nuevos"]
+
+    fechas = _fechas(df_nuevas).dropna()
+    candidatas_min = [_como_fecha(metadata['fecha_primera_venta'])] if metadata.get('fecha_primera_venta') else []
+    candidatas_max = [_como_fecha(metadata['fecha_ultima_venta'])] if metadata.get('fecha_ultima_venta') else []
+    if not fechas.empty:
+        candidatas_min.append(fechas.min())
+        candidatas_max.append(fechas.max())
+    if candidatas_min:
+        metadata['fecha_primera_venta'] = min(candidatas_min)
+        metadata['fecha_ultima_venta'] = max(candidatas_max)
+        metadata['rango_dias_historico'] = int((metadata['fecha_ultima_venta'] - metadata['fecha_primera_venta']).days)
+    return metadata
+
+
+# --- AGREGADOS MANTENIDOS DE FORMA INCREMENTAL ---
+def agregar_por_sku_dia(df_ventas: pd.DataFrame) -> pd.DataFrame:
+    """Unidades, ingresos y líneas por (SKU, día)."""
+    ventas = pd.DataFrame({
+        "sku": _texto_normalizado(df_ventas[SKU_COL]),
+        "fecha": _fechas(df_ventas),
+        "unidades": pd.to_numeric(df_ventas[CANTIDAD_COL], errors='coerce').fillna(0),
+    })
+    precio = pd.to_numeric(df_ventas[PRECIO_VENTA_COL], errors='coerce').fillna(0) if PRECIO_VENTA_COL in df_ventas.columns else 0
+    ventas["ingresos"] = ventas["unidades"] * precio
+    ventas["lineas"] = lineas_representadas(df_ventas).to_numpy()
+    return ventas.dropna(subset=["fecha"]).groupby(["sku", "fecha"], sort=False)[["unidades", "ingresos", "lineas"]].sum()
+
+
+def combinar_agregados_diarios(base: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Suma el delta sobre los agregados por (SKU, día); solo se reagrupan las filas tocadas."""
+    if base is None or base.empty:
+        return delta
+    tocadas = base.index.isin(delta.index)
+    actualizadas = pd.concat([base[tocadas], delta]).groupby(level=[0, 1], sort=False).sum()
+    return pd.concat([base[~tocadas], actualizadas])
+
+
+def combinar_agregados_sku(base: Optional[pd.DataFrame], df_nuevas: pd.DataFrame, agregar_ventas_por_sku) -> Optional[pd.DataFrame]:
+    """
+    Actualiza los agregados por SKU (ver precalculo.agregar_ventas_por_sku) con las
+    líneas nuevas: sumas para unidades/ingresos/líneas, mín/máx para las fechas.
+    """
+    if base is None:
+        return None
+    if df_nuevas.empty: # Todo el delta ya estaba en el historial: los agregados no cambian
+        return base
+    delta = agregar_ventas_por_sku(df_nuevas)
+    if delta is None:
+        return None
+    tocados = base.index.intersection(delta.index)
+    resultado = pd.concat([base, delta[~delta.index.isin(tocados)]])
+    for columna in ("unidades", "lineas", "ingresos"):
+        if columna in resultado.columns and columna in delta.columns:
+            resultado.loc[tocados, columna] = base.loc[tocados, columna] + delta.loc[tocados, columna]
+    if "primera_venta" in resultado.columns and "primera_venta" in delta.columns:
+        resultado.loc[tocados, "primera_venta"] = np.minimum(base.loc[tocados, "primera_venta"], delta.loc[tocados, "primera_venta"])
+        resultado.loc[tocados, "ultima_venta"] = np.maximum(base.loc[tocados, "ultima_venta"], delta.loc[tocados, "ultima_venta"])
+    return resultado
@@ -0,0 +1,130 @@
+# ventas_por_bloques.py
+# ===================================================================================
+# --- LECTURA POR BLOQUES DE HISTORIALES DE VENTAS MUY GRANDES ---
+# ===================================================================================
+# El plan Diamante no tiene límite de filas, pero los motores de track_expenses.py
+# reciben el historial completo como un DataFrame (y hacen varias copias). Para
+# historiales de millones de líneas leemos el CSV por bloques y cada bloque se
+# "condensa": las líneas con el mismo SKU, producto, fecha y precio unitario se
+# suman en una sola fila que recuerda cuántas líneas representa (COLUMNA_LINEAS).
+#
+# El resultado tiene las mismas columnas que el archivo original, así que los
+# motores lo procesan sin cambios: sus sumas, máximos y conteos de días con venta
+# son idénticos, y el precio promedio por línea se pondera con COLUMNA_LINEAS.
+# El tamaño ya no depende de las líneas sino de SKUs x días x precios distintos.
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SKU_COL = 'SKU / Código de producto'
+NOMBRE_COL = 'Nombre del producto'
+FECHA_COL = 'Fecha de venta'
+CANTIDAD_COL = 'Cantidad vendida'
+PRECIO_VENTA_COL = 'Precio de venta unitario (S/.)'
+COMPROBANTE_COL = 'N° de comprobante / boleta'
+
+# Cuántas líneas originales representa cada fila de un historial condensado
+COLUMNA_LINEAS = 'Lineas de venta'
+
+COLUMNAS_CLAVE = [SKU_COL, NOMBRE_COL, FECHA_COL, PRECIO_VENTA_COL]
+COLUMNAS_CONDENSABLES = set(COLUMNAS_CLAVE) | {CANTIDAD_COL}
+
+FILAS_POR_BLOQUE = 250_000
+
+
+def leer_por_bloques(fuente, filas_por_bloque: int = FILAS_POR_BLOQUE, columnas: Optional[set] = None, **opciones_csv) -> Iterator[pd.DataFrame]:
+    """Itera el CSV en bloques de `filas_por_bloque`, con los nombres de columna ya limpios."""
+    if columnas is not None:
+        opciones_csv["usecols"] = lambda col: col.strip() in columnas
+    for bloque in pd.read_csv(fuente, chunksize=filas_por_bloque, **opciones_csv):
+        bloque.columns = bloque.columns.str.strip()
+        yield bloque
+
+
+def lineas_representadas(df_ventas: pd.DataFrame) -> pd.Series:
+    """Líneas originales por fila: 1 en un historial normal, COLUMNA_LINEAS en uno condensado."""
+    if COLUMNA_LINEAS in df_ventas.columns:
+        return df_ventas[COLUMNA_LINEAS]
+    return pd.Series(1, index=df_ventas.index)
+
+
+def _condensar_bloque(bloque: pd.DataFrame) -> pd.DataFrame:
+    if SKU_COL not in bloque.columns or CANTIDAD_COL not in bloque.columns:
+        raise ValueError(f"El archivo de ventas debe tener las columnas '{SKU_COL}' y '{CANTIDAD_COL}'.")
+    # assign() no modifica el bloque recibido: puede ser un condensado compartido de la caché
+    columnas = {
+        SKU_COL: bloque[SKU_COL].astype(str).str.strip(),
+        CANTIDAD_COL: pd.to_numeric(bloque[CANTIDAD_COL], errors='coerce'),
+        COLUMNA_LINEAS: lineas_representadas(bloque),
+    }
+    if PRECIO_VENTA_COL in bloque.columns:
+        columnas[PRECIO_VENTA_COL] = pd.to_numeric(bloque[PRECIO_VENTA_COL], errors='coerce')
+    return _reducir([bloque.assign(**columnas)])
+
+
+def _reducir(parciales: List[pd.DataFrame]) -> pd.DataFrame:
+    """Vuelve a agrupar resultados parciales (las sumas son asociativas)."""
+    unidos = parciales[0] if len(parciales) == 1 else pd.concat(parciales, ignore_index=True)
+    claves = [col for col in COLUMNAS_CLAVE if col in unidos.columns]
+    # dropna=False: un nombre o precio vacío no debe hacer desaparecer la venta
+    return unidos.groupby(claves, dropna=False, sort=False).agg(
+        {CANTIDAD_COL: 'sum', COLUMNA_LINEAS: 'sum'}
+    ).reset_index()
+
+
+def condensar_bloques(bloques: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Condensa un historial bloque a bloque. La memoria queda acotada por el tamaño
+    del bloque más el resultado condensado acumulado, no por el total de líneas.
+    """
+    parciales: List[pd.DataFrame] = []
+    filas_parciales = 0
+    limite_parciales = FILAS_POR_BLOQUE
+    for bloque in bloques:
+        condensado = _condensar_bloque(bloque)
+        parciales.append(condensado)
+        filas_parciales += len(condensado)
+        if filas_parciales > limite_parciales:
+            parciales = [_reducir(parciales)]
+            filas_parciales = len(parciales[0])
+            # Si el condensado ya es grande, lo reducimos con menos frecuencia
+            limite_parciales = max(limite_parciales, 2 * filas_parciales)
+    if not parciales:
+        return pd.DataFrame(columns=[SKU_COL, CANTIDAD_COL, COLUMNA_LINEAS])
+    return _reducir(parciales)
+
+
+def condensar_ventas(fuente, filas_por_bloque: int = FILAS_POR_BLOQUE, **opciones_csv) -> pd.DataFrame:
+    """Lee un CSV de ventas (ruta o flujo) por bloques y devuelve el historial condensado."""
+    return condensar_bloques(leer_por_bloques(fuente, filas_por_bloque, COLUMNAS_CONDENSABLES, **opciones_csv))
+
+
+def metadatos_ventas_por_bloques(fuente, filas_por_bloque: int = FILAS_POR_BLOQUE, **opciones_csv) -> Dict[str, Any]:
+    """
+    Los mismos metadatos que `extraer_metadatos_df` para ventas, en una pasada por
+    bloques. Los comprobantes distintos se cuentan con hashes de 64 bits.
+    """
+    num_transacciones = 0
+    comprobantes = np.array([], dtype=np.uint64)
+    fecha_min, fecha_max = None, None
+    columnas = {COMPROBANTE_COL, FECHA_COL}
+    for bloque in leer_por_bloques(fuente, filas_por_bloque, columnas, **opciones_csv):
+        num_transacciones += len(bloque)
+        if COMPROBANTE_COL in bloque.columns:
+            hashes = pd.util.hash_pandas_object(bloque[COMPROBANTE_COL].dropna().astype(str).str.strip(), index=False).to_numpy(dtype=np.uint64)
+            comprobantes = np.union1d(comprobantes, hashes)
+        if FECHA_COL in bloque.columns:
+            fechas = pd.to_datetime(bloque[FECHA_COL], format='%d/%m/%Y', errors='coerce').dropna()
+            if not fechas.empty:
+                fecha_min = fechas.min() if fecha_min is None else min(fecha_min, fechas.min())
+                fecha_max = fechas.max() if fecha_max is None else max(fecha_max, fechas.max())
+
+    metadata: Dict[str, Any] = {'num_transacciones': int(num_transacciones)}
+    if len(comprobantes):
+        metadata['num_receipts'] = int(len(comprobantes))
+    if fecha_min is not None:
+        metadata['fecha_primera_venta'] = fecha_min
+        metadata['fecha_ultima_venta'] = fecha_max
+        metadata['rango_dias_historico'] = int((fecha_max - fecha_min).days)
+    return metadata
@@ -107,11 +107,14 @@ function AppContent() {
   };
 
 
-  const handleAnonymousAnalyze = async ({ reportType, ventasFile, inventarioFile }) => {
+  const handleAnonymousAnalyze = async ({ reportType, ventasFile, inventarioFile, validationToken }) => {
     const formData = new FormData();
     formData.append("ventas_file", ventasFile);
     formData.append("inventario_file", inventarioFile);
     formData.append("report_type", reportType);
+    if (validationToken) {
+      formData.append("validation_token", validationToken);
+    }
 
     try {
       // Usamos el cliente 'api' que no tiene interceptor de token
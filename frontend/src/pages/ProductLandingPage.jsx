@@ -177,14 +177,15 @@ export const ProductLandingPage = ({ title, subtitle, action, ctaText, reportTyp
 
     try {
       const response = await axios.post(`${API_URL}/api/v1/anonymous-validate`, formData);
-      const { status, message } = response.data;
+      const { status, message, validation_token } = response.data;
       
       switch (status) {
         case 'VALIDATION_SUCCESS':
           setErrorCount(0);
           setFeedback({ type: 'success', message: '¡Validación exitosa! Generando tu análisis completo...' });
-          // Llamamos a la función de ejecución final que nos pasaron desde App.jsx
-          await onAnalyze({ reportType, ventasFile, inventarioFile });
+          // Llamamos a la función de ejecución final que nos pasaron desde App.jsx.
+          // El token permite al backend reutilizar los archivos ya validados.
+          await onAnalyze({ reportType, ventasFile, inventarioFile, validationToken: validation_token });
           break;
         
         case 'EMPTY_RESULT':
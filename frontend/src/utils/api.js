@@ -55,6 +55,13 @@ api.interceptors.request.use(
       // Si existe un token, lo añadimos a la cabecera de autorización.
       config.headers['Authorization'] = `Bearer ${token}`;
     }
+    // El backend decide qué nodo atiende el workspace sin leer el cuerpo de la petición,
+    // así que el workspace_id del formulario o del JSON viaja también en una cabecera.
+    const data = config.data;
+    const workspaceId = data instanceof FormData ? data.get('workspace_id') : data?.workspace_id;
+    if (workspaceId) {
+      config.headers['X-Workspace-ID'] = workspaceId;
+    }
     return config;
   },
   (error) => {